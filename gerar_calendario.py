@@ -1,43 +1,42 @@
+import argparse
+import os
+
+import numpy as np
 import pandas as pd
 import holidays
 from datetime import date, timedelta
 
-def criar_base_calendario_brasil(start_year=2020, end_year=2040):
-    """
-    Cria uma base de dados completa com todos os dias do período especificado,
-    enriquecida com informações sobre feriados nacionais brasileiros e outras
-    datas importantes para análise de sazonalidade.
+from painel_ingest import ler_geojson, normalizar_serie, dia_ordinal, caminho_aliases, ARQUIVO_ALIASES
+from painel_consultas import CalendarioDias, ARQUIVO_CALENDARIO_DIAS, TIPOS_DIA
 
-    Args:
-        start_year (int): O ano de início do período.
-        end_year (int): O ano de fim do período.
+# Estado cujos feriados entram no calendário geral, além dos nacionais
+UF = 'SC'
+# Tabela local de feriados municipais: municipio, data ('DD/MM' para todos os anos ou 'AAAA-MM-DD'), nome e fonte
+ARQUIVO_FERIADOS_MUNICIPAIS = "data/feriados_municipais.csv"
 
-    Returns:
-        pd.DataFrame: Um DataFrame com o calendário completo e as flags de eventos.
+def _dias_com_feriados(data_inicial, data_final):
     """
-    print(f"Gerando calendário de {start_year} a {end_year}...")
+    Monta um DataFrame com todos os dias entre `data_inicial` e `data_final`
+    (inclusive) e o nome do feriado nacional ou estadual (UF) de cada dia
+    (NaN nos demais).
+    """
+    br_holidays = holidays.Brazil(subdiv=UF, years=range(data_inicial.year, data_final.year + 1))
 
-    # 1. Obter todos os feriados nacionais do período usando a biblioteca holidays
-    br_holidays = holidays.Brazil(years=range(start_year, end_year + 1))
-    
     # Converter para um formato mais fácil de usar (DataFrame)
     df_feriados = pd.DataFrame(list(br_holidays.items()), columns=['data', 'nome_feriado'])
     df_feriados['data'] = pd.to_datetime(df_feriados['data'])
-    print(f"Total de {len(df_feriados)} feriados nacionais encontrados.")
 
-    # 2. Criar um DataFrame com TODOS os dias do período
-    start_date = date(start_year, 1, 1)
-    end_date = date(end_year, 12, 31)
-    
     df_calendario = pd.DataFrame({
-        'data': pd.to_datetime(pd.date_range(start_date, end_date, freq='D'))
+        'data': pd.to_datetime(pd.date_range(data_inicial, data_final, freq='D'))
     })
+    return pd.merge(df_calendario, df_feriados, on='data', how='left')
 
-    # 3. Juntar as informações de feriados ao calendário completo
-    df_completo = pd.merge(df_calendario, df_feriados, on='data', how='left')
-
-    # 4. Criar as colunas de análise (flags)
-    
+def marcar_tipos_de_dia(df_completo):
+    """
+    Cria as flags de análise a partir das colunas `data` e `nome_feriado` de um
+    calendário com dias consecutivos. As flags de véspera e pós-feriado olham os
+    dias vizinhos, por isso são sempre calculadas sobre o período inteiro.
+    """
     # Flag para identificar se o dia é um feriado
     df_completo['is_feriado'] = df_completo['nome_feriado'].notna()
 
@@ -49,7 +48,7 @@ def criar_base_calendario_brasil(start_year=2020, end_year=2040):
     # Flag para identificar a véspera de feriado (dia útil)
     # Usamos shift(-1) para "olhar" o dia seguinte
     df_completo['is_vespera_feriado'] = (
-        (df_completo['is_feriado'].shift(-1) == True) & 
+        (df_completo['is_feriado'].shift(-1) == True) &
         (df_completo['is_fim_de_semana'] == False)
     ).fillna(False)
 
@@ -66,20 +65,204 @@ def criar_base_calendario_brasil(start_year=2020, end_year=2040):
         'Thursday': 'Quinta-feira', 'Friday': 'Sexta-feira', 'Saturday': 'Sábado', 'Sunday': 'Domingo'
     }
     df_completo['dia_semana_nome'] = df_completo['dia_semana_nome'].map(nomes_dias_pt)
+    return df_completo
+
+def criar_base_calendario_brasil(start_year=2020, end_year=2040):
+    """
+    Cria uma base de dados completa com todos os dias do período especificado,
+    enriquecida com informações sobre feriados nacionais brasileiros, os
+    estaduais de Santa Catarina e outras datas importantes para análise de
+    sazonalidade.
+
+    Args:
+        start_year (int): O ano de início do período.
+        end_year (int): O ano de fim do período.
+
+    Returns:
+        pd.DataFrame: Um DataFrame com o calendário completo e as flags de eventos.
+    """
+    print(f"Gerando calendário de {start_year} a {end_year}...")
+
+    # 1. Obter todos os dias do período com os feriados nacionais (biblioteca holidays)
+    df_completo = _dias_com_feriados(date(start_year, 1, 1), date(end_year, 12, 31))
+    print(f"Total de {df_completo['nome_feriado'].notna().sum()} feriados nacionais e estaduais encontrados.")
+
+    # 2. Criar as colunas de análise (flags)
+    df_completo = marcar_tipos_de_dia(df_completo)
 
     print("Colunas de análise criadas com sucesso.")
     return df_completo
 
+def estender_calendario_binario(start_year, end_year, caminho=ARQUIVO_CALENDARIO_DIAS):
+    """
+    Garante que o artefato binário do calendário cubra de `start_year` a
+    `end_year` sem regerar o que já existe.
+
+    Os feriados dos dias já presentes no artefato são lidos dele; só os dias
+    novos passam pela biblioteca holidays. As flags são recalculadas no período
+    inteiro (véspera e pós-feriado dependem dos vizinhos na junção) e o
+    artefato é regravado.
+
+    Args:
+        start_year (int): O ano de início desejado.
+        end_year (int): O ano de fim desejado.
+        caminho (str): O arquivo `.npz` do calendário.
+
+    Returns:
+        pd.DataFrame: O calendário completo, com as mesmas colunas de `criar_base_calendario_brasil`.
+    """
+    try:
+        calendario = CalendarioDias.carregar(caminho) if os.path.exists(caminho) else None
+    except ValueError as e:
+        print(f"{e} Regerando o período inteiro.")
+        calendario = None
+
+    if calendario is None:
+        df_completo = criar_base_calendario_brasil(start_year, end_year)
+    else:
+        dias = np.arange(calendario.primeiro_dia, calendario.ultimo_dia + 1)
+        df_existente = pd.DataFrame({
+            'data': pd.to_datetime(dias, unit='D'),
+            'nome_feriado': calendario.feriados_dias(dias),
+        })
+        primeira_data = df_existente['data'].iloc[0].date()
+        ultima_data = df_existente['data'].iloc[-1].date()
+
+        partes = [df_existente]
+        if date(start_year, 1, 1) < primeira_data:
+            partes.insert(0, _dias_com_feriados(date(start_year, 1, 1), primeira_data - timedelta(days=1)))
+        if date(end_year, 12, 31) > ultima_data:
+            partes.append(_dias_com_feriados(ultima_data + timedelta(days=1), date(end_year, 12, 31)))
+        if len(partes) == 1:
+            print(f"Calendário em '{caminho}' já cobre {start_year} a {end_year}.")
+        else:
+            print(f"Estendendo calendário de {primeira_data} a {ultima_data} para cobrir {start_year} a {end_year}...")
+
+        df_completo = marcar_tipos_de_dia(pd.concat(partes, ignore_index=True))
+
+    salvar_calendario_binario(df_completo, caminho)
+    return df_completo
+
+def carregar_feriados_municipais(caminho=ARQUIVO_FERIADOS_MUNICIPAIS, anos=(), arquivo_aliases=ARQUIVO_ALIASES):
+    """
+    Lê a tabela local de feriados municipais e devolve uma linha por ocorrência
+    (`municipio_normalizado`, `data`, `nome_feriado`). Datas 'DD/MM' repetem em
+    cada um dos `anos`; datas 'AAAA-MM-DD' valem só para aquele dia.
+    """
+    colunas = ['municipio_normalizado', 'data', 'nome_feriado']
+    if not os.path.exists(caminho):
+        print(f"Tabela de feriados municipais '{caminho}' não encontrada; seguindo só com os feriados nacionais e estaduais.")
+        return pd.DataFrame(columns=colunas)
+
+    df = pd.read_csv(caminho, dtype=str, keep_default_na=False)
+    df['municipio_normalizado'] = normalizar_serie(df['municipio'].str.strip(), arquivo_aliases)
+    anuais = df['data'].str.fullmatch(r'\d{1,2}/\d{1,2}')
+    partes = [df.loc[~anuais].assign(data=pd.to_datetime(df.loc[~anuais, 'data'], format='%Y-%m-%d'))]
+    for ano in anos:
+        partes.append(df.loc[anuais].assign(
+            data=pd.to_datetime(df.loc[anuais, 'data'] + f'/{ano}', format='%d/%m/%Y', errors='coerce')
+        ))
+    df_municipais = pd.concat(partes, ignore_index=True).dropna(subset=['data'])
+    return df_municipais.rename(columns={'nome': 'nome_feriado'})[colunas]
+
+def montar_camada_municipal(calendario, municipios, df_municipais):
+    """
+    Acrescenta ao calendário geral a camada município x dia dos municípios com
+    feriados próprios: cada linha recebe os feriados do calendário geral mais os
+    do município, e as flags de véspera e pós-feriado são refeitas linha a linha,
+    de forma vetorizada. Só entram as linhas que diferem do calendário geral; os
+    demais municípios (e todos, se a tabela estiver vazia) seguem o calendário
+    geral, que é devolvido sem camada.
+    """
+    bit = {tipo: np.uint8(1 << posicao) for posicao, tipo in enumerate(TIPOS_DIA)}
+    conhecidos = df_municipais['municipio_normalizado'].isin(set(municipios))
+    if not conhecidos.all():
+        print(f"Feriados municipais ignorados (município não encontrado no GeoJSON): "
+              f"{sorted(set(df_municipais.loc[~conhecidos, 'municipio_normalizado']))}")
+    posicoes = dia_ordinal(df_municipais['data']).astype(np.int64) - calendario.primeiro_dia
+    dentro = conhecidos.to_numpy() & (posicoes >= 0) & (posicoes < len(calendario.codigos))
+    df_municipais, posicoes = df_municipais[dentro], posicoes[dentro]
+    if df_municipais.empty:
+        return calendario
+
+    municipios = np.array(sorted(set(df_municipais['municipio_normalizado'])))
+    linhas = np.searchsorted(municipios, df_municipais['municipio_normalizado'].to_numpy(dtype=str))
+    nomes = df_municipais['nome_feriado'].to_numpy()
+
+    feriado = np.repeat((calendario.codigos & bit['is_feriado']).astype(bool)[None, :], len(municipios), axis=0)
+    feriado[linhas, posicoes] = True
+    fim_de_semana = (calendario.codigos & bit['is_fim_de_semana']).astype(bool)
+    vespera = np.zeros_like(feriado)
+    vespera[:, :-1] = feriado[:, 1:]
+    pos_feriado = np.zeros_like(feriado)
+    pos_feriado[:, 1:] = feriado[:, :-1]
+    codigos_municipios = (
+        feriado * bit['is_feriado'] + fim_de_semana * bit['is_fim_de_semana']
+        + (vespera & ~fim_de_semana) * bit['is_vespera_feriado'] + (pos_feriado & ~fim_de_semana) * bit['is_pos_feriado']
+    ).astype(np.uint8)
+
+    # Feriados municipais que coincidem com os gerais não mudam a linha, que é descartada
+    diferentes = (codigos_municipios != calendario.codigos).any(axis=1)
+    if not diferentes.any():
+        return calendario
+    novas_linhas = np.cumsum(diferentes) - 1
+    mantidos = diferentes[linhas]
+    municipios, codigos_municipios = municipios[diferentes], codigos_municipios[diferentes]
+    linhas, posicoes, nomes = novas_linhas[linhas[mantidos]], posicoes[mantidos], nomes[mantidos]
+
+    nomes_feriados = list(calendario.nomes_feriados)
+    nomes_feriados += sorted(set(nomes) - set(nomes_feriados))
+    ids_nomes = {nome: i for i, nome in enumerate(nomes_feriados)}
+    chaves, primeiros = np.unique(linhas * len(calendario.codigos) + posicoes, return_index=True)
+    ids = np.array([ids_nomes[nome] for nome in nomes[primeiros]], dtype=np.int16)
+
+    return CalendarioDias(
+        calendario.primeiro_dia, calendario.codigos, calendario.feriados, nomes_feriados, calendario.tipos,
+        municipios, codigos_municipios, chaves, ids
+    )
+
+def salvar_calendario_binario(df_completo, caminho=ARQUIVO_CALENDARIO_DIAS, diretorio_dados='data',
+                              arquivo_municipais=ARQUIVO_FERIADOS_MUNICIPAIS):
+    """
+    Grava o calendário como artefato binário: flags de tipo de dia em bits e o
+    índice do feriado de cada dia, indexados pelo dia ordinal, mais a camada
+    município x dia com os feriados municipais (ver `CalendarioDias`). A camada
+    municipal é sempre refeita a partir da tabela local.
+    """
+    dias = df_completo.assign(dia_ordinal=(df_completo['data'] - pd.Timestamp(0)).dt.days)
+    calendario = CalendarioDias.de_tabela(dias)
+
+    geojson = ler_geojson(diretorio_dados)
+    aliases = caminho_aliases(diretorio_dados)
+    municipios = normalizar_serie(pd.Series([f['properties']['NM_MUN'] for f in geojson['features']]), aliases)
+    anos = range(df_completo['data'].dt.year.min(), df_completo['data'].dt.year.max() + 1)
+    df_municipais = carregar_feriados_municipais(arquivo_municipais, anos, aliases)
+    calendario = montar_camada_municipal(calendario, municipios, df_municipais)
+
+    calendario.salvar(caminho)
+    print(f"Calendário binário salvo em '{caminho}' ({os.path.getsize(caminho) / 1024:.1f} KB, "
+          f"{len(calendario.municipios)} municípios, {len(calendario.chaves_feriados_municipais)} feriados municipais).")
+
 if __name__ == "__main__":
     # --- CONFIGURAÇÕES ---
     ANO_INICIO = 2020
     ANO_FIM = 2040
     NOME_ARQUIVO_EXCEL = "data/base_calendario_feriados.xlsx"
     NOME_ARQUIVO_CSV = "data/base_calendario_feriados.csv"
-    
-    # Gera o DataFrame
-    calendario_brasil = criar_base_calendario_brasil(ANO_INICIO, ANO_FIM)
-    
+
+    parser = argparse.ArgumentParser(description="Gera a base de calendário com feriados e o artefato binário usado pela análise sazonal.")
+    parser.add_argument('--ano-inicio', type=int, default=ANO_INICIO, help=f"Primeiro ano do calendário (padrão: {ANO_INICIO}).")
+    parser.add_argument('--ano-fim', type=int, default=ANO_FIM, help=f"Último ano do calendário (padrão: {ANO_FIM}).")
+    parser.add_argument('--completo', action='store_true', help="Regera todo o período em vez de só estender o artefato existente.")
+    args = parser.parse_args()
+
+    # Gera o DataFrame e o artefato binário (por padrão, só os anos que ainda faltam no artefato)
+    if args.completo:
+        calendario_brasil = criar_base_calendario_brasil(args.ano_inicio, args.ano_fim)
+        salvar_calendario_binario(calendario_brasil)
+    else:
+        calendario_brasil = estender_calendario_binario(args.ano_inicio, args.ano_fim)
+
     # --- SALVAR O ARQUIVO ---
     # Salvar em formato Excel (recomendado)
     try:
@@ -94,10 +277,10 @@ if __name__ == "__main__":
     #     print(f"Base de dados salva com sucesso em: '{NOME_ARQUIVO_CSV}'")
     # except Exception as e:
     #     print(f"Erro ao salvar o arquivo CSV: {e}")
-        
+
     print("\nVisualização das 5 primeiras linhas do arquivo gerado:")
     print(calendario_brasil.head())
     print("\nExemplo de um feriado (Ano Novo):")
     print(calendario_brasil[calendario_brasil['data'].dt.dayofyear <= 2])
     print("\nExemplo de um feriado móvel (Carnaval 2025):")
-    print(calendario_brasil[(calendario_brasil['data'] >= '2025-03-01') & (calendario_brasil['data'] <= '2025-03-05')])
\ No newline at end of file
+    print(calendario_brasil[(calendario_brasil['data'] >= '2025-03-01') & (calendario_brasil['data'] <= '2025-03-05')])
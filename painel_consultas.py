@@ -0,0 +1,812 @@
+"""
+Consultas sobre as bases já tratadas do painel.
+
+Funções sem dependência do Streamlit usadas pelos filtros e análises do
+painel: recebem os DataFrames carregados e as seleções da barra lateral e
+devolvem máscaras ou recortes.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from painel_ingest import dia_ordinal, DIA_ORDINAL_AUSENTE
+
+# Chaves das células dos cubos de contagem: município x fato x ano x mês x dia
+# da semana x faixa etária. Região, associação, nome normalizado e mês ordinal
+# dependem do município ou do mês e vêm junto sem criar células novas. O número
+# de células cresce com as combinações, não com os registros; períodos e idades
+# são filtrados pelos limites de cada célula (ver `IndiceCubo`).
+DIMENSOES_CUBO = [
+    'ano', 'mes', 'mes_ordinal', 'dia_semana', 'municipio', 'municipio_normalizado',
+    'mesoregiao', 'associacao', 'fato_comunicado', 'faixa_etaria'
+]
+# Colunas numéricas resumidas em cada célula: limites para os filtros de intervalo e soma para as médias.
+INTERVALOS_CUBO = ['dia_ordinal', 'idade_vitima']
+MEDIAS_CUBO = ['idade_vitima']
+ATRIBUTOS_FEMINICIDIO = [
+    'idade_autor', 'localidade', 'relacao_autor', 'bo_de_vd_contra_o_autor', 'passagem_policial',
+    'passagem_por_violencia_domestica', 'autor_preso', 'meio_crime'
+]
+
+
+def mascara_periodo(df, data_inicial, data_final):
+    """Máscara booleana das linhas cujo `dia_ordinal` está no período (extremos inclusos)."""
+    dias = df['dia_ordinal'].to_numpy()
+    return (dias >= dia_ordinal(data_inicial)) & (dias <= dia_ordinal(data_final))
+
+
+def recortar_periodo(df, data_inicial, data_final):
+    """
+    Recorta um DataFrame ordenado por `dia_ordinal` ao período, por busca binária.
+
+    Para bases fora de ordem, usar `mascara_periodo`.
+    """
+    dias = df['dia_ordinal'].to_numpy()
+    inicio = np.searchsorted(dias, dia_ordinal(data_inicial), side='left')
+    fim = np.searchsorted(dias, dia_ordinal(data_final), side='right')
+    return df.iloc[inicio:fim]
+
+
+def dias_do_periodo(data_inicial, data_final):
+    """Dias ordinais de todas as datas do período, em ordem."""
+    return np.arange(dia_ordinal(data_inicial), dia_ordinal(data_final) + 1, dtype=np.int32)
+
+
+class IndiceFiltro:
+    """
+    Índice invertido de uma base de fatos para responder aos filtros da barra lateral.
+
+    Para cada dimensão categórica guarda os códigos das linhas e, por valor, a
+    lista ordenada de linhas onde ele ocorre. Um filtro une as listas dos
+    valores escolhidos dentro de uma dimensão e intersecta as dimensões entre
+    si, partindo sempre da dimensão mais seletiva; intervalos numéricos (dia
+    ordinal, idade) são avaliados só sobre as linhas candidatas. Dimensões e
+    intervalos que cobrem a base inteira são ignorados.
+    """
+
+    def __init__(self, df, dimensoes, colunas_intervalo=()):
+        self.num_linhas = len(df)
+        self.dimensoes = {}
+        for coluna in dimensoes:
+            serie = df[coluna]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                codigos = serie.cat.codes.to_numpy()
+                categorias = serie.cat.categories
+            else:
+                codigos, categorias = pd.factorize(serie)
+            codigos = codigos.astype(np.int32)
+            validos = codigos >= 0
+            contagens = np.bincount(codigos[validos], minlength=len(categorias))
+            ordem = np.argsort(codigos, kind='stable')
+            inicios = np.searchsorted(codigos[ordem], np.arange(len(categorias)), side='left')
+            self.dimensoes[coluna] = {
+                'codigos': codigos,
+                'categorias': pd.Index(categorias),
+                'contagens': contagens,
+                'linhas_por_valor': ordem.astype(np.int32),
+                'inicios': inicios,
+                'tem_ausentes': not validos.all(),
+            }
+
+        self.intervalos = {}
+        for coluna in colunas_intervalo:
+            valores = df[coluna].to_numpy(dtype='float64', na_value=np.nan)
+            self.intervalos[coluna] = {
+                'valores': valores,
+                'minimo': np.nanmin(valores) if len(valores) else 0,
+                'maximo': np.nanmax(valores) if len(valores) else 0,
+                'tem_ausentes': bool(np.isnan(valores).any()),
+            }
+
+    def _codigos_selecionados(self, coluna, valores):
+        """Códigos dos valores escolhidos que existem na base, ou None se a seleção cobre tudo."""
+        dimensao = self.dimensoes[coluna]
+        codigos = dimensao['categorias'].get_indexer(pd.Index(list(valores)))
+        codigos = np.unique(codigos[codigos >= 0])
+        presentes = np.flatnonzero(dimensao['contagens'])
+        if not dimensao['tem_ausentes'] and np.isin(presentes, codigos).all():
+            return None
+        return codigos
+
+    def _intervalo_ativo(self, coluna, limites):
+        intervalo = self.intervalos[coluna]
+        inicio, fim = limites
+        return intervalo['tem_ausentes'] or inicio > intervalo['minimo'] or fim < intervalo['maximo']
+
+    def linhas(self, selecoes=None, intervalos=None):
+        """
+        Posições (ordenadas) das linhas que atendem ao filtro, ou None quando nada é filtrado.
+
+        `selecoes` mapeia dimensão -> valores aceitos; `intervalos` mapeia coluna
+        numérica -> (início, fim), extremos inclusos.
+        """
+        selecoes = selecoes or {}
+        intervalos = intervalos or {}
+        ativas = {}
+        for coluna, valores in selecoes.items():
+            codigos = self._codigos_selecionados(coluna, valores)
+            if codigos is not None:
+                ativas[coluna] = codigos
+        intervalos_ativos = {c: l for c, l in intervalos.items() if self._intervalo_ativo(c, l)}
+
+        if not ativas and not intervalos_ativos:
+            return None
+
+        if ativas:
+            tamanhos = {c: self.dimensoes[c]['contagens'][codigos].sum() for c, codigos in ativas.items()}
+            mais_seletiva = min(tamanhos, key=tamanhos.get)
+            dimensao = self.dimensoes[mais_seletiva]
+            candidatas = np.sort(np.concatenate([
+                dimensao['linhas_por_valor'][dimensao['inicios'][c]:dimensao['inicios'][c] + dimensao['contagens'][c]]
+                for c in ativas[mais_seletiva]
+            ] or [np.empty(0, dtype=np.int32)]))
+            for coluna, codigos in ativas.items():
+                if coluna == mais_seletiva or len(candidatas) == 0:
+                    continue
+                dimensao = self.dimensoes[coluna]
+                aceitos = np.zeros(len(dimensao['categorias']) + 1, dtype=bool)
+                aceitos[codigos] = True
+                # O código -1 (valor ausente) cai na última posição, nunca aceita.
+                candidatas = candidatas[aceitos[dimensao['codigos'][candidatas]]]
+        else:
+            candidatas = None
+
+        for coluna, (inicio, fim) in intervalos_ativos.items():
+            valores = self.intervalos[coluna]['valores']
+            if candidatas is None:
+                candidatas = np.flatnonzero((valores >= inicio) & (valores <= fim)).astype(np.int32)
+            else:
+                valores_candidatas = valores[candidatas]
+                candidatas = candidatas[(valores_candidatas >= inicio) & (valores_candidatas <= fim)]
+        return candidatas
+
+    def filtrar(self, df, selecoes=None, intervalos=None):
+        """Aplica o filtro ao DataFrame indexado, preservando a ordem original das linhas."""
+        linhas = self.linhas(selecoes, intervalos)
+        if linhas is None:
+            return df.copy(deep=False)
+        return df.iloc[linhas]
+
+
+def montar_cubo(df, dimensoes, colunas_intervalo=(), colunas_media=()):
+    """
+    Agrega uma base de fatos em um cubo de contagens.
+
+    Cada linha do cubo é uma combinação observada das `dimensoes` (as ausentes
+    na base são ignoradas) com a coluna `quantidade`. De cada coluna de
+    `colunas_intervalo` a célula guarda o menor e o maior valor
+    (`minimo_<coluna>`, `maximo_<coluna>`), com os registros sem valor em
+    células à parte, para que `IndiceCubo` aplique os mesmos filtros da base;
+    de cada coluna de `colunas_media`, a soma e a quantidade de valores
+    informados (`soma_<coluna>`, `quantidade_<coluna>`).
+    """
+    chaves = [c for c in dimensoes if c in df.columns]
+    valores = pd.DataFrame(
+        {c: df[c].to_numpy(dtype='float64', na_value=np.nan) for c in dict.fromkeys([*colunas_intervalo, *colunas_media])},
+        index=df.index
+    )
+    sem_valor = [valores[c].isna().rename(f'sem_{c}') for c in colunas_intervalo]
+    agrupamento = valores.groupby([df[c] for c in chaves] + sem_valor, observed=True, dropna=False, sort=False)
+
+    agregacoes = {}
+    for coluna in colunas_intervalo:
+        agregacoes[f'minimo_{coluna}'] = (coluna, 'min')
+        agregacoes[f'maximo_{coluna}'] = (coluna, 'max')
+    for coluna in colunas_media:
+        agregacoes[f'soma_{coluna}'] = (coluna, 'sum')
+        agregacoes[f'quantidade_{coluna}'] = (coluna, 'count')
+    tamanhos = agrupamento.size()
+    cubo = agrupamento.agg(**agregacoes) if agregacoes else pd.DataFrame(index=tamanhos.index)
+    cubo.insert(0, 'quantidade', tamanhos.to_numpy().astype(np.int32))
+    cubo = cubo.reset_index().drop(columns=[s.name for s in sem_valor])
+    for coluna in colunas_media:
+        cubo[f'quantidade_{coluna}'] = cubo[f'quantidade_{coluna}'].astype(np.int32)
+    return cubo
+
+
+class IndiceCubo:
+    """
+    Filtros da barra lateral sobre um cubo de `montar_cubo`, com a semântica do `IndiceFiltro` da base.
+
+    As seleções passam por um `IndiceFiltro` sobre as células. Um intervalo
+    mantém as células com todos os valores dentro dele e descarta as que ficam
+    inteiramente fora ou sem valor. Um período que começa ou termina no meio de
+    um mês, ou um intervalo de idade que corta uma faixa etária, divide células:
+    nesse caso o cubo não responde ao filtro (ver `responde`) e o cubo precisa
+    ser montado a partir dos registros filtrados.
+    """
+
+    def __init__(self, cubo, dimensoes, colunas_intervalo=()):
+        self.num_linhas = len(cubo)
+        self.indice = IndiceFiltro(cubo, dimensoes)
+        self.limites = {
+            coluna: (cubo[f'minimo_{coluna}'].to_numpy(dtype='float64'), cubo[f'maximo_{coluna}'].to_numpy(dtype='float64'))
+            for coluna in colunas_intervalo
+        }
+
+    def _celulas_dentro(self, coluna, limites):
+        """Máscaras das células inteiramente dentro e inteiramente fora do intervalo."""
+        minimos, maximos = self.limites[coluna]
+        inicio, fim = limites
+        dentro = (minimos >= inicio) & (maximos <= fim)
+        fora = (maximos < inicio) | (minimos > fim) | np.isnan(minimos)
+        return dentro, fora
+
+    def responde(self, intervalos):
+        """Se nenhuma célula fica dividida pelos `intervalos` do filtro."""
+        for coluna, limites in intervalos.items():
+            dentro, fora = self._celulas_dentro(coluna, limites)
+            if not (dentro | fora).all():
+                return False
+        return True
+
+    def linhas(self, selecoes=None, intervalos=None):
+        """
+        Posições (ordenadas) das células que atendem ao filtro, ou None quando nada
+        é filtrado. Só vale para intervalos aceitos por `responde`.
+        """
+        linhas = self.indice.linhas(selecoes)
+        aceitas = None
+        for coluna, limites in (intervalos or {}).items():
+            dentro, _ = self._celulas_dentro(coluna, limites)
+            if not dentro.all():
+                aceitas = dentro if aceitas is None else aceitas & dentro
+        if aceitas is None:
+            return linhas
+        if linhas is None:
+            return np.flatnonzero(aceitas).astype(np.int32)
+        return linhas[aceitas[linhas]]
+
+    def filtrar(self, cubo, selecoes=None, intervalos=None):
+        """Aplica o filtro ao cubo indexado, preservando a ordem original das células."""
+        linhas = self.linhas(selecoes, intervalos)
+        if linhas is None:
+            return cubo.copy(deep=False)
+        return cubo.iloc[linhas]
+
+
+def somar_cubo(cubo, por, todas_categorias=False):
+    """
+    Soma as contagens do cubo por uma ou mais colunas.
+
+    Com `todas_categorias`, colunas categóricas trazem também as categorias sem
+    registros (com zero), na ordem das categorias.
+    """
+    return cubo.groupby(por, observed=not todas_categorias)['quantidade'].sum()
+
+
+def contar_valores_cubo(cubo, coluna):
+    """Equivalente ao `value_counts` da base: contagens por valor, decrescentes e sem zeros."""
+    contagem = somar_cubo(cubo, coluna)
+    return contagem[contagem > 0].sort_values(ascending=False, kind='stable')
+
+
+def media_ponderada_cubo(cubo, coluna):
+    """
+    Média de uma coluna numérica do cubo ponderada pelas contagens (NaN se não
+    houver valores). Colunas de `colunas_media` saem das somas das células.
+    """
+    if f'soma_{coluna}' in cubo.columns:
+        quantidade = cubo[f'quantidade_{coluna}'].sum()
+        return cubo[f'soma_{coluna}'].sum() / quantidade if quantidade else np.nan
+    valores = cubo[coluna].to_numpy(dtype='float64', na_value=np.nan)
+    pesos = cubo['quantidade'].to_numpy()
+    validos = ~np.isnan(valores)
+    if not pesos[validos].sum():
+        return np.nan
+    return np.average(valores[validos], weights=pesos[validos])
+
+
+def criar_tabela_evolucao_anual(df, chaves, nomes_colunas=None):
+    """
+    Cria uma tabela de evolução anual: contagem por grupo e ano, variação entre anos, total e CAGR.
+
+    Monta uma única matriz densa grupo x ano (anos sem registro entram com zero)
+    a partir dos códigos das chaves, sem pivot_table, e calcula todas as
+    variações percentuais com um np.diff sobre ela. `chaves` são as colunas de
+    agrupamento (ex.: município e fato comunicado), em ordem, e `nomes_colunas`
+    renomeia essas colunas na tabela final.
+    """
+    nomes_colunas = nomes_colunas or {}
+    colunas_grupo = [nomes_colunas.get(chave, chave) for chave in chaves]
+
+    codigos, categorias = [], []
+    for chave in chaves:
+        serie = df[chave]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos.append(serie.cat.codes.to_numpy())
+            categorias.append(serie.cat.categories)
+        else:
+            codigo, categoria = pd.factorize(serie, sort=True)
+            codigos.append(codigo)
+            categorias.append(categoria)
+    anos_linha = df['ano'].to_numpy(dtype='float64', na_value=np.nan)
+    validas = ~np.isnan(anos_linha)
+    for codigo in codigos:
+        validas &= codigo >= 0
+    if not validas.any():
+        return pd.DataFrame(columns=colunas_grupo + ['total'])
+
+    anos_linha = anos_linha[validas].astype('int64')
+    anos = list(range(int(anos_linha.min()), int(anos_linha.max()) + 1))
+    chave_linha = np.ravel_multi_index([codigo[validas] for codigo in codigos], [len(c) for c in categorias])
+    grupos, grupo_linha = np.unique(chave_linha, return_inverse=True)
+    matriz = np.bincount(grupo_linha * len(anos) + (anos_linha - anos[0]), minlength=len(grupos) * len(anos)).reshape(len(grupos), len(anos))
+
+    anteriores = matriz[:, :-1].astype('float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variacoes = np.where(anteriores != 0, np.diff(matriz, axis=1) / anteriores * 100, np.nan)
+
+    colunas = {}
+    for nome, categoria, codigo in zip(colunas_grupo, categorias, np.unravel_index(grupos, [len(c) for c in categorias])):
+        colunas[nome] = categoria.take(codigo)
+    colunas[anos[0]] = matriz[:, 0]
+    for i in range(1, len(anos)):
+        colunas[anos[i]] = matriz[:, i]
+        colunas[f'Diferença {anos[i-1]}-{anos[i]}'] = variacoes[:, i - 1]
+    colunas['total'] = matriz.sum(axis=1)
+
+    ano_corrente = pd.Timestamp.now().year
+    posicoes_cagr = [i for i, ano in enumerate(anos) if ano != ano_corrente]
+    if len(posicoes_cagr) >= 3:
+        valor_inicial = matriz[:, posicoes_cagr[0]].astype('float64')
+        valor_final = matriz[:, posicoes_cagr[-1]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cagr = ((valor_final / valor_inicial) ** (1 / (len(posicoes_cagr) - 1)) - 1) * 100
+        colunas['Tendência (CAGR %)'] = np.where(valor_inicial != 0, cagr, np.nan)
+
+    return pd.DataFrame(colunas)
+
+
+class ContagensDiariasAcumuladas:
+    """
+    Contagens diárias acumuladas por combinação de dimensões de filtro.
+
+    Cada combinação observada das `dimensoes` (município, região, tipo de
+    fato...) é uma linha de uma matriz linha x dia com a soma acumulada das
+    ocorrências até a véspera de cada dia: o total de qualquer período é a
+    diferença de duas posições, e o de uma seleção é a soma dessas diferenças
+    sobre as linhas escolhidas, sem percorrer os registros. As linhas de uma
+    seleção são resolvidas por um `IndiceFiltro` sobre a tabela de combinações.
+
+    Só entram registros com dia e idade informados, como no filtro da barra
+    lateral; um intervalo de idade que não cobre todas as idades não pode ser
+    respondido (ver `responde`).
+    """
+
+    def __init__(self, df, dimensoes, coluna_idade='idade_vitima', coluna_pesos='quantidade'):
+        dias = df['dia_ordinal'].to_numpy(dtype=np.int64)
+        idades = df[coluna_idade].to_numpy(dtype='float64', na_value=np.nan)
+        validos = (dias != DIA_ORDINAL_AUSENTE) & ~np.isnan(idades)
+        dias = dias[validos]
+        pesos = df[coluna_pesos].to_numpy()[validos] if coluna_pesos in df.columns else None
+        self.idade_minima = np.nanmin(idades) if validos.any() else 0
+        self.idade_maxima = np.nanmax(idades) if validos.any() else 0
+
+        agrupamento = df.loc[validos, dimensoes].groupby(dimensoes, observed=True, dropna=False, sort=True)
+        codigos_linhas = agrupamento.ngroup().to_numpy()
+        self.combinacoes = agrupamento.size().index.to_frame(index=False)
+        self.indice = IndiceFiltro(self.combinacoes, dimensoes)
+
+        self.primeiro_dia = int(dias.min()) if len(dias) else 0
+        self.num_dias = int(dias.max()) - self.primeiro_dia + 1 if len(dias) else 0
+        num_linhas = len(self.combinacoes)
+        contagens = np.bincount(
+            codigos_linhas * self.num_dias + (dias - self.primeiro_dia), weights=pesos, minlength=num_linhas * self.num_dias
+        ).astype(np.int64).reshape(num_linhas, self.num_dias)
+        tipo = np.int32 if contagens.sum() < np.iinfo(np.int32).max else np.int64
+        self.acumuladas = np.zeros((num_linhas, self.num_dias + 1), dtype=tipo)
+        np.cumsum(contagens, axis=1, out=self.acumuladas[:, 1:])
+
+    def responde(self, intervalos):
+        """Se os totais desta estrutura valem para os `intervalos` do filtro (o de idade precisa cobrir todas as idades)."""
+        inicio, fim = intervalos.get('idade_vitima', (-np.inf, np.inf))
+        return inicio <= self.idade_minima and fim >= self.idade_maxima
+
+    def linhas(self, selecoes=None):
+        """Linhas (combinações) que atendem às `selecoes`, com a mesma semântica do `IndiceFiltro`."""
+        linhas = self.indice.linhas(selecoes)
+        return np.arange(len(self.combinacoes)) if linhas is None else linhas
+
+    def _posicoes(self, dias):
+        return np.clip(np.asarray(dias, dtype=np.int64) - self.primeiro_dia, 0, self.num_dias)
+
+    def total(self, linhas, dia_inicial, dia_final):
+        """Total de ocorrências das `linhas` entre dois dias ordinais (inclusive)."""
+        inicio, fim = self._posicoes([dia_inicial, dia_final + 1])
+        if fim <= inicio:
+            return 0
+        return int(self.acumuladas[linhas, fim].sum(dtype=np.int64) - self.acumuladas[linhas, inicio].sum(dtype=np.int64))
+
+    def diarias(self, linhas, dia_inicial, dia_final):
+        """Contagens diárias das `linhas` entre dois dias ordinais (inclusive): um array (linhas x dias), com zero fora da base."""
+        posicoes = self._posicoes(np.arange(dia_inicial, max(dia_final, dia_inicial - 1) + 2))
+        return np.diff(self.acumuladas[np.ix_(linhas, posicoes)], axis=1)
+
+    def totais_por_ano(self, linhas, dia_inicial, dia_final):
+        """
+        Totais por ano das `linhas` entre dois dias ordinais, como `somar_cubo(cubo, 'ano')`:
+        uma Series indexada pelo ano, sem os anos sem registros.
+        """
+        if dia_final < dia_inicial:
+            return pd.Series(dtype=np.int64)
+        limites = np.array([dia_inicial, dia_final], dtype='datetime64[D]').astype('datetime64[Y]')
+        anos = np.arange(limites[0], limites[1] + 1)
+        viradas = anos[1:].astype('datetime64[D]').astype(np.int64)
+        posicoes = self._posicoes(np.concatenate([[dia_inicial], viradas, [dia_final + 1]]))
+        totais = np.diff(self.acumuladas[np.ix_(linhas, posicoes)].sum(axis=0, dtype=np.int64))
+        serie = pd.Series(totais, index=pd.Index(anos.astype(np.int64) + 1970, name='ano'), name='quantidade')
+        return serie[serie > 0]
+
+
+# Linhas das matrizes (linha x dia da semana) e quantas há de cada tipo.
+LINHAS_SEMANAIS = {'mes': 12, 'semana_do_ano': 53, 'hora': 24}
+
+
+def dia_da_semana(dias):
+    """Código do dia da semana de dias ordinais, na ordem de ORDEM_DIAS_SEMANA (0 = domingo)."""
+    # 1970-01-01, o dia ordinal 0, foi uma quinta-feira.
+    return (np.asarray(dias, dtype=np.int64) + 4) % 7
+
+
+def semana_do_ano(dias):
+    """Semana do ano (0 a 52) de dias ordinais, contada em blocos de 7 dias a partir de 1º de janeiro."""
+    dias = np.asarray(dias, dtype=np.int64)
+    inicio_ano = dias.astype('datetime64[D]').astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+    return (dias - inicio_ano) // 7
+
+
+def _dias_da_semana_no_intervalo(inicios, fins):
+    """Quantos domingos, segundas... há em cada intervalo [inicio, fim] de dias ordinais, sem enumerá-los."""
+    tamanhos = fins - inicios + 1
+    deslocamentos = (np.arange(7) - dia_da_semana(inicios)[:, None]) % 7
+    return tamanhos[:, None] // 7 + (deslocamentos < (tamanhos % 7)[:, None])
+
+
+def dias_por_linha_semanal(dia_inicial, dia_final, linha='mes'):
+    """
+    Conta os dias de cada (linha, dia da semana) entre dois dias ordinais (inclusive).
+
+    Denominador das médias diárias das matrizes semanais, calculado por
+    aritmética sobre os trechos em que a linha é constante (meses, semanas do
+    ano) em vez de enumerar as datas. Com `linha='hora'`, cada dia contribui
+    uma vez para cada uma das 24 horas. Devolve um array (linhas x 7).
+    """
+    linhas = LINHAS_SEMANAIS[linha]
+    matriz = np.zeros((linhas, 7), dtype=np.int64)
+    if dia_final < dia_inicial:
+        return matriz
+    if linha == 'hora':
+        matriz[:] = _dias_da_semana_no_intervalo(np.array([dia_inicial]), np.array([dia_final]))
+        return matriz
+
+    limites = np.array([dia_inicial, dia_final], dtype='datetime64[D]')
+    if linha == 'mes':
+        meses = np.arange(limites[0].astype('datetime64[M]'), limites[1].astype('datetime64[M]') + 1)
+        inicios = meses.astype('datetime64[D]').astype(np.int64)
+        fins = (meses + 1).astype('datetime64[D]').astype(np.int64) - 1
+        codigos = meses.astype(np.int64) % 12
+    else:
+        anos = np.arange(limites[0].astype('datetime64[Y]'), limites[1].astype('datetime64[Y]') + 1)
+        inicio_anos = anos.astype('datetime64[D]').astype(np.int64)
+        fim_anos = (anos + 1).astype('datetime64[D]').astype(np.int64) - 1
+        inicios = (inicio_anos[:, None] + 7 * np.arange(linhas)).ravel()
+        fins = np.minimum(inicios + 6, np.repeat(fim_anos, linhas))
+        codigos = np.tile(np.arange(linhas), len(anos))
+
+    inicios = np.maximum(inicios, dia_inicial)
+    fins = np.minimum(fins, dia_final)
+    validos = inicios <= fins
+    np.add.at(matriz, codigos[validos], _dias_da_semana_no_intervalo(inicios[validos], fins[validos]))
+    return matriz
+
+
+def contar_por_linha_semanal(codigos_linha, codigos_dia_semana, linha='mes', pesos=None):
+    """
+    Conta ocorrências por (linha, dia da semana) com um único `bincount`.
+
+    Recebe os códigos já calculados (mês 0-11, semana do ano, hora 0-23 e dia da
+    semana 0-6, como os `cat.codes` das colunas derivadas na carga); códigos
+    negativos (valores ausentes) são ignorados. Devolve um array (linhas x 7).
+    """
+    linhas = LINHAS_SEMANAIS[linha]
+    codigos_linha = np.asarray(codigos_linha, dtype=np.int64)
+    codigos_dia_semana = np.asarray(codigos_dia_semana, dtype=np.int64)
+    validos = (codigos_linha >= 0) & (codigos_dia_semana >= 0)
+    if pesos is not None:
+        pesos = np.asarray(pesos, dtype=np.float64)[validos]
+    celulas = codigos_linha[validos] * 7 + codigos_dia_semana[validos]
+    return np.bincount(celulas, weights=pesos, minlength=linhas * 7).reshape(linhas, 7)
+
+
+# Flags de tipo de dia do calendário, na ordem dos bits do código diário.
+TIPOS_DIA = ['is_feriado', 'is_fim_de_semana', 'is_vespera_feriado', 'is_pos_feriado']
+DIA_COMUM = 'dia_comum'
+
+# Artefato binário do calendário gerado por gerar_calendario.py.
+ARQUIVO_CALENDARIO_DIAS = 'data/calendario_dias.npz'
+VERSAO_CALENDARIO_DIAS = 2
+
+
+class CalendarioDias:
+    """
+    Tipos de dia do calendário indexados pelo dia ordinal.
+
+    Cada dia do calendário vira um código com um bit por flag de `TIPOS_DIA`,
+    guardado em um array contíguo a partir do primeiro dia: o tipo de dia de
+    qualquer data é uma indexação, sem merge. Um segundo array guarda o índice
+    do feriado do dia em `nomes_feriados` (-1 quando não é feriado). Dias fora
+    do calendário não têm nenhuma flag nem feriado.
+
+    Opcionalmente há uma camada por município (`municipios`, nomes
+    normalizados), só com os municípios que têm feriados próprios: uma matriz
+    município x dia com os mesmos códigos, que somam os feriados municipais aos
+    nacionais e estaduais do array geral, e os feriados municipais em forma
+    esparsa (chave linha * dias + posição). Municípios fora da camada seguem o
+    calendário geral.
+
+    Os arrays podem ser gravados e lidos como um artefato `.npz` compacto,
+    gerado por `gerar_calendario.py`.
+    """
+
+    def __init__(self, primeiro_dia, codigos, feriados=None, nomes_feriados=(), tipos=TIPOS_DIA,
+                 municipios=(), codigos_municipios=None, chaves_feriados_municipais=(), feriados_municipais=()):
+        self.tipos = list(tipos)
+        self.primeiro_dia = int(primeiro_dia)
+        self.codigos = np.asarray(codigos, dtype=np.uint8)
+        if feriados is None:
+            feriados = np.full(len(self.codigos), -1)
+        self.feriados = np.asarray(feriados, dtype=np.int16)
+        self.nomes_feriados = np.asarray(nomes_feriados, dtype=str)
+
+        self.municipios = np.asarray(municipios, dtype=str)
+        if codigos_municipios is None:
+            codigos_municipios = np.zeros((0, len(self.codigos)))
+        self.codigos_municipios = np.asarray(codigos_municipios, dtype=np.uint8)
+        self.chaves_feriados_municipais = np.asarray(chaves_feriados_municipais, dtype=np.int64)
+        self.feriados_municipais = np.asarray(feriados_municipais, dtype=np.int16)
+        self._linhas_municipios = {nome: linha for linha, nome in enumerate(self.municipios)}
+
+    @classmethod
+    def de_tabela(cls, df_calendario, tipos=TIPOS_DIA):
+        """Monta o calendário geral a partir da tabela de calendário (um dia por linha, com as flags e, se houver, `nome_feriado`)."""
+        posicoes = df_calendario['dia_ordinal'].to_numpy(dtype=np.int64)
+        primeiro_dia = int(posicoes.min()) if len(posicoes) else 0
+        posicoes = posicoes - primeiro_dia
+        tamanho = int(posicoes.max()) + 1 if len(posicoes) else 0
+
+        codigos = np.zeros(tamanho, dtype=np.uint8)
+        for bit, tipo in enumerate(tipos):
+            marcados = df_calendario[tipo].fillna(False).to_numpy(dtype=bool)
+            codigos[posicoes[marcados]] |= np.uint8(1 << bit)
+
+        feriados = np.full(tamanho, -1, dtype=np.int16)
+        nomes_feriados = []
+        if 'nome_feriado' in df_calendario.columns:
+            com_feriado = df_calendario['nome_feriado'].notna().to_numpy()
+            ids, nomes_feriados = pd.factorize(df_calendario['nome_feriado'][com_feriado], sort=True)
+            feriados[posicoes[com_feriado]] = ids
+        return cls(primeiro_dia, codigos, feriados, nomes_feriados, tipos)
+
+    @classmethod
+    def carregar(cls, caminho=ARQUIVO_CALENDARIO_DIAS):
+        """Lê o artefato gravado por `salvar`; ValueError se for de outra versão."""
+        with np.load(caminho, allow_pickle=False) as artefato:
+            if int(artefato['versao']) != VERSAO_CALENDARIO_DIAS:
+                raise ValueError(f"Calendário '{caminho}' na versão {int(artefato['versao'])}; esperada {VERSAO_CALENDARIO_DIAS}.")
+            return cls(artefato['primeiro_dia'], artefato['codigos'], artefato['feriados'],
+                       artefato['nomes_feriados'], artefato['tipos'].tolist(), artefato['municipios'],
+                       artefato['codigos_municipios'], artefato['chaves_feriados_municipais'],
+                       artefato['feriados_municipais'])
+
+    def salvar(self, caminho=ARQUIVO_CALENDARIO_DIAS):
+        """Grava os arrays em um `.npz` comprimido, substituindo o anterior só ao final da escrita."""
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        temporario = f'{caminho}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            np.savez_compressed(
+                arquivo, versao=VERSAO_CALENDARIO_DIAS, primeiro_dia=self.primeiro_dia, codigos=self.codigos,
+                feriados=self.feriados, nomes_feriados=self.nomes_feriados, tipos=np.asarray(self.tipos),
+                municipios=self.municipios, codigos_municipios=self.codigos_municipios,
+                chaves_feriados_municipais=self.chaves_feriados_municipais, feriados_municipais=self.feriados_municipais
+            )
+        os.replace(temporario, caminho)
+
+    @property
+    def ultimo_dia(self):
+        """Último dia ordinal coberto pelo calendário."""
+        return self.primeiro_dia + len(self.codigos) - 1
+
+    def linhas_municipios(self, nomes):
+        """Linha de cada município (nome normalizado) na camada municipal; -1 para os que seguem o calendário geral."""
+        return np.array([self._linhas_municipios.get(nome, -1) for nome in nomes], dtype=np.int64)
+
+    def _posicoes(self, dias):
+        posicoes = np.asarray(dias, dtype=np.int64) - self.primeiro_dia
+        return posicoes, (posicoes >= 0) & (posicoes < len(self.codigos))
+
+    def codigos_dias(self, dias, linhas=None):
+        """
+        Código do tipo de cada dia ordinal (0 para dias comuns e fora do calendário).
+
+        Com `linhas` (de `linhas_municipios`, uma por dia), cada dia é
+        classificado pelo calendário do próprio município, em uma indexação 2D.
+        """
+        posicoes, dentro = self._posicoes(dias)
+        codigos = np.zeros(len(posicoes), dtype=np.uint8)
+        codigos[dentro] = self.codigos[posicoes[dentro]]
+        if linhas is not None and len(self.municipios):
+            linhas = np.asarray(linhas, dtype=np.int64)
+            locais = dentro & (linhas >= 0)
+            codigos[locais] = self.codigos_municipios[linhas[locais], posicoes[locais]]
+        return codigos
+
+    def classificar(self, datas, municipios=None):
+        """
+        Flags de tipo de dia de qualquer coleção de datas, uma coluna por `TIPOS_DIA`.
+
+        Aceita o mesmo que `dia_ordinal` (datas, Timestamps, strings ou uma
+        coluna de datas); datas vazias ou fora do calendário saem sem flags.
+        Com `municipios` (nomes normalizados, um por data), usa o calendário de
+        cada município.
+        """
+        linhas = None if municipios is None else self.linhas_municipios(municipios)
+        codigos = self.codigos_dias(dia_ordinal(pd.Series(datas)), linhas)
+        return pd.DataFrame({tipo: (codigos >> bit) & 1 == 1 for bit, tipo in enumerate(self.tipos)})
+
+    def feriados_dias(self, dias, linhas=None):
+        """Nome do feriado de cada dia ordinal (None quando não é feriado), com os municipais se houver `linhas`."""
+        posicoes, dentro = self._posicoes(dias)
+        ids = np.full(len(posicoes), -1, dtype=np.int64)
+        ids[dentro] = self.feriados[posicoes[dentro]]
+        if linhas is not None and len(self.chaves_feriados_municipais):
+            chaves = np.asarray(linhas, dtype=np.int64) * len(self.codigos) + posicoes
+            encontrados = np.searchsorted(self.chaves_feriados_municipais, chaves).clip(max=len(self.chaves_feriados_municipais) - 1)
+            municipais = dentro & (np.asarray(linhas) >= 0) & (self.chaves_feriados_municipais[encontrados] == chaves)
+            ids[municipais] = self.feriados_municipais[encontrados[municipais]]
+        nomes = np.full(len(posicoes), None, dtype=object)
+        nomes[ids >= 0] = self.nomes_feriados[ids[ids >= 0]]
+        return nomes
+
+    def contar_por_tipo(self, dias, pesos=None, linhas=None):
+        """
+        Conta dias (ou, com `pesos`, ocorrências) por tipo de dia em uma passada.
+
+        Devolve uma Series indexada por `TIPOS_DIA` e `DIA_COMUM` (sem nenhuma
+        flag). Os tipos se sobrepõem: um feriado no sábado conta nos dois.
+        """
+        por_codigo = np.bincount(self.codigos_dias(dias, linhas), weights=pesos, minlength=1 << len(self.tipos))
+        codigos = np.arange(len(por_codigo))
+        contagens = {tipo: por_codigo[(codigos >> bit) & 1 == 1].sum() for bit, tipo in enumerate(self.tipos)}
+        contagens[DIA_COMUM] = por_codigo[0]
+        return pd.Series(contagens)
+
+    def contar_dias_municipios(self, dias, linhas):
+        """
+        Conta os dias-município por tipo de dia: cada dia de `dias` em cada
+        município de `linhas`, pelo calendário do próprio município.
+        """
+        dias = np.asarray(dias, dtype=np.int64)
+        linhas = np.asarray(linhas, dtype=np.int64)
+        return self.contar_por_tipo(np.tile(dias, len(linhas)), linhas=np.repeat(linhas, len(dias)))
+
+
+def chave_filtros(**estado):
+    """
+    Forma canônica e hashable de um estado de filtros da barra lateral.
+
+    Listas e conjuntos viram tuplas ordenadas (a ordem de seleção não importa),
+    Series viram tuplas de seus valores e as entradas são ordenadas por nome.
+    """
+    def canonico(valor):
+        if isinstance(valor, (pd.Series, pd.Index, np.ndarray)):
+            valor = list(valor)
+        if isinstance(valor, (list, set, frozenset)):
+            return tuple(sorted(valor, key=str))
+        if isinstance(valor, tuple):
+            return tuple(canonico(v) for v in valor)
+        if isinstance(valor, np.generic):
+            return valor.item()
+        return valor
+    return tuple((nome, canonico(valor)) for nome, valor in sorted(estado.items()))
+
+
+def tamanho_em_bytes(valor):
+    """Estimativa da memória ocupada por um resultado guardado no cache."""
+    if isinstance(valor, (pd.DataFrame, pd.Series, pd.Index)):
+        tamanho = valor.memory_usage(deep=True)
+        return int(tamanho.sum()) if isinstance(tamanho, pd.Series) else int(tamanho)
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamanho_em_bytes(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamanho_em_bytes(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+def _copia_profunda(valor):
+    """
+    Cópia com dados próprios de DataFrames, Series e arrays (inclusive dentro de
+    dicts, listas e tuplas): sem copy-on-write, uma cópia rasa divide os buffers
+    das colunas e uma alteração no lugar feita por uma sessão mudaria o resultado
+    guardado para todas.
+    """
+    if isinstance(valor, (pd.DataFrame, pd.Series, np.ndarray)):
+        return valor.copy()
+    if isinstance(valor, dict):
+        return {k: _copia_profunda(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return type(valor)(_copia_profunda(v) for v in valor)
+    return valor
+
+
+class CacheResultados:
+    """
+    Cache LRU de resultados de consultas, compartilhado pelas sessões do processo.
+
+    O limite é em bytes, estimados por `tamanho_em_bytes` uma única vez, quando
+    o resultado entra no cache, e guardados junto dele: ao ultrapassá-lo, os
+    resultados menos usados recentemente são descartados. Resultados maiores
+    que o limite não são guardados. Cada chamada recebe uma cópia própria do
+    resultado (ver `_copia_profunda`). Conta acertos, faltas e descartes.
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self.bytes_em_uso = 0
+        self.acertos = 0
+        self.faltas = 0
+        self.descartes = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, calcular):
+        """Devolve o resultado guardado para `chave` ou o calcula com `calcular()` e guarda."""
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                self.faltas += 1
+            else:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+        if item is not None:
+            # A cópia sai fora da trava: a entrada guardada nunca é alterada.
+            return _copia_profunda(item[0])
+
+        resultado = calcular()
+        tamanho = tamanho_em_bytes(resultado)
+        if tamanho > self.limite_bytes:
+            return resultado
+
+        with self._trava:
+            if chave in self._itens:
+                self.bytes_em_uso -= self._itens.pop(chave)[1]
+            self._itens[chave] = (resultado, tamanho)
+            self.bytes_em_uso += tamanho
+            while self.bytes_em_uso > self.limite_bytes:
+                _, (_, tamanho_descartado) = self._itens.popitem(last=False)
+                self.bytes_em_uso -= tamanho_descartado
+                self.descartes += 1
+        return _copia_profunda(resultado)
+
+    def limpar(self):
+        """Descarta todos os resultados guardados (os contadores são mantidos)."""
+        with self._trava:
+            self._itens.clear()
+            self.bytes_em_uso = 0
+
+    def estatisticas(self):
+        """Acertos, faltas, descartes, número de itens e bytes em uso."""
+        with self._trava:
+            return {
+                'acertos': self.acertos,
+                'faltas': self.faltas,
+                'descartes': self.descartes,
+                'itens': len(self._itens),
+                'bytes': self.bytes_em_uso,
+            }
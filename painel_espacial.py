@@ -0,0 +1,419 @@
+"""
+Geometrias e estruturas espaciais do painel.
+
+Funções sem dependência do Streamlit sobre o GeoJSON dos municípios de SC:
+versões simplificadas para os mapas coropléticos e demais insumos das
+análises espaciais.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from shapely.geometry import mapping, shape
+
+from painel_ingest import assinatura_fontes, caminho_aliases, _gravar_json, DIRETORIO_CACHE
+
+logger = logging.getLogger('painel_espacial')
+
+# Níveis de detalhe dos mapas: tolerância de simplificação (graus) e casas
+# decimais mantidas nas coordenadas. O nível 'grosso' basta para o zoom
+# estadual dos mapas do painel.
+NIVEIS_DETALHE = {
+    'fino': (0.001, 5),
+    'medio': (0.003, 4),
+    'grosso': (0.01, 3),
+}
+NIVEL_DETALHE_MAPAS = 'grosso'
+
+# Adjacência entre municípios persistida em disco; mudar a versão invalida o arquivo.
+ARQUIVO_ADJACENCIA = 'adjacencia_municipios.json'
+VERSAO_ADJACENCIA = 1
+
+# Critérios de vizinhança disponíveis para a matriz de pesos espaciais.
+METODOS_PESOS = {
+    'queen': 'Contiguidade (fronteira ou vértice)',
+    'rook': 'Contiguidade (fronteira comum)',
+    'knn': 'k vizinhos mais próximos',
+    'distancia_inversa': 'Distância inversa',
+}
+
+# LISA: permutações condicionais, nível de significância e semente (fixa, para
+# que o mesmo filtro produza sempre o mesmo mapa). LIMIAR_PARALELO é a carga
+# (permutações x ligações) a partir da qual o pool compensa: em série o cálculo
+# custa ~15 ns por operação (999 permutações nos ~1,6 mil vizinhos de
+# contiguidade levam ~0,03 s; 9999 com distância inversa, ~2,8 s), e subir o
+# pool spawn leva ~1,1 s, mais ~10-30 ms por despacho.
+PERMUTACOES_LISA = 999
+ALFA_LISA = 0.05
+SEMENTE_LISA = 20240101
+TAMANHO_BLOCO_LISA = 32
+LIMIAR_PARALELO = 100_000_000
+QUADRANTES_LISA = ['Alto-Alto', 'Baixo-Baixo', 'Baixo-Alto', 'Alto-Baixo']
+NAO_SIGNIFICATIVO = 'Não significativo'
+
+# Propriedades mantidas nas versões simplificadas (os mapas só usam a chave normalizada).
+PROPRIEDADES_MAPA = ['CD_MUN', 'NM_MUN', 'NM_MUN_NORMALIZADO']
+
+
+def geometrias_geojson(geojson_data):
+    """Array de geometrias shapely das feições do GeoJSON, na ordem das feições."""
+    return np.array([shape(feature['geometry']) for feature in geojson_data['features']], dtype=object)
+
+
+def simplificar_geojson(geojson_data, tolerancia, casas_decimais, propriedades=None):
+    """
+    Simplifica os polígonos do GeoJSON preservando as divisas entre municípios.
+
+    A simplificação é feita sobre a cobertura inteira (cada divisa é
+    simplificada uma única vez, sem abrir frestas ou sobreposições entre
+    vizinhos) e as coordenadas são arredondadas para `casas_decimais`. Com
+    `propriedades`, só essas chaves são mantidas em cada feição.
+    """
+    geometrias = geometrias_geojson(geojson_data)
+    if hasattr(shapely, 'coverage_simplify'):
+        simplificadas = shapely.coverage_simplify(geometrias, tolerancia)
+    else:
+        logger.warning("shapely sem coverage_simplify (requer shapely 2.1 e GEOS 3.12); "
+                       "simplificando cada município isoladamente.")
+        simplificadas = shapely.simplify(geometrias, tolerancia, preserve_topology=True)
+
+    quantizadas = shapely.transform(simplificadas, lambda coordenadas: np.round(coordenadas, casas_decimais))
+    quantizadas = shapely.remove_repeated_points(quantizadas)
+
+    features = []
+    for feature, geometria in zip(geojson_data['features'], quantizadas):
+        props = feature['properties']
+        if propriedades is not None:
+            props = {chave: props[chave] for chave in propriedades if chave in props}
+        features.append({'type': 'Feature', 'properties': props, 'geometry': mapping(geometria)})
+
+    logger.info("GeoJSON simplificado (tolerância %s, %d casas): %d -> %d vértices.",
+                tolerancia, casas_decimais,
+                int(shapely.get_num_coordinates(geometrias).sum()), int(shapely.get_num_coordinates(quantizadas).sum()))
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def dissolver_geojson(geojson_data, grupos, nomes=None):
+    """
+    Une os polígonos das feições do GeoJSON por grupo.
+
+    `grupos` traz o grupo de cada feição, na ordem das feições; `nomes`
+    (opcional) mapeia grupo -> nome legível. Cada feição resultante tem as
+    propriedades `grupo`, `nome` e `num_municipios`.
+    """
+    geometrias = geometrias_geojson(geojson_data)
+    grupos = np.asarray(grupos, dtype=object)
+    unir = shapely.coverage_union_all if hasattr(shapely, 'coverage_union_all') else shapely.union_all
+
+    features = []
+    for grupo in sorted(set(grupos), key=str):
+        membros = geometrias[grupos == grupo]
+        features.append({
+            'type': 'Feature',
+            'properties': {
+                'grupo': grupo,
+                'nome': (nomes or {}).get(grupo, grupo),
+                'num_municipios': int(len(membros)),
+            },
+            'geometry': mapping(unir(membros)),
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def calcular_adjacencia(geojson_data, chave='NM_MUN_NORMALIZADO'):
+    """
+    Mapa de adjacência entre as feições do GeoJSON (as que se tocam ou se intersectam).
+
+    Os pares candidatos vêm de uma STRtree (sobreposição de envelopes) e só
+    eles passam pelo predicado exato. Devolve {nome: [vizinhos]}, com os
+    vizinhos na ordem das feições.
+    """
+    nomes = [feature['properties'].get(chave) for feature in geojson_data['features']]
+    geometrias = geometrias_geojson(geojson_data)
+    origem, destino = shapely.STRtree(geometrias).query(geometrias, predicate='intersects')
+    ordem = np.lexsort((destino, origem))
+
+    vizinhos = {nome: [] for nome in nomes if nome}
+    for i, j in zip(origem[ordem], destino[ordem]):
+        if i != j and nomes[i] and nomes[j]:
+            vizinhos[nomes[i]].append(nomes[j])
+    return vizinhos
+
+
+def carregar_adjacencia(caminho_geojson, geojson_data, chave='NM_MUN_NORMALIZADO'):
+    """
+    Retorna a adjacência dos municípios, persistida em `data/.cache`.
+
+    O arquivo vale enquanto o conteúdo do GeoJSON (e da lista de aliases, que
+    define os nomes normalizados) não mudar; caso contrário é recalculado.
+    """
+    inicio = time.perf_counter()
+    caminho_artefato = os.path.join(DIRETORIO_CACHE, ARQUIVO_ADJACENCIA)
+    fontes = [c for c in (caminho_geojson, caminho_aliases(os.path.dirname(caminho_geojson))) if os.path.exists(c)]
+
+    try:
+        with open(caminho_artefato, 'r', encoding='utf-8') as f:
+            artefato = json.load(f)
+    except (OSError, ValueError):
+        artefato = {}
+
+    assinatura = assinatura_fontes(fontes, artefato.get('fontes'))
+    hashes = {c: a['sha256'] for c, a in assinatura.items()}
+    hashes_artefato = {c: a.get('sha256') for c, a in artefato.get('fontes', {}).items()}
+    if artefato.get('versao') == VERSAO_ADJACENCIA and artefato.get('chave') == chave and hashes_artefato == hashes:
+        logger.info("Adjacência lida de '%s' em %.3fs.", caminho_artefato, time.perf_counter() - inicio)
+        return artefato['vizinhos']
+
+    vizinhos = calcular_adjacencia(geojson_data, chave)
+    try:
+        os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+        _gravar_json(caminho_artefato, {'versao': VERSAO_ADJACENCIA, 'chave': chave, 'fontes': assinatura, 'vizinhos': vizinhos})
+    except OSError as e:
+        logger.warning("Não foi possível gravar a adjacência em '%s': %s", caminho_artefato, e)
+    logger.info("Adjacência calculada em %.3fs (%d municípios).", time.perf_counter() - inicio, len(vizinhos))
+    return vizinhos
+
+
+def centroides_km(geojson_data):
+    """
+    Centroides das feições em km, numa projeção equiretangular centrada no estado.
+
+    A distorção na escala de SC é desprezível para ordenar vizinhos por distância.
+    """
+    centroides = shapely.centroid(geometrias_geojson(geojson_data))
+    coordenadas = shapely.get_coordinates(centroides)
+    latitude_media = np.radians(coordenadas[:, 1].mean())
+    return np.column_stack([
+        coordenadas[:, 0] * 111.32 * np.cos(latitude_media),
+        coordenadas[:, 1] * 110.57,
+    ])
+
+
+class PesosEspaciais:
+    """
+    Matriz esparsa (CSR) de pesos espaciais entre municípios.
+
+    Guarda os pesos brutos (1 para contiguidade, 1/d^p para distância inversa);
+    a padronização por linha é feita na hora da defasagem espacial, só sobre os
+    vizinhos que têm valor, o que equivale à média dos vizinhos com dados.
+    """
+
+    def __init__(self, nomes, matriz):
+        self.nomes = pd.Index(nomes)
+        self.matriz = sparse.csr_matrix(matriz, dtype='float64')
+        self.matriz.eliminate_zeros()
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def padronizada(self):
+        """Matriz padronizada por linha (linhas sem vizinhos ficam zeradas)."""
+        somas = np.asarray(self.matriz.sum(axis=1)).ravel()
+        inversos = np.divide(1.0, somas, out=np.zeros_like(somas), where=somas > 0)
+        return sparse.diags(inversos) @ self.matriz
+
+    def restringir(self, nomes):
+        """Submatriz só com os municípios de `nomes` que existem nos pesos, na ordem dada."""
+        posicoes = self.nomes.get_indexer(pd.Index(nomes))
+        posicoes = posicoes[posicoes >= 0]
+        return PesosEspaciais(self.nomes[posicoes], self.matriz[posicoes][:, posicoes])
+
+    def vizinhos(self, nome):
+        """Nomes dos vizinhos (peso > 0) de um município."""
+        i = self.nomes.get_loc(nome)
+        inicio, fim = self.matriz.indptr[i], self.matriz.indptr[i + 1]
+        return self.nomes[self.matriz.indices[inicio:fim]].tolist()
+
+    def defasagem(self, valores):
+        """
+        Média ponderada dos vizinhos de cada município (defasagem espacial).
+
+        `valores` é uma Series (ou DataFrame, uma coluna por recorte: ano, tipo
+        de fato...) indexada pelo nome normalizado. Vizinhos sem valor (ausentes
+        do índice ou NaN) ficam fora da média; quem não tem nenhum vizinho com
+        valor recebe 0. Todas as colunas saem de um único produto esparso.
+        """
+        tabela = valores.to_frame() if isinstance(valores, pd.Series) else valores
+        alinhado = tabela.reindex(self.nomes).to_numpy(dtype='float64')
+        presentes = ~np.isnan(alinhado)
+        numerador = self.matriz @ np.where(presentes, alinhado, 0.0)
+        denominador = self.matriz @ presentes.astype('float64')
+        media = np.divide(numerador, denominador, out=np.zeros_like(numerador), where=denominador > 0)
+
+        resultado = pd.DataFrame(media, index=self.nomes, columns=tabela.columns).reindex(tabela.index).fillna(0.0)
+        return resultado.iloc[:, 0] if isinstance(valores, pd.Series) else resultado
+
+
+def _nomes_feicoes(geojson_data, chave):
+    nomes = [feature['properties'].get(chave) for feature in geojson_data['features']]
+    posicoes = np.array([i for i, nome in enumerate(nomes) if nome], dtype=np.int64)
+    return [nomes[i] for i in posicoes], posicoes
+
+
+def pesos_contiguidade(geojson_data, vizinhos, tipo='queen', chave='NM_MUN_NORMALIZADO'):
+    """
+    Pesos binários de contiguidade a partir do mapa de adjacência.
+
+    'queen' aceita qualquer contato (a adjacência de `carregar_adjacencia`);
+    'rook' exige um trecho de fronteira comum de comprimento positivo.
+    """
+    nomes, posicoes = _nomes_feicoes(geojson_data, chave)
+    indice = pd.Index(nomes)
+    linhas = np.repeat(np.arange(len(nomes)), [len(vizinhos.get(nome, [])) for nome in nomes])
+    colunas = indice.get_indexer([v for nome in nomes for v in vizinhos.get(nome, [])])
+    validos = colunas >= 0
+    linhas, colunas = linhas[validos], colunas[validos]
+
+    if tipo == 'rook' and len(linhas):
+        fronteiras = shapely.boundary(geometrias_geojson(geojson_data)[posicoes])
+        comuns = shapely.intersection(fronteiras[linhas], fronteiras[colunas])
+        fronteira_comum = shapely.length(comuns) > 0
+        linhas, colunas = linhas[fronteira_comum], colunas[fronteira_comum]
+    elif tipo != 'queen':
+        raise ValueError(f"Tipo de contiguidade desconhecido: {tipo!r}")
+
+    matriz = sparse.csr_matrix((np.ones(len(linhas)), (linhas, colunas)), shape=(len(nomes), len(nomes)))
+    return PesosEspaciais(nomes, matriz)
+
+
+def pesos_vizinhos_proximos(geojson_data, k=6, chave='NM_MUN_NORMALIZADO'):
+    """Pesos binários ligando cada município aos k centroides mais próximos."""
+    nomes, posicoes = _nomes_feicoes(geojson_data, chave)
+    centroides = centroides_km(geojson_data)[posicoes]
+    k = max(1, min(k, len(nomes) - 1))
+    distancias = np.linalg.norm(centroides[:, None, :] - centroides[None, :, :], axis=-1)
+    np.fill_diagonal(distancias, np.inf)
+    colunas = np.argpartition(distancias, k - 1, axis=1)[:, :k].ravel()
+    linhas = np.repeat(np.arange(len(nomes)), k)
+    matriz = sparse.csr_matrix((np.ones(len(linhas)), (linhas, colunas)), shape=(len(nomes), len(nomes)))
+    return PesosEspaciais(nomes, matriz)
+
+
+def pesos_distancia_inversa(geojson_data, potencia=1.0, limite_km=100.0, chave='NM_MUN_NORMALIZADO'):
+    """Pesos 1/d^potencia entre centroides a até `limite_km` de distância (None = sem limite)."""
+    nomes, posicoes = _nomes_feicoes(geojson_data, chave)
+    centroides = centroides_km(geojson_data)[posicoes]
+    distancias = np.linalg.norm(centroides[:, None, :] - centroides[None, :, :], axis=-1)
+    np.fill_diagonal(distancias, np.inf)
+    if limite_km is not None:
+        distancias[distancias > limite_km] = np.inf
+    pesos = np.where(np.isfinite(distancias), 1.0 / np.power(np.maximum(distancias, 1e-6), potencia), 0.0)
+    return PesosEspaciais(nomes, pesos)
+
+
+def construir_pesos(geojson_data, vizinhos, metodo='queen', chave='NM_MUN_NORMALIZADO', **parametros):
+    """Monta a matriz de pesos pelo critério em `METODOS_PESOS`."""
+    if metodo in ('queen', 'rook'):
+        return pesos_contiguidade(geojson_data, vizinhos, metodo, chave)
+    if metodo == 'knn':
+        return pesos_vizinhos_proximos(geojson_data, chave=chave, **parametros)
+    if metodo == 'distancia_inversa':
+        return pesos_distancia_inversa(geojson_data, chave=chave, **parametros)
+    raise ValueError(f"Critério de vizinhança desconhecido: {metodo!r}")
+
+
+def _sortear_vizinhancas(n, k_max, permutacoes, semente):
+    """Para cada permutação, k_max posições distintas entre as n-1 demais unidades."""
+    rng = np.random.default_rng(semente)
+    return np.argsort(rng.random((permutacoes, n - 1)), axis=1)[:, :k_max].astype(np.int32)
+
+
+def _pvalores_lisa(unidades, z, defasagem, indptr, pesos, sorteios):
+    """
+    Pseudo p-valores das unidades de um bloco por permutação condicional.
+
+    O valor da própria unidade fica fixo e os vizinhos são trocados por sorteios
+    das demais unidades (o índice sorteado pula a própria). As mesmas
+    permutações servem a todas as unidades, com os pesos de cada uma aplicados
+    em ordem. Roda tanto no processo principal quanto nos processos do pool.
+    """
+    cardinalidades = indptr[unidades + 1] - indptr[unidades]
+    k = max(int(cardinalidades.max()), 1)
+    deslocamentos = np.arange(k)
+    ocupados = deslocamentos < cardinalidades[:, None]
+    pesos_bloco = np.zeros((len(unidades), k))
+    pesos_bloco[ocupados] = pesos[(indptr[unidades][:, None] + deslocamentos)[ocupados]]
+
+    observados = z[unidades] * defasagem[unidades]
+
+    sorteados = sorteios[None, :, :k]
+    sorteados = sorteados + (sorteados >= unidades[:, None, None])
+    defasagens = np.einsum('upk,uk->up', z[sorteados], pesos_bloco)
+    simulados = z[unidades][:, None] * defasagens
+
+    permutacoes = sorteios.shape[0]
+    maiores = (simulados >= observados[:, None]).sum(axis=1)
+    maiores = np.minimum(maiores, permutacoes - maiores)
+    pvalores = (maiores + 1) / (permutacoes + 1)
+    pvalores[cardinalidades == 0] = np.nan
+    return pvalores
+
+
+def calcular_lisa(pesos, valores, permutacoes=PERMUTACOES_LISA, alfa=ALFA_LISA, semente=SEMENTE_LISA, executor=None):
+    """
+    Moran local (LISA) de cada município, com significância por permutação condicional.
+
+    `valores` é uma Series indexada pelo nome normalizado (ex.: taxa por mil
+    mulheres); os pesos são restritos aos municípios com valor e padronizados
+    por linha. Com um `executor` e carga de pelo menos LIMIAR_PARALELO, os
+    blocos de municípios são distribuídos entre os processos; `executor` pode
+    ser o ProcessPoolExecutor ou uma função que o devolve, chamada só nesse
+    caso, para que o pool não seja criado à toa. Devolve um
+    DataFrame com valor, defasagem espacial, I local, p-valor, quadrante e
+    classificação (o quadrante quando p <= alfa).
+    """
+    valores = valores.dropna().astype('float64')
+    sub = pesos.restringir(valores.index)
+    n = len(sub)
+    colunas = ['valor', 'defasagem', 'moran_local', 'p_valor', 'quadrante', 'classificacao']
+    if n < 3:
+        return pd.DataFrame(columns=colunas, index=valores.index)
+
+    matriz = sub.padronizada().tocsr()
+    x = valores.reindex(sub.nomes).to_numpy()
+    z = x - x.mean()
+    m2 = (z ** 2).sum() / n
+    defasagem = matriz @ z
+    moran_local = z * defasagem / m2 if m2 > 0 else np.zeros(n)
+
+    cardinalidades = np.diff(matriz.indptr)
+    sorteios = _sortear_vizinhancas(n, max(int(cardinalidades.max()), 1), permutacoes, semente)
+    blocos = [np.arange(inicio, min(inicio + TAMANHO_BLOCO_LISA, n)) for inicio in range(0, n, TAMANHO_BLOCO_LISA)]
+    argumentos = (z, defasagem, matriz.indptr, matriz.data, sorteios)
+
+    inicio = time.perf_counter()
+    pvalores = None
+    operacoes = permutacoes * int(cardinalidades.sum())
+    if executor is not None and len(blocos) > 1 and operacoes >= LIMIAR_PARALELO:
+        try:
+            if callable(executor):
+                executor = executor()
+            futuros = [executor.submit(_pvalores_lisa, bloco, *argumentos) for bloco in blocos]
+            pvalores = np.concatenate([futuro.result() for futuro in futuros])
+        except (BrokenProcessPool, OSError) as e:
+            logger.warning("Pool de processos indisponível para o LISA (%s); calculando no processo atual.", e)
+    if pvalores is None:
+        pvalores = np.concatenate([_pvalores_lisa(bloco, *argumentos) for bloco in blocos])
+    logger.info("LISA: %d municípios, %d permutações em %.3fs.", n, permutacoes, time.perf_counter() - inicio)
+
+    quadrante = np.select(
+        [(z > 0) & (defasagem > 0), (z < 0) & (defasagem < 0), (z < 0) & (defasagem > 0), (z > 0) & (defasagem < 0)],
+        QUADRANTES_LISA,
+        default=NAO_SIGNIFICATIVO,
+    )
+    significativo = pvalores <= alfa
+    resultado = pd.DataFrame({
+        'valor': x,
+        'defasagem': defasagem,
+        'moran_local': moran_local,
+        'p_valor': pvalores,
+        'quadrante': quadrante,
+        'classificacao': np.where(significativo, quadrante, NAO_SIGNIFICATIVO),
+    }, index=sub.nomes)
+    return resultado.reindex(valores.index)
@@ -0,0 +1,625 @@
+"""
+Ingestão offline das bases do painel.
+
+Lê as planilhas de `data/`, aplica todo o tratamento (padronização de colunas,
+normalização dos nomes de municípios, junção com regiões, consolidação dos
+feminicídios e derivação de ano/mês), valida o esquema e grava um store
+analítico compacto que o painel apenas abre.
+
+Uso:
+    python -m painel_ingest data/
+    python -m painel_ingest data/ --saida data/painel_store
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+import unicodedata
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('painel_ingest')
+
+# --- ARQUIVOS DE ORIGEM ---
+ARQUIVOS_FONTE = {
+    'geral': 'base_geral.xlsx',
+    'feminicidio': 'base_feminicidio.xlsx',
+    'regioes': 'base_regioes_associacoes.xlsx',
+    'populacao': 'base_populacao.xlsx',
+    'calendario': 'base_calendario_feriados.xlsx',
+    'geojson': 'municipios_sc.json',
+    'aliases': 'aliases_municipios.csv',
+}
+
+# Grafias alternativas de municípios mapeadas para o nome usado no GeoJSON (ver `caminho_aliases`).
+ARQUIVO_ALIASES = os.path.join('data', ARQUIVOS_FONTE['aliases'])
+# Marcas diacríticas que sobram após a decomposição NFD (blocos Unicode de "combining marks").
+REGEX_MARCAS_COMBINANTES = '[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]'
+
+# --- CACHE EM DISCO DAS BASES TRATADAS ---
+# Cópias Parquet dos DataFrames já tratados, chaveadas pelo hash/mtime dos Excel de origem.
+DIRETORIO_CACHE = 'data/.cache'
+# Incrementar sempre que o tratamento das bases mudar, para invalidar as cópias antigas.
+VERSAO_CACHE = 4
+
+# --- STORE ANALÍTICO ---
+DIRETORIO_STORE = 'data/painel_store'
+ARQUIVO_MANIFESTO = 'manifesto.json'
+
+# Colunas obrigatórias de cada tabela do store, verificadas antes da gravação.
+ESQUEMA_STORE = {
+    'fatos': ['data_fato', 'municipio', 'municipio_normalizado', 'fato_comunicado', 'idade_vitima',
+              'mesoregiao', 'associacao', 'ano', 'mes', 'dia_ordinal', 'mes_ordinal', 'dia_semana', 'faixa_etaria'],
+    'feminicidios': ['data_fato', 'municipio', 'municipio_normalizado', 'idade_vitima', 'idade_autor',
+                     'relacao_autor', 'meio_crime', 'mesoregiao', 'associacao', 'ano', 'mes', 'dia_ordinal',
+                     'mes_ordinal', 'dia_semana', 'faixa_etaria'],
+    'dim_municipios': ['cd_mun', 'nm_mun', 'municipio_normalizado', 'mesoregiao', 'associacao'],
+    'dim_regioes': ['municipio', 'mesoregiao', 'associacao', 'municipio_normalizado'],
+    'dim_populacao': ['municipio', 'populacao_feminina', 'municipio_normalizado'],
+    'dim_calendario': ['data', 'dia_ordinal', 'is_feriado', 'is_fim_de_semana', 'is_vespera_feriado', 'is_pos_feriado'],
+}
+
+# Dias ordinais contam dias desde 1970-01-01; datas ausentes recebem um valor fora de qualquer período.
+DIA_ORDINAL_AUSENTE = np.iinfo(np.int32).min
+
+# Acentos removidos dos nomes de colunas de cada planilha.
+ACENTOS_GERAL = 'ãçú'
+ACENTOS_FEMINICIDIO = 'ãçúôêá'
+ACENTOS_CADASTRO = 'ãçôí'
+
+# Colunas textuais das bases de fatos guardadas como categóricas.
+COLUNAS_CATEGORICAS = [
+    'municipio', 'municipio_normalizado', 'mesoregiao', 'associacao', 'fato_comunicado', 'mes',
+    'fato', 'localidade', 'relacao_autor', 'bo_de_vd_contra_o_autor', 'passagem_policial',
+    'passagem_por_violencia_domestica', 'autor_preso', 'meio_crime'
+]
+COLUNAS_IDADE = ['idade_vitima', 'idade_autor']
+ORDEM_MESES = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
+ORDEM_DIAS_SEMANA = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+# Faixas etárias da vítima (limite superior incluído); idades fora delas ficam sem faixa.
+LIMITES_FAIXAS_ETARIAS = [0, 12, 17, 29, 40, 50, 60, 70, 79, 120]
+FAIXAS_ETARIAS = ['0-12 anos', '13-17 anos', '18-29 anos', '30-40 anos', '41-50 anos', '51-60 anos', '61-70 anos', '71-79 anos', '80+ anos']
+
+COLUNAS_FEMINICIDIO = {
+    'DATA': 'data_fato',
+    'MUNICÍPIO': 'municipio',
+    'RELAÇÃO COM O AUTOR': 'relacao_autor',
+    'BO DE VD CONTRA O AUTOR': 'bo_de_vd_contra_o_autor',
+    'IDADE AUTOR': 'idade_autor',
+    'IDADE VITIMA': 'idade_vitima',
+    'PASSAGEM POLICIAL': 'passagem_policial',
+    'PASSAGEM POR VIOLÊNCIA DOMÉSTICA': 'passagem_por_violencia_domestica',
+    'PRISÃO': 'autor_preso',
+    'MEIO': 'meio_crime'
+}
+
+
+def caminho_aliases(diretorio_dados='data'):
+    """Caminho da tabela de apelidos de municípios dentro de `diretorio_dados`."""
+    return os.path.join(diretorio_dados, ARQUIVOS_FONTE['aliases'])
+
+
+def carregar_aliases_municipios(caminho=ARQUIVO_ALIASES):
+    """
+    Lê a tabela de apelidos de municípios (grafias alternativas -> nome canônico).
+
+    As chaves são comparadas em minúsculas, antes da remoção de acentos, como
+    no restante da normalização. A leitura é memorizada pelo caminho absoluto,
+    para que diretórios de dados diferentes não compartilhem a mesma tabela.
+    """
+    return _ler_aliases_municipios(os.path.abspath(caminho))
+
+
+@lru_cache(maxsize=None)
+def _ler_aliases_municipios(caminho):
+    try:
+        df = pd.read_csv(caminho, dtype=str, keep_default_na=False)
+    except FileNotFoundError:
+        logger.warning("Tabela de apelidos '%s' não encontrada; seguindo sem apelidos.", caminho)
+        return {}
+    return dict(zip(df['nome'].str.strip().str.lower(), df['nome_canonico'].str.strip().str.lower()))
+
+
+@lru_cache(maxsize=None)
+def normalizar_nome(texto, arquivo_aliases=ARQUIVO_ALIASES):
+    """
+    Limpa e padroniza uma string de texto para ser usada como
+    chave de junção.
+    """
+    if not isinstance(texto, str):
+        return ""
+
+    texto = texto.lower()
+
+    # --- 1. Tabela de Apelidos (data/aliases_municipios.csv) ---
+    texto = carregar_aliases_municipios(arquivo_aliases).get(texto, texto)
+
+    # --- 2. Normalização de Acentos ---
+    texto = ''.join(c for c in unicodedata.normalize('NFD', texto)
+                    if unicodedata.category(c) != 'Mn')
+
+    # --- 3. Normalização de Pontuação ---
+    # Substitui qualquer coisa que NÃO seja (^) letra (a-z),
+    # número (0-9) ou espaço (\s) por um espaço.
+    texto = re.sub(r'[^a-z0-9\s]', ' ', texto)
+
+    # --- 4. Normalização de Palavras ---
+    # Remove artigos/preposições (agora cercados por espaços)
+    texto = re.sub(r'\b(de|do|da|d)\b', ' ', texto)
+
+    # --- 5. Limpeza Final ---
+    # Remove espaços múltiplos (criados pelas substituições)
+    texto = re.sub(r'\s+', ' ', texto).strip()
+
+    return texto.upper()
+
+
+def _normalizar_valores_unicos(valores, arquivo_aliases=ARQUIVO_ALIASES):
+    """Aplica as mesmas etapas de `normalizar_nome` de forma vetorizada sobre um Index de valores distintos."""
+    textos = pd.Series(valores, dtype=object)
+    eh_texto = textos.map(type).eq(str)
+    textos = textos.where(eh_texto).str.lower()
+    textos = textos.replace(carregar_aliases_municipios(arquivo_aliases))
+    textos = (textos.str.normalize('NFD')
+              .str.replace(REGEX_MARCAS_COMBINANTES, '', regex=True)
+              .str.replace(r'[^a-z0-9\s]', ' ', regex=True)
+              .str.replace(r'\b(de|do|da|d)\b', ' ', regex=True)
+              .str.replace(r'\s+', ' ', regex=True)
+              .str.strip()
+              .str.upper())
+    return textos.fillna('').to_numpy(dtype=object)
+
+
+def normalizar_serie(serie, arquivo_aliases=ARQUIVO_ALIASES):
+    """
+    Versão vetorizada de `normalizar_nome` para uma coluna inteira.
+
+    A normalização roda apenas sobre os valores distintos (há ~300 grafias de
+    municípios para dezenas de milhares de linhas) e o resultado é expandido
+    de volta pelos códigos de `pd.factorize`. Valores ausentes viram "".
+    """
+    codigos, unicos = pd.factorize(serie)
+    normalizados = np.append(_normalizar_valores_unicos(unicos, arquivo_aliases), '')
+    # Código -1 (valor ausente) aponta para o "" acrescentado ao final.
+    return pd.Series(normalizados[codigos], index=serie.index, name=serie.name, dtype=object)
+
+
+def padronizar_colunas(colunas, acentos):
+    """Padroniza nomes de colunas: sem espaços nas bordas, minúsculas, '_' no lugar de espaços e sem os acentos indicados."""
+    tabela = str.maketrans({c: unicodedata.normalize('NFD', c)[0] for c in acentos})
+    return [str(c).strip().lower().replace(' ', '_').translate(tabela) for c in colunas]
+
+
+# --- TRATAMENTO DAS BASES ---
+
+def tratar_regioes(df, arquivo_aliases=ARQUIVO_ALIASES):
+    """Trata a base de regiões e associações, normalizando o nome do município."""
+    df.columns = padronizar_colunas(df.columns, ACENTOS_CADASTRO)
+    df['municipio_normalizado'] = normalizar_serie(df['municipio'], arquivo_aliases)
+    return df
+
+
+def tratar_populacao(df, arquivo_aliases=ARQUIVO_ALIASES):
+    """Trata a base de população, normalizando o nome do município."""
+    df.columns = padronizar_colunas(df.columns, ACENTOS_CADASTRO)
+    df['municipio_normalizado'] = normalizar_serie(df['municipio'], arquivo_aliases)
+    return df
+
+
+def tratar_feminicidio(df, df_regioes, arquivo_aliases=ARQUIVO_ALIASES):
+    """Trata a base de feminicídio: renomeia colunas, converte tipos e junta as regiões."""
+    df = df.rename(columns=COLUNAS_FEMINICIDIO)
+    df.columns = padronizar_colunas(df.columns, ACENTOS_FEMINICIDIO)
+
+    df['data_fato'] = pd.to_datetime(df['data_fato'])
+    df['idade_vitima'] = pd.to_numeric(df['idade_vitima'], errors='coerce')
+    df['idade_autor'] = pd.to_numeric(df['idade_autor'], errors='coerce')
+
+    if 'municipio' in df.columns:
+        df['municipio_normalizado'] = normalizar_serie(df['municipio'], arquivo_aliases)
+
+    df = pd.merge(df, df_regioes[['municipio_normalizado', 'mesoregiao', 'associacao']], on='municipio_normalizado', how='left')
+    df['mesoregiao'] = df['mesoregiao'].fillna('Não informado')
+    df['associacao'] = df['associacao'].fillna('Não informado')
+
+    df = derivar_colunas_fatos(df)
+    return compactar_tipos(df, 'feminicidio')
+
+
+def tratar_geral(df_geral, df_regioes, df_feminicidio, arquivo_aliases=ARQUIVO_ALIASES):
+    """Trata a base geral e anexa os feminicídios já tratados como fato 'Feminicídio'."""
+    df_geral.columns = padronizar_colunas(df_geral.columns, ACENTOS_GERAL)
+
+    df_geral = df_geral.rename(columns={
+        'data_do_fato': 'data_fato', 'município': 'municipio',
+        'fato_comunicado': 'fato_comunicado', 'idade': 'idade_vitima'
+    })
+
+    df_geral['data_fato'] = pd.to_datetime(df_geral['data_fato'])
+    df_geral['idade_vitima'] = pd.to_numeric(df_geral['idade_vitima'], errors='coerce')
+
+    if 'municipio' in df_geral.columns:
+        df_geral['municipio_normalizado'] = normalizar_serie(df_geral['municipio'], arquivo_aliases)
+
+    df_geral = pd.merge(df_geral, df_regioes[['municipio_normalizado', 'mesoregiao', 'associacao']], on='municipio_normalizado', how='left')
+    df_geral['mesoregiao'] = df_geral['mesoregiao'].fillna('Não informado')
+    df_geral['associacao'] = df_geral['associacao'].fillna('Não informado')
+
+    if not df_feminicidio.empty:
+        df_feminicidio_para_geral = df_feminicidio.copy()
+        df_feminicidio_para_geral['fato_comunicado'] = 'Feminicídio'
+
+        df_final = pd.concat([df_geral, df_feminicidio_para_geral], ignore_index=True)
+    else:
+        df_final = df_geral
+
+    df_final = derivar_colunas_fatos(df_final)
+    return compactar_tipos(df_final, 'geral')
+
+
+def derivar_colunas_fatos(df):
+    """
+    Acrescenta à base de fatos as colunas derivadas da data e da idade da vítima.
+
+    Calculadas uma vez no tratamento para que o painel agrupe por códigos em vez
+    de formatar datas a cada interação: ano, mês e dia da semana (categóricas em
+    ordem de calendário), dias e meses ordinais desde 1970 e a faixa etária.
+    """
+    datas = df['data_fato']
+    df['ano'] = datas.dt.year
+    df['mes'] = pd.Categorical(datas.dt.month_name(), categories=ORDEM_MESES, ordered=True)
+    df['dia_semana'] = pd.Categorical(datas.dt.day_name(), categories=ORDEM_DIAS_SEMANA, ordered=True)
+    df['dia_ordinal'] = dia_ordinal(datas)
+    df['mes_ordinal'] = mes_ordinal(datas)
+    df['faixa_etaria'] = pd.cut(df['idade_vitima'], bins=LIMITES_FAIXAS_ETARIAS, labels=FAIXAS_ETARIAS, right=True)
+    return df
+
+
+def compactar_tipos(df, nome, referencia=None):
+    """
+    Converte as colunas de uma base de fatos para tipos compactos.
+
+    Colunas textuais viram categóricas (meses em ordem de calendário, demais em
+    ordem alfabética), idades viram Int16 e o ano vira int16. Com `referencia`,
+    as categorias são as da base de referência, acrescidas de eventuais valores
+    novos, para que as duas bases compartilhem os mesmos códigos.
+    """
+    memoria_antes = df.memory_usage(deep=True).sum()
+
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna not in df.columns:
+            continue
+        valores = df[coluna].dropna().unique()
+        if referencia is not None and coluna in referencia.columns and isinstance(referencia[coluna].dtype, pd.CategoricalDtype):
+            tipo_referencia = referencia[coluna].dtype
+            novos = [v for v in valores if v not in set(tipo_referencia.categories)]
+            categorias = list(tipo_referencia.categories) + sorted(novos, key=str)
+            tipo = pd.CategoricalDtype(categorias, ordered=tipo_referencia.ordered)
+        elif coluna == 'mes':
+            tipo = pd.CategoricalDtype(ORDEM_MESES, ordered=True)
+        else:
+            tipo = pd.CategoricalDtype(sorted(valores, key=str))
+        df[coluna] = df[coluna].astype(tipo)
+
+    for coluna in COLUNAS_IDADE:
+        if coluna not in df.columns:
+            continue
+        idades = pd.to_numeric(df[coluna], errors='coerce')
+        idades_validas = idades.dropna()
+        if idades_validas.empty or (((idades_validas % 1) == 0).all() and idades_validas.abs().max() < 2 ** 15):
+            df[coluna] = idades.astype('Int16')
+        else:
+            df[coluna] = idades.astype('float32')
+
+    if 'ano' in df.columns:
+        df['ano'] = df['ano'].astype('int16' if df['ano'].notna().all() else 'Int16')
+
+    memoria_depois = df.memory_usage(deep=True).sum()
+    logger.info("Base '%s' compactada: %.2f MB -> %.2f MB em memória (%d linhas).",
+                nome, memoria_antes / 2 ** 20, memoria_depois / 2 ** 20, len(df))
+    return df
+
+
+def tratar_calendario(df):
+    """Trata a base de calendário com feriados e datas especiais."""
+    df['data'] = pd.to_datetime(df['data'])
+    df['dia_ordinal'] = dia_ordinal(df['data'])
+    return df
+
+
+def dia_ordinal(datas):
+    """
+    Converte datas em dias inteiros desde 1970-01-01.
+
+    Aceita uma data avulsa (devolve int) ou uma coluna/array de datas (devolve
+    array int32, com DIA_ORDINAL_AUSENTE nas datas vazias), permitindo filtrar
+    períodos comparando inteiros em vez de objetos `date`.
+    """
+    if isinstance(datas, date):
+        return (pd.Timestamp(datas).normalize() - pd.Timestamp(0)).days
+    dias = np.asarray(pd.to_datetime(datas), dtype='datetime64[D]')
+    ordinais = dias.astype(np.int64)
+    ordinais[np.isnat(dias)] = DIA_ORDINAL_AUSENTE
+    return ordinais.astype(np.int32)
+
+
+def mes_ordinal(datas):
+    """Converte uma coluna de datas em meses inteiros desde 1970-01 (DIA_ORDINAL_AUSENTE nas vazias)."""
+    meses = np.asarray(pd.to_datetime(datas), dtype='datetime64[M]')
+    ordinais = meses.astype(np.int64)
+    ordinais[np.isnat(meses)] = DIA_ORDINAL_AUSENTE
+    return ordinais.astype(np.int32)
+
+
+def tratar_municipios(geojson_data, df_regioes, arquivo_aliases=ARQUIVO_ALIASES):
+    """Monta a dimensão de municípios a partir das propriedades do GeoJSON, com mesorregião e associação."""
+    df = pd.DataFrame([feature['properties'] for feature in geojson_data['features']])
+    df.columns = [c.lower() for c in df.columns]
+    df['municipio_normalizado'] = normalizar_serie(df['nm_mun'], arquivo_aliases)
+    df = pd.merge(df, df_regioes[['municipio_normalizado', 'mesoregiao', 'associacao']], on='municipio_normalizado', how='left')
+    df['mesoregiao'] = df['mesoregiao'].fillna('Não informado')
+    df['associacao'] = df['associacao'].fillna('Não informado')
+    return df
+
+
+def ler_excel(nome, diretorio_dados='data'):
+    """Lê a planilha bruta de uma base pelo nome lógico (ver ARQUIVOS_FONTE)."""
+    return pd.read_excel(os.path.join(diretorio_dados, ARQUIVOS_FONTE[nome]))
+
+
+def ler_geojson(diretorio_dados='data'):
+    """Lê o GeoJSON bruto dos municípios de Santa Catarina."""
+    with open(os.path.join(diretorio_dados, ARQUIVOS_FONTE['geojson']), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# --- CACHE PARQUET POR BASE ---
+
+def _hash_arquivo(caminho):
+    """Calcula o hash SHA-256 do conteúdo de um arquivo, lendo-o em blocos."""
+    hasher = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(bloco)
+    return hasher.hexdigest()
+
+
+def assinatura_fontes(arquivos_fonte, assinatura_anterior=None):
+    """
+    Monta a assinatura (hash, mtime e tamanho) dos arquivos de origem de uma base.
+
+    Se o mtime e o tamanho de um arquivo coincidem com a assinatura anterior,
+    o hash já conhecido é reaproveitado sem reler o arquivo.
+    """
+    assinatura_anterior = assinatura_anterior or {}
+    assinatura = {}
+    for caminho in arquivos_fonte:
+        info = os.stat(caminho)
+        anterior = assinatura_anterior.get(caminho, {})
+        if anterior.get('mtime') == info.st_mtime and anterior.get('tamanho') == info.st_size:
+            sha256 = anterior['sha256']
+        else:
+            sha256 = _hash_arquivo(caminho)
+        assinatura[caminho] = {'sha256': sha256, 'mtime': info.st_mtime, 'tamanho': info.st_size}
+    return assinatura
+
+
+def _mesmo_conteudo(assinatura_a, assinatura_b):
+    """Indica se duas assinaturas descrevem os mesmos arquivos com o mesmo conteúdo."""
+    return {c: a['sha256'] for c, a in assinatura_a.items()} == {c: a['sha256'] for c, a in assinatura_b.items()}
+
+
+def _gravar_json(caminho, conteudo):
+    """Grava um JSON de forma atômica."""
+    caminho_temporario = f'{caminho}.tmp'
+    with open(caminho_temporario, 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f, indent=2, ensure_ascii=False)
+    os.replace(caminho_temporario, caminho)
+
+
+def carregar_com_cache(nome, arquivos_fonte, construir):
+    """
+    Retorna o DataFrame tratado de uma base, usando uma cópia Parquet em disco.
+
+    A cópia fica em `data/.cache/<nome>.parquet` e é válida enquanto o conteúdo
+    (hash SHA-256) dos arquivos de origem e a VERSAO_CACHE não mudarem. Se estiver
+    ausente ou desatualizada, `construir()` é executada e a cópia é refeita.
+    """
+    inicio = time.perf_counter()
+    caminho_parquet = os.path.join(DIRETORIO_CACHE, f'{nome}.parquet')
+    caminho_meta = os.path.join(DIRETORIO_CACHE, f'{nome}.json')
+
+    meta = {}
+    if os.path.exists(caminho_meta) and os.path.exists(caminho_parquet):
+        try:
+            with open(caminho_meta, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+
+    assinatura = assinatura_fontes(arquivos_fonte, meta.get('fontes'))
+
+    if meta.get('versao') == VERSAO_CACHE and _mesmo_conteudo(meta.get('fontes', {}), assinatura):
+        try:
+            df = pd.read_parquet(caminho_parquet)
+            if meta['fontes'] != assinatura:
+                # Conteúdo idêntico com mtime novo: só atualiza a assinatura para evitar novo hash.
+                _gravar_json(caminho_meta, {'versao': VERSAO_CACHE, 'fontes': assinatura})
+            logger.info("Base '%s' lida do cache Parquet em %.3fs (%d linhas).", nome, time.perf_counter() - inicio, len(df))
+            return df
+        except Exception as e:
+            logger.warning("Cache Parquet de '%s' ilegível (%s); reconstruindo a partir das fontes.", nome, e)
+
+    df = construir()
+    tempo_construcao = time.perf_counter() - inicio
+
+    try:
+        os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+        caminho_temporario = f'{caminho_parquet}.tmp'
+        df.to_parquet(caminho_temporario, index=False)
+        os.replace(caminho_temporario, caminho_parquet)
+        _gravar_json(caminho_meta, {'versao': VERSAO_CACHE, 'fontes': assinatura})
+    except Exception as e:
+        logger.warning("Não foi possível gravar o cache Parquet de '%s': %s", nome, e)
+
+    logger.info("Base '%s' reconstruída a partir do Excel em %.3fs (%d linhas).", nome, tempo_construcao, len(df))
+    return df
+
+
+# --- STORE ANALÍTICO ---
+
+def validar_esquema(tabelas):
+    """
+    Verifica se cada tabela do store tem as colunas obrigatórias e tipos coerentes.
+
+    Lança ValueError com a lista de problemas encontrados. Problemas de qualidade
+    que não impedem o uso (datas ausentes, municípios sem região) são apenas registrados.
+    """
+    problemas = []
+    for nome, colunas in ESQUEMA_STORE.items():
+        if nome not in tabelas:
+            problemas.append(f"tabela '{nome}' ausente")
+            continue
+        faltantes = [c for c in colunas if c not in tabelas[nome].columns]
+        if faltantes:
+            problemas.append(f"tabela '{nome}' sem as colunas {faltantes}")
+
+    for nome in ('fatos', 'feminicidios'):
+        df = tabelas.get(nome)
+        if df is None or 'data_fato' not in df.columns:
+            continue
+        if not pd.api.types.is_datetime64_any_dtype(df['data_fato']):
+            problemas.append(f"tabela '{nome}': coluna 'data_fato' não é do tipo data")
+            continue
+        datas_ausentes = int(df['data_fato'].isna().sum())
+        if datas_ausentes:
+            logger.warning("Tabela '%s': %d registros sem data do fato.", nome, datas_ausentes)
+        sem_regiao = df.loc[df['mesoregiao'] == 'Não informado', 'municipio'].dropna().unique()
+        if len(sem_regiao):
+            logger.warning("Tabela '%s': %d municípios sem mesorregião/associação: %s",
+                           nome, len(sem_regiao), ', '.join(map(str, sorted(sem_regiao)[:10])))
+
+    if problemas:
+        raise ValueError("Esquema inválido no store analítico: " + '; '.join(problemas))
+
+
+def compilar_store(diretorio_dados='data', diretorio_saida=None):
+    """
+    Lê todas as planilhas de `diretorio_dados`, trata, valida e grava o store analítico.
+
+    O store é um diretório com uma tabela Parquet por entidade (fatos, feminicídios e
+    as dimensões de municípios, regiões, população e calendário) e um manifesto com
+    a assinatura das fontes usadas. A gravação é feita em um diretório temporário
+    que substitui o anterior apenas quando tudo foi escrito.
+    """
+    diretorio_saida = diretorio_saida or os.path.join(diretorio_dados, 'painel_store')
+    inicio = time.perf_counter()
+
+    aliases = caminho_aliases(diretorio_dados)
+    df_regioes = tratar_regioes(ler_excel('regioes', diretorio_dados), aliases)
+    df_feminicidio = tratar_feminicidio(ler_excel('feminicidio', diretorio_dados), df_regioes, aliases)
+    df_fatos = tratar_geral(ler_excel('geral', diretorio_dados), df_regioes, df_feminicidio, aliases)
+    tabelas = {
+        'fatos': df_fatos,
+        'feminicidios': compactar_tipos(df_feminicidio, 'feminicidio', referencia=df_fatos),
+        'dim_municipios': tratar_municipios(ler_geojson(diretorio_dados), df_regioes, aliases),
+        'dim_regioes': df_regioes,
+        'dim_populacao': tratar_populacao(ler_excel('populacao', diretorio_dados), aliases),
+        'dim_calendario': tratar_calendario(ler_excel('calendario', diretorio_dados)),
+    }
+    logger.info("Bases lidas e tratadas em %.2fs.", time.perf_counter() - inicio)
+
+    validar_esquema(tabelas)
+
+    diretorio_temporario = f'{diretorio_saida}.tmp'
+    shutil.rmtree(diretorio_temporario, ignore_errors=True)
+    os.makedirs(diretorio_temporario)
+    for nome, df in tabelas.items():
+        df.to_parquet(os.path.join(diretorio_temporario, f'{nome}.parquet'), index=False)
+
+    fontes = [os.path.join(diretorio_dados, arquivo) for arquivo in ARQUIVOS_FONTE.values()]
+    _gravar_json(os.path.join(diretorio_temporario, ARQUIVO_MANIFESTO), {
+        'versao': VERSAO_CACHE,
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'fontes': assinatura_fontes(fontes),
+        'tabelas': {nome: len(df) for nome, df in tabelas.items()},
+    })
+
+    diretorio_antigo = f'{diretorio_saida}.old'
+    shutil.rmtree(diretorio_antigo, ignore_errors=True)
+    if os.path.exists(diretorio_saida):
+        os.replace(diretorio_saida, diretorio_antigo)
+    os.replace(diretorio_temporario, diretorio_saida)
+    shutil.rmtree(diretorio_antigo, ignore_errors=True)
+
+    logger.info("Store analítico gravado em '%s' em %.2fs: %s", diretorio_saida, time.perf_counter() - inicio,
+                ', '.join(f'{nome}={len(df)}' for nome, df in tabelas.items()))
+    return tabelas
+
+
+def abrir_store(diretorio_store=DIRETORIO_STORE):
+    """
+    Abre o store analítico gravado por `compilar_store`.
+
+    Retorna um dicionário {tabela: DataFrame}, ou None se o store não existir, for de
+    outra versão ou estiver desatualizado em relação a alguma planilha presente em disco.
+    """
+    caminho_manifesto = os.path.join(diretorio_store, ARQUIVO_MANIFESTO)
+    if not os.path.exists(caminho_manifesto):
+        return None
+
+    inicio = time.perf_counter()
+    with open(caminho_manifesto, 'r', encoding='utf-8') as f:
+        manifesto = json.load(f)
+    if manifesto.get('versao') != VERSAO_CACHE:
+        logger.warning("Store analítico em '%s' é de outra versão; ignorando.", diretorio_store)
+        return None
+
+    fontes_presentes = [c for c in manifesto.get('fontes', {}) if os.path.exists(c)]
+    assinatura_atual = assinatura_fontes(fontes_presentes, manifesto['fontes'])
+    fontes_manifesto = {c: a for c, a in manifesto['fontes'].items() if c in assinatura_atual}
+    if not _mesmo_conteudo(fontes_manifesto, assinatura_atual):
+        logger.warning("Store analítico em '%s' desatualizado em relação às planilhas; rode 'python -m painel_ingest'.", diretorio_store)
+        return None
+
+    try:
+        tabelas = {
+            nome: pd.read_parquet(os.path.join(diretorio_store, f'{nome}.parquet'))
+            for nome in manifesto['tabelas']
+        }
+    except Exception as e:
+        logger.warning("Não foi possível ler o store analítico em '%s': %s", diretorio_store, e)
+        return None
+    logger.info("Store analítico aberto em %.3fs (gerado em %s).", time.perf_counter() - inicio, manifesto.get('gerado_em'))
+    return tabelas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m painel_ingest',
+        description="Compila as planilhas de dados em um store analítico pré-processado para o painel."
+    )
+    parser.add_argument('diretorio_dados', nargs='?', default='data', help="Diretório com as planilhas de origem (padrão: data).")
+    parser.add_argument('--saida', default=None, help="Diretório do store gerado (padrão: <diretorio_dados>/painel_store).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    try:
+        compilar_store(args.diretorio_dados, args.saida)
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        logger.error("Falha na ingestão: %s", e)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
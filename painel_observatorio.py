@@ -3,10 +3,34 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import json
-import unicodedata
 import numpy as np
-import re
-from shapely.geometry import shape, Point
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from painel_ingest import (
+    normalizar_serie, carregar_com_cache, dia_ordinal, abrir_store, ler_excel,
+    tratar_geral, tratar_feminicidio, tratar_regioes, tratar_populacao, tratar_calendario, compactar_tipos,
+    ARQUIVO_ALIASES, FAIXAS_ETARIAS, ORDEM_MESES, ORDEM_DIAS_SEMANA
+)
+from painel_consultas import (
+    IndiceFiltro, IndiceCubo, CacheResultados, CalendarioDias, ContagensDiariasAcumuladas, chave_filtros, dias_do_periodo,
+    montar_cubo, somar_cubo, contar_valores_cubo, media_ponderada_cubo, criar_tabela_evolucao_anual, dias_por_linha_semanal,
+    contar_por_linha_semanal, DIMENSOES_CUBO, INTERVALOS_CUBO, MEDIAS_CUBO, ATRIBUTOS_FEMINICIDIO, DIA_COMUM, ARQUIVO_CALENDARIO_DIAS
+)
+from painel_espacial import (
+    simplificar_geojson, dissolver_geojson, carregar_adjacencia, construir_pesos,
+    calcular_lisa, NIVEIS_DETALHE, NIVEL_DETALHE_MAPAS, PROPRIEDADES_MAPA, METODOS_PESOS,
+    QUADRANTES_LISA, NAO_SIGNIFICATIVO, ALFA_LISA
+)
+from painel_varredura import carregar_varredura, ROTULO_TODOS, ALFA as ALFA_VARREDURA
+from painel_sazonal import (
+    serie_diaria_cubo, agregar_serie, dias_de_evento, analisar_janelas, EVENTOS, GRANULARIDADES, SEMANAS_REFERENCIA, ALFA_BANDAS
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+logger = logging.getLogger('painel_observatorio')
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(
@@ -394,88 +418,81 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def normalizar_nome(texto):
-    """
-    Limpa e padroniza uma string de texto para ser usada como
-    chave de junção.
-    """
-    if not isinstance(texto, str):
-        return ""
-   
-    texto = texto.lower()
-   
-    # --- 1. Mapa de Exceções (Hard-coded) ---
-    mapa_excecoes = {
-        'herval': 'herval d oeste'
-        # (Mantemos a correção para o arquivo Geo)
-    }
-    if texto in mapa_excecoes:
-        texto = mapa_excecoes[texto]
- 
-    # --- 2. Normalização de Acentos ---
-    texto = ''.join(c for c in unicodedata.normalize('NFD', texto)
-                    if unicodedata.category(c) != 'Mn')
-   
-    # --- 3. Normalização de Pontuação ---
-    # Substitui qualquer coisa que NÃO seja (^) letra (a-z),
-    # número (0-9) ou espaço (\s) por um espaço.
-    texto = re.sub(r'[^a-z0-9\s]', ' ', texto)
-   
-    # --- 4. Normalização de Palavras ---
-    # Remove artigos/preposições (agora cercados por espaços)
-    texto = re.sub(r'\b(de|do|da|d)\b', ' ', texto)
-   
-    # --- 5. Limpeza Final ---
-    # Remove espaços múltiplos (criados pelas substituições)
-    texto = re.sub(r'\s+', ' ', texto).strip()
-    
-    return texto.upper()
+@st.cache_data
+def carregar_store_analitico():
+    """Abre o store analítico gerado por `python -m painel_ingest`, se existir e estiver atualizado."""
+    return abrir_store()
 
 @st.cache_data
-def carregar_geojson_sc():
-    """Carrega o GeoJSON e adiciona uma chave normalizada para o nome do município."""
+def carregar_geojson_sc(nivel_detalhe=None):
+    """
+    Carrega o GeoJSON e adiciona uma chave normalizada para o nome do município.
+
+    Com `nivel_detalhe` (chave de NIVEIS_DETALHE), devolve a versão simplificada
+    e com coordenadas arredondadas usada nos mapas.
+    """
+    if nivel_detalhe is not None:
+        geojson_data = carregar_geojson_sc()
+        if geojson_data is None:
+            return None
+        tolerancia, casas_decimais = NIVEIS_DETALHE[nivel_detalhe]
+        return simplificar_geojson(geojson_data, tolerancia, casas_decimais, PROPRIEDADES_MAPA)
     try:
         with open('data/municipios_sc.json', 'r', encoding='utf-8') as f:
             geojson_data = json.load(f)
         
-        for feature in geojson_data['features']:
-            nome_original = feature['properties'].get('NM_MUN')
+        nomes_originais = pd.Series([feature['properties'].get('NM_MUN') for feature in geojson_data['features']])
+        nomes_normalizados = normalizar_serie(nomes_originais)
+        for feature, nome_original, nome_normalizado in zip(geojson_data['features'], nomes_originais, nomes_normalizados):
             if nome_original:
-                feature['properties']['NM_MUN_NORMALIZADO'] = normalizar_nome(nome_original)
+                feature['properties']['NM_MUN_NORMALIZADO'] = nome_normalizado
             
         return geojson_data
     except FileNotFoundError:
         st.error("Arquivo 'municipios_sc.json' não encontrado na pasta 'data'.")
         return None
 
+@st.cache_data
+def carregar_geojson_agrupado(coluna_grupo):
+    """
+    Polígonos dos municípios (versão dos mapas) dissolvidos por grupo.
+
+    `coluna_grupo` pode ser 'mesoregiao' ou 'associacao' (da base de regiões) ou
+    uma das regiões do IBGE presentes no GeoJSON, 'CD_RGI' ou 'CD_RGINT'. O id
+    de cada polígono fica em `properties.grupo`.
+    """
+    geojson_data = carregar_geojson_sc()
+    geojson_mapas = carregar_geojson_sc(NIVEL_DETALHE_MAPAS)
+    if geojson_data is None or geojson_mapas is None:
+        return None
+
+    propriedades = [feature['properties'] for feature in geojson_data['features']]
+    nomes = None
+    if coluna_grupo in ('CD_RGI', 'CD_RGINT'):
+        grupos = [props.get(coluna_grupo) for props in propriedades]
+        coluna_nome = 'NM_' + coluna_grupo[3:]
+        nomes = {props.get(coluna_grupo): props.get(coluna_nome) for props in propriedades}
+    else:
+        df_regioes = carregar_dados_regioes()
+        grupo_por_municipio = df_regioes.drop_duplicates('municipio_normalizado').set_index('municipio_normalizado')[coluna_grupo]
+        grupos = grupo_por_municipio.reindex([props.get('NM_MUN_NORMALIZADO') for props in propriedades]).fillna('Não informado').tolist()
+    return dissolver_geojson(geojson_mapas, grupos, nomes)
+
 @st.cache_data
 def mapear_vizinhos(_geojson_data):
     """Cria um mapa de adjacência (municípios vizinhos) a partir do GeoJSON."""
     if _geojson_data is None:
         return {}
-    
-    geometrias = {}
-    for feature in _geojson_data['features']:
-        nome_normalizado = feature['properties'].get('NM_MUN_NORMALIZADO')
-        if nome_normalizado:
-            geometrias[nome_normalizado] = shape(feature['geometry'])
-
-    vizinhos = {nome: [] for nome in geometrias.keys()}
-    nomes_municipios = list(geometrias.keys())
-
-    for i in range(len(nomes_municipios)):
-        for j in range(i + 1, len(nomes_municipios)):
-            nome1 = nomes_municipios[i]
-            nome2 = nomes_municipios[j]
-            geom1 = geometrias[nome1]
-            geom2 = geometrias[nome2]
-            
-            # Verifica se as geometrias se tocam ou se intersectam
-            if geom1.touches(geom2) or geom1.intersects(geom2):
-                vizinhos[nome1].append(nome2)
-                vizinhos[nome2].append(nome1)
-    
-    return vizinhos
+    return carregar_adjacencia('data/municipios_sc.json', _geojson_data)
+
+@st.cache_resource
+def carregar_pesos_espaciais(metodo='queen', k=6):
+    """Matriz esparsa de pesos espaciais dos municípios, montada uma vez por processo para cada critério."""
+    geojson_sc = carregar_geojson_sc()
+    if geojson_sc is None:
+        return None
+    parametros = {'k': k} if metodo == 'knn' else {}
+    return construir_pesos(geojson_sc, mapear_vizinhos(geojson_sc), metodo, **parametros)
 
 def calcular_indice_letalidade(df_geral_filtrado, df_feminicidio_filtrado, agrupamento):
     """Calcula o Índice de Letalidade da Violência."""
@@ -490,11 +507,11 @@ def calcular_indice_letalidade(df_geral_filtrado, df_feminicidio_filtrado, agrup
     coluna_agrupamento = coluna_agrupamento_map[agrupamento]
 
     df_ocorrencias_puras = df_geral_filtrado[df_geral_filtrado['fato_comunicado'] != 'Feminicídio']
-    total_ocorrencias = df_ocorrencias_puras.groupby(coluna_agrupamento).size().reset_index(name='total_ocorrencias')
+    total_ocorrencias = df_ocorrencias_puras.groupby(coluna_agrupamento, observed=True).size().reset_index(name='total_ocorrencias')
     
-    total_feminicidios = df_feminicidio_filtrado.groupby(coluna_agrupamento).size().reset_index(name='total_feminicidios')
+    total_feminicidios = df_feminicidio_filtrado.groupby(coluna_agrupamento, observed=True).size().reset_index(name='total_feminicidios')
     
-    df_letalidade = pd.merge(total_ocorrencias, total_feminicidios, on=coluna_agrupamento, how='outer').fillna(0)
+    df_letalidade = pd.merge(total_ocorrencias, total_feminicidios, on=coluna_agrupamento, how='outer').fillna({'total_ocorrencias': 0, 'total_feminicidios': 0})
     
     df_letalidade['total_ocorrencias'] = df_letalidade['total_ocorrencias'].astype(int)
     df_letalidade['total_feminicidios'] = df_letalidade['total_feminicidios'].astype(int)
@@ -523,42 +540,15 @@ def calcular_indice_letalidade(df_geral_filtrado, df_feminicidio_filtrado, agrup
 @st.cache_data
 def carregar_dados_gerais():
     """Carrega e trata os dados da base geral, normalizando nomes de municípios."""
+    store = carregar_store_analitico()
+    if store is not None:
+        return store['fatos']
     try:
-        df_regioes = carregar_dados_regioes()
-        df_geral = pd.read_excel('data/base_geral.xlsx')
-
-        df_geral.columns = (df_geral.columns.str.strip().str.lower()
-                      .str.replace(' ', '_', regex=False).str.replace('ã', 'a', regex=False)
-                      .str.replace('ç', 'c', regex=False).str.replace('ú', 'u', regex=False))
-
-        df_geral.rename(columns={
-            'data_do_fato': 'data_fato', 'município': 'municipio',
-            'fato_comunicado': 'fato_comunicado', 'idade': 'idade_vitima'
-        }, inplace=True)
-
-        df_geral['data_fato'] = pd.to_datetime(df_geral['data_fato'])
-        df_geral['idade_vitima'] = pd.to_numeric(df_geral['idade_vitima'], errors='coerce')
-        
-        if 'municipio' in df_geral.columns:
-            df_geral['municipio_normalizado'] = df_geral['municipio'].apply(normalizar_nome)
-
-        df_geral = pd.merge(df_geral, df_regioes[['municipio_normalizado', 'mesoregiao', 'associacao']], on='municipio_normalizado', how='left')
-        df_geral['mesoregiao'].fillna('Não informado', inplace=True)
-        df_geral['associacao'].fillna('Não informado', inplace=True)
-        
-        df_feminicidio_raw = carregar_dados_feminicidio()
-        if not df_feminicidio_raw.empty:
-            df_feminicidio_para_geral = df_feminicidio_raw.copy()
-            df_feminicidio_para_geral['fato_comunicado'] = 'Feminicídio'
-            
-            df_final = pd.concat([df_geral, df_feminicidio_para_geral], ignore_index=True)
-        else:
-            df_final = df_geral
-
-        df_final['ano'] = df_final['data_fato'].dt.year
-        df_final['mes'] = df_final['data_fato'].dt.month_name()
-        
-        return df_final
+        return carregar_com_cache(
+            'geral',
+            ['data/base_geral.xlsx', 'data/base_feminicidio.xlsx', 'data/base_regioes_associacoes.xlsx', ARQUIVO_ALIASES],
+            lambda: tratar_geral(ler_excel('geral'), carregar_dados_regioes(), carregar_feminicidio_tratado())
+        )
         
     except FileNotFoundError:
         st.error("Arquivo 'base_geral.xlsx' ou 'base_feminicidio.xlsx' não encontrado na pasta 'data'.")
@@ -567,48 +557,23 @@ def carregar_dados_gerais():
         st.error(f"Erro de Chave (KeyError) na base geral: A coluna {e} não foi encontrada.")
         return pd.DataFrame()
 
+def carregar_feminicidio_tratado():
+    """Lê a base de feminicídio tratada a partir do cache em disco, sem alinhar categorias."""
+    return carregar_com_cache(
+        'feminicidio',
+        ['data/base_feminicidio.xlsx', 'data/base_regioes_associacoes.xlsx', ARQUIVO_ALIASES],
+        lambda: tratar_feminicidio(ler_excel('feminicidio'), carregar_dados_regioes())
+    )
+
 @st.cache_data
 def carregar_dados_feminicidio():
     """Carrega e trata os dados da base de feminicídio de forma robusta."""
+    store = carregar_store_analitico()
+    if store is not None:
+        return store['feminicidios']
     try:
-        df_regioes = carregar_dados_regioes()
-        df = pd.read_excel('data/base_feminicidio.xlsx')
-
-        df.rename(columns={
-            'DATA': 'data_fato',
-            'MUNICÍPIO': 'municipio',
-            'RELAÇÃO COM O AUTOR': 'relacao_autor',
-            'BO DE VD CONTRA O AUTOR': 'bo_de_vd_contra_o_autor',
-            'IDADE AUTOR': 'idade_autor',
-            'IDADE VITIMA': 'idade_vitima',
-            'PASSAGEM POLICIAL': 'passagem_policial',
-            'PASSAGEM POR VIOLÊNCIA DOMÉSTICA': 'passagem_por_violencia_domestica',
-            'PRISÃO': 'autor_preso',
-            'MEIO': 'meio_crime'
-        }, inplace=True)
-
-        df.columns = (df.columns.str.strip().str.lower()
-                      .str.replace(' ', '_', regex=False)
-                      .str.replace('ã', 'a', regex=False)
-                      .str.replace('ç', 'c', regex=False)
-                      .str.replace('ú', 'u', regex=False)
-                      .str.replace('ô', 'o', regex=False)
-                      .str.replace('ê', 'e', regex=False)
-                      .str.replace('á', 'a', regex=False))
-
-        df['data_fato'] = pd.to_datetime(df['data_fato'])
-        df['idade_vitima'] = pd.to_numeric(df['idade_vitima'], errors='coerce')
-        df['idade_autor'] = pd.to_numeric(df['idade_autor'], errors='coerce')
-        
-        if 'municipio' in df.columns:
-            df['municipio_normalizado'] = df['municipio'].apply(normalizar_nome)
-
-        df = pd.merge(df, df_regioes[['municipio_normalizado', 'mesoregiao', 'associacao']], on='municipio_normalizado', how='left')
-        df['mesoregiao'].fillna('Não informado', inplace=True)
-        df['associacao'].fillna('Não informado', inplace=True)
-        
-        df['ano'] = df['data_fato'].dt.year
-        return df
+        # As categorias seguem as da base geral para que as duas bases usem os mesmos códigos.
+        return compactar_tipos(carregar_feminicidio_tratado(), 'feminicidio', referencia=carregar_dados_gerais())
         
     except FileNotFoundError:
         st.error("Arquivo 'base_feminicidio.xlsx' não encontrado na pasta 'data'.")
@@ -622,10 +587,15 @@ def carregar_dados_feminicidio():
 @st.cache_data
 def carregar_dados_calendario():
     """Carrega a base de calendário com feriados e datas especiais."""
+    store = carregar_store_analitico()
+    if store is not None:
+        return store['dim_calendario']
     try:
-        df = pd.read_excel('data/base_calendario_feriados.xlsx')
-        df['data'] = pd.to_datetime(df['data'])
-        return df
+        return carregar_com_cache(
+            'calendario',
+            ['data/base_calendario_feriados.xlsx'],
+            lambda: tratar_calendario(ler_excel('calendario'))
+        )
     except FileNotFoundError:
         st.error("Arquivo 'base_calendario_feriados.xlsx' não encontrado na pasta 'data'. Este arquivo é necessário para a Análise Sazonal.")
         return pd.DataFrame()
@@ -633,6 +603,11 @@ def carregar_dados_calendario():
         st.error(f"Ocorreu um erro ao carregar os dados do calendário: {e}")
         return pd.DataFrame()
 
+def contar_ocorrencias(serie):
+    """Conta os registros por valor, sem as categorias que não ocorrem na seleção."""
+    contagem = serie.value_counts()
+    return contagem[contagem > 0]
+
 def colorir_percentual(val):
     """Retorna a cor para o valor percentual."""
     if pd.isna(val) or val == 0:
@@ -649,6 +624,43 @@ def formatar_seta_percentual(val):
         return f'{seta} {abs(val):.2f}%'
     return f'{abs(val):.2f}%'
 
+@st.fragment
+def exibir_grafico_selecionavel(opcoes, chave, chave_grafico, construir_figura, *dados):
+    """
+    Exibe o seletor de tipo de gráfico e o gráfico correspondente como um fragmento.
+
+    Trocar o tipo reexecuta só este trecho: a figura é refeita por
+    `construir_figura(tipo, *dados)` a partir dos agregados já calculados na
+    última execução completa, sem recarregar, refiltrar ou reagregar as bases.
+    """
+    tipo = st.selectbox("Tipo de Gráfico", opcoes, key=chave)
+    st.plotly_chart(construir_figura(tipo, *dados), use_container_width=True, key=chave_grafico)
+
+@st.fragment
+def exibir_serie_temporal(opcoes, chave, chave_granularidade, chave_grafico, construir_figura, serie, primeiro_dia, grupos, coluna_grupo, *dados):
+    """
+    Exibe os seletores de granularidade e de tipo de gráfico e a série temporal como um fragmento.
+
+    A série diária (grupo x dia) vem pronta do cache de resultados: trocar a
+    granularidade só a reagrega por somas acumuladas, sem tocar nas bases. A
+    figura recebe um DataFrame com `periodo`, `quantidade` e, se houver
+    agrupamento, a `coluna_grupo` (sem os períodos zerados de cada grupo).
+    """
+    col_granularidade, col_tipo = st.columns(2)
+    with col_granularidade:
+        granularidade = st.selectbox(
+            "Granularidade", list(GRANULARIDADES), index=list(GRANULARIDADES).index('mensal'),
+            format_func=GRANULARIDADES.get, key=chave_granularidade
+        )
+    with col_tipo:
+        tipo = st.selectbox("Tipo de Gráfico", opcoes, key=chave)
+    registros = agregar_serie(serie, primeiro_dia, granularidade, grupos)
+    if coluna_grupo is None:
+        registros = registros.drop(columns='grupo')
+    else:
+        registros = registros[registros['quantidade'] > 0].rename(columns={'grupo': coluna_grupo})
+    st.plotly_chart(construir_figura(tipo, registros, *dados), use_container_width=True, key=chave_grafico)
+
 def calcular_cagr(valor_inicial, valor_final, num_anos):
     """Calcula a Taxa de Crescimento Anual Composta (CAGR)."""
     if isinstance(valor_inicial, pd.Series):
@@ -665,109 +677,21 @@ def calcular_cagr(valor_inicial, valor_final, num_anos):
             return np.nan
         return ((valor_final / valor_inicial) ** (1 / (num_anos - 1)) - 1) * 100
 
-def criar_tabela_consolidada(df, coluna_agrupamento, nome_agrupamento):
-    """Cria uma tabela consolidada com dados de crimes por [agrupamento]."""
-    df_agrupado = df.groupby([coluna_agrupamento, 'fato_comunicado', 'ano']).size().reset_index(name='total_crime')
-    df_pivot = df_agrupado.pivot_table(index=[coluna_agrupamento, 'fato_comunicado'], columns='ano', values='total_crime', fill_value=0)
-    df_pivot = df_pivot.reindex(sorted(df_pivot.columns), axis=1)
-    df_pivot['total'] = df_pivot.sum(axis=1)
-    
-    anos = sorted(df_agrupado['ano'].unique())
-    if len(anos) > 1:
-        for i in range(1, len(anos)):
-            ano_atual = anos[i]
-            ano_anterior = anos[i-1]
-            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
-            df_pivot[coluna_evolucao] = (
-                (df_pivot[ano_atual] - df_pivot[ano_anterior]) / df_pivot[ano_anterior].replace(0, pd.NA) * 100
-            )
-    
-    anos_int = sorted([col for col in df_pivot.columns if isinstance(col, int)])
-    
-    ano_corrente = pd.Timestamp.now().year
-    anos_para_cagr = [ano for ano in anos_int if ano != ano_corrente]
-
-    if len(anos_para_cagr) >= 3:
-        valor_inicial = df_pivot[anos_para_cagr[0]]
-        valor_final = df_pivot[anos_para_cagr[-1]]
-        df_pivot['Tendência (CAGR %)'] = calcular_cagr(valor_inicial, valor_final, len(anos_para_cagr))
-
-    ordem_colunas = []
-    if anos_int:
-        ordem_colunas.append(anos_int[0])
-        for i in range(1, len(anos_int)):
-            ano_anterior = anos_int[i-1]
-            ano_atual = anos_int[i]
-            ordem_colunas.append(ano_atual)
-            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
-            if coluna_evolucao in df_pivot.columns:
-                ordem_colunas.append(coluna_evolucao)
-    
-    ordem_colunas.append('total')
-    if 'Tendência (CAGR %)' in df_pivot.columns:
-        ordem_colunas.append('Tendência (CAGR %)')
-        
-    df_consolidado = df_pivot[ordem_colunas].reset_index()
-    nome_coluna = f"Nome do {nome_agrupamento}" if nome_agrupamento == "Município" else nome_agrupamento
-    df_consolidado.rename(columns={coluna_agrupamento: nome_coluna, 'fato_comunicado': 'Fato Comunicado'}, inplace=True)
-    
-    return df_consolidado
-
-def criar_tabela_total_consolidada(df):
-    """Cria uma tabela consolidada com o total de crimes por tipo."""
-    df_agrupado = df.groupby(['fato_comunicado', 'ano']).size().reset_index(name='total_crime')
-    df_pivot = df_agrupado.pivot_table(index='fato_comunicado', columns='ano', values='total_crime', fill_value=0)
-    
-    anos_existentes = [col for col in df_pivot.columns if isinstance(col, (int, float))]
-    if anos_existentes:
-        anos_todos = range(int(min(anos_existentes)), int(max(anos_existentes)) + 1)
-        for ano in anos_todos:
-            if ano not in df_pivot.columns:
-                df_pivot[ano] = 0
-
-    df_pivot = df_pivot.reindex(sorted(df_pivot.columns), axis=1)
-    df_pivot['total'] = df_pivot.sum(axis=1)
-    
-    anos = sorted([col for col in df_pivot.columns if isinstance(col, (int, float))])
-
-    if len(anos) > 1:
-        for i in range(1, len(anos)):
-            ano_atual = anos[i]
-            ano_anterior = anos[i-1]
-            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
-            
-            denominador = df_pivot[ano_anterior].replace(0, pd.NA)
-            df_pivot[coluna_evolucao] = (df_pivot[ano_atual] - df_pivot[ano_anterior]) / denominador * 100
+def calcular_metricas_populacionais(df_crimes, df_pop):
+    """Calcula, por município, a média anual de fatos e as taxas sobre a população feminina."""
+    crimes_por_municipio = contar_ocorrencias(df_crimes['municipio_normalizado']).reset_index()
+    crimes_por_municipio.columns = ['municipio_normalizado', 'total_fatos']
 
-    anos_int = sorted([col for col in df_pivot.columns if isinstance(col, int)])
-    
-    ano_corrente = pd.Timestamp.now().year
-    anos_para_cagr = [ano for ano in anos_int if ano != ano_corrente]
-
-    if len(anos_para_cagr) >= 3:
-        valor_inicial = df_pivot[anos_para_cagr[0]]
-        valor_final = df_pivot[anos_para_cagr[-1]]
-        df_pivot['Tendência (CAGR %)'] = calcular_cagr(valor_inicial, valor_final, len(anos_para_cagr))
+    df_metricas = pd.merge(df_pop.copy(), crimes_por_municipio, on='municipio_normalizado', how='left')
+    df_metricas['total_fatos'] = df_metricas['total_fatos'].fillna(0)
 
-    ordem_colunas = []
-    if anos_int:
-        ordem_colunas.append(anos_int[0])
-        for i in range(1, len(anos_int)):
-            ano_anterior = anos_int[i-1]
-            ano_atual = anos_int[i]
-            ordem_colunas.append(ano_atual)
-            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
-            if coluna_evolucao in df_pivot.columns:
-                ordem_colunas.append(coluna_evolucao)
-    
-    ordem_colunas.append('total')
-    if 'Tendência (CAGR %)' in df_pivot.columns:
-        ordem_colunas.append('Tendência (CAGR %)')
+    anos_no_filtro = df_crimes['ano'].unique()
+    num_anos = len(anos_no_filtro) if len(anos_no_filtro) > 0 else 1
 
-    df_consolidado = df_pivot[ordem_colunas].reset_index()
-    df_consolidado.rename(columns={'fato_comunicado': 'Fato Comunicado'}, inplace=True)
-    
-    return df_consolidado
+    df_metricas['media_anual_fatos'] = df_metricas['total_fatos'] / num_anos
+    df_metricas['taxa_por_mil_mulheres'] = ((df_metricas['media_anual_fatos'] / df_metricas['populacao_feminina']) * 1000).fillna(0)
+    df_metricas['percentual_mulheres_vitimas'] = ((df_metricas['media_anual_fatos'] / df_metricas['populacao_feminina']) * 100).fillna(0)
+    return df_metricas
 
 def criar_tabela_populacional_agrupada(df_crimes, df_pop, df_regioes, agrupamento, num_anos):
     """Cria uma tabela de análise populacional, permitindo o agrupamento por diferentes níveis."""
@@ -797,7 +721,7 @@ def criar_tabela_populacional_agrupada(df_crimes, df_pop, df_regioes, agrupament
         "Associação": "associacao"
     }[agrupamento]
 
-    crimes_agrupado = df_crimes[coluna_agrupamento].value_counts().reset_index()
+    crimes_agrupado = contar_ocorrencias(df_crimes[coluna_agrupamento]).reset_index()
     crimes_agrupado.columns = [coluna_agrupamento, 'total_fatos']
 
     if agrupamento == "Município":
@@ -822,133 +746,18 @@ def criar_tabela_populacional_agrupada(df_crimes, df_pop, df_regioes, agrupament
     return tabela_final[[agrupamento, 'População Feminina', 'Média Anual de Fatos Ocorridos', 'Fatos por Mil Mulheres (anual)', '% de Mulheres Vítimas (anual)']].set_index(agrupamento)
 
 
-def criar_tabela_feminicidio_agrupado(df, coluna_agrupamento, nome_agrupamento):
-    """Cria uma tabela consolidada com dados de feminicídios por [agrupamento]."""
-    df_agrupado = df.groupby([coluna_agrupamento, 'ano']).size().reset_index(name='total_crime')
-    df_pivot = df_agrupado.pivot_table(index=coluna_agrupamento, columns='ano', values='total_crime', fill_value=0)
-    
-    anos_existentes = [col for col in df_pivot.columns if isinstance(col, (int, float))]
-    if anos_existentes:
-        anos_todos = range(int(min(anos_existentes)), int(max(anos_existentes)) + 1)
-        for ano in anos_todos:
-            if ano not in df_pivot.columns:
-                df_pivot[ano] = 0
-
-    df_pivot = df_pivot.reindex(sorted(df_pivot.columns), axis=1)
-    df_pivot['total'] = df_pivot.sum(axis=1)
-    
-    anos = sorted([col for col in df_pivot.columns if isinstance(col, (int, float))])
-
-    if len(anos) > 1:
-        for i in range(1, len(anos)):
-            ano_atual = anos[i]
-            ano_anterior = anos[i-1]
-            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
-            denominador = df_pivot[ano_anterior].replace(0, pd.NA)
-            df_pivot[coluna_evolucao] = (df_pivot[ano_atual] - df_pivot[ano_anterior]) / denominador * 100
-
-    anos_int = sorted([col for col in df_pivot.columns if isinstance(col, int)])
-    
-    ano_corrente = pd.Timestamp.now().year
-    anos_para_cagr = [ano for ano in anos_int if ano != ano_corrente]
-
-    if len(anos_para_cagr) >= 3:
-        valor_inicial = df_pivot[anos_para_cagr[0]]
-        valor_final = df_pivot[anos_para_cagr[-1]]
-        df_pivot['Tendência (CAGR %)'] = calcular_cagr(valor_inicial, valor_final, len(anos_para_cagr))
-
-    ordem_colunas = []
-    if anos_int:
-        ordem_colunas.append(anos_int[0])
-        for i in range(1, len(anos_int)):
-            ano_anterior = anos_int[i-1]
-            ano_atual = anos_int[i]
-            ordem_colunas.append(ano_atual)
-            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
-            if coluna_evolucao in df_pivot.columns:
-                ordem_colunas.append(coluna_evolucao)
-    
-    ordem_colunas.append('total')
-    if 'Tendência (CAGR %)' in df_pivot.columns:
-        ordem_colunas.append('Tendência (CAGR %)')
-
-    df_consolidado = df_pivot[ordem_colunas].reset_index()
-    nome_coluna = f"Nome do {nome_agrupamento}" if nome_agrupamento == "Município" else nome_agrupamento
-    df_consolidado.rename(columns={coluna_agrupamento: nome_coluna}, inplace=True)
-    
-    return df_consolidado
-
-def criar_tabela_total_feminicidio(df):
-    """Cria uma tabela consolidada com o total de feminicídios por ano."""
-    if df.empty:
-        return pd.DataFrame(columns=['Tipo de Crime', 'total'])
-        
-    df_agrupado = df.groupby('ano').size().reset_index(name='total_crime')
-    df_pivot = df_agrupado.pivot_table(columns='ano', values='total_crime', fill_value=0)
-    
-    anos_existentes = [col for col in df.ano.unique() if isinstance(col, (int, float))]
-    if anos_existentes:
-        anos_todos = range(int(min(anos_existentes)), int(max(anos_existentes)) + 1)
-        for ano in anos_todos:
-            if ano not in df_pivot.columns:
-                df_pivot[ano] = 0
-    df_pivot = df_pivot.reindex(sorted(df_pivot.columns), axis=1)
-
-    df_pivot['total'] = df_pivot.sum(axis=1)
-    
-    anos = sorted([col for col in df_pivot.columns if isinstance(col, (int, float))])
-
-    if len(anos) > 1:
-        for i in range(1, len(anos)):
-            ano_atual = anos[i]
-            ano_anterior = anos[i-1]
-            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
-            denominador = df_pivot[ano_anterior].replace(0, pd.NA)
-            df_pivot[coluna_evolucao] = (df_pivot[ano_atual] - df_pivot[ano_anterior]) / denominador * 100
-
-    anos_int = sorted([col for col in df_pivot.columns if isinstance(col, int)])
-    
-    ano_corrente = pd.Timestamp.now().year
-    anos_para_cagr = [ano for ano in anos_int if ano != ano_corrente]
-
-    if len(anos_para_cagr) >= 3:
-        valor_inicial = df_pivot[anos_para_cagr[0]]
-        valor_final = df_pivot[anos_para_cagr[-1]]
-        df_pivot['Tendência (CAGR %)'] = calcular_cagr(valor_inicial, valor_final, len(anos_para_cagr))
-
-    ordem_colunas = []
-    if anos_int:
-        ordem_colunas.append(anos_int[0])
-        for i in range(1, len(anos_int)):
-            ano_anterior = anos_int[i-1]
-            ano_atual = anos_int[i]
-            ordem_colunas.append(ano_atual)
-            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
-            if coluna_evolucao in df_pivot.columns:
-                ordem_colunas.append(coluna_evolucao)
-    
-    ordem_colunas.append('total')
-    if 'Tendência (CAGR %)' in df_pivot.columns:
-        ordem_colunas.append('Tendência (CAGR %)')
-
-    df_consolidado = df_pivot[ordem_colunas].reset_index(drop=True)
-    df_consolidado.insert(0, 'Tipo de Crime', 'Feminicídio')
-    
-    return df_consolidado
-    
 @st.cache_data
 def carregar_dados_regioes():
     """Carrega a base de regiões e associações, normalizando o nome do município."""
+    store = carregar_store_analitico()
+    if store is not None:
+        return store['dim_regioes']
     try:
-        df = pd.read_excel('data/base_regioes_associacoes.xlsx')
-        df.columns = (df.columns.str.strip().str.lower()
-                      .str.replace(' ', '_', regex=False)
-                      .str.replace('ã', 'a', regex=False)
-                      .str.replace('ç', 'c', regex=False)
-                      .str.replace('ô', 'o', regex=False)
-                      .str.replace('í', 'i', regex=False))
-        df['municipio_normalizado'] = df['municipio'].apply(normalizar_nome)
-        return df
+        return carregar_com_cache(
+            'regioes',
+            ['data/base_regioes_associacoes.xlsx', ARQUIVO_ALIASES],
+            lambda: tratar_regioes(ler_excel('regioes'))
+        )
     except FileNotFoundError:
         st.error("Arquivo 'base_regioes_associacoes.xlsx' não encontrado na pasta 'data'.")
         return pd.DataFrame()
@@ -959,16 +768,15 @@ def carregar_dados_regioes():
 @st.cache_data
 def carregar_dados_populacao():
     """Carrega a base de população, normalizando o nome do município."""
+    store = carregar_store_analitico()
+    if store is not None:
+        return store['dim_populacao']
     try:
-        df = pd.read_excel('data/base_populacao.xlsx')
-        df.columns = (df.columns.str.strip().str.lower()
-                      .str.replace(' ', '_', regex=False)
-                      .str.replace('ã', 'a', regex=False)
-                      .str.replace('ç', 'c', regex=False)
-                      .str.replace('ô', 'o', regex=False)
-                      .str.replace('í', 'i', regex=False))
-        df['municipio_normalizado'] = df['municipio'].apply(normalizar_nome)
-        return df
+        return carregar_com_cache(
+            'populacao',
+            ['data/base_populacao.xlsx', ARQUIVO_ALIASES],
+            lambda: tratar_populacao(ler_excel('populacao'))
+        )
     except FileNotFoundError:
         st.error("Arquivo 'base_populacao.xlsx' não encontrado na pasta 'data'.")
         return pd.DataFrame()
@@ -976,7 +784,106 @@ def carregar_dados_populacao():
         st.error(f"Ocorreu um erro ao carregar os dados da população: {e}")
         return pd.DataFrame()
 
+DIMENSOES_FILTRO = ['municipio', 'mesoregiao', 'associacao', 'fato_comunicado', 'municipio_normalizado']
+DIMENSOES_FILTRO_FEMINICIDIO = [d for d in DIMENSOES_FILTRO if d != 'fato_comunicado']
+INTERVALOS_FILTRO = ['dia_ordinal', 'idade_vitima']
+
+@st.cache_resource
+def carregar_indices_filtro():
+    """Monta uma vez por processo os índices de filtro das bases geral e de feminicídio."""
+    df_geral = carregar_dados_gerais()
+    df_feminicidio = carregar_dados_feminicidio()
+    return {
+        'geral': IndiceFiltro(df_geral, DIMENSOES_FILTRO, INTERVALOS_FILTRO),
+        'feminicidio': IndiceFiltro(df_feminicidio, DIMENSOES_FILTRO_FEMINICIDIO, INTERVALOS_FILTRO),
+    }
+
+@st.cache_resource
+def carregar_cubos():
+    """Monta uma vez por processo os cubos de contagem das bases, com seus índices de filtro."""
+    cubo_geral = montar_cubo(carregar_dados_gerais(), DIMENSOES_CUBO, INTERVALOS_CUBO, MEDIAS_CUBO)
+    cubo_feminicidio = montar_cubo(carregar_dados_feminicidio(), DIMENSOES_CUBO + ATRIBUTOS_FEMINICIDIO, INTERVALOS_CUBO, MEDIAS_CUBO)
+    return {
+        'geral': cubo_geral,
+        'feminicidio': cubo_feminicidio,
+        'indice_geral': IndiceCubo(cubo_geral, DIMENSOES_FILTRO, INTERVALOS_CUBO),
+        'indice_feminicidio': IndiceCubo(cubo_feminicidio, DIMENSOES_FILTRO_FEMINICIDIO, INTERVALOS_CUBO),
+    }
+
+def filtrar_cubo(nome, df_filtrado, selecoes, intervalos):
+    """
+    Cubo de contagens da base `nome` sob o filtro da barra lateral. Um período
+    ou intervalo de idade que corta um mês ou uma faixa etária não é respondido
+    pelo cubo pré-agregado: o cubo é montado a partir dos registros filtrados.
+    """
+    cubos = carregar_cubos()
+    indice = cubos[f'indice_{nome}']
+    if indice.responde(intervalos):
+        return indice.filtrar(cubos[nome], selecoes, intervalos)
+    dimensoes = DIMENSOES_CUBO + (ATRIBUTOS_FEMINICIDIO if nome == 'feminicidio' else [])
+    return montar_cubo(df_filtrado, dimensoes, INTERVALOS_CUBO, MEDIAS_CUBO)
+
+@st.cache_resource
+def carregar_contagens_diarias():
+    """Contagens diárias acumuladas das bases por combinação de filtros, montadas uma vez por processo."""
+    return {
+        'geral': ContagensDiariasAcumuladas(carregar_dados_gerais(), DIMENSOES_FILTRO),
+        'feminicidio': ContagensDiariasAcumuladas(carregar_dados_feminicidio(), DIMENSOES_FILTRO_FEMINICIDIO),
+    }
+
+def ocorrencias_diarias(nome, df_filtrado, selecoes, intervalos, primeiro_dia, ultimo_dia):
+    """
+    Ocorrências da base `nome` sob o filtro, por combinação de filtros e dia
+    (`dia_ordinal` e `quantidade`), para as séries diárias e o calendário.
+
+    Saem das diferenças das contagens acumuladas das combinações selecionadas,
+    para qualquer período; só um intervalo de idade que não cobre todas as
+    idades usa os registros filtrados.
+    """
+    contagens = carregar_contagens_diarias()[nome]
+    if not contagens.responde(intervalos):
+        colunas = list(contagens.combinacoes.columns) + ['dia_ordinal']
+        return df_filtrado[colunas].assign(quantidade=np.int32(1))
+    linhas = contagens.linhas(selecoes)
+    diarias = contagens.diarias(linhas, primeiro_dia, ultimo_dia)
+    posicoes_linhas, posicoes_dias = np.nonzero(diarias)
+    ocorrencias = contagens.combinacoes.iloc[linhas[posicoes_linhas]].reset_index(drop=True)
+    ocorrencias['dia_ordinal'] = primeiro_dia + posicoes_dias
+    ocorrencias['quantidade'] = diarias[posicoes_linhas, posicoes_dias]
+    return ocorrencias
+
+@st.cache_resource
+def carregar_calendario_dias():
+    """
+    Array de tipos de dia do calendário indexado pelo dia ordinal, lido uma vez por processo.
+
+    Usa o artefato binário de `gerar_calendario.py`; sem ele, monta o array a
+    partir da base de calendário.
+    """
+    if os.path.exists(ARQUIVO_CALENDARIO_DIAS):
+        try:
+            return CalendarioDias.carregar(ARQUIVO_CALENDARIO_DIAS)
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("Calendário binário '%s' ignorado: %s", ARQUIVO_CALENDARIO_DIAS, e)
+    return CalendarioDias.de_tabela(carregar_dados_calendario())
+
+LIMITE_CACHE_RESULTADOS = 256 * 2 ** 20
+
+@st.cache_resource
+def carregar_cache_resultados():
+    """Cache de resultados filtrados compartilhado por todas as sessões do processo."""
+    return CacheResultados(LIMITE_CACHE_RESULTADOS)
+
+@st.cache_resource
+def carregar_executor_processos():
+    """
+    Pool de processos compartilhado pelas análises com permutações (uma instância por servidor).
+    Criado na primeira carga que passa de LIMIAR_PARALELO (ver `calcular_lisa`).
+    """
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context('spawn'))
+
 geojson_sc = carregar_geojson_sc()
+geojson_mapas = carregar_geojson_sc(NIVEL_DETALHE_MAPAS)
 df_geral = carregar_dados_gerais()
 df_feminicidio = carregar_dados_feminicidio()
 df_populacao = carregar_dados_populacao()
@@ -986,13 +893,14 @@ df_calendario = carregar_dados_calendario()
 
 st.sidebar.image("logo_ovm.jpeg", use_container_width=True)
 
+# Abas e seções avançadas com estado: só o conteúdo visível é executado a cada rerun.
 tab_geral, tab_feminicidio, tab_analises_avancadas, tab_glossario, tab_download = st.tabs([
     "📊 Análise Geral", 
     "🚨 Análise de Feminicídios",
     "🔬 Análises Avançadas",
     "📖 Metodologia e Glossário", 
     "📥 Download de Dados"
-])
+], key="secao_ativa", on_change="rerun")
 
 if not df_geral.empty and not df_feminicidio.empty and geojson_sc is not None and not df_populacao.empty and not df_calendario.empty:
     with st.sidebar:
@@ -1028,10 +936,13 @@ if not df_geral.empty and not df_feminicidio.empty and geojson_sc is not None an
             help="Selecione a data de fim do período."
         )
         
-        df_geral_filtrado_por_data = df_geral[
-            (df_geral['data_fato'].dt.date >= data_inicial) &
-            (df_geral['data_fato'].dt.date <= data_final)
-        ]
+        indices_filtro = carregar_indices_filtro()
+        cache_resultados = carregar_cache_resultados()
+        periodo_selecionado = (dia_ordinal(data_inicial), dia_ordinal(data_final))
+        df_geral_filtrado_por_data = cache_resultados.obter(
+            chave_filtros(consulta='periodo', periodo=periodo_selecionado),
+            lambda: indices_filtro['geral'].filtrar(df_geral, intervalos={'dia_ordinal': periodo_selecionado})
+        )
 
         # --- LOCALIZAÇÃO ---
         st.subheader("📍 LOCALIZAÇÃO")
@@ -1102,23 +1013,10 @@ if not df_geral.empty and not df_feminicidio.empty and geojson_sc is not None an
         st.caption(f"Idades: {idade_selecionada[0]} a {idade_max_texto}")
         
         # --- CÁLCULOS PARA FILTROS POPULACIONAIS ---
-        crimes_por_municipio_para_filtro = df_geral_filtrado_por_data['municipio_normalizado'].value_counts().reset_index()
-        crimes_por_municipio_para_filtro.columns = ['municipio_normalizado', 'total_fatos']
-
-        df_populacional_metrics = pd.merge(
-            df_populacao.copy(),
-            crimes_por_municipio_para_filtro,
-            on='municipio_normalizado',
-            how='left'
+        df_populacional_metrics = cache_resultados.obter(
+            chave_filtros(consulta='metricas_populacionais', periodo=periodo_selecionado),
+            lambda: calcular_metricas_populacionais(df_geral_filtrado_por_data, df_populacao)
         )
-        df_populacional_metrics['total_fatos'].fillna(0, inplace=True)
-
-        anos_no_filtro = df_geral_filtrado_por_data['ano'].unique()
-        num_anos = len(anos_no_filtro) if len(anos_no_filtro) > 0 else 1
-
-        df_populacional_metrics['media_anual_fatos'] = df_populacional_metrics['total_fatos'] / num_anos
-        df_populacional_metrics['taxa_por_mil_mulheres'] = ((df_populacional_metrics['media_anual_fatos'] / df_populacional_metrics['populacao_feminina']) * 1000).fillna(0)
-        df_populacional_metrics['percentual_mulheres_vitimas'] = ((df_populacional_metrics['media_anual_fatos'] / df_populacional_metrics['populacao_feminina']) * 100).fillna(0)
 
         # --- FILTROS POPULACIONAIS ---
         st.subheader("📊 FILTROS POPULACIONAIS")
@@ -1169,708 +1067,851 @@ if not df_geral.empty and not df_feminicidio.empty and geojson_sc is not None an
         (df_populacional_metrics['percentual_mulheres_vitimas'] <= perc_selecionado[1])
     ]['municipio_normalizado']
 
-    df_geral_filtrado = df_geral[
-        (df_geral['data_fato'].dt.date >= data_inicial) &
-        (df_geral['data_fato'].dt.date <= data_final) &
-        (df_geral['fato_comunicado'].isin(fato_selecionado)) &
-        (df_geral['municipio'].isin(municipio_selecionado)) &
-        (df_geral['mesoregiao'].isin(mesoregiao_selecionado)) &
-        (df_geral['associacao'].isin(associacao_selecionado)) &
-        (df_geral['idade_vitima'] >= idade_selecionada[0]) & (df_geral['idade_vitima'] <= idade_max_filtro) &
-        (df_geral['municipio_normalizado'].isin(municipios_filtrados_populacao))
-    ]
-    
-    df_feminicidio_filtrado = df_feminicidio[
-        (df_feminicidio['data_fato'].dt.date >= data_inicial) &
-        (df_feminicidio['data_fato'].dt.date <= data_final) &
-        (df_feminicidio['municipio'].isin(municipio_selecionado)) &
-        (df_feminicidio['mesoregiao'].isin(mesoregiao_selecionado)) &
-        (df_feminicidio['associacao'].isin(associacao_selecionado)) &
-        (df_feminicidio['idade_vitima'] >= idade_selecionada[0]) & (df_feminicidio['idade_vitima'] <= idade_max_filtro) &
-        (df_feminicidio['municipio_normalizado'].isin(municipios_filtrados_populacao))
-    ]
-
-    with tab_geral:
-        st.header("Violência Contra a Mulher em Santa Catarina")
-        st.markdown("Visão geral dos registros de ocorrências.")
-
-        total_registros = df_geral_filtrado.shape[0]
-        media_idade_vitima = 0.0
-        if not df_geral_filtrado.empty and df_geral_filtrado['idade_vitima'].notna().any():
-            media_idade_vitima = df_geral_filtrado['idade_vitima'].mean()
-
-        num_dias = (data_final - data_inicial).days + 1
+    selecoes_filtro = {
+        'municipio': municipio_selecionado,
+        'mesoregiao': mesoregiao_selecionado,
+        'associacao': associacao_selecionado,
+        'municipio_normalizado': municipios_filtrados_populacao,
+    }
+    intervalos_filtro = {
+        'dia_ordinal': periodo_selecionado,
+        'idade_vitima': (idade_selecionada[0], idade_max_filtro),
+    }
+
+    # Estado canônico dos filtros: chave dos resultados no cache compartilhado entre sessões.
+    estado_filtros = dict(fatos=fato_selecionado, **selecoes_filtro, **intervalos_filtro)
+
+    selecoes_geral = {**selecoes_filtro, 'fato_comunicado': fato_selecionado}
+
+    def filtrar_bases():
+        # Os gráficos de contagem consultam os cubos agregados, filtrados com o mesmo estado da barra lateral.
+        df_geral_filtrado = indices_filtro['geral'].filtrar(df_geral, selecoes_geral, intervalos_filtro)
+        df_feminicidio_filtrado = indices_filtro['feminicidio'].filtrar(df_feminicidio, selecoes_filtro, intervalos_filtro)
+        return {
+            'geral': df_geral_filtrado,
+            'feminicidio': df_feminicidio_filtrado,
+            'cubo_geral': filtrar_cubo('geral', df_geral_filtrado, selecoes_geral, intervalos_filtro),
+            'cubo_feminicidio': filtrar_cubo('feminicidio', df_feminicidio_filtrado, selecoes_filtro, intervalos_filtro),
+        }
+
+    bases_filtradas = cache_resultados.obter(chave_filtros(consulta='bases', **estado_filtros), filtrar_bases)
+    df_geral_filtrado = bases_filtradas['geral']
+    df_feminicidio_filtrado = bases_filtradas['feminicidio']
+    cubo_geral_filtrado = bases_filtradas['cubo_geral']
+    cubo_feminicidio_filtrado = bases_filtradas['cubo_feminicidio']
+    logger.debug("Cache de resultados: %s", cache_resultados.estatisticas())
+
+    if tab_geral.open:
+        with tab_geral:
+            st.header("Violência Contra a Mulher em Santa Catarina")
+            st.markdown("Visão geral dos registros de ocorrências.")
+
+            # Total e totais anuais por diferenças das contagens acumuladas das combinações selecionadas; só um
+            # intervalo de idade parcial precisa do cubo filtrado.
+            contagens_diarias = carregar_contagens_diarias()['geral']
+            if contagens_diarias.responde(intervalos_filtro):
+                linhas_selecionadas = contagens_diarias.linhas(selecoes_geral)
+                total_registros = contagens_diarias.total(linhas_selecionadas, *periodo_selecionado)
+                dados_por_ano = contagens_diarias.totais_por_ano(linhas_selecionadas, *periodo_selecionado)
+            else:
+                total_registros = int(cubo_geral_filtrado['quantidade'].sum())
+                dados_por_ano = somar_cubo(cubo_geral_filtrado, 'ano')
+
+            media_idade_vitima = 0.0
+            if total_registros > 0 and cubo_geral_filtrado['quantidade_idade_vitima'].sum() > 0:
+                media_idade_vitima = media_ponderada_cubo(cubo_geral_filtrado, 'idade_vitima')
+
+            num_dias = (data_final - data_inicial).days + 1
         
-        crimes_por_dia = total_registros / num_dias if num_dias > 0 else 0
-        crimes_por_hora = total_registros / (num_dias * 24) if num_dias > 0 else 0
+            crimes_por_dia = total_registros / num_dias if num_dias > 0 else 0
+            crimes_por_hora = total_registros / (num_dias * 24) if num_dias > 0 else 0
         
-        df_cagr_kpi = df_geral_filtrado[df_geral_filtrado['ano'] != pd.Timestamp.now().year]
-        anos_unicos = sorted(df_cagr_kpi['ano'].unique())
-        num_anos_total = len(anos_unicos)
-
-        if num_anos_total >= 3:
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric(label="Total de Registros no Período", value=f"{total_registros:,}".replace(",", "."))
-                st.metric(label="Média de Crimes por Dia", value=f"{crimes_por_dia:.1f}")
-
-            with col2:
-                dados_por_ano = df_cagr_kpi.groupby('ano').size()
-                valor_inicial = dados_por_ano.iloc[0]
-                valor_final = dados_por_ano.iloc[-1]
+            dados_por_ano = dados_por_ano[dados_por_ano.index != pd.Timestamp.now().year]
+            num_anos_total = len(dados_por_ano)
+
+            if num_anos_total >= 3:
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric(label="Total de Registros no Período", value=f"{total_registros:,}".replace(",", "."))
+                    st.metric(label="Média de Crimes por Dia", value=f"{crimes_por_dia:.1f}")
+
+                with col2:
+                    valor_inicial = dados_por_ano.iloc[0]
+                    valor_final = dados_por_ano.iloc[-1]
                 
-                cagr = calcular_cagr(valor_inicial, valor_final, num_anos_total)
+                    cagr = calcular_cagr(valor_inicial, valor_final, num_anos_total)
                 
-                if pd.notna(cagr):
-                    delta_cagr = f"{cagr:.1f}% ao ano"
-                    icone_cagr = "📈" if cagr > 0 else "📉"
-                    st.metric(label=f"Tendência de Longo Prazo (CAGR) {icone_cagr}", value=delta_cagr,
-                              help="Taxa de Crescimento Anual Composta no período selecionado.")
-                else:
-                    st.metric(label="Tendência de Longo Prazo (CAGR)", value="N/A", help="Dados insuficientes para cálculo.")
+                    if pd.notna(cagr):
+                        delta_cagr = f"{cagr:.1f}% ao ano"
+                        icone_cagr = "📈" if cagr > 0 else "📉"
+                        st.metric(label=f"Tendência de Longo Prazo (CAGR) {icone_cagr}", value=delta_cagr,
+                                  help="Taxa de Crescimento Anual Composta no período selecionado.")
+                    else:
+                        st.metric(label="Tendência de Longo Prazo (CAGR)", value="N/A", help="Dados insuficientes para cálculo.")
                 
-                st.metric(label="Média de Crimes por Hora", value=f"{crimes_por_hora:.2f}")
+                    st.metric(label="Média de Crimes por Hora", value=f"{crimes_por_hora:.2f}")
 
-            with col3:
-                st.metric(label="Idade Média da Vítima", value=f"{media_idade_vitima:.1f} anos")
-        else:
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric(label="Total de Registros", value=f"{total_registros:,}".replace(",", "."))
-                st.metric(label="Média de Crimes por Dia", value=f"{crimes_por_dia:.1f}")
-            with col2:
-                st.metric(label="Idade Média da Vítima", value=f"{media_idade_vitima:.1f} anos")
-                st.metric(label="Média de Crimes por Hora", value=f"{crimes_por_hora:.2f}")
+                with col3:
+                    st.metric(label="Idade Média da Vítima", value=f"{media_idade_vitima:.1f} anos")
+            else:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric(label="Total de Registros", value=f"{total_registros:,}".replace(",", "."))
+                    st.metric(label="Média de Crimes por Dia", value=f"{crimes_por_dia:.1f}")
+                with col2:
+                    st.metric(label="Idade Média da Vítima", value=f"{media_idade_vitima:.1f} anos")
+                    st.metric(label="Média de Crimes por Hora", value=f"{crimes_por_hora:.2f}")
 
-        st.markdown("---")
+            st.markdown("---")
         
-        st.subheader(f"Distribuição de Crimes por {agrupamento_selecionado}")
+            st.subheader(f"Distribuição de Crimes por {agrupamento_selecionado}")
         
-        view_type = st.radio(
-            "Selecione a visualização do mapa:",
-            ("Soma dos Crimes", "Crimes por Mil Mulheres", "% de Mulheres Vítimas"),
-            horizontal=True,
-            key="map_view_type"
-        )
+            @st.fragment
+            def exibir_mapa_geral(agrupamento_selecionado, cubo_geral_filtrado, df_populacao, df_geral_filtrado, geojson_mapas):
+                """Mapa coroplético da aba geral; trocar a visualização reexecuta só o mapa."""
+                view_type = st.radio(
+                    "Selecione a visualização do mapa:",
+                    ("Soma dos Crimes", "Crimes por Mil Mulheres", "% de Mulheres Vítimas"),
+                    horizontal=True,
+                    key="map_view_type"
+                )
 
-        map_df = pd.DataFrame()
-        color_col = 'value'
-        label_text = 'Valor'
+                map_df = pd.DataFrame()
+                color_col = 'value'
+                label_text = 'Valor'
 
-        if view_type == "Soma dos Crimes":
-            color_col = 'quantidade'
-            label_text = f'Total de Registros ({agrupamento_selecionado})'
-        elif view_type == "Crimes por Mil Mulheres":
-            color_col = 'taxa_por_mil_mulheres'
-            label_text = f'Crimes por Mil Mulheres ({agrupamento_selecionado})'
-        else:
-            color_col = 'percentual_mulheres_vitimas'
-            label_text = f'% de Mulheres Vítimas ({agrupamento_selecionado})'
+                if view_type == "Soma dos Crimes":
+                    color_col = 'quantidade'
+                    label_text = f'Total de Registros ({agrupamento_selecionado})'
+                elif view_type == "Crimes por Mil Mulheres":
+                    color_col = 'taxa_por_mil_mulheres'
+                    label_text = f'Crimes por Mil Mulheres ({agrupamento_selecionado})'
+                else:
+                    color_col = 'percentual_mulheres_vitimas'
+                    label_text = f'% de Mulheres Vítimas ({agrupamento_selecionado})'
 
-        base_map_df = df_geral_filtrado['municipio_normalizado'].value_counts().reset_index()
-        base_map_df.columns = ['municipio_normalizado', 'total_fatos']
+                base_map_df = contar_valores_cubo(cubo_geral_filtrado, 'municipio_normalizado').reset_index()
+                base_map_df.columns = ['municipio_normalizado', 'total_fatos']
 
-        if view_type != "Soma dos Crimes":
-            base_map_df = pd.merge(base_map_df, df_populacao, on='municipio_normalizado', how='left')
-            base_map_df.dropna(subset=['populacao_feminina'], inplace=True)
+                if view_type != "Soma dos Crimes":
+                    base_map_df = pd.merge(base_map_df, df_populacao, on='municipio_normalizado', how='left')
+                    base_map_df.dropna(subset=['populacao_feminina'], inplace=True)
 
-            anos_no_filtro = df_geral_filtrado['ano'].unique()
-            num_anos = len(anos_no_filtro) if len(anos_no_filtro) > 0 else 1
-            base_map_df['media_anual_fatos'] = base_map_df['total_fatos'] / num_anos
+                    anos_no_filtro = df_geral_filtrado['ano'].unique()
+                    num_anos = len(anos_no_filtro) if len(anos_no_filtro) > 0 else 1
+                    base_map_df['media_anual_fatos'] = base_map_df['total_fatos'] / num_anos
 
-            if view_type == "Crimes por Mil Mulheres":
-                base_map_df[color_col] = ((base_map_df['media_anual_fatos'] / base_map_df['populacao_feminina']) * 1000).fillna(0)
-            else:
-                base_map_df[color_col] = ((base_map_df['media_anual_fatos'] / base_map_df['populacao_feminina']) * 100).fillna(0)
-        else:
-            base_map_df.rename(columns={'total_fatos': color_col}, inplace=True)
+                    if view_type == "Crimes por Mil Mulheres":
+                        base_map_df[color_col] = ((base_map_df['media_anual_fatos'] / base_map_df['populacao_feminina']) * 1000).fillna(0)
+                    else:
+                        base_map_df[color_col] = ((base_map_df['media_anual_fatos'] / base_map_df['populacao_feminina']) * 100).fillna(0)
+                else:
+                    base_map_df.rename(columns={'total_fatos': color_col}, inplace=True)
 
-        if agrupamento_selecionado == "Município" or agrupamento_selecionado == "Consolidado":
-            map_df = base_map_df[['municipio_normalizado', color_col]]
-        else: 
-            agrupamento_col = "mesoregiao" if agrupamento_selecionado == "Mesorregião" else "associacao"
+                if agrupamento_selecionado == "Município" or agrupamento_selecionado == "Consolidado":
+                    map_df = base_map_df[['municipio_normalizado', color_col]]
+                    if not map_df.empty:
+                        map_df = map_df[map_df['municipio_normalizado'].isin(df_geral_filtrado['municipio_normalizado'].unique())]
+                    geojson_mapa, locations_mapa, featureidkey_mapa = geojson_mapas, 'municipio_normalizado', "properties.NM_MUN_NORMALIZADO"
+                else: 
+                    agrupamento_col = "mesoregiao" if agrupamento_selecionado == "Mesorregião" else "associacao"
             
-            municipio_grupo_mapping = df_geral_filtrado[['municipio_normalizado', agrupamento_col]].drop_duplicates()
-            df_with_groups = pd.merge(base_map_df, municipio_grupo_mapping, on='municipio_normalizado', how='left')
+                    municipio_grupo_mapping = cubo_geral_filtrado[['municipio_normalizado', agrupamento_col]].drop_duplicates()
+                    df_with_groups = pd.merge(base_map_df, municipio_grupo_mapping, on='municipio_normalizado', how='left')
             
-            if view_type == "Soma dos Crimes":
-                crimes_por_grupo = df_with_groups.groupby(agrupamento_col)[color_col].sum().reset_index()
-                map_df = pd.merge(municipio_grupo_mapping, crimes_por_grupo, on=agrupamento_col, how='left').fillna(0)
-            else: 
-                grouped_pop = df_with_groups.groupby(agrupamento_col).agg(
-                    total_fatos_grupo=('total_fatos', 'sum'),
-                    populacao_feminina_grupo=('populacao_feminina', 'sum')
-                ).reset_index()
+                    if view_type == "Soma dos Crimes":
+                        map_df = df_with_groups.groupby(agrupamento_col, observed=True)[color_col].sum().reset_index()
+                    else: 
+                        grouped_pop = df_with_groups.groupby(agrupamento_col, observed=True).agg(
+                            total_fatos_grupo=('total_fatos', 'sum'),
+                            populacao_feminina_grupo=('populacao_feminina', 'sum')
+                        ).reset_index()
                 
-                anos_no_filtro = df_geral_filtrado['ano'].unique()
-                num_anos = len(anos_no_filtro) if len(anos_no_filtro) > 0 else 1
-                grouped_pop['media_anual_grupo'] = grouped_pop['total_fatos_grupo'] / num_anos
-
-                if view_type == "Crimes por Mil Mulheres":
-                    grouped_pop[color_col] = ((grouped_pop['media_anual_grupo'] / grouped_pop['populacao_feminina_grupo']) * 1000).fillna(0)
-                else:
-                    grouped_pop[color_col] = ((grouped_pop['media_anual_grupo'] / grouped_pop['populacao_feminina_grupo']) * 100).fillna(0)
+                        anos_no_filtro = df_geral_filtrado['ano'].unique()
+                        num_anos = len(anos_no_filtro) if len(anos_no_filtro) > 0 else 1
+                        grouped_pop['media_anual_grupo'] = grouped_pop['total_fatos_grupo'] / num_anos
+
+                        if view_type == "Crimes por Mil Mulheres":
+                            grouped_pop[color_col] = ((grouped_pop['media_anual_grupo'] / grouped_pop['populacao_feminina_grupo']) * 1000).fillna(0)
+                        else:
+                            grouped_pop[color_col] = ((grouped_pop['media_anual_grupo'] / grouped_pop['populacao_feminina_grupo']) * 100).fillna(0)
                     
-                map_df = pd.merge(municipio_grupo_mapping, grouped_pop[[agrupamento_col, color_col]], on=agrupamento_col, how='left').fillna(0)
-
-        if not map_df.empty:
-            map_df = map_df[map_df['municipio_normalizado'].isin(df_geral_filtrado['municipio_normalizado'].unique())]
-
-        fig_mapa = px.choropleth_mapbox(
-            map_df, 
-            geojson=geojson_sc, 
-            locations='municipio_normalizado',
-            featureidkey="properties.NM_MUN_NORMALIZADO", 
-            color=color_col,
-            color_continuous_scale="Purples", 
-            mapbox_style="carto-positron",
-            zoom=6, 
-            center={"lat": -27.59, "lon": -50.52}, 
-            opacity=0.7,
-            labels={color_col: label_text}
-        )
-        fig_mapa.update_layout(
-            margin={"r":0,"t":0,"l":0,"b":0},
-            coloraxis_showscale=True 
-        )
-        st.plotly_chart(fig_mapa, use_container_width=True, key="mapa_geral")
+                        map_df = grouped_pop[[agrupamento_col, color_col]]
+
+                    # Os grupos são desenhados com os polígonos já dissolvidos, um por grupo.
+                    geojson_mapa, locations_mapa, featureidkey_mapa = carregar_geojson_agrupado(agrupamento_col), agrupamento_col, "properties.grupo"
+
+                fig_mapa = px.choropleth_mapbox(
+                    map_df, 
+                    geojson=geojson_mapa, 
+                    locations=locations_mapa,
+                    featureidkey=featureidkey_mapa, 
+                    color=color_col,
+                    color_continuous_scale="Purples", 
+                    mapbox_style="carto-positron",
+                    zoom=6, 
+                    center={"lat": -27.59, "lon": -50.52}, 
+                    opacity=0.7,
+                    labels={color_col: label_text}
+                )
+                fig_mapa.update_layout(
+                    margin={"r":0,"t":0,"l":0,"b":0},
+                    coloraxis_showscale=True 
+                )
+                st.plotly_chart(fig_mapa, use_container_width=True, key="mapa_geral")
 
-        st.markdown("---")
+            exibir_mapa_geral(agrupamento_selecionado, cubo_geral_filtrado, df_populacao, df_geral_filtrado, geojson_mapas)
 
-        st.subheader("Evolução dos Registros de Ocorrências (Série Temporal)")
-        chart_type_temporal = st.selectbox(
-            "Tipo de Gráfico",
-            ("Linha", "Área", "Barras"),
-            key="chart_type_temporal"
-        )
-        df_temporal = df_geral_filtrado.copy()
-        df_temporal['ano_mes'] = df_temporal['data_fato'].dt.to_period('M').astype(str)
-        
-        color_param_temporal = None
-        if agrupamento_selecionado == "Consolidado":
-            registros_por_mes_ano = df_temporal.groupby('ano_mes').size().reset_index(name='quantidade').sort_values('ano_mes')
-        else:
-            mapa_agrupamento_tabela = {
-                "Município": "municipio",
-                "Mesorregião": "mesoregiao",
-                "Associação": "associacao"
-            }
-            coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
-            registros_por_mes_ano = df_temporal.groupby(['ano_mes', coluna_agrupamento]).size().reset_index(name='quantidade').sort_values('ano_mes')
-            color_param_temporal = coluna_agrupamento
-
-        if chart_type_temporal == "Barras":
-            fig_temporal = px.bar(
-                registros_por_mes_ano, x='ano_mes', y='quantidade', color=color_param_temporal,
-                labels={'ano_mes': 'Mês/Ano', 'quantidade': 'Quantidade de Registros'},
-                template='plotly_white'
-            )
-            if agrupamento_selecionado == "Consolidado":
-                fig_temporal.update_traces(marker_color='#8A2BE2')
-        elif chart_type_temporal == "Área":
-            fig_temporal = px.area(
-                registros_por_mes_ano, x='ano_mes', y='quantidade', color=color_param_temporal,
-                labels={'ano_mes': 'Mês/Ano', 'quantidade': 'Quantidade de Registros'},
-                template='plotly_white'
-            )
-            if agrupamento_selecionado == "Consolidado":
-                fig_temporal.update_traces(line_color='#8A2BE2')
-        else: # Linha
-            fig_temporal = px.line(
-                registros_por_mes_ano, x='ano_mes', y='quantidade', color=color_param_temporal,
-                labels={'ano_mes': 'Mês/Ano', 'quantidade': 'Quantidade de Registros'},
-                template='plotly_white', markers=True
-            )
-            if agrupamento_selecionado == "Consolidado":
-                fig_temporal.update_traces(line_color='#8A2BE2')
-        st.plotly_chart(fig_temporal, use_container_width=True, key="temporal_geral")
-        st.markdown("---")
+            st.markdown("---")
 
-        col_graf1, col_graf2 = st.columns(2)
-        with col_graf1:
-            st.subheader("Registros de Ocorrências por Ano")
-            chart_type_ano = st.selectbox(
-                "Tipo de Gráfico",
-                ("Barras", "Pizza", "Linha", "Área"),
-                key="chart_type_ano"
-            )
-            if agrupamento_selecionado == "Consolidado":
-                registros_por_ano = df_geral_filtrado['ano'].value_counts().sort_index().reset_index()
-                registros_por_ano.columns = ['ano', 'Quantidade']
-                color_param = None
-            else:
+            st.subheader("Evolução dos Registros de Ocorrências (Série Temporal)")
+            color_param_temporal = None
+            if agrupamento_selecionado != "Consolidado":
                 mapa_agrupamento_tabela = {
                     "Município": "municipio",
                     "Mesorregião": "mesoregiao",
                     "Associação": "associacao"
                 }
-                coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
-                registros_por_ano = df_geral_filtrado.groupby(['ano', coluna_agrupamento]).size().reset_index(name='Quantidade')
-                color_param = coluna_agrupamento
-
-            if chart_type_ano == "Barras":
-                fig_ano = px.bar(
-                    registros_por_ano, x='ano', y='Quantidade', color=color_param,
-                    labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
-                )
-                if agrupamento_selecionado == "Consolidado":
-                    fig_ano.update_traces(marker_color='#8A2BE2')
-                fig_ano.update_traces(textposition='outside')
-            elif chart_type_ano == "Linha":
-                fig_ano = px.line(
-                    registros_por_ano, x='ano', y='Quantidade', color=color_param,
-                    labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white', markers=True
-                )
-                if agrupamento_selecionado == "Consolidado":
-                    fig_ano.update_traces(line_color='#8A2BE2')
-            elif chart_type_ano == "Área":
-                fig_ano = px.area(
-                    registros_por_ano, x='ano', y='Quantidade', color=color_param,
-                    labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white'
-                )
-                if agrupamento_selecionado == "Consolidado":
-                    fig_ano.update_traces(line_color='#8A2BE2')
-            else: # Pizza
-                pie_names = 'ano' if agrupamento_selecionado == "Consolidado" else color_param
-                fig_ano = px.pie(
-                    registros_por_ano, names=pie_names, values='Quantidade',
-                    hole=.4, color_discrete_sequence=px.colors.sequential.Purples_r
+                color_param_temporal = mapa_agrupamento_tabela[agrupamento_selecionado]
+            # Uma série diária densa por grupo, guardada no cache; as granularidades saem dela no fragmento.
+            serie_temporal, grupos_temporais = cache_resultados.obter(
+                chave_filtros(consulta='serie_diaria', agrupamento=agrupamento_selecionado, **estado_filtros),
+                lambda: serie_diaria_cubo(
+                    ocorrencias_diarias('geral', df_geral_filtrado, selecoes_geral, intervalos_filtro, *periodo_selecionado),
+                    *periodo_selecionado, coluna=color_param_temporal
                 )
-                fig_ano.update_traces(textinfo='percent+label', textposition='outside')
-            st.plotly_chart(fig_ano, use_container_width=True, key="ano_geral")
-
-        with col_graf2:
-            st.subheader("Tipos de Crimes Mais Frequentes")
-            chart_type_fato = st.selectbox(
-                "Tipo de Gráfico",
-                ("Barras", "Pizza"),
-                key="chart_type_fato"
             )
-            if agrupamento_selecionado == "Consolidado":
-                registros_por_fato = df_geral_filtrado['fato_comunicado'].value_counts().reset_index()
-                registros_por_fato.columns = ['fato_comunicado', 'Quantidade']
-                color_param = None
-            else:
-                mapa_agrupamento_tabela = {
-                    "Município": "municipio",
-                    "Mesorregião": "mesoregiao",
-                    "Associação": "associacao"
-                }
-                coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
-                registros_por_fato = df_geral_filtrado.groupby(['fato_comunicado', coluna_agrupamento]).size().reset_index(name='Quantidade')
-                color_param = coluna_agrupamento
 
-            if chart_type_fato == "Barras":
-                fig_fato = px.bar(
-                    registros_por_fato, x='Quantidade', y='fato_comunicado', color=color_param, orientation='h',
-                    labels={'fato_comunicado': 'Tipo de Crime', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
-                )
+            def figura_temporal(chart_type_temporal, registros_temporais, color_param_temporal, agrupamento_selecionado):
+                if chart_type_temporal == "Barras":
+                    fig_temporal = px.bar(
+                        registros_temporais, x='periodo', y='quantidade', color=color_param_temporal,
+                        labels={'periodo': 'Período', 'quantidade': 'Quantidade de Registros'},
+                        template='plotly_white'
+                    )
+                    if agrupamento_selecionado == "Consolidado":
+                        fig_temporal.update_traces(marker_color='#8A2BE2')
+                elif chart_type_temporal == "Área":
+                    fig_temporal = px.area(
+                        registros_temporais, x='periodo', y='quantidade', color=color_param_temporal,
+                        labels={'periodo': 'Período', 'quantidade': 'Quantidade de Registros'},
+                        template='plotly_white'
+                    )
+                    if agrupamento_selecionado == "Consolidado":
+                        fig_temporal.update_traces(line_color='#8A2BE2')
+                else: # Linha
+                    fig_temporal = px.line(
+                        registros_temporais, x='periodo', y='quantidade', color=color_param_temporal,
+                        labels={'periodo': 'Período', 'quantidade': 'Quantidade de Registros'},
+                        template='plotly_white', markers=True
+                    )
+                    if agrupamento_selecionado == "Consolidado":
+                        fig_temporal.update_traces(line_color='#8A2BE2')
+                return fig_temporal
+
+            exibir_serie_temporal(
+                ("Linha", "Área", "Barras"), "chart_type_temporal", "granularidade_temporal", "temporal_geral", figura_temporal,
+                serie_temporal, periodo_selecionado[0], grupos_temporais, color_param_temporal, color_param_temporal, agrupamento_selecionado
+            )
+            st.markdown("---")
+
+            col_graf1, col_graf2 = st.columns(2)
+            with col_graf1:
+                st.subheader("Registros de Ocorrências por Ano")
                 if agrupamento_selecionado == "Consolidado":
-                    fig_fato.update_traces(marker_color='#9370DB')
-                fig_fato.update_traces(textposition='auto')
-                fig_fato.update_layout(yaxis={'categoryorder':'total ascending'})
-            else:
-                pie_names = 'fato_comunicado' if agrupamento_selecionado == "Consolidado" else color_param
-                fig_fato = px.pie(
-                    registros_por_fato, names=pie_names, values='Quantidade',
-                    hole=.4, color_discrete_sequence=px.colors.sequential.Purples_r
-                )
-                fig_fato.update_traces(textinfo='percent+label', textposition='outside')
-            st.plotly_chart(fig_fato, use_container_width=True, key="fato_geral")
+                    registros_por_ano = somar_cubo(cubo_geral_filtrado, 'ano').reset_index()
+                    registros_por_ano.columns = ['ano', 'Quantidade']
+                    color_param = None
+                else:
+                    mapa_agrupamento_tabela = {
+                        "Município": "municipio",
+                        "Mesorregião": "mesoregiao",
+                        "Associação": "associacao"
+                    }
+                    coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
+                    registros_por_ano = somar_cubo(cubo_geral_filtrado, ['ano', coluna_agrupamento]).reset_index(name='Quantidade')
+                    color_param = coluna_agrupamento
+
+                def figura_ano(chart_type_ano, registros_por_ano, color_param, agrupamento_selecionado):
+                    if chart_type_ano == "Barras":
+                        fig_ano = px.bar(
+                            registros_por_ano, x='ano', y='Quantidade', color=color_param,
+                            labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                        )
+                        if agrupamento_selecionado == "Consolidado":
+                            fig_ano.update_traces(marker_color='#8A2BE2')
+                        fig_ano.update_traces(textposition='outside')
+                    elif chart_type_ano == "Linha":
+                        fig_ano = px.line(
+                            registros_por_ano, x='ano', y='Quantidade', color=color_param,
+                            labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white', markers=True
+                        )
+                        if agrupamento_selecionado == "Consolidado":
+                            fig_ano.update_traces(line_color='#8A2BE2')
+                    elif chart_type_ano == "Área":
+                        fig_ano = px.area(
+                            registros_por_ano, x='ano', y='Quantidade', color=color_param,
+                            labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white'
+                        )
+                        if agrupamento_selecionado == "Consolidado":
+                            fig_ano.update_traces(line_color='#8A2BE2')
+                    else: # Pizza
+                        pie_names = 'ano' if agrupamento_selecionado == "Consolidado" else color_param
+                        fig_ano = px.pie(
+                            registros_por_ano, names=pie_names, values='Quantidade',
+                            hole=.4, color_discrete_sequence=px.colors.sequential.Purples_r
+                        )
+                        fig_ano.update_traces(textinfo='percent+label', textposition='outside')
+                    return fig_ano
 
-        st.markdown("---")
+                exibir_grafico_selecionavel(("Barras", "Pizza", "Linha", "Área"), "chart_type_ano", "ano_geral", figura_ano, registros_por_ano, color_param, agrupamento_selecionado)
+
+            with col_graf2:
+                st.subheader("Tipos de Crimes Mais Frequentes")
+                if agrupamento_selecionado == "Consolidado":
+                    registros_por_fato = contar_valores_cubo(cubo_geral_filtrado, 'fato_comunicado').reset_index()
+                    registros_por_fato.columns = ['fato_comunicado', 'Quantidade']
+                    color_param = None
+                else:
+                    mapa_agrupamento_tabela = {
+                        "Município": "municipio",
+                        "Mesorregião": "mesoregiao",
+                        "Associação": "associacao"
+                    }
+                    coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
+                    registros_por_fato = somar_cubo(cubo_geral_filtrado, ['fato_comunicado', coluna_agrupamento]).reset_index(name='Quantidade')
+                    color_param = coluna_agrupamento
+
+                def figura_fato(chart_type_fato, registros_por_fato, color_param, agrupamento_selecionado):
+                    if chart_type_fato == "Barras":
+                        fig_fato = px.bar(
+                            registros_por_fato, x='Quantidade', y='fato_comunicado', color=color_param, orientation='h',
+                            labels={'fato_comunicado': 'Tipo de Crime', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                        )
+                        if agrupamento_selecionado == "Consolidado":
+                            fig_fato.update_traces(marker_color='#9370DB')
+                        fig_fato.update_traces(textposition='auto')
+                        fig_fato.update_layout(yaxis={'categoryorder':'total ascending'})
+                    else:
+                        pie_names = 'fato_comunicado' if agrupamento_selecionado == "Consolidado" else color_param
+                        fig_fato = px.pie(
+                            registros_por_fato, names=pie_names, values='Quantidade',
+                            hole=.4, color_discrete_sequence=px.colors.sequential.Purples_r
+                        )
+                        fig_fato.update_traces(textinfo='percent+label', textposition='outside')
+                    return fig_fato
+
+                exibir_grafico_selecionavel(("Barras", "Pizza"), "chart_type_fato", "fato_geral", figura_fato, registros_por_fato, color_param, agrupamento_selecionado)
+
+            st.markdown("---")
         
-        col_graf3, col_graf4 = st.columns(2)
-        with col_graf3:
-            st.subheader("Distribuição por Faixa Etária da Vítima")
-            chart_type_faixa_etaria = st.selectbox(
-                "Tipo de Gráfico",
-                ("Barras", "Pizza"),
-                key="chart_type_faixa_etaria"
-            )
-            df_faixa_etaria = df_geral_filtrado.dropna(subset=['idade_vitima'])
-            bins = [0, 12, 17, 29, 40, 50, 60, 70, 79, 120]
-            labels = ['0-12 anos', '13-17 anos', '18-29 anos', '30-40 anos', '41-50 anos', '51-60 anos', '61-70 anos', '71-79 anos', '80+ anos']
-            df_faixa_etaria['faixa_etaria'] = pd.cut(df_faixa_etaria['idade_vitima'], bins=bins, labels=labels, right=True)
-            registros_por_faixa = df_faixa_etaria['faixa_etaria'].value_counts().sort_index().reset_index()
-            registros_por_faixa.columns = ['Faixa Etária', 'Quantidade']
-
-            if chart_type_faixa_etaria == "Barras":
-                fig_faixa_etaria = px.bar(
-                    registros_por_faixa, x='Faixa Etária', y='Quantidade',
-                    labels={'x': 'Faixa Etária', 'y': 'Quantidade'}, template='plotly_white', text='Quantidade'
-                )
-                fig_faixa_etaria.update_traces(marker_color='#9370DB', textposition='outside')
-            else:
-                fig_faixa_etaria = px.pie(
-                    registros_por_faixa, names='Faixa Etária', values='Quantidade',
-                    hole=.4,
-                    color_discrete_sequence=px.colors.sequential.Purples_r
-                )
-                fig_faixa_etaria.update_traces(textinfo='percent+label', textposition='outside')
-            st.plotly_chart(fig_faixa_etaria, use_container_width=True, key="faixa_etaria_geral")
-        with col_graf4:
-            st.subheader("Distribuição de Ocorrências por Mês")
-            chart_type_mes = st.selectbox(
-                "Tipo de Gráfico",
-                ("Pizza", "Barras", "Linha", "Área"),
-                key="chart_type_mes"
-            )
-            meses_ordem = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
-            df_geral_filtrado['mes_cat'] = pd.Categorical(df_geral_filtrado['mes'], categories=meses_ordem, ordered=True)
-            registros_por_mes = df_geral_filtrado['mes_cat'].value_counts().sort_index().reset_index()
-            registros_por_mes.columns = ['Mês', 'Quantidade']
-            nomes_meses_pt = {'January': 'Janeiro', 'February': 'Fevereiro', 'March': 'Março', 'April': 'Abril', 'May': 'Maio', 'June': 'Junho', 'July': 'Julho', 'August': 'Agosto', 'September': 'Setembro', 'October': 'Outubro', 'November': 'Novembro', 'December': 'Dezembro'}
-            registros_por_mes['Mês'] = registros_por_mes['Mês'].map(nomes_meses_pt)
-
-            if chart_type_mes == "Barras":
-                fig_mes = px.bar(
-                    registros_por_mes, x='Mês', y='Quantidade',
-                    labels={'x': 'Mês', 'y': 'Quantidade'}, template='plotly_white', text='Quantidade'
-                )
-                fig_mes.update_traces(marker_color='#9370DB', textposition='outside')
-            elif chart_type_mes == "Linha":
-                fig_mes = px.line(
-                    registros_por_mes, x='Mês', y='Quantidade',
-                    labels={'x': 'Mês', 'y': 'Quantidade'}, template='plotly_white', markers=True
-                )
-                fig_mes.update_traces(line_color='#9370DB')
-            elif chart_type_mes == "Área":
-                fig_mes = px.area(
-                    registros_por_mes, x='Mês', y='Quantidade',
-                    labels={'x': 'Mês', 'y': 'Quantidade'}, template='plotly_white'
-                )
-                fig_mes.update_traces(line_color='#9370DB')
-            else: 
-                fig_mes = px.pie(
-                    registros_por_mes, names='Mês', values='Quantidade', hole=.4,
-                    color_discrete_sequence=px.colors.sequential.Purples_r
-                )
-                fig_mes.update_traces(textinfo='percent+label', textposition='outside', sort=False)
-            st.plotly_chart(fig_mes, use_container_width=True, key="mes_geral")
+            col_graf3, col_graf4 = st.columns(2)
+            with col_graf3:
+                st.subheader("Distribuição por Faixa Etária da Vítima")
+                registros_por_faixa = somar_cubo(cubo_geral_filtrado, 'faixa_etaria', todas_categorias=True).reset_index()
+                registros_por_faixa.columns = ['Faixa Etária', 'Quantidade']
+
+                def figura_faixa_etaria(chart_type_faixa_etaria, registros_por_faixa):
+                    if chart_type_faixa_etaria == "Barras":
+                        fig_faixa_etaria = px.bar(
+                            registros_por_faixa, x='Faixa Etária', y='Quantidade',
+                            labels={'x': 'Faixa Etária', 'y': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                        )
+                        fig_faixa_etaria.update_traces(marker_color='#9370DB', textposition='outside')
+                    else:
+                        fig_faixa_etaria = px.pie(
+                            registros_por_faixa, names='Faixa Etária', values='Quantidade',
+                            hole=.4,
+                            color_discrete_sequence=px.colors.sequential.Purples_r
+                        )
+                        fig_faixa_etaria.update_traces(textinfo='percent+label', textposition='outside')
+                    return fig_faixa_etaria
+
+                exibir_grafico_selecionavel(("Barras", "Pizza"), "chart_type_faixa_etaria", "faixa_etaria_geral", figura_faixa_etaria, registros_por_faixa)
+            with col_graf4:
+                st.subheader("Distribuição de Ocorrências por Mês")
+                registros_por_mes = somar_cubo(cubo_geral_filtrado, 'mes', todas_categorias=True).reset_index()
+                registros_por_mes.columns = ['Mês', 'Quantidade']
+                nomes_meses_pt = {'January': 'Janeiro', 'February': 'Fevereiro', 'March': 'Março', 'April': 'Abril', 'May': 'Maio', 'June': 'Junho', 'July': 'Julho', 'August': 'Agosto', 'September': 'Setembro', 'October': 'Outubro', 'November': 'Novembro', 'December': 'Dezembro'}
+                registros_por_mes['Mês'] = registros_por_mes['Mês'].map(nomes_meses_pt)
+
+                def figura_mes(chart_type_mes, registros_por_mes):
+                    if chart_type_mes == "Barras":
+                        fig_mes = px.bar(
+                            registros_por_mes, x='Mês', y='Quantidade',
+                            labels={'x': 'Mês', 'y': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                        )
+                        fig_mes.update_traces(marker_color='#9370DB', textposition='outside')
+                    elif chart_type_mes == "Linha":
+                        fig_mes = px.line(
+                            registros_por_mes, x='Mês', y='Quantidade',
+                            labels={'x': 'Mês', 'y': 'Quantidade'}, template='plotly_white', markers=True
+                        )
+                        fig_mes.update_traces(line_color='#9370DB')
+                    elif chart_type_mes == "Área":
+                        fig_mes = px.area(
+                            registros_por_mes, x='Mês', y='Quantidade',
+                            labels={'x': 'Mês', 'y': 'Quantidade'}, template='plotly_white'
+                        )
+                        fig_mes.update_traces(line_color='#9370DB')
+                    else: 
+                        fig_mes = px.pie(
+                            registros_por_mes, names='Mês', values='Quantidade', hole=.4,
+                            color_discrete_sequence=px.colors.sequential.Purples_r
+                        )
+                        fig_mes.update_traces(textinfo='percent+label', textposition='outside', sort=False)
+                    return fig_mes
+
+                exibir_grafico_selecionavel(("Pizza", "Barras", "Linha", "Área"), "chart_type_mes", "mes_geral", figura_mes, registros_por_mes)
         
-        st.markdown("---")
+            st.markdown("---")
 
-        st.subheader("Distribuição de Ocorrências por Dia da Semana")
-        chart_type_dia_semana = st.selectbox(
-            "Tipo de Gráfico",
-            ("Barras", "Pizza", "Linha", "Área"),
-            key="chart_type_dia_semana"
-        )
-        df_geral_filtrado['dia_semana'] = df_geral_filtrado['data_fato'].dt.day_name()
-        dias_ordem = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-        df_geral_filtrado['dia_semana_cat'] = pd.Categorical(df_geral_filtrado['dia_semana'], categories=dias_ordem, ordered=True)
-        registros_por_dia = df_geral_filtrado['dia_semana_cat'].value_counts().sort_index().reset_index()
-        registros_por_dia.columns = ['Dia da Semana', 'Quantidade']
-        nomes_dias_pt = {'Monday': 'Segunda-feira', 'Tuesday': 'Terça-feira', 'Wednesday': 'Quarta-feira', 'Thursday': 'Quinta-feira', 'Friday': 'Sexta-feira', 'Saturday': 'Sábado', 'Sunday': 'Domingo'}
-        registros_por_dia['Dia da Semana'] = registros_por_dia['Dia da Semana'].map(nomes_dias_pt)
-
-        if chart_type_dia_semana == "Barras":
-            fig_dia_semana = px.bar(
-                registros_por_dia, x='Dia da Semana', y='Quantidade',
-                labels={'x': 'Dia da Semana', 'y': 'Quantidade'}, template='plotly_white', text='Quantidade'
-            )
-            fig_dia_semana.update_traces(marker_color='#8A2BE2', textposition='outside')
-        elif chart_type_dia_semana == "Linha":
-            fig_dia_semana = px.line(
-                registros_por_dia, x='Dia da Semana', y='Quantidade',
-                labels={'x': 'Dia da Semana', 'y': 'Quantidade'}, template='plotly_white', markers=True
-            )
-            fig_dia_semana.update_traces(line_color='#8A2BE2')
-        elif chart_type_dia_semana == "Área":
-            fig_dia_semana = px.area(
-                registros_por_dia, x='Dia da Semana', y='Quantidade',
-                labels={'x': 'Dia da Semana', 'y': 'Quantidade'}, template='plotly_white'
-            )
-            fig_dia_semana.update_traces(line_color='#8A2BE2')
-        else:
-            fig_dia_semana = px.pie(
-                registros_por_dia, names='Dia da Semana', values='Quantidade',
-                hole=.4,
-                color_discrete_sequence=px.colors.sequential.Purples_r
-            )
-            fig_dia_semana.update_traces(textinfo='percent+label', textposition='outside')
-        st.plotly_chart(fig_dia_semana, use_container_width=True, key="dia_semana_geral")
+            st.subheader("Distribuição de Ocorrências por Dia da Semana")
+            registros_por_dia = somar_cubo(cubo_geral_filtrado, 'dia_semana', todas_categorias=True).reset_index()
+            registros_por_dia.columns = ['Dia da Semana', 'Quantidade']
+            nomes_dias_pt = {'Monday': 'Segunda-feira', 'Tuesday': 'Terça-feira', 'Wednesday': 'Quarta-feira', 'Thursday': 'Quinta-feira', 'Friday': 'Sexta-feira', 'Saturday': 'Sábado', 'Sunday': 'Domingo'}
+            registros_por_dia['Dia da Semana'] = registros_por_dia['Dia da Semana'].map(nomes_dias_pt)
+
+            def figura_dia_semana(chart_type_dia_semana, registros_por_dia):
+                if chart_type_dia_semana == "Barras":
+                    fig_dia_semana = px.bar(
+                        registros_por_dia, x='Dia da Semana', y='Quantidade',
+                        labels={'x': 'Dia da Semana', 'y': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                    )
+                    fig_dia_semana.update_traces(marker_color='#8A2BE2', textposition='outside')
+                elif chart_type_dia_semana == "Linha":
+                    fig_dia_semana = px.line(
+                        registros_por_dia, x='Dia da Semana', y='Quantidade',
+                        labels={'x': 'Dia da Semana', 'y': 'Quantidade'}, template='plotly_white', markers=True
+                    )
+                    fig_dia_semana.update_traces(line_color='#8A2BE2')
+                elif chart_type_dia_semana == "Área":
+                    fig_dia_semana = px.area(
+                        registros_por_dia, x='Dia da Semana', y='Quantidade',
+                        labels={'x': 'Dia da Semana', 'y': 'Quantidade'}, template='plotly_white'
+                    )
+                    fig_dia_semana.update_traces(line_color='#8A2BE2')
+                else:
+                    fig_dia_semana = px.pie(
+                        registros_por_dia, names='Dia da Semana', values='Quantidade',
+                        hole=.4,
+                        color_discrete_sequence=px.colors.sequential.Purples_r
+                    )
+                    fig_dia_semana.update_traces(textinfo='percent+label', textposition='outside')
+                return fig_dia_semana
 
-        st.markdown("---")
+            exibir_grafico_selecionavel(("Barras", "Pizza", "Linha", "Área"), "chart_type_dia_semana", "dia_semana_geral", figura_dia_semana, registros_por_dia)
+
+            st.markdown("---")
         
-        st.subheader("Análise Populacional dos Crimes por Município")
+            st.subheader("Análise Populacional dos Crimes por Município")
         
-        anos_no_filtro = df_geral_filtrado['ano'].unique()
-        num_anos = len(anos_no_filtro) if len(anos_no_filtro) > 0 else 1
+            anos_no_filtro = df_geral_filtrado['ano'].unique()
+            num_anos = len(anos_no_filtro) if len(anos_no_filtro) > 0 else 1
         
-        tabela_populacional = criar_tabela_populacional_agrupada(
-            df_geral_filtrado, df_populacao, df_regioes, agrupamento_selecionado, num_anos
-        )
+            tabela_populacional = cache_resultados.obter(
+                chave_filtros(consulta='tabela_populacional', agrupamento=agrupamento_selecionado, **estado_filtros),
+                lambda: criar_tabela_populacional_agrupada(df_geral_filtrado, df_populacao, df_regioes, agrupamento_selecionado, num_anos)
+            )
         
-        st.dataframe(
-            tabela_populacional.style.format({
-                'Média Anual de Fatos Ocorridos': '{:.2f}',
-                'Fatos por Mil Mulheres (anual)': '{:.2f}',
-                '% de Mulheres Vítimas (anual)': '{:.2f}%',
-                'População Feminina': '{:,.0f}',
-                'Tendência (CAGR %)': '{:+.1f}%'
-            }),
-            use_container_width=True
-        )
+            st.dataframe(
+                tabela_populacional.style.format({
+                    'Média Anual de Fatos Ocorridos': '{:.2f}',
+                    'Fatos por Mil Mulheres (anual)': '{:.2f}',
+                    '% de Mulheres Vítimas (anual)': '{:.2f}%',
+                    'População Feminina': '{:,.0f}',
+                    'Tendência (CAGR %)': '{:+.1f}%'
+                }),
+                use_container_width=True
+            )
 
-        st.markdown("---")
+            st.markdown("---")
 
-        if agrupamento_selecionado != "Consolidado":
-            mapa_agrupamento_tabela = {
-                "Município": "municipio",
-                "Mesorregião": "mesoregiao",
-                "Associação": "associacao"
-            }
-            coluna_agrupamento_tabela = mapa_agrupamento_tabela[agrupamento_selecionado]
+            if agrupamento_selecionado != "Consolidado":
+                mapa_agrupamento_tabela = {
+                    "Município": "municipio",
+                    "Mesorregião": "mesoregiao",
+                    "Associação": "associacao"
+                }
+                coluna_agrupamento_tabela = mapa_agrupamento_tabela[agrupamento_selecionado]
+                nome_coluna_agrupamento = f"Nome do {agrupamento_selecionado}" if agrupamento_selecionado == "Município" else agrupamento_selecionado
             
-            st.subheader(f"Tabela Consolidada de Crimes por {agrupamento_selecionado}")
-            if not df_geral_filtrado.empty:
-                tabela_consolidada = criar_tabela_consolidada(df_geral_filtrado, coluna_agrupamento_tabela, agrupamento_selecionado)
-                if not tabela_consolidada.empty:
-                    colunas_evolucao = [col for col in tabela_consolidada.columns if 'Diferença' in str(col)]
+                st.subheader(f"Tabela Consolidada de Crimes por {agrupamento_selecionado}")
+                if not df_geral_filtrado.empty:
+                    tabela_consolidada = cache_resultados.obter(
+                        chave_filtros(consulta='tabela_consolidada', agrupamento=agrupamento_selecionado, **estado_filtros),
+                        lambda: criar_tabela_evolucao_anual(df_geral_filtrado, [coluna_agrupamento_tabela, 'fato_comunicado'], {coluna_agrupamento_tabela: nome_coluna_agrupamento, 'fato_comunicado': 'Fato Comunicado'})
+                    )
+                    if not tabela_consolidada.empty:
+                        colunas_evolucao = [col for col in tabela_consolidada.columns if 'Diferença' in str(col)]
 
-                    format_dict = {col: formatar_seta_percentual for col in colunas_evolucao}
+                        format_dict = {col: formatar_seta_percentual for col in colunas_evolucao}
                     
-                    anos_int = [col for col in tabela_consolidada.columns if isinstance(col, int)]
-                    for ano in anos_int:
-                        format_dict[ano] = '{:.0f}'
-                    format_dict['total'] = '{:.0f}'
-                    if 'Tendência (CAGR %)' in tabela_consolidada.columns:
-                        format_dict['Tendência (CAGR %)'] = '{:+.1f}%'
-
-                    colunas_para_colorir = colunas_evolucao[:]
-                    if 'Tendência (CAGR %)' in tabela_consolidada.columns:
-                        colunas_para_colorir.append('Tendência (CAGR %)')
-
-                    styler = tabela_consolidada.style.applymap(
-                        colorir_percentual,
-                        subset=colunas_para_colorir
-                    ).format(format_dict)
+                        anos_int = [col for col in tabela_consolidada.columns if isinstance(col, int)]
+                        for ano in anos_int:
+                            format_dict[ano] = '{:.0f}'
+                        format_dict['total'] = '{:.0f}'
+                        if 'Tendência (CAGR %)' in tabela_consolidada.columns:
+                            format_dict['Tendência (CAGR %)'] = '{:+.1f}%'
+
+                        colunas_para_colorir = colunas_evolucao[:]
+                        if 'Tendência (CAGR %)' in tabela_consolidada.columns:
+                            colunas_para_colorir.append('Tendência (CAGR %)')
+
+                        styler = tabela_consolidada.style.applymap(
+                            colorir_percentual,
+                            subset=colunas_para_colorir
+                        ).format(format_dict)
                     
-                    st.dataframe(styler, use_container_width=True)
+                        st.dataframe(styler, use_container_width=True)
+                    else:
+                        st.warning("Não há dados para exibir na tabela consolidada com os filtros selecionados.")
                 else:
                     st.warning("Não há dados para exibir na tabela consolidada com os filtros selecionados.")
             else:
-                st.warning("Não há dados para exibir na tabela consolidada com os filtros selecionados.")
-        else:
-            st.subheader("Tabela Consolidada de Crimes (Total SC)")
-            if not df_geral_filtrado.empty:
-                tabela_total = criar_tabela_total_consolidada(df_geral_filtrado)
-                if not tabela_total.empty:
-                    colunas_evolucao = [col for col in tabela_total.columns if 'Diferença' in str(col)]
+                st.subheader("Tabela Consolidada de Crimes (Total SC)")
+                if not df_geral_filtrado.empty:
+                    tabela_total = cache_resultados.obter(
+                        chave_filtros(consulta='tabela_total', **estado_filtros),
+                        lambda: criar_tabela_evolucao_anual(df_geral_filtrado, ['fato_comunicado'], {'fato_comunicado': 'Fato Comunicado'})
+                    )
+                    if not tabela_total.empty:
+                        colunas_evolucao = [col for col in tabela_total.columns if 'Diferença' in str(col)]
 
-                    format_dict = {col: formatar_seta_percentual for col in colunas_evolucao}
+                        format_dict = {col: formatar_seta_percentual for col in colunas_evolucao}
                     
-                    anos_int = [col for col in tabela_total.columns if isinstance(col, int)]
-                    for ano in anos_int:
-                        format_dict[ano] = '{:.0f}'
-                    format_dict['total'] = '{:.0f}'
-                    format_dict['Tendência (CAGR %)'] = '{:+.1f}%'
-
-                    colunas_para_colorir = colunas_evolucao[:]
-                    if 'Tendência (CAGR %)' in tabela_total.columns:
-                        colunas_para_colorir.append('Tendência (CAGR %)')
-
-                    styler = tabela_total.style.applymap(
-                        colorir_percentual,
-                        subset=colunas_para_colorir
-                    ).format(format_dict)
+                        anos_int = [col for col in tabela_total.columns if isinstance(col, int)]
+                        for ano in anos_int:
+                            format_dict[ano] = '{:.0f}'
+                        format_dict['total'] = '{:.0f}'
+                        format_dict['Tendência (CAGR %)'] = '{:+.1f}%'
+
+                        colunas_para_colorir = colunas_evolucao[:]
+                        if 'Tendência (CAGR %)' in tabela_total.columns:
+                            colunas_para_colorir.append('Tendência (CAGR %)')
+
+                        styler = tabela_total.style.applymap(
+                            colorir_percentual,
+                            subset=colunas_para_colorir
+                        ).format(format_dict)
                     
-                    st.dataframe(styler, use_container_width=True)
+                        st.dataframe(styler, use_container_width=True)
+                    else:
+                        st.warning("Não há dados para exibir na tabela consolidada com os filtros selecionados.")
                 else:
                     st.warning("Não há dados para exibir na tabela consolidada com os filtros selecionados.")
-            else:
-                st.warning("Não há dados para exibir na tabela consolidada com os filtros selecionados.")
-
-    with tab_feminicidio:
-        st.header("Análise de Feminicídios Consumados")
-        st.markdown("Indicadores específicos sobre os crimes de feminicídio no estado.")
-        
-        total_feminicidios = df_feminicidio_filtrado.shape[0]
-        idade_media_vitima_fem = df_feminicidio_filtrado['idade_vitima'].mean()
-        idade_media_autor_fem = df_feminicidio_filtrado['idade_autor'].mean()
-        texto_idade_vitima = f"{idade_media_vitima_fem:.1f} anos" if not pd.isna(idade_media_vitima_fem) else "Dados Insuficientes"
-        texto_idade_autor = f"{idade_media_autor_fem:.1f} anos" if not pd.isna(idade_media_autor_fem) else "Dados Insuficientes"
-        
-        col1_fem, col2_fem, col3_fem = st.columns(3)
-        with col1_fem:
-            st.metric(label="Total de Feminicídios", value=total_feminicidios)
-        with col2_fem:
-            st.metric(label="Idade Média da Vítima", value=texto_idade_vitima)
-        with col3_fem:
-            st.metric(label="Idade Média do Autor", value=texto_idade_autor)
-        
-        st.markdown("---")
 
-        st.subheader(f"Distribuição de Feminicídios por {agrupamento_selecionado}")
+            if df_geral_filtrado.empty:
+                st.error("🚨 Dados não carregados. Verifique os arquivos em `data/`.")
+                st.warning("Certifique-se de que os arquivos `base_geral.xlsx`, `base_feminicidio.xlsx` e `municipios_sc.json` existem na pasta `data`.")
 
-        if agrupamento_selecionado == "Município" or agrupamento_selecionado == "Consolidado":
-            map_df_fem = df_feminicidio_filtrado['municipio_normalizado'].value_counts().reset_index()
-            map_df_fem.columns = ['municipio_normalizado', 'quantidade']
-        else: 
-            agrupamento_col_fem = "mesoregiao" if agrupamento_selecionado == "Mesorregião" else "associacao"
-            
-            feminicidios_por_grupo = df_feminicidio_filtrado.groupby(agrupamento_col_fem).size().reset_index(name='quantidade_grupo')
-            
-            municipio_grupo_mapping_fem = df_feminicidio_filtrado[['municipio_normalizado', agrupamento_col_fem]].drop_duplicates()
+    if tab_feminicidio.open:
+        with tab_feminicidio:
+            st.header("Análise de Feminicídios Consumados")
+            st.markdown("Indicadores específicos sobre os crimes de feminicídio no estado.")
+        
+            total_feminicidios = int(cubo_feminicidio_filtrado['quantidade'].sum())
+            idade_media_vitima_fem = media_ponderada_cubo(cubo_feminicidio_filtrado, 'idade_vitima')
+            idade_media_autor_fem = media_ponderada_cubo(cubo_feminicidio_filtrado, 'idade_autor')
+            texto_idade_vitima = f"{idade_media_vitima_fem:.1f} anos" if not pd.isna(idade_media_vitima_fem) else "Dados Insuficientes"
+            texto_idade_autor = f"{idade_media_autor_fem:.1f} anos" if not pd.isna(idade_media_autor_fem) else "Dados Insuficientes"
+        
+            col1_fem, col2_fem, col3_fem = st.columns(3)
+            with col1_fem:
+                st.metric(label="Total de Feminicídios", value=total_feminicidios)
+            with col2_fem:
+                st.metric(label="Idade Média da Vítima", value=texto_idade_vitima)
+            with col3_fem:
+                st.metric(label="Idade Média do Autor", value=texto_idade_autor)
+        
+            st.markdown("---")
+
+            st.subheader(f"Distribuição de Feminicídios por {agrupamento_selecionado}")
+
+            if agrupamento_selecionado == "Município" or agrupamento_selecionado == "Consolidado":
+                map_df_fem = contar_valores_cubo(cubo_feminicidio_filtrado, 'municipio_normalizado').reset_index()
+                map_df_fem.columns = ['municipio_normalizado', 'quantidade']
+                geojson_mapa_fem, locations_mapa_fem, featureidkey_mapa_fem = geojson_mapas, 'municipio_normalizado', "properties.NM_MUN_NORMALIZADO"
+            else: 
+                agrupamento_col_fem = "mesoregiao" if agrupamento_selecionado == "Mesorregião" else "associacao"
             
-            map_df_fem = pd.merge(municipio_grupo_mapping_fem, feminicidios_por_grupo, on=agrupamento_col_fem)
-            map_df_fem = map_df_fem.rename(columns={'quantidade_grupo': 'quantidade'})
-
-        fig_mapa_fem = px.choropleth_mapbox(
-            map_df_fem, 
-            geojson=geojson_sc, 
-            locations='municipio_normalizado',
-            featureidkey="properties.NM_MUN_NORMALIZADO", 
-            color='quantidade',
-            color_continuous_scale="Reds", 
-            mapbox_style="carto-positron",
-            zoom=6, 
-            center={"lat": -27.59, "lon": -50.52}, 
-            opacity=0.7,
-            labels={'quantidade': f'Total de Feminicídios ({agrupamento_selecionado})'}
-        )
-        fig_mapa_fem.update_layout(
-            margin={"r":0,"t":0,"l":0,"b":0},
-            coloraxis_showscale=False
-        )
-        st.plotly_chart(fig_mapa_fem, use_container_width=True, key="mapa_fem")
+                map_df_fem = somar_cubo(cubo_feminicidio_filtrado, agrupamento_col_fem).reset_index(name='quantidade')
+                geojson_mapa_fem, locations_mapa_fem, featureidkey_mapa_fem = carregar_geojson_agrupado(agrupamento_col_fem), agrupamento_col_fem, "properties.grupo"
+
+            fig_mapa_fem = px.choropleth_mapbox(
+                map_df_fem, 
+                geojson=geojson_mapa_fem, 
+                locations=locations_mapa_fem,
+                featureidkey=featureidkey_mapa_fem, 
+                color='quantidade',
+                color_continuous_scale="Reds", 
+                mapbox_style="carto-positron",
+                zoom=6, 
+                center={"lat": -27.59, "lon": -50.52}, 
+                opacity=0.7,
+                labels={'quantidade': f'Total de Feminicídios ({agrupamento_selecionado})'}
+            )
+            fig_mapa_fem.update_layout(
+                margin={"r":0,"t":0,"l":0,"b":0},
+                coloraxis_showscale=False
+            )
+            st.plotly_chart(fig_mapa_fem, use_container_width=True, key="mapa_fem")
 
-        st.markdown("---")
-        
-        st.subheader("Raio-X do Agressor")
-        st.markdown("""
-        Análise aprofundada sobre o perfil do agressor, incluindo a dinâmica de idade com a vítima e seu histórico criminal. 
-        Estes gráficos ajudam a identificar padrões e possíveis pontos de falha na prevenção.
-        """)
+            st.markdown("---")
         
-        col_raiox1, col_raiox2 = st.columns(2)
+            st.subheader("Raio-X do Agressor")
+            st.markdown("""
+            Análise aprofundada sobre o perfil do agressor, incluindo a dinâmica de idade com a vítima e seu histórico criminal. 
+            Estes gráficos ajudam a identificar padrões e possíveis pontos de falha na prevenção.
+            """)
         
-        with col_raiox1:
-            if not df_feminicidio_filtrado.empty and df_feminicidio_filtrado[['idade_vitima', 'idade_autor']].notna().all(axis=1).any():
-                fig_scatter_idade = px.scatter(
-                    df_feminicidio_filtrado.dropna(subset=['idade_vitima', 'idade_autor']),
-                    x='idade_vitima',
-                    y='idade_autor',
-                    title="Dinâmica de Idade: Vítima vs. Agressor",
-                    labels={'idade_vitima': 'Idade da Vítima', 'idade_autor': 'Idade do Autor'},
-                    color_discrete_sequence=['#8e24aa'],
-                    hover_data=['municipio', 'relacao_autor', 'meio_crime']
-                )
+            col_raiox1, col_raiox2 = st.columns(2)
+        
+            with col_raiox1:
+                if not df_feminicidio_filtrado.empty and df_feminicidio_filtrado[['idade_vitima', 'idade_autor']].notna().all(axis=1).any():
+                    fig_scatter_idade = px.scatter(
+                        df_feminicidio_filtrado.dropna(subset=['idade_vitima', 'idade_autor']),
+                        x='idade_vitima',
+                        y='idade_autor',
+                        title="Dinâmica de Idade: Vítima vs. Agressor",
+                        labels={'idade_vitima': 'Idade da Vítima', 'idade_autor': 'Idade do Autor'},
+                        color_discrete_sequence=['#8e24aa'],
+                        hover_data=['municipio', 'relacao_autor', 'meio_crime']
+                    )
                 
-                max_idade = max(
-                    df_feminicidio_filtrado['idade_vitima'].max(),
-                    df_feminicidio_filtrado['idade_autor'].max()
-                )
+                    max_idade = max(
+                        df_feminicidio_filtrado['idade_vitima'].max(),
+                        df_feminicidio_filtrado['idade_autor'].max()
+                    )
                 
-                fig_scatter_idade.add_shape(
-                    type='line',
-                    x0=0, y0=0,
-                    x1=max_idade, y1=max_idade,
-                    line=dict(color='rgba(255, 0, 0, 0.5)', width=2, dash='dash'),
-                    name='Idade Igual'
-                )
+                    fig_scatter_idade.add_shape(
+                        type='line',
+                        x0=0, y0=0,
+                        x1=max_idade, y1=max_idade,
+                        line=dict(color='rgba(255, 0, 0, 0.5)', width=2, dash='dash'),
+                        name='Idade Igual'
+                    )
                 
-                fig_scatter_idade.update_layout(
-                    xaxis_title="Idade da Vítima",
-                    yaxis_title="Idade do Autor",
-                    legend_title="Legenda"
-                )
-                st.plotly_chart(fig_scatter_idade, use_container_width=True, key="scatter_idade_fem")
-            else:
-                st.info("Não há dados suficientes para exibir o gráfico de correlação de idades.")
+                    fig_scatter_idade.update_layout(
+                        xaxis_title="Idade da Vítima",
+                        yaxis_title="Idade do Autor",
+                        legend_title="Legenda"
+                    )
+                    st.plotly_chart(fig_scatter_idade, use_container_width=True, key="scatter_idade_fem")
+                else:
+                    st.info("Não há dados suficientes para exibir o gráfico de correlação de idades.")
 
-        with col_raiox2:
-            if not df_feminicidio_filtrado.empty and 'passagem_policial' in df_feminicidio_filtrado.columns and 'passagem_por_violencia_domestica' in df_feminicidio_filtrado.columns:
-                total_agressores = len(df_feminicidio_filtrado)
-                com_passagem = df_feminicidio_filtrado['passagem_policial'].value_counts().get('SIM', 0)
-                sem_passagem = total_agressores - com_passagem
+            with col_raiox2:
+                if not df_feminicidio_filtrado.empty and 'passagem_policial' in df_feminicidio_filtrado.columns and 'passagem_por_violencia_domestica' in df_feminicidio_filtrado.columns:
+                    total_agressores = len(df_feminicidio_filtrado)
+                    com_passagem = df_feminicidio_filtrado['passagem_policial'].value_counts().get('SIM', 0)
+                    sem_passagem = total_agressores - com_passagem
                 
-                com_bo_vd = len(df_feminicidio_filtrado[
-                    (df_feminicidio_filtrado['passagem_policial'] == 'SIM') &
-                    (df_feminicidio_filtrado['passagem_por_violencia_domestica'] == 'SIM')
-                ])
-                com_bo_outros = com_passagem - com_bo_vd
-
-                if total_agressores > 0:
-                    fig_sankey = go.Figure(data=[go.Sankey(
-                        node=dict(
-                            pad=15,
-                            thickness=20,
-                            line=dict(color="black", width=0.5),
-                            label=["Total de Agressores", "Com Passagem Policial", "Sem Passagem Policial", "Com B.O. por Violência Doméstica", "Com B.O. por Outros Crimes"],
-                            color=["#4a148c", "#8e24aa", "#e0e0e0", "#ab47bc", "#ce93d8"]
-                        ),
-                        link=dict(
-                            source=[0, 0, 1, 1],
-                            target=[1, 2, 3, 4],
-                            value=[com_passagem, sem_passagem, com_bo_vd, com_bo_outros],
-                            color=["rgba(142, 36, 170, 0.6)", "rgba(189, 189, 189, 0.6)", "rgba(171, 71, 188, 0.6)", "rgba(206, 147, 216, 0.6)"]
-                        ))])
-
-                    fig_sankey.update_layout(
-                        title_text="Histórico do Agressor: A Escalada da Violência",
-                        font_size=12
-                    )
-                    st.plotly_chart(fig_sankey, use_container_width=True, key="sankey_fem")
+                    com_bo_vd = len(df_feminicidio_filtrado[
+                        (df_feminicidio_filtrado['passagem_policial'] == 'SIM') &
+                        (df_feminicidio_filtrado['passagem_por_violencia_domestica'] == 'SIM')
+                    ])
+                    com_bo_outros = com_passagem - com_bo_vd
+
+                    if total_agressores > 0:
+                        fig_sankey = go.Figure(data=[go.Sankey(
+                            node=dict(
+                                pad=15,
+                                thickness=20,
+                                line=dict(color="black", width=0.5),
+                                label=["Total de Agressores", "Com Passagem Policial", "Sem Passagem Policial", "Com B.O. por Violência Doméstica", "Com B.O. por Outros Crimes"],
+                                color=["#4a148c", "#8e24aa", "#e0e0e0", "#ab47bc", "#ce93d8"]
+                            ),
+                            link=dict(
+                                source=[0, 0, 1, 1],
+                                target=[1, 2, 3, 4],
+                                value=[com_passagem, sem_passagem, com_bo_vd, com_bo_outros],
+                                color=["rgba(142, 36, 170, 0.6)", "rgba(189, 189, 189, 0.6)", "rgba(171, 71, 188, 0.6)", "rgba(206, 147, 216, 0.6)"]
+                            ))])
+
+                        fig_sankey.update_layout(
+                            title_text="Histórico do Agressor: A Escalada da Violência",
+                            font_size=12
+                        )
+                        st.plotly_chart(fig_sankey, use_container_width=True, key="sankey_fem")
+                    else:
+                        st.info("Não há dados para exibir o gráfico de histórico do agressor.")
                 else:
-                    st.info("Não há dados para exibir o gráfico de histórico do agressor.")
-            else:
-                st.info("Não há dados suficientes ou as colunas necessárias não existem para exibir o gráfico de histórico do agressor.")
+                    st.info("Não há dados suficientes ou as colunas necessárias não existem para exibir o gráfico de histórico do agressor.")
         
-        st.markdown("---")
+            st.markdown("---")
 
-        col_graf_fem1, col_graf_fem2 = st.columns(2)
-        with col_graf_fem1:
-            st.subheader("Vínculo entre a Vítima e o Autor")
-            chart_type_vinculo = st.selectbox(
-                "Tipo de Gráfico",
-                ("Barras", "Pizza"),
-                key="chart_type_vinculo"
-            )
-            if agrupamento_selecionado == "Consolidado":
-                vinculo_autor = df_feminicidio_filtrado['relacao_autor'].value_counts().reset_index()
-                vinculo_autor.columns = ['relacao_autor', 'Quantidade']
-                color_param = None
-            else:
-                mapa_agrupamento_tabela = {
-                    "Município": "municipio",
-                    "Mesorregião": "mesoregiao",
-                    "Associação": "associacao"
-                }
-                coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
-                vinculo_autor = df_feminicidio_filtrado.groupby(['relacao_autor', coluna_agrupamento]).size().reset_index(name='Quantidade')
-                color_param = coluna_agrupamento
-            
-            if chart_type_vinculo == "Barras":
-                fig_vinculo = px.bar(
-                    vinculo_autor, x='Quantidade', y='relacao_autor', color=color_param, orientation='h',
-                    labels={'relacao_autor': 'Vínculo com o Autor', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
-                )
+            col_graf_fem1, col_graf_fem2 = st.columns(2)
+            with col_graf_fem1:
+                st.subheader("Vínculo entre a Vítima e o Autor")
                 if agrupamento_selecionado == "Consolidado":
-                    fig_vinculo.update_traces(marker_color='#8A2BE2')
-                fig_vinculo.update_traces(textposition='auto')
-                fig_vinculo.update_layout(yaxis={'categoryorder':'total ascending'})
-            else:
-                pie_names = 'relacao_autor' if agrupamento_selecionado == "Consolidado" else color_param
-                fig_vinculo = px.pie(
-                    vinculo_autor, names=pie_names, values='Quantidade',
-                    hole=.4, color_discrete_sequence=px.colors.sequential.Purples_r
-                )
-                fig_vinculo.update_traces(textinfo='percent+label', textposition='outside')
-            st.plotly_chart(fig_vinculo, use_container_width=True, key="vinculo_fem")
+                    vinculo_autor = contar_valores_cubo(cubo_feminicidio_filtrado, 'relacao_autor').reset_index()
+                    vinculo_autor.columns = ['relacao_autor', 'Quantidade']
+                    color_param = None
+                else:
+                    mapa_agrupamento_tabela = {
+                        "Município": "municipio",
+                        "Mesorregião": "mesoregiao",
+                        "Associação": "associacao"
+                    }
+                    coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
+                    vinculo_autor = somar_cubo(cubo_feminicidio_filtrado, ['relacao_autor', coluna_agrupamento]).reset_index(name='Quantidade')
+                    color_param = coluna_agrupamento
+
+                def figura_vinculo(chart_type_vinculo, vinculo_autor, color_param, agrupamento_selecionado):
+                    if chart_type_vinculo == "Barras":
+                        fig_vinculo = px.bar(
+                            vinculo_autor, x='Quantidade', y='relacao_autor', color=color_param, orientation='h',
+                            labels={'relacao_autor': 'Vínculo com o Autor', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                        )
+                        if agrupamento_selecionado == "Consolidado":
+                            fig_vinculo.update_traces(marker_color='#8A2BE2')
+                        fig_vinculo.update_traces(textposition='auto')
+                        fig_vinculo.update_layout(yaxis={'categoryorder':'total ascending'})
+                    else:
+                        pie_names = 'relacao_autor' if agrupamento_selecionado == "Consolidado" else color_param
+                        fig_vinculo = px.pie(
+                            vinculo_autor, names=pie_names, values='Quantidade',
+                            hole=.4, color_discrete_sequence=px.colors.sequential.Purples_r
+                        )
+                        fig_vinculo.update_traces(textinfo='percent+label', textposition='outside')
+                    return fig_vinculo
+
+                exibir_grafico_selecionavel(("Barras", "Pizza"), "chart_type_vinculo", "vinculo_fem", figura_vinculo, vinculo_autor, color_param, agrupamento_selecionado)
         
-        with col_graf_fem2:
-            st.subheader("Meio Utilizado para o Crime")
-            chart_type_meio = st.selectbox(
-                "Tipo de Gráfico",
-                ("Barras", "Pizza"),
-                key="chart_type_meio"
-            )
+            with col_graf_fem2:
+                st.subheader("Meio Utilizado para o Crime")
+                if agrupamento_selecionado == "Consolidado":
+                    meio_crime = contar_valores_cubo(cubo_feminicidio_filtrado, 'meio_crime').reset_index()
+                    meio_crime.columns = ['meio_crime', 'Quantidade']
+                    color_param = None
+                else:
+                    mapa_agrupamento_tabela = {
+                        "Município": "municipio",
+                        "Mesorregião": "mesoregiao",
+                        "Associação": "associacao"
+                    }
+                    coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
+                    meio_crime = somar_cubo(cubo_feminicidio_filtrado, ['meio_crime', coluna_agrupamento]).reset_index(name='Quantidade')
+                    color_param = coluna_agrupamento
+
+                def figura_meio(chart_type_meio, meio_crime, color_param, agrupamento_selecionado):
+                    if chart_type_meio == "Barras":
+                        fig_meio = px.bar(
+                            meio_crime, x='meio_crime', y='Quantidade', color=color_param,
+                            labels={'meio_crime': 'Meio Utilizado', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                        )
+                        if agrupamento_selecionado == "Consolidado":
+                            fig_meio.update_traces(marker_color='#8A2BE2')
+                        fig_meio.update_traces(textposition='outside')
+                    else:
+                        pie_names = 'meio_crime' if agrupamento_selecionado == "Consolidado" else color_param
+                        fig_meio = px.pie(
+                            meio_crime, names=pie_names, values='Quantidade',
+                            hole=.4, color_discrete_sequence=px.colors.sequential.Purples_r
+                        )
+                        fig_meio.update_traces(textinfo='percent+label', textposition='outside')
+                    return fig_meio
+
+                exibir_grafico_selecionavel(("Barras", "Pizza"), "chart_type_meio", "meio_fem", figura_meio, meio_crime, color_param, agrupamento_selecionado)
+            st.markdown("---")
+        
+            col_graf_fem1, col_graf_fem2 = st.columns(2)
+            with col_graf_fem1:
+                st.subheader("Distribuição de Idade da Vítima")
+                df_idade_vitima = df_feminicidio_filtrado.dropna(subset=['idade_vitima'])
+
+                def figura_idade_vitima(chart_type_idade_vitima, df_idade_vitima):
+                    if chart_type_idade_vitima == "Histograma":
+                        fig_idade_vitima = px.histogram(
+                            df_idade_vitima, x='idade_vitima', nbins=20,
+                            labels={'idade_vitima': 'Idade da Vítima', 'count': 'Quantidade'},
+                            template='plotly_white', color_discrete_sequence=['#8e24aa']
+                        )
+                    else: 
+                        fig_idade_vitima = px.violin(
+                            df_idade_vitima, y='idade_vitima',
+                            labels={'idade_vitima': 'Idade da Vítima'},
+                            template='plotly_white', color_discrete_sequence=['#8e24aa'],
+                            box=True, points="all"
+                        )
+                    return fig_idade_vitima
+
+                exibir_grafico_selecionavel(("Histograma", "Gráfico de Densidade"), "chart_type_idade_vitima", "idade_vitima_fem", figura_idade_vitima, df_idade_vitima)
+        
+            with col_graf_fem2:
+                st.subheader("Distribuição de Idade do Autor")
+                df_idade_autor = df_feminicidio_filtrado.dropna(subset=['idade_autor'])
+
+                def figura_idade_autor(chart_type_idade_autor, df_idade_autor):
+                    if chart_type_idade_autor == "Histograma":
+                        fig_idade_autor = px.histogram(
+                            df_idade_autor, x='idade_autor', nbins=20,
+                            labels={'idade_autor': 'Idade do Autor', 'count': 'Quantidade'},
+                            template='plotly_white', color_discrete_sequence=['#ab47bc']
+                        )
+                    else:
+                        fig_idade_autor = px.violin(
+                            df_idade_autor, y='idade_autor',
+                            labels={'idade_autor': 'Idade do Autor'},
+                            template='plotly_white', color_discrete_sequence=['#ab47bc'],
+                            box=True, points="all"
+                        )
+                    return fig_idade_autor
+
+                exibir_grafico_selecionavel(("Histograma", "Gráfico de Densidade"), "chart_type_idade_autor", "idade_autor_fem", figura_idade_autor, df_idade_autor)
+
+            st.markdown("---")
+
+            col_graf_fem3, col_graf_fem4 = st.columns(2)
+            with col_graf_fem3:
+                st.subheader("Vítima Possuía B.O. contra o Autor?")
+                bo_contra_autor = contar_valores_cubo(cubo_feminicidio_filtrado, 'bo_de_vd_contra_o_autor').reset_index()
+                bo_contra_autor.columns = ['Resposta', 'Quantidade']
+
+                def figura_bo(chart_type_bo, bo_contra_autor):
+                    if chart_type_bo == "Barras":
+                        fig_bo = px.bar(
+                            bo_contra_autor, x='Resposta', y='Quantidade',
+                            labels={'Resposta': 'Resposta', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                        )
+                        fig_bo.update_traces(marker_color='#8e24aa', textposition='outside')
+                    else:
+                        fig_bo = px.pie(
+                            bo_contra_autor, names='Resposta', values='Quantidade', hole=0.4,
+                            color_discrete_sequence=px.colors.sequential.Purples_r
+                        )
+                    return fig_bo
+
+                exibir_grafico_selecionavel(("Pizza", "Barras"), "chart_type_bo", "bo_fem", figura_bo, bo_contra_autor)
+
+            with col_graf_fem4:
+                st.subheader("Autor Foi Preso?")
+                autor_preso = contar_valores_cubo(cubo_feminicidio_filtrado, 'autor_preso').reset_index()
+                autor_preso.columns = ['Resposta', 'Quantidade']
+
+                def figura_preso(chart_type_preso, autor_preso):
+                    if chart_type_preso == "Barras":
+                        fig_preso = px.bar(
+                            autor_preso, x='Resposta', y='Quantidade',
+                            labels={'Resposta': 'Resposta', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                        )
+                        fig_preso.update_traces(marker_color='#ab47bc', textposition='outside')
+                    else:
+                        fig_preso = px.pie(
+                            autor_preso, names='Resposta', values='Quantidade', hole=0.4,
+                            color_discrete_sequence=px.colors.sequential.Purples_r
+                        )
+                    return fig_preso
+
+                exibir_grafico_selecionavel(("Pizza", "Barras"), "chart_type_preso", "preso_fem", figura_preso, autor_preso)
+        
+            st.markdown("---")
+        
+            st.subheader("Localidade do Crime")
             if agrupamento_selecionado == "Consolidado":
-                meio_crime = df_feminicidio_filtrado['meio_crime'].value_counts().reset_index()
-                meio_crime.columns = ['meio_crime', 'Quantidade']
+                localidade_crime = contar_valores_cubo(cubo_feminicidio_filtrado, 'localidade').reset_index()
+                localidade_crime.columns = ['localidade', 'Quantidade']
                 color_param = None
             else:
                 mapa_agrupamento_tabela = {
@@ -1879,914 +1920,957 @@ if not df_geral.empty and not df_feminicidio.empty and geojson_sc is not None an
                     "Associação": "associacao"
                 }
                 coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
-                meio_crime = df_feminicidio_filtrado.groupby(['meio_crime', coluna_agrupamento]).size().reset_index(name='Quantidade')
+                localidade_crime = somar_cubo(cubo_feminicidio_filtrado, ['localidade', coluna_agrupamento]).reset_index(name='Quantidade')
                 color_param = coluna_agrupamento
 
-            if chart_type_meio == "Barras":
-                fig_meio = px.bar(
-                    meio_crime, x='meio_crime', y='Quantidade', color=color_param,
-                    labels={'meio_crime': 'Meio Utilizado', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
-                )
-                if agrupamento_selecionado == "Consolidado":
-                    fig_meio.update_traces(marker_color='#8A2BE2')
-                fig_meio.update_traces(textposition='outside')
-            else:
-                pie_names = 'meio_crime' if agrupamento_selecionado == "Consolidado" else color_param
-                fig_meio = px.pie(
-                    meio_crime, names=pie_names, values='Quantidade',
-                    hole=.4, color_discrete_sequence=px.colors.sequential.Purples_r
-                )
-                fig_meio.update_traces(textinfo='percent+label', textposition='outside')
-            st.plotly_chart(fig_meio, use_container_width=True, key="meio_fem")
-        st.markdown("---")
-        
-        col_graf_fem1, col_graf_fem2 = st.columns(2)
-        with col_graf_fem1:
-            st.subheader("Distribuição de Idade da Vítima")
-            chart_type_idade_vitima = st.selectbox(
-                "Tipo de Gráfico",
-                ("Histograma", "Gráfico de Densidade"),
-                key="chart_type_idade_vitima"
-            )
-            df_idade_vitima = df_feminicidio_filtrado.dropna(subset=['idade_vitima'])
-            if chart_type_idade_vitima == "Histograma":
-                fig_idade_vitima = px.histogram(
-                    df_idade_vitima, x='idade_vitima', nbins=20,
-                    labels={'idade_vitima': 'Idade da Vítima', 'count': 'Quantidade'},
-                    template='plotly_white', color_discrete_sequence=['#8e24aa']
-                )
-            else: 
-                fig_idade_vitima = px.violin(
-                    df_idade_vitima, y='idade_vitima',
-                    labels={'idade_vitima': 'Idade da Vítima'},
-                    template='plotly_white', color_discrete_sequence=['#8e24aa'],
-                    box=True, points="all"
-                )
-            st.plotly_chart(fig_idade_vitima, use_container_width=True, key="idade_vitima_fem")
-        
-        with col_graf_fem2:
-            st.subheader("Distribuição de Idade do Autor")
-            chart_type_idade_autor = st.selectbox(
-                "Tipo de Gráfico",
-                ("Histograma", "Gráfico de Densidade"),
-                key="chart_type_idade_autor"
-            )
-            df_idade_autor = df_feminicidio_filtrado.dropna(subset=['idade_autor'])
-            if chart_type_idade_autor == "Histograma":
-                fig_idade_autor = px.histogram(
-                    df_idade_autor, x='idade_autor', nbins=20,
-                    labels={'idade_autor': 'Idade do Autor', 'count': 'Quantidade'},
-                    template='plotly_white', color_discrete_sequence=['#ab47bc']
-                )
-            else:
-                fig_idade_autor = px.violin(
-                    df_idade_autor, y='idade_autor',
-                    labels={'idade_autor': 'Idade do Autor'},
-                    template='plotly_white', color_discrete_sequence=['#ab47bc'],
-                    box=True, points="all"
-                )
-            st.plotly_chart(fig_idade_autor, use_container_width=True, key="idade_autor_fem")
-
-        st.markdown("---")
-
-        col_graf_fem3, col_graf_fem4 = st.columns(2)
-        with col_graf_fem3:
-            st.subheader("Vítima Possuía B.O. contra o Autor?")
-            chart_type_bo = st.selectbox(
-                "Tipo de Gráfico",
-                ("Pizza", "Barras"),
-                key="chart_type_bo"
-            )
-            bo_contra_autor = df_feminicidio_filtrado['bo_de_vd_contra_o_autor'].value_counts().reset_index()
-            bo_contra_autor.columns = ['Resposta', 'Quantidade']
-            
-            if chart_type_bo == "Barras":
-                fig_bo = px.bar(
-                    bo_contra_autor, x='Resposta', y='Quantidade',
-                    labels={'Resposta': 'Resposta', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
-                )
-                fig_bo.update_traces(marker_color='#8e24aa', textposition='outside')
-            else:
-                fig_bo = px.pie(
-                    bo_contra_autor, names='Resposta', values='Quantidade', hole=0.4,
-                    color_discrete_sequence=px.colors.sequential.Purples_r
-                )
-            st.plotly_chart(fig_bo, use_container_width=True, key="bo_fem")
-
-        with col_graf_fem4:
-            st.subheader("Autor Foi Preso?")
-            chart_type_preso = st.selectbox(
-                "Tipo de Gráfico",
-                ("Pizza", "Barras"),
-                key="chart_type_preso"
-            )
-            autor_preso = df_feminicidio_filtrado['autor_preso'].value_counts().reset_index()
-            autor_preso.columns = ['Resposta', 'Quantidade']
+            def figura_localidade(chart_type_localidade, localidade_crime, color_param, agrupamento_selecionado):
+                if chart_type_localidade == "Barras":
+                    fig_localidade = px.bar(
+                        localidade_crime, x='localidade', y='Quantidade', color=color_param,
+                        labels={'localidade': 'Localidade', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                    )
+                    if agrupamento_selecionado == "Consolidado":
+                        fig_localidade.update_traces(marker_color='#8A2BE2')
+                    fig_localidade.update_traces(textposition='outside')
+                else:
+                    pie_names = 'localidade' if agrupamento_selecionado == "Consolidado" else color_param
+                    fig_localidade = px.pie(
+                        localidade_crime, names=pie_names, values='Quantidade',
+                        hole=.4, color_discrete_sequence=px.colors.sequential.Purples_r
+                    )
+                    fig_localidade.update_traces(textinfo='percent+label', textposition='outside')
+                return fig_localidade
 
-            if chart_type_preso == "Barras":
-                fig_preso = px.bar(
-                    autor_preso, x='Resposta', y='Quantidade',
-                    labels={'Resposta': 'Resposta', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
-                )
-                fig_preso.update_traces(marker_color='#ab47bc', textposition='outside')
-            else:
-                fig_preso = px.pie(
-                    autor_preso, names='Resposta', values='Quantidade', hole=0.4,
-                    color_discrete_sequence=px.colors.sequential.Purples_r
-                )
-            st.plotly_chart(fig_preso, use_container_width=True, key="preso_fem")
-        
-        st.markdown("---")
+            exibir_grafico_selecionavel(("Barras", "Pizza"), "chart_type_localidade", "localidade_fem", figura_localidade, localidade_crime, color_param, agrupamento_selecionado)
         
-        st.subheader("Localidade do Crime")
-        chart_type_localidade = st.selectbox(
-            "Tipo de Gráfico",
-            ("Barras", "Pizza"),
-            key="chart_type_localidade"
-        )
-        if agrupamento_selecionado == "Consolidado":
-            localidade_crime = df_feminicidio_filtrado['localidade'].value_counts().reset_index()
-            localidade_crime.columns = ['localidade', 'Quantidade']
-            color_param = None
-        else:
-            mapa_agrupamento_tabela = {
-                "Município": "municipio",
-                "Mesorregião": "mesoregiao",
-                "Associação": "associacao"
-            }
-            coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
-            localidade_crime = df_feminicidio_filtrado.groupby(['localidade', coluna_agrupamento]).size().reset_index(name='Quantidade')
-            color_param = coluna_agrupamento
-
-        if chart_type_localidade == "Barras":
-            fig_localidade = px.bar(
-                localidade_crime, x='localidade', y='Quantidade', color=color_param,
-                labels={'localidade': 'Localidade', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
-            )
-            if agrupamento_selecionado == "Consolidado":
-                fig_localidade.update_traces(marker_color='#8A2BE2')
-            fig_localidade.update_traces(textposition='outside')
-        else:
-            pie_names = 'localidade' if agrupamento_selecionado == "Consolidado" else color_param
-            fig_localidade = px.pie(
-                localidade_crime, names=pie_names, values='Quantidade',
-                hole=.4, color_discrete_sequence=px.colors.sequential.Purples_r
-            )
-            fig_localidade.update_traces(textinfo='percent+label', textposition='outside')
-        st.plotly_chart(fig_localidade, use_container_width=True, key="localidade_fem")
-        
-        st.markdown("---")
+            st.markdown("---")
 
-        col_graf_fem5, col_graf_fem6 = st.columns(2)
-        with col_graf_fem5:
-            st.subheader("Autor com Registro de B.O.?")
-            chart_type_autor_bo = st.selectbox(
-                "Tipo de Gráfico",
-                ("Pizza", "Barras"),
-                key="chart_type_autor_bo"
-            )
-            autor_bo = df_feminicidio_filtrado['passagem_policial'].value_counts().reset_index()
-            autor_bo.columns = ['Resposta', 'Quantidade']
-            if chart_type_autor_bo == "Barras":
-                fig_autor_bo = px.bar(
-                    autor_bo, x='Resposta', y='Quantidade',
-                    labels={'Resposta': 'Resposta', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
-                )
-                fig_autor_bo.update_traces(marker_color='#8e24aa', textposition='outside')
-            else:
-                fig_autor_bo = px.pie(
-                    autor_bo, names='Resposta', values='Quantidade', hole=0.4,
-                    color_discrete_sequence=px.colors.sequential.Purples_r
-                )
-            st.plotly_chart(fig_autor_bo, use_container_width=True, key="autor_bo_fem")
-
-        with col_graf_fem6:
-            st.subheader("Autor com B.O. por Violência Doméstica?")
-            if 'passagem_por_violencia_domestica' in df_feminicidio_filtrado.columns:
-                chart_type_autor_bo_vd = st.selectbox(
-                    "Tipo de Gráfico",
-                    ("Pizza", "Barras"),
-                    key="chart_type_autor_bo_vd"
-                )
-                autor_bo_vd = df_feminicidio_filtrado['passagem_por_violencia_domestica'].value_counts().reset_index()
-                autor_bo_vd.columns = ['Resposta', 'Quantidade']
-                
-                if not autor_bo_vd.empty:
-                    if chart_type_autor_bo_vd == "Barras":
-                        fig_autor_bo_vd = px.bar(
-                            autor_bo_vd, x='Resposta', y='Quantidade',
+            col_graf_fem5, col_graf_fem6 = st.columns(2)
+            with col_graf_fem5:
+                st.subheader("Autor com Registro de B.O.?")
+                autor_bo = contar_valores_cubo(cubo_feminicidio_filtrado, 'passagem_policial').reset_index()
+                autor_bo.columns = ['Resposta', 'Quantidade']
+
+                def figura_autor_bo(chart_type_autor_bo, autor_bo):
+                    if chart_type_autor_bo == "Barras":
+                        fig_autor_bo = px.bar(
+                            autor_bo, x='Resposta', y='Quantidade',
                             labels={'Resposta': 'Resposta', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
                         )
-                        fig_autor_bo_vd.update_traces(marker_color='#ab47bc', textposition='outside')
+                        fig_autor_bo.update_traces(marker_color='#8e24aa', textposition='outside')
                     else:
-                        fig_autor_bo_vd = px.pie(
-                            autor_bo_vd, names='Resposta', values='Quantidade', hole=0.4,
+                        fig_autor_bo = px.pie(
+                            autor_bo, names='Resposta', values='Quantidade', hole=0.4,
                             color_discrete_sequence=px.colors.sequential.Purples_r
                         )
-                    st.plotly_chart(fig_autor_bo_vd, use_container_width=True, key="autor_bo_vd_fem")
+                    return fig_autor_bo
+
+                exibir_grafico_selecionavel(("Pizza", "Barras"), "chart_type_autor_bo", "autor_bo_fem", figura_autor_bo, autor_bo)
+
+            with col_graf_fem6:
+                st.subheader("Autor com B.O. por Violência Doméstica?")
+                if 'passagem_por_violencia_domestica' in df_feminicidio_filtrado.columns:
+                    autor_bo_vd = contar_valores_cubo(cubo_feminicidio_filtrado, 'passagem_por_violencia_domestica').reset_index()
+                    autor_bo_vd.columns = ['Resposta', 'Quantidade']
+
+                    @st.fragment
+                    def exibir_grafico_autor_bo_vd(autor_bo_vd):
+                        """Gráfico de B.O. por violência doméstica do autor; trocar o tipo reexecuta só este gráfico."""
+                        chart_type_autor_bo_vd = st.selectbox(
+                            "Tipo de Gráfico",
+                            ("Pizza", "Barras"),
+                            key="chart_type_autor_bo_vd"
+                        )
+
+                        if not autor_bo_vd.empty:
+                            if chart_type_autor_bo_vd == "Barras":
+                                fig_autor_bo_vd = px.bar(
+                                    autor_bo_vd, x='Resposta', y='Quantidade',
+                                    labels={'Resposta': 'Resposta', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                                )
+                                fig_autor_bo_vd.update_traces(marker_color='#ab47bc', textposition='outside')
+                            else:
+                                fig_autor_bo_vd = px.pie(
+                                    autor_bo_vd, names='Resposta', values='Quantidade', hole=0.4,
+                                    color_discrete_sequence=px.colors.sequential.Purples_r
+                                )
+                            st.plotly_chart(fig_autor_bo_vd, use_container_width=True, key="autor_bo_vd_fem")
+                        else:
+                            st.info("Não há dados sobre B.O. por violência doméstica para os filtros selecionados.")
+
+                    exibir_grafico_autor_bo_vd(autor_bo_vd)
                 else:
-                    st.info("Não há dados sobre B.O. por violência doméstica para os filtros selecionados.")
-            else:
-                st.warning("A coluna 'Passagem por Violência Doméstica' não foi encontrada na base de dados.")
+                    st.warning("A coluna 'Passagem por Violência Doméstica' não foi encontrada na base de dados.")
 
-        st.markdown("---")
+            st.markdown("---")
 
-        st.subheader("Quantidade de Feminicídios por Mês/Ano")
-        chart_type_fem_mes_ano = st.selectbox(
-            "Tipo de Gráfico",
-            ("Barras", "Linha", "Área"),
-            key="chart_type_fem_mes_ano"
-        )
-        df_feminicidio_filtrado['ano_mes'] = df_feminicidio_filtrado['data_fato'].dt.to_period('M').astype(str)
-        if agrupamento_selecionado == "Consolidado":
-            feminicidios_por_mes = df_feminicidio_filtrado.groupby('ano_mes').size().reset_index(name='Quantidade')
-            color_param = None
-        else:
-            mapa_agrupamento_tabela = {
-                "Município": "municipio",
-                "Mesorregião": "mesoregiao",
-                "Associação": "associacao"
-            }
-            coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
-            feminicidios_por_mes = df_feminicidio_filtrado.groupby(['ano_mes', coluna_agrupamento]).size().reset_index(name='Quantidade')
-            color_param = coluna_agrupamento
-        feminicidios_por_mes.rename(columns={'ano_mes': 'Mês/Ano'}, inplace=True)
-        if chart_type_fem_mes_ano == "Linha":
-            fig_mes_ano = px.line(
-                feminicidios_por_mes, x='Mês/Ano', y='Quantidade', color=color_param,
-                labels={'x': 'Mês/Ano', 'y': 'Quantidade'},
-                template='plotly_white', markers=True
-            )
+            st.subheader("Quantidade de Feminicídios ao Longo do Tempo")
             if agrupamento_selecionado == "Consolidado":
-                fig_mes_ano.update_traces(line_color='#8A2BE2')
-        elif chart_type_fem_mes_ano == "Área":
-            fig_mes_ano = px.area(
-                feminicidios_por_mes, x='Mês/Ano', y='Quantidade', color=color_param,
-                labels={'x': 'Mês/Ano', 'y': 'Quantidade'},
-                template='plotly_white'
+                color_param = None
+            else:
+                mapa_agrupamento_tabela = {
+                    "Município": "municipio",
+                    "Mesorregião": "mesoregiao",
+                    "Associação": "associacao"
+                }
+                color_param = mapa_agrupamento_tabela[agrupamento_selecionado]
+            serie_feminicidios, grupos_feminicidios = cache_resultados.obter(
+                chave_filtros(consulta='serie_diaria_feminicidio', agrupamento=agrupamento_selecionado, **estado_filtros),
+                lambda: serie_diaria_cubo(
+                    ocorrencias_diarias('feminicidio', df_feminicidio_filtrado, selecoes_filtro, intervalos_filtro, *periodo_selecionado),
+                    *periodo_selecionado, coluna=color_param
+                )
             )
-            if agrupamento_selecionado == "Consolidado":
-                fig_mes_ano.update_traces(line_color='#8A2BE2')
-        else: # Barras
-            fig_mes_ano = px.bar(
-                feminicidios_por_mes, x='Mês/Ano', y='Quantidade', color=color_param,
-                labels={'x': 'Mês/Ano', 'y': 'Quantidade'},
-                template='plotly_white', text='Quantidade'
+
+            def figura_fem_mes_ano(chart_type_fem_mes_ano, feminicidios_por_periodo, color_param, agrupamento_selecionado):
+                feminicidios_por_periodo = feminicidios_por_periodo.rename(columns={'periodo': 'Período', 'quantidade': 'Quantidade'})
+                if chart_type_fem_mes_ano == "Linha":
+                    fig_mes_ano = px.line(
+                        feminicidios_por_periodo, x='Período', y='Quantidade', color=color_param,
+                        labels={'x': 'Período', 'y': 'Quantidade'},
+                        template='plotly_white', markers=True
+                    )
+                    if agrupamento_selecionado == "Consolidado":
+                        fig_mes_ano.update_traces(line_color='#8A2BE2')
+                elif chart_type_fem_mes_ano == "Área":
+                    fig_mes_ano = px.area(
+                        feminicidios_por_periodo, x='Período', y='Quantidade', color=color_param,
+                        labels={'x': 'Período', 'y': 'Quantidade'},
+                        template='plotly_white'
+                    )
+                    if agrupamento_selecionado == "Consolidado":
+                        fig_mes_ano.update_traces(line_color='#8A2BE2')
+                else: # Barras
+                    fig_mes_ano = px.bar(
+                        feminicidios_por_periodo, x='Período', y='Quantidade', color=color_param,
+                        labels={'x': 'Período', 'y': 'Quantidade'},
+                        template='plotly_white', text='Quantidade'
+                    )
+                    if agrupamento_selecionado == "Consolidado":
+                        fig_mes_ano.update_traces(marker_color='#8A2BE2')
+                    fig_mes_ano.update_traces(textposition='outside')
+                return fig_mes_ano
+
+            exibir_serie_temporal(
+                ("Barras", "Linha", "Área"), "chart_type_fem_mes_ano", "granularidade_fem", "mes_ano_fem", figura_fem_mes_ano,
+                serie_feminicidios, periodo_selecionado[0], grupos_feminicidios, color_param, color_param, agrupamento_selecionado
             )
-            if agrupamento_selecionado == "Consolidado":
-                fig_mes_ano.update_traces(marker_color='#8A2BE2')
-            fig_mes_ano.update_traces(textposition='outside')
-        st.plotly_chart(fig_mes_ano, use_container_width=True, key="mes_ano_fem")
         
-        st.markdown("---")
+            st.markdown("---")
 
-        st.subheader("Quantidade de Feminicídios por Ano")
-        chart_type_fem_ano = st.selectbox(
-            "Tipo de Gráfico",
-            ("Barras", "Linha", "Área"),
-            key="chart_type_fem_ano"
-        )
-        if agrupamento_selecionado == "Consolidado":
-            feminicidios_por_ano = df_feminicidio_filtrado['ano'].value_counts().sort_index().reset_index()
-            feminicidios_por_ano.columns = ['ano', 'Quantidade']
-            color_param = None
-        else:
-            mapa_agrupamento_tabela = {
-                "Município": "municipio",
-                "Mesorregião": "mesoregiao",
-                "Associação": "associacao"
-            }
-            coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
-            feminicidios_por_ano = df_feminicidio_filtrado.groupby(['ano', coluna_agrupamento]).size().reset_index(name='Quantidade')
-            color_param = coluna_agrupamento
-        
-        if chart_type_fem_ano == "Linha":
-            fig_ano_fem = px.line(
-                feminicidios_por_ano, x='ano', y='Quantidade', color=color_param,
-                labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white', markers=True
-            )
+            st.subheader("Quantidade de Feminicídios por Ano")
             if agrupamento_selecionado == "Consolidado":
-                fig_ano_fem.update_traces(line_color='#6a1b9a')
-        elif chart_type_fem_ano == "Área":
-            fig_ano_fem = px.area(
-                feminicidios_por_ano, x='ano', y='Quantidade', color=color_param,
-                labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white'
-            )
-            if agrupamento_selecionado == "Consolidado":
-                fig_ano_fem.update_traces(line_color='#6a1b9a')
-        else: # Barras
-            fig_ano_fem = px.bar(
-                feminicidios_por_ano, x='ano', y='Quantidade', color=color_param,
-                labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
-            )
-            if agrupamento_selecionado == "Consolidado":
-                fig_ano_fem.update_traces(marker_color='#6a1b9a')
-            fig_ano_fem.update_traces(textposition='outside')
-        st.plotly_chart(fig_ano_fem, use_container_width=True, key="ano_fem")
+                feminicidios_por_ano = somar_cubo(cubo_feminicidio_filtrado, 'ano').reset_index()
+                feminicidios_por_ano.columns = ['ano', 'Quantidade']
+                color_param = None
+            else:
+                mapa_agrupamento_tabela = {
+                    "Município": "municipio",
+                    "Mesorregião": "mesoregiao",
+                    "Associação": "associacao"
+                }
+                coluna_agrupamento = mapa_agrupamento_tabela[agrupamento_selecionado]
+                feminicidios_por_ano = somar_cubo(cubo_feminicidio_filtrado, ['ano', coluna_agrupamento]).reset_index(name='Quantidade')
+                color_param = coluna_agrupamento
 
-        st.markdown("---")
+            def figura_fem_ano(chart_type_fem_ano, feminicidios_por_ano, color_param, agrupamento_selecionado):
+                if chart_type_fem_ano == "Linha":
+                    fig_ano_fem = px.line(
+                        feminicidios_por_ano, x='ano', y='Quantidade', color=color_param,
+                        labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white', markers=True
+                    )
+                    if agrupamento_selecionado == "Consolidado":
+                        fig_ano_fem.update_traces(line_color='#6a1b9a')
+                elif chart_type_fem_ano == "Área":
+                    fig_ano_fem = px.area(
+                        feminicidios_por_ano, x='ano', y='Quantidade', color=color_param,
+                        labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white'
+                    )
+                    if agrupamento_selecionado == "Consolidado":
+                        fig_ano_fem.update_traces(line_color='#6a1b9a')
+                else: # Barras
+                    fig_ano_fem = px.bar(
+                        feminicidios_por_ano, x='ano', y='Quantidade', color=color_param,
+                        labels={'ano': 'Ano', 'Quantidade': 'Quantidade'}, template='plotly_white', text='Quantidade'
+                    )
+                    if agrupamento_selecionado == "Consolidado":
+                        fig_ano_fem.update_traces(marker_color='#6a1b9a')
+                    fig_ano_fem.update_traces(textposition='outside')
+                return fig_ano_fem
+
+            exibir_grafico_selecionavel(("Barras", "Linha", "Área"), "chart_type_fem_ano", "ano_fem", figura_fem_ano, feminicidios_por_ano, color_param, agrupamento_selecionado)
+
+            st.markdown("---")
 
-        if agrupamento_selecionado != "Consolidado":
-            mapa_agrupamento_tabela = {
-                "Município": "municipio",
-                "Mesorregião": "mesoregiao",
-                "Associação": "associacao"
-            }
-            coluna_agrupamento_tabela = mapa_agrupamento_tabela[agrupamento_selecionado]
+            if agrupamento_selecionado != "Consolidado":
+                mapa_agrupamento_tabela = {
+                    "Município": "municipio",
+                    "Mesorregião": "mesoregiao",
+                    "Associação": "associacao"
+                }
+                coluna_agrupamento_tabela = mapa_agrupamento_tabela[agrupamento_selecionado]
+                nome_coluna_agrupamento = f"Nome do {agrupamento_selecionado}" if agrupamento_selecionado == "Município" else agrupamento_selecionado
             
-            st.subheader(f"Tabela Consolidada de Feminicídios por {agrupamento_selecionado}")
-            if not df_feminicidio_filtrado.empty:
-                tabela_feminicidio = criar_tabela_feminicidio_agrupado(df_feminicidio_filtrado, coluna_agrupamento_tabela, agrupamento_selecionado)
-                if not tabela_feminicidio.empty:
-                    colunas_evolucao = [col for col in tabela_feminicidio.columns if 'Diferença' in str(col)]
-                    format_dict = {col: formatar_seta_percentual for col in colunas_evolucao}
-                    anos_int = [col for col in tabela_feminicidio.columns if isinstance(col, int)]
-                    for ano in anos_int:
-                        format_dict[ano] = '{:.0f}'
-                    format_dict['total'] = '{:.0f}'
-                    format_dict['Tendência (CAGR %)'] = '{:+.1f}%'
+                st.subheader(f"Tabela Consolidada de Feminicídios por {agrupamento_selecionado}")
+                if not df_feminicidio_filtrado.empty:
+                    tabela_feminicidio = cache_resultados.obter(
+                        chave_filtros(consulta='tabela_feminicidio', agrupamento=agrupamento_selecionado, **estado_filtros),
+                        lambda: criar_tabela_evolucao_anual(df_feminicidio_filtrado, [coluna_agrupamento_tabela], {coluna_agrupamento_tabela: nome_coluna_agrupamento})
+                    )
+                    if not tabela_feminicidio.empty:
+                        colunas_evolucao = [col for col in tabela_feminicidio.columns if 'Diferença' in str(col)]
+                        format_dict = {col: formatar_seta_percentual for col in colunas_evolucao}
+                        anos_int = [col for col in tabela_feminicidio.columns if isinstance(col, int)]
+                        for ano in anos_int:
+                            format_dict[ano] = '{:.0f}'
+                        format_dict['total'] = '{:.0f}'
+                        format_dict['Tendência (CAGR %)'] = '{:+.1f}%'
                     
-                    colunas_para_colorir = colunas_evolucao[:]
-                    if 'Tendência (CAGR %)' in tabela_feminicidio.columns:
-                        colunas_para_colorir.append('Tendência (CAGR %)')
-
-                    styler = tabela_feminicidio.style.applymap(
-                        colorir_percentual,
-                        subset=colunas_para_colorir
-                    ).format(format_dict)
+                        colunas_para_colorir = colunas_evolucao[:]
+                        if 'Tendência (CAGR %)' in tabela_feminicidio.columns:
+                            colunas_para_colorir.append('Tendência (CAGR %)')
+
+                        styler = tabela_feminicidio.style.applymap(
+                            colorir_percentual,
+                            subset=colunas_para_colorir
+                        ).format(format_dict)
                     
-                    st.dataframe(styler, use_container_width=True)
+                        st.dataframe(styler, use_container_width=True)
+                    else:
+                        st.warning("Não há dados para exibir na tabela de feminicídios com os filtros selecionados.")
                 else:
                     st.warning("Não há dados para exibir na tabela de feminicídios com os filtros selecionados.")
             else:
-                st.warning("Não há dados para exibir na tabela de feminicídios com os filtros selecionados.")
-        else:
-            st.subheader("Tabela Consolidada de Feminicídios (Total SC)")
-            if not df_feminicidio_filtrado.empty:
-                tabela_total_fem = criar_tabela_total_feminicidio(df_feminicidio_filtrado)
-                if not tabela_total_fem.empty:
-                    colunas_evolucao = [col for col in tabela_total_fem.columns if 'Diferença' in str(col)]
-                    format_dict = {col: formatar_seta_percentual for col in colunas_evolucao}
-                    anos_int = [col for col in tabela_total_fem.columns if isinstance(col, int)]
-                    for ano in anos_int:
-                        format_dict[ano] = '{:.0f}'
-                    format_dict['total'] = '{:.0f}'
-                    format_dict['Tendência (CAGR %)'] = '{:+.1f}%'
-
-                    colunas_para_colorir = colunas_evolucao[:]
-                    if 'Tendência (CAGR %)' in tabela_total_fem.columns:
-                        colunas_para_colorir.append('Tendência (CAGR %)')
-
-                    styler = tabela_total_fem.style.applymap(
-                        colorir_percentual,
-                        subset=colunas_para_colorir
-                    ).format(format_dict)
+                st.subheader("Tabela Consolidada de Feminicídios (Total SC)")
+                if not df_feminicidio_filtrado.empty:
+                    tabela_total_fem = cache_resultados.obter(
+                        chave_filtros(consulta='tabela_total_feminicidio', **estado_filtros),
+                        lambda: criar_tabela_evolucao_anual(df_feminicidio_filtrado.assign(tipo_de_crime='Feminicídio'), ['tipo_de_crime'], {'tipo_de_crime': 'Tipo de Crime'})
+                    )
+                    if not tabela_total_fem.empty:
+                        colunas_evolucao = [col for col in tabela_total_fem.columns if 'Diferença' in str(col)]
+                        format_dict = {col: formatar_seta_percentual for col in colunas_evolucao}
+                        anos_int = [col for col in tabela_total_fem.columns if isinstance(col, int)]
+                        for ano in anos_int:
+                            format_dict[ano] = '{:.0f}'
+                        format_dict['total'] = '{:.0f}'
+                        format_dict['Tendência (CAGR %)'] = '{:+.1f}%'
+
+                        colunas_para_colorir = colunas_evolucao[:]
+                        if 'Tendência (CAGR %)' in tabela_total_fem.columns:
+                            colunas_para_colorir.append('Tendência (CAGR %)')
+
+                        styler = tabela_total_fem.style.applymap(
+                            colorir_percentual,
+                            subset=colunas_para_colorir
+                        ).format(format_dict)
                     
-                    st.dataframe(styler, use_container_width=True)
+                        st.dataframe(styler, use_container_width=True)
+                    else:
+                        st.warning("Não há dados para exibir na tabela de feminicídios com os filtros selecionados.")
                 else:
                     st.warning("Não há dados para exibir na tabela de feminicídios com os filtros selecionados.")
-            else:
-                st.warning("Não há dados para exibir na tabela de feminicídios com os filtros selecionados.")
 
-with tab_analises_avancadas:
-    st.header("Análises Avançadas sobre a Violência")
-    st.markdown("Explore métricas e correlações mais profundas para entender as dinâmicas da violência contra a mulher em Santa Catarina.")
+            if df_geral_filtrado.empty:
+                st.error("🚨 Dados não carregados. Verifique os arquivos em `data/`.")
+                st.warning("Certifique-se de que os arquivos `base_geral.xlsx` e `base_feminicidio.xlsx` existem na pasta `data`.")
+
+if tab_analises_avancadas.open:
+    with tab_analises_avancadas:
+        st.header("Análises Avançadas sobre a Violência")
+        st.markdown("Explore métricas e correlações mais profundas para entender as dinâmicas da violência contra a mulher em Santa Catarina.")
     
-    with st.expander("📈 Índice de Letalidade da Violência", expanded=False):
-        st.header("Índice de Letalidade da Violência")
-        st.markdown("""
-        **A Grande Pergunta:** Qual a probabilidade de uma denúncia de violência em um determinado município escalar para um feminicídio?
+        secao_letalidade = st.expander("📈 Índice de Letalidade da Violência", expanded=False, key="secao_letalidade", on_change="rerun")
+        if secao_letalidade.open:
+            with secao_letalidade:
+                st.header("Índice de Letalidade da Violência")
+                st.markdown("""
+                **A Grande Pergunta:** Qual a probabilidade de uma denúncia de violência em um determinado município escalar para um feminicídio?
 
-        Este índice diferencia o volume de denúncias da **falha fatal do sistema de prevenção**. Um município pode ter poucas denúncias, mas uma alta taxa de letalidade, indicando um problema gravíssimo e silencioso. O índice é calculado como:
+                Este índice diferencia o volume de denúncias da **falha fatal do sistema de prevenção**. Um município pode ter poucas denúncias, mas uma alta taxa de letalidade, indicando um problema gravíssimo e silencioso. O índice é calculado como:
         
-        `Índice = (Total de Feminicídios / (Total de Ocorrências de Violência + Total de Feminicídios)) * 100`
+                `Índice = (Total de Feminicídios / (Total de Ocorrências de Violência + Total de Feminicídios)) * 100`
 
-        Isso representa: *"Para cada 100 ocorrências de violência contra a mulher, X resultam em morte."*
-        """)
+                Isso representa: *"Para cada 100 ocorrências de violência contra a mulher, X resultam em morte."*
+                """)
         
-        # O agrupamento "Consolidado" não faz sentido para este índice, pois queremos comparar localidades.
-        if agrupamento_selecionado == "Consolidado":
-            st.warning("Por favor, selecione um nível de agrupamento (Município, Mesorregião ou Associação) para visualizar o Índice de Letalidade.")
-        else:
-            # Calcular o índice
-            df_letalidade_calculado = calcular_indice_letalidade(df_geral_filtrado, df_feminicidio_filtrado, agrupamento_selecionado)
+                # O agrupamento "Consolidado" não faz sentido para este índice, pois queremos comparar localidades.
+                if agrupamento_selecionado == "Consolidado":
+                    st.warning("Por favor, selecione um nível de agrupamento (Município, Mesorregião ou Associação) para visualizar o Índice de Letalidade.")
+                else:
+                    # Calcular o índice
+                    df_letalidade_calculado = calcular_indice_letalidade(df_geral_filtrado, df_feminicidio_filtrado, agrupamento_selecionado)
             
-            if df_letalidade_calculado.empty:
-                st.info("Não há dados suficientes para calcular o Índice de Letalidade com os filtros selecionados.")
-            else:
-                st.subheader(f"Mapa Coroplético do Índice de Letalidade por {agrupamento_selecionado}")
-
-                if agrupamento_selecionado == "Município":
-                    map_df_letalidade = df_letalidade_calculado.rename(columns={'localidade': 'municipio_normalizado'})
-                else: 
-                    mapa_grupo_para_indice = df_letalidade_calculado.set_index('localidade')['indice_letalidade']
-                    
-                    coluna_agrupamento = "mesoregiao" if agrupamento_selecionado == "Mesorregião" else "associacao"
-                    
-                    municipios_no_filtro = df_geral_filtrado[['municipio_normalizado', coluna_agrupamento]].drop_duplicates()
-                    
-                    municipios_no_filtro['indice_letalidade'] = municipios_no_filtro[coluna_agrupamento].map(mapa_grupo_para_indice)
-                    map_df_letalidade = municipios_no_filtro.fillna(0)
-
-                fig_mapa_letalidade = px.choropleth_mapbox(
-                    map_df_letalidade, 
-                    geojson=geojson_sc, 
-                    locations='municipio_normalizado',
-                    featureidkey="properties.NM_MUN_NORMALIZADO", 
-                    color='indice_letalidade',
-                    color_continuous_scale="OrRd", 
-                    mapbox_style="carto-positron",
-                    zoom=6, 
-                    center={"lat": -27.59, "lon": -50.52}, 
-                    opacity=0.7,
-                    labels={'indice_letalidade': f'Índice de Letalidade (a cada 100 eventos)'}
-                )
-                fig_mapa_letalidade.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
-                st.plotly_chart(fig_mapa_letalidade, use_container_width=True, key="mapa_letalidade")
+                    if df_letalidade_calculado.empty:
+                        st.info("Não há dados suficientes para calcular o Índice de Letalidade com os filtros selecionados.")
+                    else:
+                        st.subheader(f"Mapa Coroplético do Índice de Letalidade por {agrupamento_selecionado}")
+
+                        if agrupamento_selecionado == "Município":
+                            geojson_letalidade, featureidkey_letalidade = geojson_mapas, "properties.NM_MUN_NORMALIZADO"
+                        else: 
+                            coluna_agrupamento = "mesoregiao" if agrupamento_selecionado == "Mesorregião" else "associacao"
+                            geojson_letalidade, featureidkey_letalidade = carregar_geojson_agrupado(coluna_agrupamento), "properties.grupo"
+
+                        fig_mapa_letalidade = px.choropleth_mapbox(
+                            df_letalidade_calculado, 
+                            geojson=geojson_letalidade, 
+                            locations='localidade',
+                            featureidkey=featureidkey_letalidade, 
+                            color='indice_letalidade',
+                            color_continuous_scale="OrRd", 
+                            mapbox_style="carto-positron",
+                            zoom=6, 
+                            center={"lat": -27.59, "lon": -50.52}, 
+                            opacity=0.7,
+                            labels={'indice_letalidade': f'Índice de Letalidade (a cada 100 eventos)'}
+                        )
+                        fig_mapa_letalidade.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+                        st.plotly_chart(fig_mapa_letalidade, use_container_width=True, key="mapa_letalidade")
 
-                st.markdown("---")
+                        st.markdown("---")
                 
-                st.subheader(f"Ranking do Índice de Letalidade por {agrupamento_selecionado}")
-                st.markdown("A tabela abaixo classifica as localidades com maior risco de letalidade. O índice alto, mesmo com poucas ocorrências, é um sinal de alerta.")
+                        st.subheader(f"Ranking do Índice de Letalidade por {agrupamento_selecionado}")
+                        st.markdown("A tabela abaixo classifica as localidades com maior risco de letalidade. O índice alto, mesmo com poucas ocorrências, é um sinal de alerta.")
                 
-                # Formatar a tabela de ranking
-                df_ranking = df_letalidade_calculado.rename(columns={
-                    'localidade': agrupamento_selecionado,
-                    'total_eventos': 'Total de Eventos (Ocorrências + Feminicídios)',
-                    'total_ocorrencias': 'Ocorrências de Violência',
-                    'total_feminicidios': 'Feminicídios',
-                    'indice_letalidade': 'Índice de Letalidade'
-                }).set_index(agrupamento_selecionado)
-
-                st.dataframe(
-                    df_ranking.style.format({
-                        'Índice de Letalidade': '{:.2f}',
-                        'Total de Eventos (Ocorrências + Feminicídios)': '{:.0f}',
-                        'Ocorrências de Violência': '{:.0f}',
-                        'Feminicídios': '{:.0f}'
-                    }).background_gradient(cmap='OrRd', subset=['Índice de Letalidade']),
-                    use_container_width=True
-                )
+                        # Formatar a tabela de ranking
+                        df_ranking = df_letalidade_calculado.rename(columns={
+                            'localidade': agrupamento_selecionado,
+                            'total_eventos': 'Total de Eventos (Ocorrências + Feminicídios)',
+                            'total_ocorrencias': 'Ocorrências de Violência',
+                            'total_feminicidios': 'Feminicídios',
+                            'indice_letalidade': 'Índice de Letalidade'
+                        }).set_index(agrupamento_selecionado)
+
+                        st.dataframe(
+                            df_ranking.style.format({
+                                'Índice de Letalidade': '{:.2f}',
+                                'Total de Eventos (Ocorrências + Feminicídios)': '{:.0f}',
+                                'Ocorrências de Violência': '{:.0f}',
+                                'Feminicídios': '{:.0f}'
+                            }).background_gradient(cmap='OrRd', subset=['Índice de Letalidade']),
+                            use_container_width=True
+                        )
 
-    with st.expander("🎯 Análise de Vulnerabilidade", expanded=False):
-        st.header("Análise de Vulnerabilidade por Faixa Etária e Tipo de Crime")
-        st.markdown("""
-        Esta análise segmenta o problema por demografia, em vez de geografia, para identificar janelas de vulnerabilidade específicas na vida de uma mulher para certos tipos de crime. O objetivo é permitir a criação de campanhas de prevenção e políticas de proteção mais direcionadas.
+        secao_vulnerabilidade = st.expander("🎯 Análise de Vulnerabilidade", expanded=False, key="secao_vulnerabilidade", on_change="rerun")
+        if secao_vulnerabilidade.open:
+            with secao_vulnerabilidade:
+                st.header("Análise de Vulnerabilidade por Faixa Etária e Tipo de Crime")
+                st.markdown("""
+                Esta análise segmenta o problema por demografia, em vez de geografia, para identificar janelas de vulnerabilidade específicas na vida de uma mulher para certos tipos de crime. O objetivo é permitir a criação de campanhas de prevenção e políticas de proteção mais direcionadas.
         
-        **A grande questão:** O perfil da violência muda drasticamente conforme a idade da vítima?
-        """)
+                **A grande questão:** O perfil da violência muda drasticamente conforme a idade da vítima?
+                """)
 
-        st.subheader("Visualização da Distribuição de Crimes por Faixa Etária")
+                st.subheader("Visualização da Distribuição de Crimes por Faixa Etária")
         
-        df_vulnerabilidade = df_geral_filtrado.dropna(subset=['idade_vitima']).copy()
-        bins = [0, 12, 17, 29, 40, 50, 60, 70, 79, 120]
-        labels = ['0-12 anos', '13-17 anos', '18-29 anos', '30-40 anos', '41-50 anos', '51-60 anos', '61-70 anos', '71-79 anos', '80+ anos']
-        df_vulnerabilidade['faixa_etaria'] = pd.cut(df_vulnerabilidade['idade_vitima'], bins=bins, labels=labels, right=True)
+                # Contagens por faixa etária (pré-calculada na carga) e tipo de crime, usadas pelos dois gráficos.
+                possui_idade = cubo_geral_filtrado['quantidade_idade_vitima'].sum() > 0
+                crime_counts = somar_cubo(cubo_geral_filtrado, ['faixa_etaria', 'fato_comunicado']).unstack(fill_value=0).reindex(FAIXAS_ETARIAS, fill_value=0)
 
-        if not df_vulnerabilidade.empty:
-            crime_counts = df_vulnerabilidade.groupby(['faixa_etaria', 'fato_comunicado']).size().unstack(fill_value=0)
+                if possui_idade:
             
-            crime_percentages = crime_counts.div(crime_counts.sum(axis=1), axis=0) * 100
+                    crime_percentages = crime_counts.div(crime_counts.sum(axis=1), axis=0) * 100
             
-            crime_percentages = crime_percentages.reset_index()
+                    crime_percentages = crime_percentages.reset_index()
             
-            df_plot = crime_percentages.melt(
-                id_vars='faixa_etaria', 
-                var_name='fato_comunicado', 
-                value_name='percentual'
-            )
+                    df_plot = crime_percentages.melt(
+                        id_vars='faixa_etaria', 
+                        var_name='fato_comunicado', 
+                        value_name='percentual'
+                    )
 
-            fig_barras_vulnerabilidade = px.bar(
-                df_plot,
-                x='faixa_etaria',
-                y='percentual',
-                color='fato_comunicado',
-                title="Distribuição Percentual de Tipos de Crime por Faixa Etária",
-                labels={'faixa_etaria': 'Faixa Etária da Vítima', 'percentual': 'Percentual de Ocorrências (%)', 'fato_comunicado': 'Tipo de Crime'},
-                template='plotly_white',
-                color_discrete_sequence=px.colors.sequential.Purples_r
-            )
-            fig_barras_vulnerabilidade.update_layout(
-                barmode='stack',
-                yaxis_ticksuffix='%'
-            )
-            st.plotly_chart(fig_barras_vulnerabilidade, use_container_width=True, key="barras_vulnerabilidade")
-        else:
-            st.warning("Não há dados suficientes para gerar o gráfico de vulnerabilidade com os filtros selecionados.")
+                    fig_barras_vulnerabilidade = px.bar(
+                        df_plot,
+                        x='faixa_etaria',
+                        y='percentual',
+                        color='fato_comunicado',
+                        title="Distribuição Percentual de Tipos de Crime por Faixa Etária",
+                        labels={'faixa_etaria': 'Faixa Etária da Vítima', 'percentual': 'Percentual de Ocorrências (%)', 'fato_comunicado': 'Tipo de Crime'},
+                        template='plotly_white',
+                        color_discrete_sequence=px.colors.sequential.Purples_r
+                    )
+                    fig_barras_vulnerabilidade.update_layout(
+                        barmode='stack',
+                        yaxis_ticksuffix='%'
+                    )
+                    st.plotly_chart(fig_barras_vulnerabilidade, use_container_width=True, key="barras_vulnerabilidade")
+                else:
+                    st.warning("Não há dados suficientes para gerar o gráfico de vulnerabilidade com os filtros selecionados.")
 
-        st.markdown("---")
+                st.markdown("---")
 
-        st.subheader("Análise de Concentração: Heatmap de Crimes por Faixa Etária")
-        st.markdown("""
-        O heatmap abaixo mostra a concentração de tipos de crime em cada faixa etária. Células mais escuras indicam uma maior concentração (em números absolutos), destacando quais crimes são mais prevalentes em determinados períodos da vida da mulher.
-        """)
+                st.subheader("Análise de Concentração: Heatmap de Crimes por Faixa Etária")
+                st.markdown("""
+                O heatmap abaixo mostra a concentração de tipos de crime em cada faixa etária. Células mais escuras indicam uma maior concentração (em números absolutos), destacando quais crimes são mais prevalentes em determinados períodos da vida da mulher.
+                """)
 
-        if not df_vulnerabilidade.empty:
-            crime_counts_heatmap = df_vulnerabilidade.groupby(['faixa_etaria', 'fato_comunicado']).size().unstack(fill_value=0)
+                if possui_idade:
+                    crime_counts_heatmap = crime_counts
             
-            fig_heatmap = go.Figure(data=go.Heatmap(
-                z=crime_counts_heatmap.values,
-                x=crime_counts_heatmap.columns,
-                y=crime_counts_heatmap.index,
-                colorscale='Purples',
-                hoverongaps=False
-            ))
-
-            fig_heatmap.update_layout(
-                title="Concentração de Crimes (Absoluto) por Faixa Etária e Tipo",
-                xaxis_title="Tipo de Crime",
-                yaxis_title="Faixa Etária da Vítima",
-            )
-            st.plotly_chart(fig_heatmap, use_container_width=True, key="heatmap_vulnerabilidade")
-        else:
-            st.warning("Não há dados suficientes para gerar o heatmap com os filtros selecionados.")
-
-    with st.expander("🔎 Efetividade da Denúncia", expanded=False):
-        st.header("Índice de Efetividade da Denúncia")
-        st.markdown("""
-        **A Grande Pergunta:** Em um município, um alto número de denúncias de crimes "menores" (como ameaça) está correlacionado a um menor número de crimes graves (lesão corporal, feminicídio)? Ou seja, a denúncia está funcionando como um mecanismo de prevenção eficaz?
-
-        Este é um proxy para medir a efetividade da resposta do sistema de segurança e apoio. Um sistema eficaz deveria intervir após a primeira denúncia, impedindo a escalada da violência.
-        """)
-
-        crimes_leves = ["Ameaça", "Vias de Fato"]
-        crimes_graves = ["Lesão Corporal Dolosa", "Estupro", "Feminicídio"]
-
-        if not df_geral_filtrado.empty and not df_populacao.empty:
-            df_leves = df_geral_filtrado[df_geral_filtrado['fato_comunicado'].isin(crimes_leves)]
-            contagem_leves = df_leves.groupby('municipio_normalizado').size().reset_index(name='total_crimes_leves')
-
-            df_graves = df_geral_filtrado[df_geral_filtrado['fato_comunicado'].isin(crimes_graves)]
-            contagem_graves = df_graves.groupby('municipio_normalizado').size().reset_index(name='total_crimes_graves')
-
-            df_efetividade = pd.merge(contagem_leves, contagem_graves, on='municipio_normalizado', how='outer').fillna(0)
-
-            df_efetividade = pd.merge(df_efetividade, df_populacao[['municipio_normalizado', 'municipio', 'populacao_feminina']], on='municipio_normalizado', how='left')
-            df_efetividade.dropna(subset=['populacao_feminina', 'municipio'], inplace=True)
-            df_efetividade = df_efetividade[df_efetividade['populacao_feminina'] > 0]
-
-            df_efetividade['taxa_crimes_leves'] = (df_efetividade['total_crimes_leves'] / df_efetividade['populacao_feminina']) * 1000
-            df_efetividade['taxa_crimes_graves'] = (df_efetividade['total_crimes_graves'] / df_efetividade['populacao_feminina']) * 1000
-
-            st.subheader("Gráfico de Dispersão: Relação entre Denúncias Leves e Ocorrências Graves")
-            fig_efetividade = px.scatter(
-                df_efetividade,
-                x='taxa_crimes_leves',
-                y='taxa_crimes_graves',
-                hover_name='municipio',
-                hover_data={
-                    'total_crimes_leves': ':.0f',
-                    'total_crimes_graves': ':.0f',
-                    'populacao_feminina': ':.0f',
-                    'municipio': False
-                },
-                trendline="ols",  
-                labels={
-                    'taxa_crimes_leves': 'Taxa de Crimes Leves (por 1.000 mulheres)',
-                    'taxa_crimes_graves': 'Taxa de Crimes Graves (por 1.000 mulheres)'
-                },
-                title="Efetividade da Denúncia: Crimes Leves vs. Graves por Município"
-            )
-            fig_efetividade.update_traces(marker=dict(size=10, opacity=0.7, color='#8e24aa'))
-            st.plotly_chart(fig_efetividade, use_container_width=True, key="scatter_efetividade")
-
-            st.markdown("---")
-            st.subheader("Como Interpretar o Gráfico")
-            st.markdown("""
-            - **Correlação Negativa (Pontos formam uma linha que desce da esquerda para a direita):** Cenário Ideal. Municípios onde as mulheres denunciam mais os crimes leves tendem a ter menos crimes graves. Isso sugere que a denúncia e a intervenção precoce estão funcionando.
-            - **Correlação Positiva (Pontos formam uma linha que sobe):** Pior Cenário. Municípios com muitas denúncias leves também têm muitos crimes graves. Isso pode indicar um sistema que apenas registra as ocorrências, mas falha em proteger a vítima e impedir a escalada da violência.
-            - **Sem Correlação (Nuvem de pontos dispersa):** Indica que a relação não é direta e outros fatores (socioeconômicos, culturais) são mais determinantes.
-            """)
-            st.info("Este insight não mede apenas o crime, mas tenta avaliar a resposta do ecossistema de proteção. Ele gera hipóteses sobre a efetividade da polícia, medidas protetivas e redes de apoio, apontando para municípios que podem precisar de uma auditoria em seus processos de atendimento à mulher.")
-
-        else:
-            st.warning("Não há dados suficientes para gerar a análise de efetividade com os filtros selecionados.")
-
-    with st.expander("🌐 Contágio Geográfico", expanded=False):
-        st.header("Análise de Contágio Geográfico (Hotspots de Vizinhança)")
-        st.markdown("""
-        **A Grande Pergunta:** A violência em um município é um fenômeno isolado ou é influenciada pela situação de seus vizinhos? Existem "clusters" regionais de violência que transcendem as fronteiras municipais?
-
-        Esta análise trata a violência como um fenômeno que pode se "espalhar" ou se concentrar em microrregiões, requerendo soluções coordenadas entre múltiplos municípios.
-        """)
-        
-        if not df_geral_filtrado.empty and not df_populacao.empty:
-            mapa_vizinhos = mapear_vizinhos(geojson_sc)
-
-            crimes_por_municipio = df_geral_filtrado['municipio_normalizado'].value_counts().reset_index()
-            crimes_por_municipio.columns = ['municipio_normalizado', 'total_fatos']
+                    fig_heatmap = go.Figure(data=go.Heatmap(
+                        z=crime_counts_heatmap.values,
+                        x=crime_counts_heatmap.columns,
+                        y=crime_counts_heatmap.index,
+                        colorscale='Purples',
+                        hoverongaps=False
+                    ))
+
+                    fig_heatmap.update_layout(
+                        title="Concentração de Crimes (Absoluto) por Faixa Etária e Tipo",
+                        xaxis_title="Tipo de Crime",
+                        yaxis_title="Faixa Etária da Vítima",
+                    )
+                    st.plotly_chart(fig_heatmap, use_container_width=True, key="heatmap_vulnerabilidade")
+                else:
+                    st.warning("Não há dados suficientes para gerar o heatmap com os filtros selecionados.")
+
+        secao_efetividade = st.expander("🔎 Efetividade da Denúncia", expanded=False, key="secao_efetividade", on_change="rerun")
+        if secao_efetividade.open:
+            with secao_efetividade:
+                st.header("Índice de Efetividade da Denúncia")
+                st.markdown("""
+                **A Grande Pergunta:** Em um município, um alto número de denúncias de crimes "menores" (como ameaça) está correlacionado a um menor número de crimes graves (lesão corporal, feminicídio)? Ou seja, a denúncia está funcionando como um mecanismo de prevenção eficaz?
+
+                Este é um proxy para medir a efetividade da resposta do sistema de segurança e apoio. Um sistema eficaz deveria intervir após a primeira denúncia, impedindo a escalada da violência.
+                """)
+
+                crimes_leves = ["Ameaça", "Vias de Fato"]
+                crimes_graves = ["Lesão Corporal Dolosa", "Estupro", "Feminicídio"]
+
+                if not df_geral_filtrado.empty and not df_populacao.empty:
+                    df_leves = df_geral_filtrado[df_geral_filtrado['fato_comunicado'].isin(crimes_leves)]
+                    contagem_leves = df_leves.groupby('municipio_normalizado', observed=True).size().reset_index(name='total_crimes_leves')
+
+                    df_graves = df_geral_filtrado[df_geral_filtrado['fato_comunicado'].isin(crimes_graves)]
+                    contagem_graves = df_graves.groupby('municipio_normalizado', observed=True).size().reset_index(name='total_crimes_graves')
+
+                    df_efetividade = pd.merge(contagem_leves, contagem_graves, on='municipio_normalizado', how='outer').fillna({'total_crimes_leves': 0, 'total_crimes_graves': 0})
+
+                    df_efetividade = pd.merge(df_efetividade, df_populacao[['municipio_normalizado', 'municipio', 'populacao_feminina']], on='municipio_normalizado', how='left')
+                    df_efetividade.dropna(subset=['populacao_feminina', 'municipio'], inplace=True)
+                    df_efetividade = df_efetividade[df_efetividade['populacao_feminina'] > 0]
+
+                    df_efetividade['taxa_crimes_leves'] = (df_efetividade['total_crimes_leves'] / df_efetividade['populacao_feminina']) * 1000
+                    df_efetividade['taxa_crimes_graves'] = (df_efetividade['total_crimes_graves'] / df_efetividade['populacao_feminina']) * 1000
+
+                    st.subheader("Gráfico de Dispersão: Relação entre Denúncias Leves e Ocorrências Graves")
+                    fig_efetividade = px.scatter(
+                        df_efetividade,
+                        x='taxa_crimes_leves',
+                        y='taxa_crimes_graves',
+                        hover_name='municipio',
+                        hover_data={
+                            'total_crimes_leves': ':.0f',
+                            'total_crimes_graves': ':.0f',
+                            'populacao_feminina': ':.0f',
+                            'municipio': False
+                        },
+                        trendline="ols",  
+                        labels={
+                            'taxa_crimes_leves': 'Taxa de Crimes Leves (por 1.000 mulheres)',
+                            'taxa_crimes_graves': 'Taxa de Crimes Graves (por 1.000 mulheres)'
+                        },
+                        title="Efetividade da Denúncia: Crimes Leves vs. Graves por Município"
+                    )
+                    fig_efetividade.update_traces(marker=dict(size=10, opacity=0.7, color='#8e24aa'))
+                    st.plotly_chart(fig_efetividade, use_container_width=True, key="scatter_efetividade")
+
+                    st.markdown("---")
+                    st.subheader("Como Interpretar o Gráfico")
+                    st.markdown("""
+                    - **Correlação Negativa (Pontos formam uma linha que desce da esquerda para a direita):** Cenário Ideal. Municípios onde as mulheres denunciam mais os crimes leves tendem a ter menos crimes graves. Isso sugere que a denúncia e a intervenção precoce estão funcionando.
+                    - **Correlação Positiva (Pontos formam uma linha que sobe):** Pior Cenário. Municípios com muitas denúncias leves também têm muitos crimes graves. Isso pode indicar um sistema que apenas registra as ocorrências, mas falha em proteger a vítima e impedir a escalada da violência.
+                    - **Sem Correlação (Nuvem de pontos dispersa):** Indica que a relação não é direta e outros fatores (socioeconômicos, culturais) são mais determinantes.
+                    """)
+                    st.info("Este insight não mede apenas o crime, mas tenta avaliar a resposta do ecossistema de proteção. Ele gera hipóteses sobre a efetividade da polícia, medidas protetivas e redes de apoio, apontando para municípios que podem precisar de uma auditoria em seus processos de atendimento à mulher.")
 
-            df_taxas = pd.merge(crimes_por_municipio, df_populacao[['municipio_normalizado', 'municipio', 'populacao_feminina']], on='municipio_normalizado', how='left')
-            df_taxas.dropna(subset=['populacao_feminina', 'municipio'], inplace=True)
-            df_taxas = df_taxas[df_taxas['populacao_feminina'] > 0]
+                else:
+                    st.warning("Não há dados suficientes para gerar a análise de efetividade com os filtros selecionados.")
+
+        secao_contagio = st.expander("🌐 Contágio Geográfico", expanded=False, key="secao_contagio", on_change="rerun")
+        if secao_contagio.open:
+            with secao_contagio:
+                st.header("Análise de Contágio Geográfico (Hotspots de Vizinhança)")
+                st.markdown("""
+                **A Grande Pergunta:** A violência em um município é um fenômeno isolado ou é influenciada pela situação de seus vizinhos? Existem "clusters" regionais de violência que transcendem as fronteiras municipais?
+
+                Esta análise trata a violência como um fenômeno que pode se "espalhar" ou se concentrar em microrregiões, requerendo soluções coordenadas entre múltiplos municípios.
+                """)
+        
+                @st.fragment
+                def exibir_contagio(df_geral_filtrado, df_populacao, cache_resultados, estado_filtros, geojson_mapas):
+                    """Análise de contágio e LISA; trocar o critério de vizinhança ou as permutações reexecuta só esta seção."""
+                    if not df_geral_filtrado.empty and not df_populacao.empty:
+                        col_criterio, col_k = st.columns([3, 1])
+                        with col_criterio:
+                            criterio_vizinhanca = st.selectbox(
+                                "Critério de vizinhança",
+                                options=list(METODOS_PESOS),
+                                format_func=METODOS_PESOS.get,
+                                key="criterio_vizinhanca"
+                            )
+                        with col_k:
+                            k_vizinhos = st.number_input("k (vizinhos mais próximos)", min_value=1, max_value=20, value=6, step=1, disabled=criterio_vizinhanca != 'knn', key="k_vizinhos")
+                        pesos_espaciais = carregar_pesos_espaciais(criterio_vizinhanca, int(k_vizinhos))
+
+                        crimes_por_municipio = contar_ocorrencias(df_geral_filtrado['municipio_normalizado']).reset_index()
+                        crimes_por_municipio.columns = ['municipio_normalizado', 'total_fatos']
+
+                        df_taxas = pd.merge(crimes_por_municipio, df_populacao[['municipio_normalizado', 'municipio', 'populacao_feminina']], on='municipio_normalizado', how='left')
+                        df_taxas.dropna(subset=['populacao_feminina', 'municipio'], inplace=True)
+                        df_taxas = df_taxas[df_taxas['populacao_feminina'] > 0]
             
-            anos_no_filtro = df_geral_filtrado['ano'].unique()
-            num_anos = len(anos_no_filtro) if len(anos_no_filtro) > 0 else 1
-            media_anual_fatos = df_taxas['total_fatos'] / num_anos
+                        anos_no_filtro = df_geral_filtrado['ano'].unique()
+                        num_anos = len(anos_no_filtro) if len(anos_no_filtro) > 0 else 1
+                        media_anual_fatos = df_taxas['total_fatos'] / num_anos
 
-            df_taxas['taxa_propria'] = (media_anual_fatos / df_taxas['populacao_feminina']) * 1000
+                        df_taxas['taxa_propria'] = (media_anual_fatos / df_taxas['populacao_feminina']) * 1000
 
-            taxa_por_municipio_map = df_taxas.set_index('municipio_normalizado')['taxa_propria']
+                        taxa_por_municipio_map = df_taxas.set_index('municipio_normalizado')['taxa_propria']
             
-            taxas_vizinhanca = []
-            for municipio in df_taxas['municipio_normalizado']:
-                vizinhos = mapa_vizinhos.get(municipio, [])
-                if vizinhos:
-                    taxas_dos_vizinhos = taxa_por_municipio_map.reindex(vizinhos).dropna()
-                    if not taxas_dos_vizinhos.empty:
-                        taxas_vizinhanca.append(taxas_dos_vizinhos.mean())
-                    else:
-                        taxas_vizinhanca.append(0)
-                else:
-                    taxas_vizinhanca.append(0)
-            
-            df_taxas['taxa_vizinhanca'] = taxas_vizinhanca
+                        if pesos_espaciais is not None:
+                            df_taxas['taxa_vizinhanca'] = pesos_espaciais.defasagem(taxa_por_municipio_map).to_numpy()
+                        else:
+                            df_taxas['taxa_vizinhanca'] = 0.0
 
-            st.subheader("Gráfico de Dispersão: Taxa de Violência Própria vs. Vizinhança")
+                        st.subheader("Gráfico de Dispersão: Taxa de Violência Própria vs. Vizinhança")
             
-            media_propria = df_taxas['taxa_propria'].mean()
-            media_vizinhanca = df_taxas['taxa_vizinhanca'].mean()
-
-            fig_contagio = px.scatter(
-                df_taxas,
-                x='taxa_propria',
-                y='taxa_vizinhanca',
-                hover_name='municipio',
-                hover_data={'taxa_propria': ':.2f', 'taxa_vizinhanca': ':.2f', 'municipio': False},
-                labels={
-                    'taxa_propria': 'Taxa de Violência do Próprio Município (por mil mulheres)',
-                    'taxa_vizinhanca': 'Taxa Média de Violência da Vizinhança (por mil mulheres)'
-                },
-                title="Análise de Hotspots: Violência Local vs. Influência da Vizinhança"
-            )
+                        media_propria = df_taxas['taxa_propria'].mean()
+                        media_vizinhanca = df_taxas['taxa_vizinhanca'].mean()
+
+                        fig_contagio = px.scatter(
+                            df_taxas,
+                            x='taxa_propria',
+                            y='taxa_vizinhanca',
+                            hover_name='municipio',
+                            hover_data={'taxa_propria': ':.2f', 'taxa_vizinhanca': ':.2f', 'municipio': False},
+                            labels={
+                                'taxa_propria': 'Taxa de Violência do Próprio Município (por mil mulheres)',
+                                'taxa_vizinhanca': 'Taxa Média de Violência da Vizinhança (por mil mulheres)'
+                            },
+                            title="Análise de Hotspots: Violência Local vs. Influência da Vizinhança"
+                        )
 
-            fig_contagio.add_vline(x=media_propria, line_width=1, line_dash="dash", line_color="gray")
-            fig_contagio.add_hline(y=media_vizinhanca, line_width=1, line_dash="dash", line_color="gray")
+                        fig_contagio.add_vline(x=media_propria, line_width=1, line_dash="dash", line_color="gray")
+                        fig_contagio.add_hline(y=media_vizinhanca, line_width=1, line_dash="dash", line_color="gray")
 
-            max_x = df_taxas['taxa_propria'].max() * 1.05
-            max_y = df_taxas['taxa_vizinhanca'].max() * 1.05
-            fig_contagio.add_annotation(x=media_propria, y=max_y, text="Municípios em Risco", showarrow=False, xanchor='center', yanchor='top', font=dict(color="orange"))
-            fig_contagio.add_annotation(x=max_x, y=max_y, text="Hotspots (Alto-Alto)", showarrow=False, xanchor='right', yanchor='top', font=dict(color="red"))
-            fig_contagio.add_annotation(x=0, y=0, text="Pontos Frios (Baixo-Baixo)", showarrow=False, xanchor='left', yanchor='bottom', font=dict(color="green"))
-            fig_contagio.add_annotation(x=max_x, y=0, text="Ilhas de Violência", showarrow=False, xanchor='right', yanchor='bottom', font=dict(color="purple"))
+                        max_x = df_taxas['taxa_propria'].max() * 1.05
+                        max_y = df_taxas['taxa_vizinhanca'].max() * 1.05
+                        fig_contagio.add_annotation(x=media_propria, y=max_y, text="Municípios em Risco", showarrow=False, xanchor='center', yanchor='top', font=dict(color="orange"))
+                        fig_contagio.add_annotation(x=max_x, y=max_y, text="Hotspots (Alto-Alto)", showarrow=False, xanchor='right', yanchor='top', font=dict(color="red"))
+                        fig_contagio.add_annotation(x=0, y=0, text="Pontos Frios (Baixo-Baixo)", showarrow=False, xanchor='left', yanchor='bottom', font=dict(color="green"))
+                        fig_contagio.add_annotation(x=max_x, y=0, text="Ilhas de Violência", showarrow=False, xanchor='right', yanchor='bottom', font=dict(color="purple"))
             
-            fig_contagio.update_traces(marker=dict(size=10, opacity=0.7, color='#8e24aa'))
-            st.plotly_chart(fig_contagio, use_container_width=True, key="scatter_contagio")
-
-            st.markdown("---")
-            st.subheader("Como Interpretar os Quadrantes")
-            st.markdown("""
-            - **🔴 Hotspots (Superior Direito):** Municípios com alta violência, cercados por vizinhos também com alta violência. Indicam um *cluster* geográfico de risco que exige ações regionais coordenadas.
-            - **🟠 Municípios em Risco (Superior Esquerdo):** Baixa violência interna, mas cercados por vizinhos violentos. Estão em risco de "contágio" ou "transbordamento" da violência. Ações preventivas são cruciais aqui.
-            - **🟣 Ilhas de Violência (Inferior Direito):** Alta violência interna, mas cercados por vizinhos mais pacíficos. O problema é mais localizado e pode estar ligado a fatores específicos do município.
-            - **🟢 Pontos Frios (Inferior Esquerdo):** Baixa violência, cercados por vizinhos também com baixa violência. São áreas de resiliência que podem oferecer *insights* sobre políticas públicas eficazes.
-            """)
-        else:
-            st.warning("Não há dados suficientes para gerar a Análise de Contágio Geográfico com os filtros selecionados.")
-    
-    with st.expander("📅 Análise Sazonal", expanded=False):
-        st.header("Sazonalidade e Eventos-Chave: O Calendário do Risco")
-        st.markdown("""
-        **A Grande Pergunta:** A violência contra a mulher aumenta de forma previsível em torno de datas ou eventos específicos (feriados, fins de semana prolongados, períodos de férias)?
-        
-        Esta análise vai além do gráfico mensal, investigando micro-padrões temporais que podem orientar ações de segurança e campanhas de conscientização.
-        """)
-
-        df_geral_filtrado['dia_semana'] = df_geral_filtrado['data_fato'].dt.day_name()
-        df_geral_filtrado['mes'] = df_geral_filtrado['data_fato'].dt.month_name()
-
-        if not df_geral_filtrado.empty:
-            st.subheader("Impacto de Feriados e Fins de Semana na Média Diária de Ocorrências")
-
-            df_geral_filtrado_sazonal = df_geral_filtrado.copy()
-            df_geral_filtrado_sazonal['data_fato_date'] = df_geral_filtrado_sazonal['data_fato'].dt.date
-            df_calendario['data_fato_date'] = df_calendario['data'].dt.date
-
-            df_geral_filtrado_sazonal = pd.merge(
-                df_geral_filtrado_sazonal,
-                df_calendario[['data_fato_date', 'is_feriado', 'is_fim_de_semana', 'is_vespera_feriado', 'is_pos_feriado']],
-                on='data_fato_date',
-                how='left'
-            )
-            df_geral_filtrado_sazonal[['is_feriado', 'is_vespera_feriado', 'is_pos_feriado']] = df_geral_filtrado_sazonal[['is_feriado', 'is_vespera_feriado', 'is_pos_feriado']].fillna(False)
+                        fig_contagio.update_traces(marker=dict(size=10, opacity=0.7, color='#8e24aa'))
+                        st.plotly_chart(fig_contagio, use_container_width=True, key="scatter_contagio")
+
+                        st.markdown("---")
+                        st.subheader("Como Interpretar os Quadrantes")
+                        st.markdown("""
+                        - **🔴 Hotspots (Superior Direito):** Municípios com alta violência, cercados por vizinhos também com alta violência. Indicam um *cluster* geográfico de risco que exige ações regionais coordenadas.
+                        - **🟠 Municípios em Risco (Superior Esquerdo):** Baixa violência interna, mas cercados por vizinhos violentos. Estão em risco de "contágio" ou "transbordamento" da violência. Ações preventivas são cruciais aqui.
+                        - **🟣 Ilhas de Violência (Inferior Direito):** Alta violência interna, mas cercados por vizinhos mais pacíficos. O problema é mais localizado e pode estar ligado a fatores específicos do município.
+                        - **🟢 Pontos Frios (Inferior Esquerdo):** Baixa violência, cercados por vizinhos também com baixa violência. São áreas de resiliência que podem oferecer *insights* sobre políticas públicas eficazes.
+                        """)
+
+                        st.markdown("---")
+                        st.subheader("Mapa de Significância LISA (Moran Local)")
+                        st.markdown(f"""
+                        Os quadrantes acima comparam cada município com a média, mas não dizem se o padrão poderia ter surgido ao acaso. O **Moran Local (LISA)** testa isso: a taxa de cada município é mantida fixa e seus vizinhos são sorteados aleatoriamente entre os demais municípios milhares de vezes. Só aparecem coloridos os municípios cujo padrão de vizinhança é significativo (p ≤ {ALFA_LISA:.2f}).
+                        """)
+                        permutacoes_lisa = st.select_slider(
+                            "Número de permutações",
+                            options=[99, 499, 999, 4999, 9999],
+                            value=999,
+                            key="permutacoes_lisa"
+                        )
 
-            datas_periodo_filtrado = pd.date_range(start=data_inicial, end=data_final)
-            df_periodo_completo = pd.DataFrame(datas_periodo_filtrado, columns=['data'])
-            df_periodo_completo['data_fato_date'] = df_periodo_completo['data'].dt.date
+                        if pesos_espaciais is not None:
+                            df_lisa = cache_resultados.obter(
+                                chave_filtros(consulta='lisa', criterio=criterio_vizinhanca, k=int(k_vizinhos), permutacoes=permutacoes_lisa, **estado_filtros),
+                                lambda: calcular_lisa(pesos_espaciais, taxa_por_municipio_map, permutacoes_lisa, executor=carregar_executor_processos)
+                            ).dropna(subset=['classificacao']).rename_axis('municipio_normalizado').reset_index()
+                            df_lisa['municipio'] = df_lisa['municipio_normalizado'].map(df_taxas.set_index('municipio_normalizado')['municipio'])
+
+                            cores_lisa = {
+                                'Alto-Alto': '#d7191c',
+                                'Baixo-Baixo': '#2c7bb6',
+                                'Baixo-Alto': '#abd9e9',
+                                'Alto-Baixo': '#fdae61',
+                                NAO_SIGNIFICATIVO: '#eeeeee',
+                            }
+                            fig_lisa = px.choropleth_mapbox(
+                                df_lisa,
+                                geojson=geojson_mapas,
+                                locations='municipio_normalizado',
+                                featureidkey="properties.NM_MUN_NORMALIZADO",
+                                color='classificacao',
+                                color_discrete_map=cores_lisa,
+                                category_orders={'classificacao': QUADRANTES_LISA + [NAO_SIGNIFICATIVO]},
+                                hover_name='municipio',
+                                hover_data={'valor': ':.2f', 'defasagem': ':.2f', 'p_valor': ':.3f', 'municipio_normalizado': False},
+                                mapbox_style="carto-positron",
+                                zoom=6,
+                                center={"lat": -27.59, "lon": -50.52},
+                                opacity=0.7,
+                                labels={'classificacao': 'Classificação LISA', 'valor': 'Taxa própria', 'defasagem': 'Taxa da vizinhança', 'p_valor': 'p-valor'}
+                            )
+                            fig_lisa.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+                            st.plotly_chart(fig_lisa, use_container_width=True, key="mapa_lisa")
+
+                            num_significativos = int((df_lisa['classificacao'] != NAO_SIGNIFICATIVO).sum())
+                            st.caption(f"{num_significativos} de {len(df_lisa)} municípios com padrão local significativo ({permutacoes_lisa} permutações condicionais).")
+                    else:
+                        st.warning("Não há dados suficientes para gerar a Análise de Contágio Geográfico com os filtros selecionados.")
+
+                exibir_contagio(df_geral_filtrado, df_populacao, cache_resultados, estado_filtros, geojson_mapas)
+
+        secao_aglomerados = st.expander("🛰️ Aglomerados Espaço-Temporais", expanded=False, key="secao_aglomerados", on_change="rerun")
+        if secao_aglomerados.open:
+            with secao_aglomerados:
+                st.header("Varredura Espaço-Temporal: Surtos Regionais de Violência")
+                st.markdown("""
+                **A Grande Pergunta:** Houve momentos em que um grupo de municípios vizinhos registrou, durante algumas semanas, muito mais ocorrências do que o esperado pela sua população feminina?
+
+                A varredura de Kulldorff percorre milhões de "cilindros" (um conjunto de municípios vizinhos ao longo de uma janela de semanas) e testa, por simulação de Monte Carlo, se o excesso observado poderia ter surgido ao acaso. O cálculo é feito em lote sobre a base completa, **independente dos filtros da barra lateral**.
+                """)
+
+                @st.fragment
+                def exibir_aglomerados(geojson_mapas):
+                    """Painel da varredura espaço-temporal; trocar o tipo de fato reexecuta só o painel."""
+                    resultado_varredura = carregar_varredura()
+                    if resultado_varredura is None:
+                        st.info("Nenhum resultado de varredura disponível ou atualizado. Rode `python -m painel_varredura` (ou `python -m painel_varredura --por-fato`, para uma varredura por tipo de fato) para gerá-lo.")
+                    else:
+                        rotulos_varredura = list(resultado_varredura['resultados'])
+                        rotulo_varredura = st.selectbox(
+                            "Tipo de fato",
+                            options=rotulos_varredura,
+                            index=rotulos_varredura.index(ROTULO_TODOS) if ROTULO_TODOS in rotulos_varredura else 0,
+                            key="rotulo_varredura"
+                        )
+                        resultado_rotulo = resultado_varredura['resultados'][rotulo_varredura]
+                        parametros_varredura = resultado_varredura['parametros']
+                        st.caption(
+                            f"Gerado em {resultado_varredura['gerado_em']} · {resultado_rotulo['ocorrencias']} ocorrências · "
+                            f"{resultado_rotulo['replicas']} réplicas de Monte Carlo · períodos de {parametros_varredura['dias_por_periodo']} dias, "
+                            f"duração máxima de {parametros_varredura['max_duracao']} períodos."
+                        )
 
-            df_periodo_completo_com_eventos = pd.merge(
-                df_periodo_completo,
-                df_calendario[['data_fato_date', 'is_feriado', 'is_fim_de_semana', 'is_vespera_feriado', 'is_pos_feriado']],
-                on='data_fato_date',
-                how='left'
-            )
-            df_periodo_completo_com_eventos.fillna(False, inplace=True)
-
-            total_dias_feriado = df_periodo_completo_com_eventos['is_feriado'].sum()
-            total_dias_vespera = df_periodo_completo_com_eventos['is_vespera_feriado'].sum()
-            total_dias_pos = df_periodo_completo_com_eventos['is_pos_feriado'].sum()
-            total_dias_fds = df_periodo_completo_com_eventos['is_fim_de_semana'].sum()
-            total_dias_uteis_comuns = len(df_periodo_completo_com_eventos[
-                (df_periodo_completo_com_eventos['is_feriado'] == False) &
-                (df_periodo_completo_com_eventos['is_fim_de_semana'] == False) &
-                (df_periodo_completo_com_eventos['is_vespera_feriado'] == False) &
-                (df_periodo_completo_com_eventos['is_pos_feriado'] == False)
-            ])
-
-            ocorrencias_feriado = df_geral_filtrado_sazonal['is_feriado'].sum()
-            ocorrencias_vespera = df_geral_filtrado_sazonal['is_vespera_feriado'].sum()
-            ocorrencias_pos = df_geral_filtrado_sazonal['is_pos_feriado'].sum()
-            ocorrencias_fds = df_geral_filtrado_sazonal['is_fim_de_semana'].sum()
-            ocorrencias_uteis_comuns = len(df_geral_filtrado_sazonal[
-                (df_geral_filtrado_sazonal['is_feriado'] == False) &
-                (df_geral_filtrado_sazonal['is_fim_de_semana'] == False) &
-                (df_geral_filtrado_sazonal['is_vespera_feriado'] == False) &
-                (df_geral_filtrado_sazonal['is_pos_feriado'] == False)
-            ])
-
-            media_feriado = (ocorrencias_feriado / total_dias_feriado) if total_dias_feriado > 0 else 0
-            media_vespera = (ocorrencias_vespera / total_dias_vespera) if total_dias_vespera > 0 else 0
-            media_pos = (ocorrencias_pos / total_dias_pos) if total_dias_pos > 0 else 0
-            media_fds = (ocorrencias_fds / total_dias_fds) if total_dias_fds > 0 else 0
-            media_uteis_comuns = (ocorrencias_uteis_comuns / total_dias_uteis_comuns) if total_dias_uteis_comuns > 0 else 0
+                        df_aglomerados = pd.DataFrame(resultado_rotulo['aglomerados'])
+                        if df_aglomerados.empty:
+                            st.info("A varredura não encontrou nenhum aglomerado com excesso de ocorrências.")
+                        else:
+                            df_aglomerados.insert(0, 'Aglomerado', range(1, len(df_aglomerados) + 1))
+                            tabela_aglomerados = pd.DataFrame({
+                                'Aglomerado': df_aglomerados['Aglomerado'],
+                                'Início': df_aglomerados['data_inicial'],
+                                'Fim': df_aglomerados['data_final'],
+                                'Municípios': df_aglomerados['municipios'].str.len(),
+                                'Centro': df_aglomerados['municipios'].str[0],
+                                'Ocorrências': df_aglomerados['casos'],
+                                'Esperadas': df_aglomerados['esperados'],
+                                'Risco Relativo': df_aglomerados['risco_relativo'],
+                                'p-valor': df_aglomerados['p_valor'],
+                            })
+                            st.dataframe(
+                                tabela_aglomerados.style.format({'Esperadas': '{:.1f}', 'Risco Relativo': '{:.2f}', 'p-valor': '{:.3f}'}),
+                                use_container_width=True,
+                                hide_index=True
+                            )
+
+                            df_mapa_aglomerados = df_aglomerados.explode('municipios').rename(columns={'municipios': 'municipio_normalizado'})
+                            df_mapa_aglomerados['Aglomerado'] = df_mapa_aglomerados['Aglomerado'].astype(str)
+                            fig_aglomerados = px.choropleth_mapbox(
+                                df_mapa_aglomerados,
+                                geojson=geojson_mapas,
+                                locations='municipio_normalizado',
+                                featureidkey="properties.NM_MUN_NORMALIZADO",
+                                color='Aglomerado',
+                                hover_data={'data_inicial': True, 'data_final': True, 'p_valor': ':.3f'},
+                                mapbox_style="carto-positron",
+                                zoom=6,
+                                center={"lat": -27.59, "lon": -50.52},
+                                opacity=0.7,
+                                labels={'data_inicial': 'Início', 'data_final': 'Fim', 'p_valor': 'p-valor'}
+                            )
+                            fig_aglomerados.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
+                            st.plotly_chart(fig_aglomerados, use_container_width=True, key="mapa_aglomerados")
+                            st.info(f"Aglomerados com p-valor ≤ {ALFA_VARREDURA:.2f} dificilmente ocorreriam ao acaso e merecem investigação: um surto localizado pode indicar um agressor em série, um evento regional ou mudanças no registro das ocorrências.")
+
+                exibir_aglomerados(geojson_mapas)
+    
+        secao_sazonal = st.expander("📅 Análise Sazonal", expanded=False, key="secao_sazonal", on_change="rerun")
+        if secao_sazonal.open:
+            with secao_sazonal:
+                st.header("Sazonalidade e Eventos-Chave: O Calendário do Risco")
+                st.markdown("""
+                **A Grande Pergunta:** A violência contra a mulher aumenta de forma previsível em torno de datas ou eventos específicos (feriados, fins de semana prolongados, períodos de férias)?
+        
+                Esta análise vai além do gráfico mensal, investigando micro-padrões temporais que podem orientar ações de segurança e campanhas de conscientização.
+                """)
+
+                if not df_geral_filtrado.empty:
+                    st.subheader("Impacto de Feriados e Fins de Semana na Média Diária de Ocorrências")
+
+                    # Tipo de cada dia por indexação 2D (município x dia) no calendário e contagens por tipo com um
+                    # bincount: cada ocorrência segue o calendário do seu município (feriados nacionais, estaduais e
+                    # municipais). O denominador são os dias-município do período dos municípios com registros,
+                    # divididos pelo número de municípios, para manter a escala de média diária do estado.
+                    calendario_dias = carregar_calendario_dias()
+                    ocorrencias = ocorrencias_diarias('geral', df_geral_filtrado, selecoes_geral, intervalos_filtro, *periodo_selecionado)
+                    municipios_ocorrencias = ocorrencias['municipio_normalizado'].cat
+                    linhas_categorias = np.append(calendario_dias.linhas_municipios(municipios_ocorrencias.categories), -1)
+                    codigos_municipios = municipios_ocorrencias.codes.to_numpy()
+                    ocorrencias_por_tipo = calendario_dias.contar_por_tipo(
+                        ocorrencias['dia_ordinal'].to_numpy(), pesos=ocorrencias['quantidade'].to_numpy(),
+                        linhas=linhas_categorias[codigos_municipios]
+                    )
+                    linhas_presentes = linhas_categorias[np.unique(codigos_municipios)]
+                    dias_por_tipo = calendario_dias.contar_dias_municipios(
+                        dias_do_periodo(data_inicial, data_final), linhas_presentes
+                    ) / len(linhas_presentes)
+                    medias_por_tipo = (ocorrencias_por_tipo / dias_por_tipo.where(dias_por_tipo > 0)).fillna(0)
+
+                    media_feriado = medias_por_tipo['is_feriado']
+                    media_vespera = medias_por_tipo['is_vespera_feriado']
+                    media_pos = medias_por_tipo['is_pos_feriado']
+                    media_fds = medias_por_tipo['is_fim_de_semana']
+                    media_uteis_comuns = medias_por_tipo[DIA_COMUM]
             
-            df_medias = pd.DataFrame({
-                'Tipo de Dia': ['Dia Útil Comum', 'Fim de Semana', 'Véspera de Feriado', 'Feriado', 'Pós-Feriado'],
-                'Média Diária de Ocorrências': [media_uteis_comuns, media_fds, media_vespera, media_feriado, media_pos]
-            }).sort_values('Média Diária de Ocorrências', ascending=False)
+                    df_medias = pd.DataFrame({
+                        'Tipo de Dia': ['Dia Útil Comum', 'Fim de Semana', 'Véspera de Feriado', 'Feriado', 'Pós-Feriado'],
+                        'Média Diária de Ocorrências': [media_uteis_comuns, media_fds, media_vespera, media_feriado, media_pos]
+                    }).sort_values('Média Diária de Ocorrências', ascending=False)
             
-            fig_barras_sazonal = px.bar(
-                df_medias,
-                x='Tipo de Dia',
-                y='Média Diária de Ocorrências',
-                text='Média Diária de Ocorrências',
-                title="Média de Ocorrências por Tipo de Dia",
-                labels={'Média Diária de Ocorrências': 'Média de Ocorrências por Dia', 'Tipo de Dia': ''},
-                template='plotly_white'
-            )
-            fig_barras_sazonal.update_traces(
-                marker_color='#8e24aa',
-                texttemplate='%{text:.2f}',
-                textposition='outside'
-            )
-            st.plotly_chart(fig_barras_sazonal, use_container_width=True, key="barras_sazonal")
-
-            st.markdown("---")
-
-            st.subheader("Heatmap de Risco: Dia da Semana vs. Mês")
-            st.markdown("A cor de cada célula representa a quantidade média de crimes, destacando os períodos mais 'quentes' do ano.")
-            
-            datas_periodo_filtrado_hm = pd.to_datetime(pd.date_range(start=data_inicial, end=data_final))
-
-            df_periodo_completo_hm = pd.DataFrame(datas_periodo_filtrado_hm, columns=['data_fato'])
-            df_periodo_completo_hm['mes'] = df_periodo_completo_hm['data_fato'].dt.month_name()
-            df_periodo_completo_hm['dia_semana'] = df_periodo_completo_hm['data_fato'].dt.day_name()
-
-            contagem_dias_hm = df_periodo_completo_hm.groupby(['mes', 'dia_semana']).size().reset_index(name='total_dias_no_periodo')
-
-            ocorrencias_hm = df_geral_filtrado.groupby(['mes', 'dia_semana']).size().reset_index(name='total_ocorrencias')
+                    fig_barras_sazonal = px.bar(
+                        df_medias,
+                        x='Tipo de Dia',
+                        y='Média Diária de Ocorrências',
+                        text='Média Diária de Ocorrências',
+                        title="Média de Ocorrências por Tipo de Dia",
+                        labels={'Média Diária de Ocorrências': 'Média de Ocorrências por Dia', 'Tipo de Dia': ''},
+                        template='plotly_white'
+                    )
+                    fig_barras_sazonal.update_traces(
+                        marker_color='#8e24aa',
+                        texttemplate='%{text:.2f}',
+                        textposition='outside'
+                    )
+                    st.plotly_chart(fig_barras_sazonal, use_container_width=True, key="barras_sazonal")
+                    st.caption("Feriados nacionais, estaduais (SC) e municipais: cada ocorrência é classificada pelo calendário do seu município.")
 
-            df_media_hm = pd.merge(
-                contagem_dias_hm,
-                ocorrencias_hm,
-                on=['mes', 'dia_semana'],
-                how='left'
-            ).fillna({'total_ocorrencias': 0})
+                    st.markdown("---")
 
-            df_media_hm['media_diaria'] = df_media_hm['total_ocorrencias'] / df_media_hm['total_dias_no_periodo']
+                    st.subheader("Heatmap de Risco: Dia da Semana vs. Mês")
+                    st.markdown("A cor de cada célula representa a quantidade média de crimes, destacando os períodos mais 'quentes' do ano.")
             
-            heatmap_pivot = df_media_hm.pivot_table(index='mes', columns='dia_semana', values='media_diaria').fillna(0)
-            
-            # 8. Ordenar meses e dias da semana
-            meses_ordem = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
-            nomes_meses_pt = {'January': 'Janeiro', 'February': 'Fevereiro', 'March': 'Março', 'April': 'Abril', 'May': 'Maio', 'June': 'Junho', 'July': 'Julho', 'August': 'Agosto', 'September': 'Setembro', 'October': 'Outubro', 'November': 'Novembro', 'December': 'Dezembro'}
-            dias_ordem = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-            nomes_dias_pt = {'Monday': 'Segunda', 'Tuesday': 'Terça', 'Wednesday': 'Quarta', 'Thursday': 'Quinta', 'Friday': 'Sexta', 'Saturday': 'Sábado', 'Sunday': 'Domingo'}
+                    # Dias de cada (mês, dia da semana) no período por aritmética e ocorrências com um bincount 12x7
+                    # sobre os códigos de mês e dia da semana calculados na carga.
+                    dias_hm = dias_por_linha_semanal(dia_ordinal(data_inicial), dia_ordinal(data_final), 'mes')
+                    ocorrencias_hm = contar_por_linha_semanal(
+                        cubo_geral_filtrado['mes'].cat.codes, cubo_geral_filtrado['dia_semana'].cat.codes, 'mes',
+                        pesos=cubo_geral_filtrado['quantidade']
+                    )
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        media_diaria_hm = np.where(dias_hm > 0, ocorrencias_hm / dias_hm, 0.0)
+                    heatmap_pivot = pd.DataFrame(media_diaria_hm, index=ORDEM_MESES, columns=ORDEM_DIAS_SEMANA)
             
-            heatmap_pivot = heatmap_pivot.reindex(index=meses_ordem, columns=dias_ordem, fill_value=0)
+                    nomes_meses_pt = {'January': 'Janeiro', 'February': 'Fevereiro', 'March': 'Março', 'April': 'Abril', 'May': 'Maio', 'June': 'Junho', 'July': 'Julho', 'August': 'Agosto', 'September': 'Setembro', 'October': 'Outubro', 'November': 'Novembro', 'December': 'Dezembro'}
+                    nomes_dias_pt = {'Monday': 'Segunda', 'Tuesday': 'Terça', 'Wednesday': 'Quarta', 'Thursday': 'Quinta', 'Friday': 'Sexta', 'Saturday': 'Sábado', 'Sunday': 'Domingo'}
             
-            heatmap_pivot.index = heatmap_pivot.index.map(nomes_meses_pt)
-            heatmap_pivot.columns = [nomes_dias_pt[col] for col in heatmap_pivot.columns]
+                    heatmap_pivot.index = heatmap_pivot.index.map(nomes_meses_pt)
+                    heatmap_pivot.columns = [nomes_dias_pt[col] for col in heatmap_pivot.columns]
             
-            fig_heatmap_sazonal = go.Figure(data=go.Heatmap(
-                z=heatmap_pivot.values,
-                x=heatmap_pivot.columns,
-                y=heatmap_pivot.index,
-                colorscale='Purples',
-                hoverongaps=False,
-                text=heatmap_pivot.values,
-                texttemplate="%{text:.2f}"
-            ))
-
-            fig_heatmap_sazonal.update_layout(
-                title="Concentração Média de Ocorrências por Mês e Dia da Semana",
-                xaxis_title="Dia da Semana",
-                yaxis_title="Mês",
-                xaxis={'type': 'category'}, 
-                yaxis={'type': 'category', 'categoryorder': 'array', 'categoryarray': list(nomes_meses_pt.values())}
-            )
-            st.plotly_chart(fig_heatmap_sazonal, use_container_width=True, key="heatmap_sazonal")
+                    fig_heatmap_sazonal = go.Figure(data=go.Heatmap(
+                        z=heatmap_pivot.values,
+                        x=heatmap_pivot.columns,
+                        y=heatmap_pivot.index,
+                        colorscale='Purples',
+                        hoverongaps=False,
+                        text=heatmap_pivot.values,
+                        texttemplate="%{text:.2f}"
+                    ))
+
+                    fig_heatmap_sazonal.update_layout(
+                        title="Concentração Média de Ocorrências por Mês e Dia da Semana",
+                        xaxis_title="Dia da Semana",
+                        yaxis_title="Mês",
+                        xaxis={'type': 'category'}, 
+                        yaxis={'type': 'category', 'categoryorder': 'array', 'categoryarray': list(nomes_meses_pt.values())}
+                    )
+                    st.plotly_chart(fig_heatmap_sazonal, use_container_width=True, key="heatmap_sazonal")
             
-            st.markdown("---")
-            st.info("""
-            **Por que é Avançado:** Transforma a análise temporal de descritiva ("o que aconteceu") para preditiva ("o que provavelmente vai acontecer"). Isso permite um planejamento proativo, como o reforço de patrulhas e a intensificação de campanhas "Ligue 180" durante o Carnaval ou as festas de fim de ano, por exemplo.
-            """)
+                    st.markdown("---")
+
+                    @st.fragment
+                    def exibir_janelas_eventos(df_geral_filtrado, selecoes_geral, intervalos_filtro, data_inicial, data_final,
+                                               cache_resultados, estado_filtros):
+                        """Janelas de eventos do calendário; trocar o evento ou a largura da janela reexecuta só este painel."""
+                        st.subheader("Janelas de Eventos: Observado vs. Esperado")
+                        st.markdown(f"""
+                        Para cada ocorrência do evento escolhido, compara os registros de cada dia da janela (dias antes e depois) com o **esperado**: a média do mesmo dia da semana nas {SEMANAS_REFERENCIA} semanas vizinhas de cada lado, fora da janela e sem contar feriados nem outras ocorrências do evento. Uma razão acima de 1 indica mais ocorrências do que o normal para aquele dia da semana. A faixa sombreada é o intervalo de {1 - ALFA_BANDAS:.0%} obtido reamostrando os eventos (bootstrap).
+                        """)
+                        col_evento, col_janela = st.columns([3, 1])
+                        with col_evento:
+                            evento = st.selectbox("Evento", options=list(EVENTOS), format_func=EVENTOS.get, key="evento_janela")
+                        with col_janela:
+                            k_janela = st.slider("Dias antes e depois", min_value=1, max_value=14, value=3, key="k_janela_evento")
+
+                        def calcular_janelas():
+                            # Série diária densa (tipo de fato x dia) do período com um bincount e todas as janelas do
+                            # evento de uma vez, por somas acumuladas.
+                            primeiro_dia, ultimo_dia = dia_ordinal(data_inicial), dia_ordinal(data_final)
+                            ocorrencias = ocorrencias_diarias(
+                                'geral', df_geral_filtrado, selecoes_geral, intervalos_filtro, primeiro_dia, ultimo_dia
+                            )
+                            serie, fatos = serie_diaria_cubo(ocorrencias, primeiro_dia, ultimo_dia, coluna='fato_comunicado')
+                            calendario_dias = carregar_calendario_dias()
+                            dias_eventos = dias_de_evento(calendario_dias, evento, primeiro_dia, ultimo_dia)
+                            # Feriados não servem de referência para o esperado de nenhum evento.
+                            feriados = dias_de_evento(calendario_dias, 'feriados', primeiro_dia, ultimo_dia)
+                            return analisar_janelas(serie, primeiro_dia, dias_eventos, k_janela, grupos=fatos, dias_excluidos=feriados)
+
+                        janelas = cache_resultados.obter(
+                            chave_filtros(consulta='janelas_eventos', evento=evento, k=k_janela, **estado_filtros),
+                            calcular_janelas
+                        )
+                        if not janelas['eventos']:
+                            st.info(f"Nenhuma ocorrência de '{EVENTOS[evento]}' no período com janela e semanas de referência completas. Amplie o período ou reduza a janela.")
+                            return
+
+                        perfil = janelas['perfil'].reset_index()
+                        fig_janelas = go.Figure([
+                            go.Scatter(x=perfil['deslocamento'], y=perfil['superior'], mode='lines', line=dict(width=0), hoverinfo='skip', showlegend=False),
+                            go.Scatter(
+                                x=perfil['deslocamento'], y=perfil['inferior'], mode='lines', line=dict(width=0), fill='tonexty',
+                                fillcolor='rgba(142, 36, 170, 0.2)', name=f"Intervalo de {1 - ALFA_BANDAS:.0%}", hoverinfo='skip'
+                            ),
+                            go.Scatter(
+                                x=perfil['deslocamento'], y=perfil['razao'], mode='lines+markers', name='Observado / Esperado',
+                                line=dict(color='#8e24aa'), customdata=perfil[['observado', 'esperado']],
+                                hovertemplate="Dia %{x:+d}<br>Razão: %{y:.2f}<br>Observado: %{customdata[0]:.0f}<br>Esperado: %{customdata[1]:.1f}<extra></extra>"
+                            ),
+                        ])
+                        fig_janelas.add_hline(y=1, line_width=1, line_dash="dash", line_color="gray")
+                        fig_janelas.update_layout(
+                            title=f"{EVENTOS[evento]}: Ocorrências em Relação ao Esperado ({janelas['eventos']} eventos)",
+                            xaxis_title="Dias em relação ao evento",
+                            yaxis_title="Observado / Esperado",
+                            xaxis={'tickmode': 'linear', 'dtick': 1},
+                            template='plotly_white'
+                        )
+                        st.plotly_chart(fig_janelas, use_container_width=True, key="janelas_eventos")
+
+                        tabela_janelas = janelas['por_grupo'].rename_axis('Tipo de Fato').rename(columns={
+                            'observado': 'Observado', 'esperado': 'Esperado', 'razao': 'Razão',
+                            'inferior': 'Limite Inferior', 'superior': 'Limite Superior'
+                        })
+                        st.markdown(f"**Totais da janela (±{k_janela} dias) por tipo de fato**")
+                        st.dataframe(
+                            tabela_janelas.style.format({
+                                'Observado': '{:,.0f}', 'Esperado': '{:,.1f}', 'Razão': '{:.2f}',
+                                'Limite Inferior': '{:.2f}', 'Limite Superior': '{:.2f}'
+                            }, na_rep='-'),
+                            use_container_width=True
+                        )
 
-        else:
-            st.warning("Não há dados para exibir a Análise Sazonal com os filtros selecionados.")
+                    exibir_janelas_eventos(
+                        df_geral_filtrado, selecoes_geral, intervalos_filtro, data_inicial, data_final, cache_resultados, estado_filtros
+                    )
 
+                    st.markdown("---")
+                    st.info("""
+                    **Por que é Avançado:** Transforma a análise temporal de descritiva ("o que aconteceu") para preditiva ("o que provavelmente vai acontecer"). Isso permite um planejamento proativo, como o reforço de patrulhas e a intensificação de campanhas "Ligue 180" durante o Carnaval ou as festas de fim de ano, por exemplo.
+                    """)
+
+                else:
+                    st.warning("Não há dados para exibir a Análise Sazonal com os filtros selecionados.")
 
-    if not df_geral_filtrado.empty:
-        pass
-    else:
-        with tab_geral:
-            st.error("🚨 Dados não carregados. Verifique os arquivos em `data/`.")
-            st.warning("Certifique-se de que os arquivos `base_geral.xlsx`, `base_feminicidio.xlsx` e `municipios_sc.json` existem na pasta `data`.")
-        with tab_feminicidio:
-            st.error("🚨 Dados não carregados. Verifique os arquivos em `data/`.")
-            st.warning("Certifique-se de que os arquivos `base_geral.xlsx` e `base_feminicidio.xlsx` existem na pasta `data`.")
 
-with tab_glossario:
-    st.header("Metodologia e Glossário")
+if tab_glossario.open:
+    with tab_glossario:
+        st.header("Metodologia e Glossário")
     
-    st.subheader("Metodologia")
-    st.markdown("""
-    Os dados que constam neste painel foram fornecidos pela **Gerência de Estatística e Análise Criminal da Secretaria de Estado da Segurança Pública** (GEAC | DINE | SSP | SC).
+        st.subheader("Metodologia")
+        st.markdown("""
+        Os dados que constam neste painel foram fornecidos pela **Gerência de Estatística e Análise Criminal da Secretaria de Estado da Segurança Pública** (GEAC | DINE | SSP | SC).
     
-    Eles foram organizados e processados para possibilitar clareza no entendimento das informações e permitir a interação dos usuários.
+        Eles foram organizados e processados para possibilitar clareza no entendimento das informações e permitir a interação dos usuários.
     
-    A elaboração do painel é uma parceria entre o **Observatório da Violência Contra a Mulher (OVM/SC)** e o **Ministério Público de Contas de Santa Catarina (MPC/SC)**.
-    """)
+        A elaboração do painel é uma parceria entre o **Observatório da Violência Contra a Mulher (OVM/SC)** e o **Ministério Público de Contas de Santa Catarina (MPC/SC)**.
+        """)
 
-    st.subheader("Análise de Tendências: Entendendo o CAGR")
-    st.markdown("""
-    Além de comparar um ano com o anterior, este painel utiliza a **Taxa de Crescimento Anual Composta (CAGR)** para analisar tendências de longo prazo.
+        st.subheader("Análise de Tendências: Entendendo o CAGR")
+        st.markdown("""
+        Além de comparar um ano com o anterior, este painel utiliza a **Taxa de Crescimento Anual Composta (CAGR)** para analisar tendências de longo prazo.
 
-    **O que é?** O CAGR é uma medida que suaviza a volatilidade dos números anuais e nos informa qual teria sido a taxa de crescimento constante e média ao longo de todo um período.
+        **O que é?** O CAGR é uma medida que suaviza a volatilidade dos números anuais e nos informa qual teria sido a taxa de crescimento constante e média ao longo de todo um período.
 
-    **Por que é importante?** Enquanto a variação ano a ano pode mostrar picos e quedas bruscas, o CAGR revela a verdadeira trajetória do problema. Uma pequena queda em um único ano pode mascarar um crescimento consistente da violência ao longo de cinco anos. O CAGR ajuda a identificar problemas crônicos e a avaliar o impacto real e duradouro das políticas públicas, para além das flutuações de curto prazo.
+        **Por que é importante?** Enquanto a variação ano a ano pode mostrar picos e quedas bruscas, o CAGR revela a verdadeira trajetória do problema. Uma pequena queda em um único ano pode mascarar um crescimento consistente da violência ao longo de cinco anos. O CAGR ajuda a identificar problemas crônicos e a avaliar o impacto real e duradouro das políticas públicas, para além das flutuações de curto prazo.
 
-    **Como interpretar:** Um CAGR positivo (ex: +5%) indica uma tendência de crescimento no número de ocorrências, enquanto um CAGR negativo (ex: -3%) aponta para uma tendência de redução no longo prazo.
-    """)
+        **Como interpretar:** Um CAGR positivo (ex: +5%) indica uma tendência de crescimento no número de ocorrências, enquanto um CAGR negativo (ex: -3%) aponta para uma tendência de redução no longo prazo.
+        """)
     
-    st.markdown("---")
+        st.markdown("---")
     
-    st.subheader("Glossário de Tipos de Crimes")
+        st.subheader("Glossário de Tipos de Crimes")
     
-    with st.expander("🔹 Ameaça", expanded=False):
-        st.markdown("""
-        Ameaçar alguém, por palavra, escrito ou gesto, ou qualquer outro meio simbólico, de causar-lhe mal injusto e grave.
+        with st.expander("🔹 Ameaça", expanded=False):
+            st.markdown("""
+            Ameaçar alguém, por palavra, escrito ou gesto, ou qualquer outro meio simbólico, de causar-lhe mal injusto e grave.
         
-        **Base Legal:** Art. 147 do Código Penal Brasileiro
-        """)
+            **Base Legal:** Art. 147 do Código Penal Brasileiro
+            """)
     
-    with st.expander("🔹 Lesão Corporal Dolosa", expanded=False):
-        st.markdown("""
-        A lesão corporal caracteriza-se por ofender a integridade corporal ou a saúde de outrem. O crime doloso ocorre quando o agente quis o resultado ou assumiu o risco de produzi-lo.
+        with st.expander("🔹 Lesão Corporal Dolosa", expanded=False):
+            st.markdown("""
+            A lesão corporal caracteriza-se por ofender a integridade corporal ou a saúde de outrem. O crime doloso ocorre quando o agente quis o resultado ou assumiu o risco de produzi-lo.
         
-        **Base Legal:** Art. 129 do Código Penal Brasileiro
-        """)
+            **Base Legal:** Art. 129 do Código Penal Brasileiro
+            """)
     
-    with st.expander("🔹 Estupro", expanded=False):
-        st.markdown("""
-        Constranger alguém, mediante violência ou grave ameaça, a ter conjunção carnal ou a praticar ou permitir que com ele se pratique outro ato libidinoso.
+        with st.expander("🔹 Estupro", expanded=False):
+            st.markdown("""
+            Constranger alguém, mediante violência ou grave ameaça, a ter conjunção carnal ou a praticar ou permitir que com ele se pratique outro ato libidinoso.
         
-        **Base Legal:** Art. 213 do Código Penal Brasileiro
-        """)
+            **Base Legal:** Art. 213 do Código Penal Brasileiro
+            """)
     
-    with st.expander("🔹 Feminicídio", expanded=False):
-        st.markdown("""
-        Homicídio contra a mulher por razões da condição de sexo feminino. 
+        with st.expander("🔹 Feminicídio", expanded=False):
+            st.markdown("""
+            Homicídio contra a mulher por razões da condição de sexo feminino. 
         
-        Considera-se que há razões de condição de sexo feminino quando o crime envolve:
-        - Violência doméstica e familiar
-        - Menosprezo ou discriminação à condição de mulher
+            Considera-se que há razões de condição de sexo feminino quando o crime envolve:
+            - Violência doméstica e familiar
+            - Menosprezo ou discriminação à condição de mulher
         
-        **Base Legal:** Art. 121, §2º-A do Código Penal (Lei nº 13.104/2015)
-        """)
+            **Base Legal:** Art. 121, §2º-A do Código Penal (Lei nº 13.104/2015)
+            """)
     
-    with st.expander("🔹 Vias de Fato", expanded=False):
-        st.markdown("""
-        São atos agressivos praticados contra alguém, que não cheguem a causar lesão corporal. 
+        with st.expander("🔹 Vias de Fato", expanded=False):
+            st.markdown("""
+            São atos agressivos praticados contra alguém, que não cheguem a causar lesão corporal. 
         
-        **Exemplos:** empurrar, sacudir, puxar cabelo, etc.
+            **Exemplos:** empurrar, sacudir, puxar cabelo, etc.
         
-        **Base Legal:** Art. 21 da Lei de Contravenções Penais
-        """)
+            **Base Legal:** Art. 21 da Lei de Contravenções Penais
+            """)
     
-    st.markdown("---")
+        st.markdown("---")
     
-    st.info("**Fontes:** Código Penal Brasileiro, Lei do Feminicídio (Lei nº 13.104/2015), Lei Maria da Penha (Lei nº 11.340/2006).")
+        st.info("**Fontes:** Código Penal Brasileiro, Lei do Feminicídio (Lei nº 13.104/2015), Lei Maria da Penha (Lei nº 11.340/2006).")
     
-    st.markdown("---")
+        st.markdown("---")
     
-    st.markdown("""
-    <div style='text-align: center; padding: 2rem; background: linear-gradient(135deg, #f8f4fb 0%, #ffffff 100%); border-radius: 10px; margin-top: 2rem;'>
-        <h4 style='color: #6a1b9a; margin-bottom: 1rem;'>💜 Em caso de violência, denuncie!</h4>
-        <p style='font-size: 1.2rem; font-weight: 600; color: #4a148c;'>Ligue 180 - Central de Atendimento à Mulher</p>
-        <p style='color: #666; margin-top: 0.5rem;'>Disque 190 - Polícia Militar | 197 - Polícia Civil</p>
-    </div>
-    """, unsafe_allow_html=True)
+        st.markdown("""
+        <div style='text-align: center; padding: 2rem; background: linear-gradient(135deg, #f8f4fb 0%, #ffffff 100%); border-radius: 10px; margin-top: 2rem;'>
+            <h4 style='color: #6a1b9a; margin-bottom: 1rem;'>💜 Em caso de violência, denuncie!</h4>
+            <p style='font-size: 1.2rem; font-weight: 600; color: #4a148c;'>Ligue 180 - Central de Atendimento à Mulher</p>
+            <p style='color: #666; margin-top: 0.5rem;'>Disque 190 - Polícia Militar | 197 - Polícia Civil</p>
+        </div>
+        """, unsafe_allow_html=True)
 
 st.markdown("""
 <div class='footer'>
@@ -2794,43 +2878,44 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-with tab_download:
-    st.header("Download das Fontes de Dados")
-    st.markdown("Faça o download dos arquivos de dados utilizados neste painel.")
+if tab_download.open:
+    with tab_download:
+        st.header("Download das Fontes de Dados")
+        st.markdown("Faça o download dos arquivos de dados utilizados neste painel.")
 
-    st.markdown("---")
-
-    col1, col2, col3 = st.columns(3)
+        st.markdown("---")
 
-    with col1:
-        st.subheader("Base Geral de Crimes")
-        st.markdown("Contém todos os registros de violência contra a mulher, exceto feminicídios.")
-        with open("data/base_geral.xlsx", "rb") as fp:
-            st.download_button(
-                label="Download (XLSX)",
-                data=fp,
-                file_name="base_geral.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            st.subheader("Base Geral de Crimes")
+            st.markdown("Contém todos os registros de violência contra a mulher, exceto feminicídios.")
+            with open("data/base_geral.xlsx", "rb") as fp:
+                st.download_button(
+                    label="Download (XLSX)",
+                    data=fp,
+                    file_name="base_geral.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
 
-    with col2:
-        st.subheader("Base de Feminicídios")
-        st.markdown("Contém os registros de feminicídios consumados.")
-        with open("data/base_feminicidio.xlsx", "rb") as fp:
-            st.download_button(
-                label="Download (XLSX)",
-                data=fp,
-                file_name="base_feminicidio.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+        with col2:
+            st.subheader("Base de Feminicídios")
+            st.markdown("Contém os registros de feminicídios consumados.")
+            with open("data/base_feminicidio.xlsx", "rb") as fp:
+                st.download_button(
+                    label="Download (XLSX)",
+                    data=fp,
+                    file_name="base_feminicidio.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
 
-    with col3:
-        st.subheader("Mapa de Municípios (GeoJSON)")
-        st.markdown("Arquivo com as geometrias dos municípios de Santa Catarina.")
-        with open("data/municipios_sc.json", "rb") as fp:
-            st.download_button(
-                label="Download (JSON)",
-                data=fp,
-                file_name="municipios_sc.json",
-                mime="application/json"
-            )
+        with col3:
+            st.subheader("Mapa de Municípios (GeoJSON)")
+            st.markdown("Arquivo com as geometrias dos municípios de Santa Catarina.")
+            with open("data/municipios_sc.json", "rb") as fp:
+                st.download_button(
+                    label="Download (JSON)",
+                    data=fp,
+                    file_name="municipios_sc.json",
+                    mime="application/json"
+                )
@@ -0,0 +1,311 @@
+"""
+Janelas de eventos do calendário: ocorrências observadas vs. esperadas.
+
+Funções sem dependência do Streamlit para medir o efeito de datas como
+feriados, pontes e dias de pagamento. As ocorrências viram uma série diária
+densa (grupo x dia) indexada pelo dia ordinal; o esperado de cada dia é a
+média do mesmo dia da semana nas semanas vizinhas, fora da janela do evento e
+sem feriados ou outros dias de evento, obtida por uma convolução com um núcleo
+esparso. As somas das janelas (±k dias) de todos os eventos saem de somas
+acumuladas em uma única passada, e as bandas de confiança vêm de um bootstrap
+dos eventos feito em lote, como um produto de matrizes.
+
+A mesma série diária, agregada por somas acumuladas, alimenta as séries
+temporais do painel em qualquer granularidade (dia, semana, mês, trimestre,
+ano) ou janela móvel.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from painel_consultas import dia_da_semana
+
+# Eventos disponíveis para a análise de janelas.
+EVENTOS = {
+    'feriados': 'Todos os feriados',
+    'natal': 'Natal',
+    'ano_novo': 'Ano Novo',
+    'carnaval': 'Carnaval (terça-feira)',
+    'enforcamentos': 'Pontes de feriado (enforcamentos)',
+    'pagamento': 'Dia de pagamento (5º dia útil)',
+}
+
+# Linha de base: semanas de referência de cada lado da janela. Bandas por
+# bootstrap dos eventos, com semente fixa para resultados reprodutíveis.
+SEMANAS_REFERENCIA = 4
+REPLICAS_BOOTSTRAP = 1000
+ALFA_BANDAS = 0.05
+SEMENTE = 20240101
+
+# Granularidades das séries temporais; as móveis somam os últimos N dias.
+GRANULARIDADES = {
+    'diaria': 'Diária',
+    'semanal': 'Semanal',
+    'mensal': 'Mensal',
+    'trimestral': 'Trimestral',
+    'anual': 'Anual',
+    'movel_7': 'Móvel de 7 dias',
+    'movel_30': 'Móvel de 30 dias',
+    'movel_365': 'Móvel de 365 dias',
+}
+JANELAS_MOVEIS = {'movel_7': 7, 'movel_30': 30, 'movel_365': 365}
+
+# Regras dos eventos derivados de outras datas.
+DIAS_ANTES_SEXTA_SANTA_CARNAVAL = 45
+DIA_UTIL_PAGAMENTO = 5
+
+
+def serie_diaria(dias, primeiro_dia, ultimo_dia, pesos=None, grupos=None, n_grupos=1):
+    """
+    Série diária densa de ocorrências entre dois dias ordinais (inclusive).
+
+    Um único `bincount` sobre a célula (grupo, dia): `grupos` são códigos
+    inteiros (0 a n_grupos - 1, por exemplo município ou tipo de fato) e
+    `pesos` as quantidades de cada linha. Dias fora do intervalo e grupos
+    negativos são ignorados. Devolve um array (n_grupos x dias).
+    """
+    n_dias = max(int(ultimo_dia) - int(primeiro_dia) + 1, 0)
+    posicoes = np.asarray(dias, dtype=np.int64) - int(primeiro_dia)
+    grupos = np.zeros(len(posicoes), dtype=np.int64) if grupos is None else np.asarray(grupos, dtype=np.int64)
+    validos = (posicoes >= 0) & (posicoes < n_dias) & (grupos >= 0)
+    if pesos is not None:
+        pesos = np.asarray(pesos, dtype=np.float64)[validos]
+    celulas = grupos[validos] * n_dias + posicoes[validos]
+    return np.bincount(celulas, weights=pesos, minlength=n_grupos * n_dias).astype(np.float64).reshape(n_grupos, n_dias)
+
+
+def serie_diaria_cubo(cubo, primeiro_dia, ultimo_dia, coluna=None):
+    """
+    Série diária de uma tabela de contagens (`dia_ordinal` e `quantidade` por
+    linha), com uma linha por valor de `coluna` (em ordem) ou uma linha só. Devolve a série e os rótulos das linhas.
+    """
+    if coluna is None:
+        codigos, grupos = None, [None]
+    else:
+        codigos, grupos = pd.factorize(cubo[coluna], sort=True)
+    serie = serie_diaria(
+        cubo['dia_ordinal'].to_numpy(), primeiro_dia, ultimo_dia, pesos=cubo['quantidade'].to_numpy(),
+        grupos=codigos, n_grupos=len(grupos)
+    )
+    return serie, list(grupos)
+
+
+def _inicio_periodo(dias, granularidade):
+    """Dia ordinal do início do período (semana a partir do domingo, mês, trimestre ou ano) de cada dia."""
+    if granularidade == 'diaria':
+        return dias
+    if granularidade == 'semanal':
+        return dias - dia_da_semana(dias)
+    datas = dias.astype('datetime64[D]')
+    if granularidade == 'anual':
+        return datas.astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+    meses = datas.astype('datetime64[M]').astype(np.int64)
+    if granularidade == 'trimestral':
+        meses = meses - meses % 3
+    return meses.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+
+def agregar_serie(serie, primeiro_dia, granularidade, grupos=None):
+    """
+    Agrega uma série diária (grupos x dias) em uma granularidade de `GRANULARIDADES`.
+
+    Os totais de cada período e de cada janela móvel são diferenças da soma
+    acumulada da série, sem reagrupar registros. Os períodos são rotulados pelo
+    dia de início (o primeiro e o último podem estar incompletos); as janelas
+    móveis, pelo último dia, a partir da primeira janela completa. Devolve um
+    DataFrame longo com `periodo`, `grupo` e `quantidade`.
+    """
+    serie = np.atleast_2d(serie)
+    grupos = list(range(serie.shape[0])) if grupos is None else list(grupos)
+    n_dias = serie.shape[1]
+    acumulada = np.concatenate([np.zeros((serie.shape[0], 1)), np.cumsum(serie, axis=1)], axis=1)
+    dias = int(primeiro_dia) + np.arange(n_dias, dtype=np.int64)
+
+    if granularidade in JANELAS_MOVEIS:
+        janela = JANELAS_MOVEIS[granularidade]
+        fins = np.arange(janela, n_dias + 1)
+        valores = acumulada[:, fins] - acumulada[:, fins - janela]
+        periodos = dias[fins - 1]
+    elif granularidade in GRANULARIDADES:
+        inicios = _inicio_periodo(dias, granularidade)
+        cortes = np.flatnonzero(np.diff(inicios, prepend=inicios[:1] - 1))
+        valores = acumulada[:, np.append(cortes[1:], n_dias)] - acumulada[:, cortes]
+        periodos = inicios[cortes]
+    else:
+        raise ValueError(f"Granularidade desconhecida: '{granularidade}'. Opções: {', '.join(GRANULARIDADES)}.")
+
+    return pd.DataFrame({
+        'periodo': pd.to_datetime(np.tile(periodos, len(grupos)).astype('datetime64[D]')),
+        'grupo': np.repeat(np.asarray(grupos, dtype=object), len(periodos)),
+        'quantidade': np.rint(valores).astype(np.int64).ravel(),
+    })
+
+
+def deslocamentos_referencia(k, semanas=SEMANAS_REFERENCIA):
+    """
+    Deslocamentos (em dias) das referências do esperado: múltiplos de 7 dos dois
+    lados, começando na primeira semana que deixa qualquer dia da janela ±k fora dela.
+    """
+    primeira = (2 * k) // 7 + 1
+    semanas_usadas = np.arange(primeira, primeira + semanas)
+    return np.concatenate([-7 * semanas_usadas[::-1], 7 * semanas_usadas])
+
+
+def linha_de_base(serie, k, semanas=SEMANAS_REFERENCIA, excluidos=None):
+    """
+    Esperado de cada dia: média do mesmo dia da semana em `semanas` semanas de
+    cada lado, fora de qualquer janela ±k que contenha o dia.
+
+    É a convolução da série com um núcleo de 2 * semanas coeficientes não nulos,
+    aplicada a todos os grupos de uma vez como somas de fatias deslocadas.
+    `excluidos` (máscara booleana dos dias da série, como feriados e dias de
+    evento) tira dias das referências: a média é feita só sobre as referências
+    válidas de cada dia. Dias cujas referências saem da série, ou sem nenhuma
+    referência válida, ficam NaN.
+    """
+    serie = np.atleast_2d(serie)
+    deslocamentos = deslocamentos_referencia(k, semanas)
+    alcance = int(np.abs(deslocamentos).max())
+    n_dias = serie.shape[1]
+    estendida = np.pad(serie.astype(np.float64), ((0, 0), (alcance, alcance)), constant_values=np.nan)
+    validos = np.ones(n_dias, dtype=bool) if excluidos is None else ~np.asarray(excluidos, dtype=bool)
+    validos = np.pad(validos, alcance, constant_values=True)
+    soma = np.zeros_like(serie, dtype=np.float64)
+    referencias = np.zeros(n_dias, dtype=np.int64)
+    for deslocamento in deslocamentos:
+        fatia = slice(alcance + deslocamento, alcance + deslocamento + n_dias)
+        soma += np.where(validos[fatia], estendida[:, fatia], 0.0)
+        referencias += validos[fatia]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(referencias > 0, soma / referencias, np.nan)
+
+
+def dias_de_evento(calendario, evento, primeiro_dia=None, ultimo_dia=None):
+    """
+    Dias ordinais de um evento de `EVENTOS` pelo calendário geral (feriados
+    nacionais e estaduais), opcionalmente restritos a um intervalo.
+
+    O Carnaval é a terça-feira 45 dias antes da Sexta-feira Santa; as pontes são
+    a segunda-feira antes de um feriado na terça e a sexta-feira depois de um
+    feriado na quinta; o dia de pagamento é o quinto dia útil (segunda a sexta,
+    exceto feriados) de cada mês.
+    """
+    dias = calendario.primeiro_dia + np.arange(len(calendario.codigos), dtype=np.int64)
+    nomes = np.full(len(dias), '', dtype=object)
+    com_feriado = calendario.feriados >= 0
+    nomes[com_feriado] = calendario.nomes_feriados[calendario.feriados[com_feriado]]
+    feriado = com_feriado | ((calendario.codigos & (1 << calendario.tipos.index('is_feriado'))) > 0)
+    semana = dia_da_semana(dias)
+    util = ~feriado & (semana >= 1) & (semana <= 5)
+
+    if evento == 'feriados':
+        marcados = feriado
+    elif evento == 'natal':
+        marcados = nomes == 'Natal'
+    elif evento == 'ano_novo':
+        marcados = nomes == 'Confraternização Universal'
+    elif evento == 'carnaval':
+        marcados = np.zeros(len(dias), dtype=bool)
+        carnaval = np.flatnonzero(nomes == 'Sexta-feira Santa') - DIAS_ANTES_SEXTA_SANTA_CARNAVAL
+        marcados[carnaval[carnaval >= 0]] = True
+    elif evento == 'enforcamentos':
+        feriado_seguinte = np.append(feriado[1:], False)
+        feriado_anterior = np.insert(feriado[:-1], 0, False)
+        marcados = util & (((semana == 1) & feriado_seguinte) | ((semana == 5) & feriado_anterior))
+    elif evento == 'pagamento':
+        meses = dias.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        inicio_mes = np.flatnonzero(np.diff(meses, prepend=meses[0] - 1))
+        uteis_acumulados = np.cumsum(util)
+        uteis_antes_do_mes = (uteis_acumulados - util)[inicio_mes]
+        uteis_no_mes = uteis_acumulados - np.repeat(uteis_antes_do_mes, np.diff(np.append(inicio_mes, len(dias))))
+        marcados = util & (uteis_no_mes == DIA_UTIL_PAGAMENTO)
+    else:
+        raise ValueError(f"Evento desconhecido: '{evento}'. Opções: {', '.join(EVENTOS)}.")
+
+    selecionados = dias[marcados]
+    if primeiro_dia is not None:
+        selecionados = selecionados[selecionados >= primeiro_dia]
+    if ultimo_dia is not None:
+        selecionados = selecionados[selecionados <= ultimo_dia]
+    return selecionados
+
+
+def _somas_janelas(serie, posicoes, k):
+    """Soma de cada janela [posição - k, posição + k] de cada grupo por diferença de somas acumuladas (grupos x eventos)."""
+    acumulada = np.concatenate([np.zeros((serie.shape[0], 1)), np.cumsum(serie, axis=1)], axis=1)
+    return acumulada[:, posicoes + k + 1] - acumulada[:, posicoes - k]
+
+
+def _quantis_razao(observados, esperados, alfa):
+    """Limites inferior e superior da razão observado/esperado entre réplicas (eixo 0)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        razoes = np.where(esperados > 0, observados / esperados, np.nan)
+    with warnings.catch_warnings():
+        # Colunas sem nenhuma réplica válida (esperado zero) ficam NaN, sem aviso.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        limites = np.nanquantile(razoes, [alfa / 2, 1 - alfa / 2], axis=0)
+    return limites[0], limites[1]
+
+
+def analisar_janelas(serie, primeiro_dia, dias_eventos, k, grupos=None, dias_excluidos=(), semanas=SEMANAS_REFERENCIA,
+                     replicas=REPLICAS_BOOTSTRAP, alfa=ALFA_BANDAS, semente=SEMENTE):
+    """
+    Ocorrências observadas e esperadas em torno de cada evento.
+
+    `serie` é a série diária (grupos x dias) de `serie_diaria`, começando em
+    `primeiro_dia`; `grupos` nomeia suas linhas. Os dias dos eventos e os
+    `dias_excluidos` (por exemplo, todos os feriados) não servem de referência
+    para o esperado. Entram só os eventos cuja janela ±k e cujas referências do
+    esperado cabem na série. As bandas
+    reamostram os eventos com reposição: as `replicas` réplicas são uma matriz
+    de pesos multinomiais (réplicas x eventos) multiplicada pelos perfis e
+    pelas somas das janelas.
+
+    Devolve um dict com `perfil` (razão observado/esperado de cada deslocamento
+    de -k a +k, somando todos os grupos), `por_grupo` (totais das janelas e
+    razão de cada grupo) e `eventos` (quantos eventos entraram).
+    """
+    serie = np.atleast_2d(np.asarray(serie, dtype=np.float64))
+    grupos = list(range(serie.shape[0])) if grupos is None else list(grupos)
+    posicoes = np.asarray(dias_eventos, dtype=np.int64) - int(primeiro_dia)
+    excluidos = np.zeros(serie.shape[1], dtype=bool)
+    for dias in (posicoes, np.asarray(dias_excluidos, dtype=np.int64) - int(primeiro_dia)):
+        excluidos[dias[(dias >= 0) & (dias < serie.shape[1])]] = True
+    esperado = linha_de_base(serie, k, semanas, excluidos)
+    total = serie.sum(axis=0)
+    esperado_total = esperado.sum(axis=0)
+
+    posicoes = posicoes[(posicoes - k >= 0) & (posicoes + k < serie.shape[1])]
+    indices = posicoes[:, None] + np.arange(-k, k + 1)
+    posicoes = posicoes[np.isfinite(esperado_total[indices]).all(axis=1)]
+    indices = posicoes[:, None] + np.arange(-k, k + 1)
+
+    perfis_observados = total[indices]
+    perfis_esperados = esperado_total[indices]
+    observados_grupos = _somas_janelas(serie, posicoes, k)
+    esperados_grupos = _somas_janelas(np.nan_to_num(esperado), posicoes, k)
+
+    n_eventos = len(posicoes)
+    if n_eventos:
+        rng = np.random.default_rng(semente)
+        pesos = rng.multinomial(n_eventos, np.full(n_eventos, 1 / n_eventos), size=replicas).astype(np.float64)
+        inferior, superior = _quantis_razao(pesos @ perfis_observados, pesos @ perfis_esperados, alfa)
+        inferior_grupos, superior_grupos = _quantis_razao(pesos @ observados_grupos.T, pesos @ esperados_grupos.T, alfa)
+    else:
+        inferior = superior = np.full(2 * k + 1, np.nan)
+        inferior_grupos = superior_grupos = np.full(len(grupos), np.nan)
+
+    def tabela(observado, esperado_janela, inferior, superior, indice):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            razao = np.where(esperado_janela > 0, observado / esperado_janela, np.nan)
+        return pd.DataFrame({
+            'observado': observado, 'esperado': esperado_janela, 'razao': razao,
+            'inferior': inferior, 'superior': superior
+        }, index=indice)
+
+    perfil = tabela(perfis_observados.sum(axis=0), perfis_esperados.sum(axis=0), inferior, superior,
+                    pd.RangeIndex(-k, k + 1, name='deslocamento'))
+    por_grupo = tabela(observados_grupos.sum(axis=1), esperados_grupos.sum(axis=1), inferior_grupos, superior_grupos,
+                       pd.Index(grupos, name='grupo'))
+    return {'perfil': perfil, 'por_grupo': por_grupo, 'eventos': n_eventos}
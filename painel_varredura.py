@@ -0,0 +1,361 @@
+"""
+Varredura espaço-temporal (estatística de Kulldorff, modelo de Poisson).
+
+Procura aglomerados de municípios vizinhos com excesso de ocorrências durante
+algumas semanas. Os candidatos são cilindros: na base, um conjunto de
+municípios que cresce a partir de um centro pelo centroide mais próximo (e
+conexo pela adjacência); na altura, uma janela de semanas consecutivas. O
+número esperado de casos vem da população feminina de cada município,
+condicionado ao total de cada semana. A significância é avaliada por réplicas
+de Monte Carlo distribuídas num pool de processos, com parada antecipada quando
+o aglomerado principal já não pode ser significativo.
+
+O cálculo é caro demais para o ciclo de uma requisição: roda em lote
+(`python -m painel_varredura`) e grava o resultado em `data/.cache`, de onde o
+painel apenas lê.
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from scipy.special import xlogy
+
+from painel_ingest import (
+    abrir_store, compilar_store, ler_geojson, normalizar_serie, assinatura_fontes, _mesmo_conteudo, _gravar_json,
+    caminho_aliases, ARQUIVOS_FONTE, DIRETORIO_CACHE, DIA_ORDINAL_AUSENTE
+)
+from painel_espacial import carregar_adjacencia, centroides_km
+
+logger = logging.getLogger('painel_varredura')
+
+ARQUIVO_VARREDURA = 'varredura_espaco_temporal.json'
+VERSAO_VARREDURA = 1
+ROTULO_TODOS = 'Todos os fatos'
+
+# Parâmetros padrão: semanas como unidade de tempo, aglomerados de até 20
+# municípios e 20% da população feminina, com duração de até 8 semanas.
+DIAS_POR_PERIODO = 7
+MAX_MUNICIPIOS = 20
+MAX_FRACAO_POPULACAO = 0.2
+MAX_DURACAO = 8
+REPLICAS = 999
+ALFA = 0.05
+REPLICAS_POR_TAREFA = 8
+MAX_AGLOMERADOS = 10
+SEMENTE = 20240101
+
+
+def montar_zonas(centroides, adjacentes, fracoes_populacao, max_municipios=MAX_MUNICIPIOS, max_fracao=MAX_FRACAO_POPULACAO):
+    """
+    Bases dos cilindros: para cada centro, os municípios em ordem de distância.
+
+    Devolve (membros, fracoes, validas), todos com forma (centros, k): o índice
+    do k-ésimo município mais próximo, a fração acumulada da população e se o
+    conjunto até ali é uma zona válida (dentro do limite de população e com cada
+    município tocando algum dos anteriores).
+    """
+    n = len(centroides)
+    k = min(max_municipios, n)
+    distancias = np.linalg.norm(centroides[:, None, :] - centroides[None, :, :], axis=-1)
+    membros = np.argsort(distancias, axis=1, kind='stable')[:, :k]
+    fracoes = np.cumsum(fracoes_populacao[membros], axis=1)
+
+    conexos = np.ones((n, k), dtype=bool)
+    for j in range(1, k):
+        toca_anterior = adjacentes[membros[:, j][:, None], membros[:, :j]].any(axis=1)
+        conexos[:, j] = conexos[:, j - 1] & toca_anterior
+    validas = conexos & (fracoes <= max_fracao)
+    validas[:, 0] = True
+    return membros, fracoes, validas
+
+
+def _razao_verossimilhanca(casos, esperados, total):
+    """Log da razão de verossimilhança de Poisson, só para excesso de casos (casos > esperados)."""
+    excesso = casos > esperados
+    c, e = casos[excesso], esperados[excesso]
+    llr = np.zeros(casos.shape)
+    llr[excesso] = c * np.log(c / e) + xlogy(total - c, (total - c) / (total - e))
+    return llr
+
+
+def _varrer(contagens, estrutura, detalhar=False):
+    """
+    Maior razão de verossimilhança entre todos os cilindros.
+
+    Só as zonas válidas entram na conta. Com `detalhar`, devolve também, por
+    zona válida, a melhor razão, o período final e a duração da janela.
+    """
+    centros, ks = estrutura['zonas']
+    fracoes = estrutura['fracoes'][centros, ks]
+    totais_periodo = estrutura['totais_periodo']
+    total = totais_periodo.sum()
+    num_periodos = len(totais_periodo)
+
+    prefixo = np.zeros((len(centros), num_periodos + 1))
+    np.cumsum(np.cumsum(contagens[estrutura['membros']], axis=1)[centros, ks], axis=1, out=prefixo[:, 1:])
+    prefixo_total = np.concatenate([[0.0], np.cumsum(totais_periodo)])
+
+    melhor = np.zeros(len(centros))
+    fim = np.zeros(len(centros), dtype=np.int32)
+    duracao = np.zeros(len(centros), dtype=np.int32)
+    for d in range(1, min(estrutura['max_duracao'], num_periodos) + 1):
+        if estrutura['prospectiva']:
+            casos = prefixo[:, -1:] - prefixo[:, -1 - d:-d]
+            totais_janela = prefixo_total[-1:] - prefixo_total[-1 - d:-d]
+            primeiro_fim = num_periodos - 1
+        else:
+            casos = prefixo[:, d:] - prefixo[:, :-d]
+            totais_janela = prefixo_total[d:] - prefixo_total[:-d]
+            primeiro_fim = d - 1
+        llr = _razao_verossimilhanca(casos, fracoes[:, None] * totais_janela, total)
+        posicao = llr.argmax(axis=1)
+        maximo = llr[np.arange(len(centros)), posicao]
+        melhorou = maximo > melhor
+        melhor = np.where(melhorou, maximo, melhor)
+        if detalhar:
+            fim = np.where(melhorou, posicao + primeiro_fim, fim)
+            duracao = np.where(melhorou, d, duracao)
+
+    if detalhar:
+        return melhor, fim, duracao
+    return melhor.max()
+
+
+def _replicas(semente, quantidade, estrutura):
+    """Máximos de `quantidade` réplicas sob a hipótese nula; roda nos processos do pool."""
+    rng = np.random.default_rng(semente)
+    probabilidades = estrutura['fracoes_populacao']
+    totais_periodo = estrutura['totais_periodo'].astype(np.int64)
+    maximos = np.empty(quantidade)
+    for r in range(quantidade):
+        contagens = rng.multinomial(totais_periodo, probabilidades).T
+        maximos[r] = _varrer(contagens, estrutura)
+    return maximos
+
+
+def varredura_espaco_temporal(contagens, populacao, centroides, adjacentes, replicas=REPLICAS, alfa=ALFA,
+                              max_municipios=MAX_MUNICIPIOS, max_fracao=MAX_FRACAO_POPULACAO, max_duracao=MAX_DURACAO,
+                              prospectiva=False, semente=SEMENTE, executor=None):
+    """
+    Varredura espaço-temporal de Poisson sobre uma matriz município x período.
+
+    `contagens` tem forma (municípios, períodos); `populacao`, `centroides`
+    (km) e `adjacentes` (matriz booleana) seguem a mesma ordem de municípios.
+    As réplicas redistribuem o total de cada período entre os municípios na
+    proporção da população e são processadas em tarefas no `executor`, se
+    houver; a simulação para assim que o número de réplicas com máximo igual ou
+    maior que o observado garante p > alfa para o aglomerado principal.
+
+    Devolve (aglomerados, replicas_feitas): os aglomerados (sem municípios em
+    comum) em ordem decrescente de razão de verossimilhança, cada um com seus
+    índices de município, período inicial e final, casos, esperados, risco
+    relativo, razão de verossimilhança e p-valor.
+    """
+    contagens = np.asarray(contagens, dtype='float64')
+    fracoes_populacao = populacao / populacao.sum()
+    membros, fracoes, validas = montar_zonas(centroides, adjacentes, fracoes_populacao, max_municipios, max_fracao)
+    estrutura = {
+        'membros': membros,
+        'fracoes': fracoes,
+        'zonas': np.nonzero(validas),
+        'fracoes_populacao': fracoes_populacao,
+        'totais_periodo': contagens.sum(axis=0),
+        'max_duracao': max_duracao,
+        'prospectiva': prospectiva,
+    }
+    total = contagens.sum()
+    if total == 0:
+        return [], 0
+
+    inicio = time.perf_counter()
+    melhor, fim, duracao = _varrer(contagens, estrutura, detalhar=True)
+    aglomerados = []
+    usados = np.zeros(len(populacao), dtype=bool)
+    for zona in np.argsort(-melhor, kind='stable'):
+        centro, k = estrutura['zonas'][0][zona], estrutura['zonas'][1][zona]
+        if melhor[zona] <= 0 or len(aglomerados) == MAX_AGLOMERADOS:
+            break
+        municipios = membros[centro, :k + 1]
+        if usados[municipios].any():
+            continue
+        usados[municipios] = True
+        primeiro, ultimo = fim[zona] - duracao[zona] + 1, fim[zona]
+        casos = contagens[municipios, primeiro:ultimo + 1].sum()
+        esperados = fracoes[centro, k] * estrutura['totais_periodo'][primeiro:ultimo + 1].sum()
+        aglomerados.append({
+            'municipios': municipios.tolist(),
+            'periodo_inicial': int(primeiro),
+            'periodo_final': int(ultimo),
+            'casos': int(casos),
+            'esperados': float(esperados),
+            'risco_relativo': float((casos / esperados) / ((total - casos) / (total - esperados))) if total > casos else float('inf'),
+            'llr': float(melhor[zona]),
+        })
+    logger.info("Varredura observada em %.2fs: %d aglomerados candidatos.", time.perf_counter() - inicio, len(aglomerados))
+    if not aglomerados:
+        return [], 0
+
+    observado = aglomerados[0]['llr']
+    parada = math.ceil(alfa * (replicas + 1))
+    tarefas = [min(REPLICAS_POR_TAREFA, replicas - i) for i in range(0, replicas, REPLICAS_POR_TAREFA)]
+    sementes = np.random.SeedSequence(semente).spawn(len(tarefas))
+    paralelas = getattr(executor, '_max_workers', 1) * 2 if executor is not None else 1
+
+    maximos = []
+    inicio = time.perf_counter()
+    for onda in range(0, len(tarefas), paralelas):
+        lote = list(zip(sementes[onda:onda + paralelas], tarefas[onda:onda + paralelas]))
+        if executor is not None:
+            futuros = [executor.submit(_replicas, s, q, estrutura) for s, q in lote]
+            maximos.extend(np.concatenate([futuro.result() for futuro in futuros]))
+        else:
+            maximos.extend(np.concatenate([_replicas(s, q, estrutura) for s, q in lote]))
+        if sum(m >= observado for m in maximos) >= parada:
+            logger.info("Parada antecipada após %d réplicas: aglomerado principal não significativo.", len(maximos))
+            break
+    maximos = np.asarray(maximos)
+    logger.info("%d réplicas em %.2fs.", len(maximos), time.perf_counter() - inicio)
+
+    for aglomerado in aglomerados:
+        aglomerado['p_valor'] = float((1 + (maximos >= aglomerado['llr']).sum()) / (len(maximos) + 1))
+    return aglomerados, len(maximos)
+
+
+def _fontes_varredura(diretorio_dados):
+    fontes = [os.path.join(diretorio_dados, ARQUIVOS_FONTE[nome]) for nome in ('geral', 'populacao', 'geojson')]
+    return [c for c in fontes + [caminho_aliases(diretorio_dados)] if os.path.exists(c)]
+
+
+def executar_varredura(diretorio_dados='data', por_fato=False, executor=None, **parametros):
+    """
+    Roda a varredura sobre a base completa (e, com `por_fato`, sobre cada tipo de
+    fato) e grava o resultado em `data/.cache`, com a assinatura das fontes usadas.
+    """
+    inicio = time.perf_counter()
+    tabelas = abrir_store(os.path.join(diretorio_dados, 'painel_store')) or compilar_store(diretorio_dados)
+    df_fatos, df_populacao = tabelas['fatos'], tabelas['dim_populacao']
+
+    geojson_data = ler_geojson(diretorio_dados)
+    nomes = normalizar_serie(
+        pd.Series([feature['properties'].get('NM_MUN') for feature in geojson_data['features']]), caminho_aliases(diretorio_dados)
+    )
+    for feature, nome in zip(geojson_data['features'], nomes):
+        feature['properties']['NM_MUN_NORMALIZADO'] = nome
+    vizinhos = carregar_adjacencia(os.path.join(diretorio_dados, ARQUIVOS_FONTE['geojson']), geojson_data)
+
+    populacao = df_populacao.drop_duplicates('municipio_normalizado').set_index('municipio_normalizado')['populacao_feminina']
+    com_populacao = nomes.isin(populacao[populacao > 0].index).to_numpy()
+    nomes_unidades = pd.Index(nomes[com_populacao])
+    centroides = centroides_km(geojson_data)[com_populacao]
+    adjacentes = np.zeros((len(nomes_unidades), len(nomes_unidades)), dtype=bool)
+    for i, nome in enumerate(nomes_unidades):
+        posicoes = nomes_unidades.get_indexer(vizinhos.get(nome, []))
+        adjacentes[i, posicoes[posicoes >= 0]] = True
+
+    dias = df_fatos['dia_ordinal'].to_numpy()
+    validas = dias != DIA_ORDINAL_AUSENTE
+    primeiro_dia = int(dias[validas].min())
+    periodos = (dias - primeiro_dia) // parametros.get('dias_por_periodo', DIAS_POR_PERIODO)
+    num_periodos = int(periodos[validas].max()) + 1
+    unidades = nomes_unidades.get_indexer(df_fatos['municipio_normalizado'].astype(object))
+    validas &= unidades >= 0
+
+    recortes = {ROTULO_TODOS: validas}
+    if por_fato:
+        for fato in df_fatos['fato_comunicado'].dropna().unique():
+            recortes[str(fato)] = validas & (df_fatos['fato_comunicado'] == fato).to_numpy()
+
+    parametros_varredura = {c: v for c, v in parametros.items() if c != 'dias_por_periodo'}
+    dias_por_periodo = parametros.get('dias_por_periodo', DIAS_POR_PERIODO)
+    resultados = {}
+    for rotulo, mascara in recortes.items():
+        contagens = np.zeros((len(nomes_unidades), num_periodos))
+        np.add.at(contagens, (unidades[mascara], periodos[mascara]), 1)
+        logger.info("Varrendo '%s' (%d ocorrências).", rotulo, int(contagens.sum()))
+        aglomerados, replicas_feitas = varredura_espaco_temporal(
+            contagens, populacao.reindex(nomes_unidades).to_numpy(dtype='float64'), centroides, adjacentes,
+            executor=executor, **parametros_varredura
+        )
+        for aglomerado in aglomerados:
+            aglomerado['municipios'] = nomes_unidades[aglomerado['municipios']].tolist()
+            aglomerado['data_inicial'] = str(pd.Timestamp(primeiro_dia + aglomerado['periodo_inicial'] * dias_por_periodo, unit='D').date())
+            aglomerado['data_final'] = str(pd.Timestamp(primeiro_dia + (aglomerado['periodo_final'] + 1) * dias_por_periodo - 1, unit='D').date())
+        resultados[rotulo] = {'aglomerados': aglomerados, 'replicas': replicas_feitas, 'ocorrencias': int(contagens.sum())}
+
+    os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+    _gravar_json(os.path.join(DIRETORIO_CACHE, ARQUIVO_VARREDURA), {
+        'versao': VERSAO_VARREDURA,
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'fontes': assinatura_fontes(_fontes_varredura(diretorio_dados)),
+        'parametros': {'dias_por_periodo': dias_por_periodo, **parametros_varredura},
+        'resultados': resultados,
+    })
+    logger.info("Varredura gravada em '%s' em %.2fs.", os.path.join(DIRETORIO_CACHE, ARQUIVO_VARREDURA), time.perf_counter() - inicio)
+    return resultados
+
+
+def carregar_varredura(diretorio_dados='data'):
+    """
+    Lê o resultado gravado por `executar_varredura`.
+
+    Retorna o conteúdo do arquivo, ou None se ele não existir, for de outra
+    versão ou estiver desatualizado em relação às fontes.
+    """
+    caminho = os.path.join(DIRETORIO_CACHE, ARQUIVO_VARREDURA)
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            conteudo = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if conteudo.get('versao') != VERSAO_VARREDURA:
+        return None
+    if not _mesmo_conteudo(conteudo.get('fontes', {}), assinatura_fontes(_fontes_varredura(diretorio_dados), conteudo.get('fontes'))):
+        logger.warning("Varredura em '%s' desatualizada em relação às bases; rode 'python -m painel_varredura'.", caminho)
+        return None
+    return conteudo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m painel_varredura',
+        description="Roda a varredura espaço-temporal de Kulldorff e grava o resultado lido pelo painel."
+    )
+    parser.add_argument('diretorio_dados', nargs='?', default='data', help="Diretório com as planilhas de origem (padrão: data).")
+    parser.add_argument('--por-fato', action='store_true', help="Roda também uma varredura para cada tipo de fato.")
+    parser.add_argument('--replicas', type=int, default=REPLICAS, help=f"Réplicas de Monte Carlo (padrão: {REPLICAS}).")
+    parser.add_argument('--max-duracao', type=int, default=MAX_DURACAO, help=f"Duração máxima do aglomerado em períodos (padrão: {MAX_DURACAO}).")
+    parser.add_argument('--dias-por-periodo', type=int, default=DIAS_POR_PERIODO, help=f"Dias por período (padrão: {DIAS_POR_PERIODO}).")
+    parser.add_argument('--prospectiva', action='store_true', help="Só considera janelas que terminam no último período (aglomerados em andamento).")
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1, help="Processos para as réplicas (padrão: todos os núcleos).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    parametros = {
+        'replicas': args.replicas,
+        'max_duracao': args.max_duracao,
+        'dias_por_periodo': args.dias_por_periodo,
+        'prospectiva': args.prospectiva,
+    }
+    try:
+        if args.processos > 1:
+            with ProcessPoolExecutor(max_workers=args.processos, mp_context=multiprocessing.get_context('spawn')) as executor:
+                executar_varredura(args.diretorio_dados, args.por_fato, executor, **parametros)
+        else:
+            executar_varredura(args.diretorio_dados, args.por_fato, **parametros)
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        logger.error("Falha na varredura: %s", e)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from painel_consultas import criar_tabela_evolucao_anual
+
+
+# --- Construtores antigos das tabelas consolidadas, copiados sem alteração da versão anterior do painel ---
+
+def calcular_cagr(valor_inicial, valor_final, num_anos):
+    """Calcula a Taxa de Crescimento Anual Composta (CAGR)."""
+    if isinstance(valor_inicial, pd.Series):
+        cagr = pd.Series(np.nan, index=valor_inicial.index, dtype='float64')
+        if num_anos < 3:
+            return cagr
+
+        mask = (valor_inicial.notna()) & (valor_final.notna()) & (valor_inicial != 0)
+
+        cagr.loc[mask] = ((valor_final[mask] / valor_inicial[mask]) ** (1 / (num_anos - 1)) - 1) * 100
+        return cagr
+    else:
+        if pd.isna(valor_inicial) or pd.isna(valor_final) or valor_inicial == 0 or num_anos < 3:
+            return np.nan
+        return ((valor_final / valor_inicial) ** (1 / (num_anos - 1)) - 1) * 100
+
+
+def criar_tabela_consolidada(df, coluna_agrupamento, nome_agrupamento):
+    """Cria uma tabela consolidada com dados de crimes por [agrupamento]."""
+    df_agrupado = df.groupby([coluna_agrupamento, 'fato_comunicado', 'ano'], observed=True).size().reset_index(name='total_crime')
+    df_pivot = df_agrupado.pivot_table(index=[coluna_agrupamento, 'fato_comunicado'], columns='ano', values='total_crime', fill_value=0, observed=True)
+    df_pivot = df_pivot.reindex(sorted(df_pivot.columns), axis=1)
+    df_pivot['total'] = df_pivot.sum(axis=1)
+
+    anos = sorted(df_agrupado['ano'].unique())
+    if len(anos) > 1:
+        for i in range(1, len(anos)):
+            ano_atual = anos[i]
+            ano_anterior = anos[i-1]
+            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
+            df_pivot[coluna_evolucao] = (
+                (df_pivot[ano_atual] - df_pivot[ano_anterior]) / df_pivot[ano_anterior].replace(0, pd.NA) * 100
+            )
+
+    anos_int = sorted([col for col in df_pivot.columns if isinstance(col, int)])
+
+    ano_corrente = pd.Timestamp.now().year
+    anos_para_cagr = [ano for ano in anos_int if ano != ano_corrente]
+
+    if len(anos_para_cagr) >= 3:
+        valor_inicial = df_pivot[anos_para_cagr[0]]
+        valor_final = df_pivot[anos_para_cagr[-1]]
+        df_pivot['Tendência (CAGR %)'] = calcular_cagr(valor_inicial, valor_final, len(anos_para_cagr))
+
+    ordem_colunas = []
+    if anos_int:
+        ordem_colunas.append(anos_int[0])
+        for i in range(1, len(anos_int)):
+            ano_anterior = anos_int[i-1]
+            ano_atual = anos_int[i]
+            ordem_colunas.append(ano_atual)
+            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
+            if coluna_evolucao in df_pivot.columns:
+                ordem_colunas.append(coluna_evolucao)
+
+    ordem_colunas.append('total')
+    if 'Tendência (CAGR %)' in df_pivot.columns:
+        ordem_colunas.append('Tendência (CAGR %)')
+
+    df_consolidado = df_pivot[ordem_colunas].reset_index()
+    nome_coluna = f"Nome do {nome_agrupamento}" if nome_agrupamento == "Município" else nome_agrupamento
+    df_consolidado.rename(columns={coluna_agrupamento: nome_coluna, 'fato_comunicado': 'Fato Comunicado'}, inplace=True)
+
+    return df_consolidado
+
+
+def criar_tabela_total_consolidada(df):
+    """Cria uma tabela consolidada com o total de crimes por tipo."""
+    df_agrupado = df.groupby(['fato_comunicado', 'ano'], observed=True).size().reset_index(name='total_crime')
+    df_pivot = df_agrupado.pivot_table(index='fato_comunicado', columns='ano', values='total_crime', fill_value=0, observed=True)
+
+    anos_existentes = [col for col in df_pivot.columns if isinstance(col, (int, float))]
+    if anos_existentes:
+        anos_todos = range(int(min(anos_existentes)), int(max(anos_existentes)) + 1)
+        for ano in anos_todos:
+            if ano not in df_pivot.columns:
+                df_pivot[ano] = 0
+
+    df_pivot = df_pivot.reindex(sorted(df_pivot.columns), axis=1)
+    df_pivot['total'] = df_pivot.sum(axis=1)
+
+    anos = sorted([col for col in df_pivot.columns if isinstance(col, (int, float))])
+
+    if len(anos) > 1:
+        for i in range(1, len(anos)):
+            ano_atual = anos[i]
+            ano_anterior = anos[i-1]
+            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
+
+            denominador = df_pivot[ano_anterior].replace(0, pd.NA)
+            df_pivot[coluna_evolucao] = (df_pivot[ano_atual] - df_pivot[ano_anterior]) / denominador * 100
+
+    anos_int = sorted([col for col in df_pivot.columns if isinstance(col, int)])
+
+    ano_corrente = pd.Timestamp.now().year
+    anos_para_cagr = [ano for ano in anos_int if ano != ano_corrente]
+
+    if len(anos_para_cagr) >= 3:
+        valor_inicial = df_pivot[anos_para_cagr[0]]
+        valor_final = df_pivot[anos_para_cagr[-1]]
+        df_pivot['Tendência (CAGR %)'] = calcular_cagr(valor_inicial, valor_final, len(anos_para_cagr))
+
+    ordem_colunas = []
+    if anos_int:
+        ordem_colunas.append(anos_int[0])
+        for i in range(1, len(anos_int)):
+            ano_anterior = anos_int[i-1]
+            ano_atual = anos_int[i]
+            ordem_colunas.append(ano_atual)
+            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
+            if coluna_evolucao in df_pivot.columns:
+                ordem_colunas.append(coluna_evolucao)
+
+    ordem_colunas.append('total')
+    if 'Tendência (CAGR %)' in df_pivot.columns:
+        ordem_colunas.append('Tendência (CAGR %)')
+
+    df_consolidado = df_pivot[ordem_colunas].reset_index()
+    df_consolidado.rename(columns={'fato_comunicado': 'Fato Comunicado'}, inplace=True)
+
+    return df_consolidado
+
+
+def criar_tabela_feminicidio_agrupado(df, coluna_agrupamento, nome_agrupamento):
+    """Cria uma tabela consolidada com dados de feminicídios por [agrupamento]."""
+    df_agrupado = df.groupby([coluna_agrupamento, 'ano'], observed=True).size().reset_index(name='total_crime')
+    df_pivot = df_agrupado.pivot_table(index=coluna_agrupamento, columns='ano', values='total_crime', fill_value=0, observed=True)
+
+    anos_existentes = [col for col in df_pivot.columns if isinstance(col, (int, float))]
+    if anos_existentes:
+        anos_todos = range(int(min(anos_existentes)), int(max(anos_existentes)) + 1)
+        for ano in anos_todos:
+            if ano not in df_pivot.columns:
+                df_pivot[ano] = 0
+
+    df_pivot = df_pivot.reindex(sorted(df_pivot.columns), axis=1)
+    df_pivot['total'] = df_pivot.sum(axis=1)
+
+    anos = sorted([col for col in df_pivot.columns if isinstance(col, (int, float))])
+
+    if len(anos) > 1:
+        for i in range(1, len(anos)):
+            ano_atual = anos[i]
+            ano_anterior = anos[i-1]
+            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
+            denominador = df_pivot[ano_anterior].replace(0, pd.NA)
+            df_pivot[coluna_evolucao] = (df_pivot[ano_atual] - df_pivot[ano_anterior]) / denominador * 100
+
+    anos_int = sorted([col for col in df_pivot.columns if isinstance(col, int)])
+
+    ano_corrente = pd.Timestamp.now().year
+    anos_para_cagr = [ano for ano in anos_int if ano != ano_corrente]
+
+    if len(anos_para_cagr) >= 3:
+        valor_inicial = df_pivot[anos_para_cagr[0]]
+        valor_final = df_pivot[anos_para_cagr[-1]]
+        df_pivot['Tendência (CAGR %)'] = calcular_cagr(valor_inicial, valor_final, len(anos_para_cagr))
+
+    ordem_colunas = []
+    if anos_int:
+        ordem_colunas.append(anos_int[0])
+        for i in range(1, len(anos_int)):
+            ano_anterior = anos_int[i-1]
+            ano_atual = anos_int[i]
+            ordem_colunas.append(ano_atual)
+            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
+            if coluna_evolucao in df_pivot.columns:
+                ordem_colunas.append(coluna_evolucao)
+
+    ordem_colunas.append('total')
+    if 'Tendência (CAGR %)' in df_pivot.columns:
+        ordem_colunas.append('Tendência (CAGR %)')
+
+    df_consolidado = df_pivot[ordem_colunas].reset_index()
+    nome_coluna = f"Nome do {nome_agrupamento}" if nome_agrupamento == "Município" else nome_agrupamento
+    df_consolidado.rename(columns={coluna_agrupamento: nome_coluna}, inplace=True)
+
+    return df_consolidado
+
+
+def criar_tabela_total_feminicidio(df):
+    """Cria uma tabela consolidada com o total de feminicídios por ano."""
+    if df.empty:
+        return pd.DataFrame(columns=['Tipo de Crime', 'total'])
+
+    df_agrupado = df.groupby('ano').size().reset_index(name='total_crime')
+    df_pivot = df_agrupado.pivot_table(columns='ano', values='total_crime', fill_value=0)
+
+    anos_existentes = [col for col in df.ano.unique() if isinstance(col, (int, float))]
+    if anos_existentes:
+        anos_todos = range(int(min(anos_existentes)), int(max(anos_existentes)) + 1)
+        for ano in anos_todos:
+            if ano not in df_pivot.columns:
+                df_pivot[ano] = 0
+    df_pivot = df_pivot.reindex(sorted(df_pivot.columns), axis=1)
+
+    df_pivot['total'] = df_pivot.sum(axis=1)
+
+    anos = sorted([col for col in df_pivot.columns if isinstance(col, (int, float))])
+
+    if len(anos) > 1:
+        for i in range(1, len(anos)):
+            ano_atual = anos[i]
+            ano_anterior = anos[i-1]
+            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
+            denominador = df_pivot[ano_anterior].replace(0, pd.NA)
+            df_pivot[coluna_evolucao] = (df_pivot[ano_atual] - df_pivot[ano_anterior]) / denominador * 100
+
+    anos_int = sorted([col for col in df_pivot.columns if isinstance(col, int)])
+
+    ano_corrente = pd.Timestamp.now().year
+    anos_para_cagr = [ano for ano in anos_int if ano != ano_corrente]
+
+    if len(anos_para_cagr) >= 3:
+        valor_inicial = df_pivot[anos_para_cagr[0]]
+        valor_final = df_pivot[anos_para_cagr[-1]]
+        df_pivot['Tendência (CAGR %)'] = calcular_cagr(valor_inicial, valor_final, len(anos_para_cagr))
+
+    ordem_colunas = []
+    if anos_int:
+        ordem_colunas.append(anos_int[0])
+        for i in range(1, len(anos_int)):
+            ano_anterior = anos_int[i-1]
+            ano_atual = anos_int[i]
+            ordem_colunas.append(ano_atual)
+            coluna_evolucao = f'Diferença {ano_anterior}-{ano_atual}'
+            if coluna_evolucao in df_pivot.columns:
+                ordem_colunas.append(coluna_evolucao)
+
+    ordem_colunas.append('total')
+    if 'Tendência (CAGR %)' in df_pivot.columns:
+        ordem_colunas.append('Tendência (CAGR %)')
+
+    df_consolidado = df_pivot[ordem_colunas].reset_index(drop=True)
+    df_consolidado.insert(0, 'Tipo de Crime', 'Feminicídio')
+
+    return df_consolidado
+
+
+# --- Regressão ---
+
+def _base_sintetica():
+    rng = np.random.default_rng(5)
+    n = 600
+    df = pd.DataFrame({
+        'municipio': pd.Categorical(rng.choice(['JOINVILLE', 'BLUMENAU', 'LAGES', 'ITAJAI'], n),
+                                    categories=['BLUMENAU', 'ITAJAI', 'JOINVILLE', 'LAGES', 'SEM REGISTROS']),
+        'fato_comunicado': pd.Categorical(rng.choice(['Ameaça', 'Estupro', 'Vias de Fato'], n)),
+        'ano': rng.choice(np.arange(2018, 2024, dtype=np.int16), n),
+    })
+    df['mesoregiao'] = df['municipio'].map({'JOINVILLE': 'Norte', 'BLUMENAU': 'Vale', 'LAGES': 'Serrana', 'ITAJAI': 'Vale'})
+    # Grupos sem registro em alguns anos: variação a partir de zero e CAGR sem valor inicial.
+    return df[~((df['municipio'] == 'LAGES') & df['ano'].isin([2018, 2020]))
+              & ~((df['municipio'] == 'ITAJAI') & (df['fato_comunicado'] == 'Estupro') & (df['ano'] == 2021))]
+
+
+def _comparar(nova, antiga):
+    assert list(nova.columns) == list(antiga.columns)
+    for coluna in nova.columns:
+        if pd.api.types.is_numeric_dtype(nova[coluna]):
+            np.testing.assert_allclose(
+                nova[coluna].to_numpy(dtype='float64'), pd.to_numeric(antiga[coluna]).to_numpy(dtype='float64', na_value=np.nan),
+                err_msg=str(coluna)
+            )
+        else:
+            assert nova[coluna].astype(str).tolist() == antiga[coluna].astype(str).tolist(), coluna
+
+
+@pytest.mark.parametrize('coluna, nome', [('municipio', 'Município'), ('mesoregiao', 'Mesorregião')])
+def test_tabela_por_agrupamento_e_fato_igual_a_criar_tabela_consolidada(coluna, nome):
+    df = _base_sintetica()
+    nome_coluna = f"Nome do {nome}" if nome == "Município" else nome
+    nova = criar_tabela_evolucao_anual(df, [coluna, 'fato_comunicado'], {coluna: nome_coluna, 'fato_comunicado': 'Fato Comunicado'})
+    _comparar(nova, criar_tabela_consolidada(df, coluna, nome))
+
+
+def test_tabela_total_por_fato_igual_a_criar_tabela_total_consolidada():
+    df = _base_sintetica()
+    nova = criar_tabela_evolucao_anual(df, ['fato_comunicado'], {'fato_comunicado': 'Fato Comunicado'})
+    _comparar(nova, criar_tabela_total_consolidada(df))
+
+
+def test_tabela_de_feminicidios_por_agrupamento_igual_a_criar_tabela_feminicidio_agrupado():
+    df = _base_sintetica()
+    nova = criar_tabela_evolucao_anual(df, ['municipio'], {'municipio': 'Nome do Município'})
+    _comparar(nova, criar_tabela_feminicidio_agrupado(df, 'municipio', 'Município'))
+
+
+def test_total_de_feminicidios_igual_a_criar_tabela_total_feminicidio():
+    df = _base_sintetica()
+    nova = criar_tabela_evolucao_anual(df.assign(tipo_de_crime='Feminicídio'), ['tipo_de_crime'], {'tipo_de_crime': 'Tipo de Crime'})
+    _comparar(nova, criar_tabela_total_feminicidio(df))
+
+
+def test_anos_sem_registro_entram_com_zero():
+    # Mudança intencional: a tabela antiga por agrupamento e fato pulava o ano ausente ('Diferença 2019-2021').
+    df = _base_sintetica()
+    df = df[df['ano'] != 2020]
+    nova = criar_tabela_evolucao_anual(df, ['municipio', 'fato_comunicado'])
+    assert (nova[2020] == 0).all()
+    assert 'Diferença 2019-2021' in criar_tabela_consolidada(df, 'municipio', 'Município').columns
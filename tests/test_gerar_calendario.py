@@ -0,0 +1,59 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from gerar_calendario import (
+    _dias_com_feriados, carregar_feriados_municipais, marcar_tipos_de_dia, montar_camada_municipal,
+)
+from painel_consultas import CalendarioDias
+from painel_ingest import dia_ordinal
+
+# 2023-06-14 é uma quarta-feira, sem feriado nacional ou estadual nos dias vizinhos.
+FERIADO_MUNICIPAL = pd.Timestamp('2023-06-14')
+
+
+def _calendario_geral():
+    df = marcar_tipos_de_dia(_dias_com_feriados(date(2023, 1, 1), date(2023, 12, 31)))
+    return CalendarioDias.de_tabela(df.assign(dia_ordinal=dia_ordinal(df['data'])))
+
+
+def _tabela_municipal(tmp_path, linhas):
+    caminho = tmp_path / 'feriados_municipais.csv'
+    pd.DataFrame(linhas, columns=['municipio', 'data', 'nome', 'fonte']).to_csv(caminho, index=False)
+    return carregar_feriados_municipais(str(caminho), anos=[2023], arquivo_aliases=str(tmp_path / 'sem_aliases.csv'))
+
+
+def test_feriado_municipal_vale_so_para_o_proprio_municipio(tmp_path):
+    geral = _calendario_geral()
+    municipais = _tabela_municipal(tmp_path, [('Joinville', '14/06', 'Feriado de teste', 'teste')])
+    calendario = montar_camada_municipal(geral, ['BLUMENAU', 'JOINVILLE', 'LAGES'], municipais)
+
+    assert calendario.municipios.tolist() == ['JOINVILLE']
+    datas = pd.Series(pd.date_range(FERIADO_MUNICIPAL - pd.Timedelta(days=1), periods=3))
+    dias = dia_ordinal(datas)
+    joinville = calendario.classificar(datas, ['JOINVILLE'] * 3)
+    assert joinville['is_vespera_feriado'].tolist() == [True, False, False]
+    assert joinville['is_feriado'].tolist() == [False, True, False]
+    assert joinville['is_pos_feriado'].tolist() == [False, False, True]
+    assert calendario.feriados_dias(dias, calendario.linhas_municipios(['JOINVILLE'] * 3)).tolist() == [None, 'Feriado de teste', None]
+
+    for outro in ('BLUMENAU', 'LAGES', 'MUNICIPIO FORA DO MAPA'):
+        pd.testing.assert_frame_equal(calendario.classificar(datas, [outro] * 3), geral.classificar(datas))
+        assert not calendario.classificar(datas, [outro] * 3).any(axis=None)
+    np.testing.assert_array_equal(calendario.codigos, geral.codigos)
+
+
+def test_sem_feriados_municipais_nao_ha_camada(tmp_path):
+    geral = _calendario_geral()
+    for linhas in ([], [('Joinville', '25/12', 'Natal', 'teste')]):
+        calendario = montar_camada_municipal(geral, ['JOINVILLE', 'LAGES'], _tabela_municipal(tmp_path, linhas))
+        assert len(calendario.municipios) == 0
+        assert calendario.codigos_municipios.size == 0
+
+
+def test_tabela_de_feriados_municipais_entra_inteira_no_artefato():
+    # Todo município da tabela precisa casar com o GeoJSON e ter a sua linha no calendário gravado.
+    calendario = CalendarioDias.carregar()
+    tabela = carregar_feriados_municipais(anos=[2023])
+    assert len(tabela) and set(tabela['municipio_normalizado']) == set(calendario.municipios)
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from painel_consultas import (
+    CacheResultados, ContagensDiariasAcumuladas, IndiceCubo, IndiceFiltro, contar_por_linha_semanal,
+    dias_por_linha_semanal, media_ponderada_cubo, montar_cubo, somar_cubo,
+)
+from painel_ingest import DIA_ORDINAL_AUSENTE, dia_ordinal
+
+DIMENSOES = ['municipio', 'fato']
+INTERVALOS = ['dia_ordinal', 'idade']
+
+
+@pytest.fixture(scope='module')
+def base():
+    rng = np.random.default_rng(7)
+    n = 500
+    municipios = pd.Categorical(rng.choice(['A', 'B', 'C'], n), categories=['A', 'B', 'C', 'Sem casos'])
+    fatos = rng.choice(np.array(['Ameaça', 'Estupro', None], dtype=object), n, p=[0.6, 0.3, 0.1])
+    idades = rng.integers(0, 90, n).astype(float)
+    idades[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame({
+        'municipio': municipios, 'fato': fatos,
+        'dia_ordinal': rng.integers(19000, 19400, n), 'idade': idades,
+    })
+
+
+def _filtrar_com_mascara(df, selecoes, intervalos):
+    mascara = pd.Series(True, index=df.index)
+    for coluna, valores in selecoes.items():
+        mascara &= df[coluna].isin(list(valores))
+    for coluna, (inicio, fim) in intervalos.items():
+        mascara &= df[coluna].between(inicio, fim)
+    return df[mascara]
+
+
+@pytest.mark.parametrize('selecoes, intervalos', [
+    ({'municipio': []}, {}),
+    ({'fato': []}, {'dia_ordinal': (19000, 19400)}),
+    ({'municipio': ['A', 'B', 'C', 'Sem casos']}, {}),
+    ({'municipio': ['A', 'B', 'C'], 'fato': ['Ameaça', 'Estupro']}, {}),
+    ({'fato': ['Estupro']}, {}),
+    ({}, {'idade': (0, np.inf)}),
+    ({'municipio': ['B']}, {'idade': (18, 29)}),
+    ({}, {'dia_ordinal': (19500, 19600)}),
+    ({'municipio': ['A']}, {'dia_ordinal': (18000, 18999)}),
+    ({'municipio': ['A', 'Inexistente'], 'fato': ['Ameaça']}, {'dia_ordinal': (19100, 19200), 'idade': (10, 60)}),
+])
+def test_indice_filtro_equivale_a_mascara_booleana(base, selecoes, intervalos):
+    indice = IndiceFiltro(base, DIMENSOES, INTERVALOS)
+    pd.testing.assert_frame_equal(
+        indice.filtrar(base, selecoes, intervalos), _filtrar_com_mascara(base, selecoes, intervalos)
+    )
+
+
+def test_selecao_completa_sem_ausentes_nao_filtra(base):
+    indice = IndiceFiltro(base, DIMENSOES, INTERVALOS)
+    assert indice.linhas({'municipio': ['A', 'B', 'C']}, {'dia_ordinal': (19000, 19400)}) is None
+
+
+def _base_datada():
+    rng = np.random.default_rng(11)
+    n = 2000
+    datas = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D')
+    idades = pd.array(rng.integers(0, 90, n), dtype='Int16')
+    idades[rng.random(n) < 0.1] = pd.NA
+    df = pd.DataFrame({
+        'municipio': pd.Categorical(rng.choice(['A', 'B', 'C'], n)),
+        'fato': pd.Categorical(rng.choice(['Ameaça', 'Estupro'], n)),
+        'mes': datas.month, 'dia_ordinal': (datas - pd.Timestamp(0)).days, 'idade': idades,
+    })
+    df['faixa'] = pd.cut(df['idade'], bins=[0, 17, 59, 120])
+    return df
+
+
+def test_cubo_responde_periodos_de_meses_inteiros_e_faixas_inteiras():
+    df = _base_datada()
+    cubo = montar_cubo(df, ['municipio', 'fato', 'mes', 'faixa'], ['dia_ordinal', 'idade'], ['idade'])
+    assert len(cubo) < len(df)
+    indice_cubo = IndiceCubo(cubo, DIMENSOES, ['dia_ordinal', 'idade'])
+    indice = IndiceFiltro(df, DIMENSOES, ['dia_ordinal', 'idade'])
+    inicio_marco, fim_junho = ((pd.Timestamp(d) - pd.Timestamp(0)).days for d in ('2023-03-01', '2023-06-30'))
+
+    intervalos = {'dia_ordinal': (inicio_marco, fim_junho), 'idade': (18, 59)}
+    assert indice_cubo.responde(intervalos)
+    filtrado = indice_cubo.filtrar(cubo, {'fato': ['Estupro']}, intervalos)
+    linhas = indice.filtrar(df, {'fato': ['Estupro']}, intervalos)
+    pd.testing.assert_series_equal(
+        somar_cubo(filtrado, 'mes'), linhas.groupby('mes').size().rename('quantidade').astype(np.int32)
+    )
+    assert media_ponderada_cubo(filtrado, 'idade') == pytest.approx(linhas['idade'].astype(float).mean())
+
+    # Um período que começa no meio de um mês ou uma idade que corta uma faixa divide células.
+    assert not indice_cubo.responde({'dia_ordinal': (inicio_marco + 10, fim_junho), 'idade': (18, 59)})
+    assert not indice_cubo.responde({'dia_ordinal': (inicio_marco, fim_junho), 'idade': (18, 40)})
+
+
+def test_cache_entrega_copias_independentes_e_mede_cada_entrada_uma_vez(monkeypatch):
+    medicoes = []
+    memory_usage = pd.DataFrame.memory_usage
+    monkeypatch.setattr(pd.DataFrame, 'memory_usage', lambda df, **kw: medicoes.append(1) or memory_usage(df, **kw))
+    cache = CacheResultados(10_000_000)
+    calcular = lambda: {'base': pd.DataFrame({'quantidade': [1, 2, 3]}), 'serie': (np.zeros(3), ['A'])}
+
+    primeiro = cache.obter('chave', calcular)
+    primeiro['base'].loc[0, 'quantidade'] = 100
+    primeiro['base']['quantidade'] *= 10
+    primeiro['serie'][0][:] = 7
+    primeiro['serie'][1].append('B')
+
+    segundo = cache.obter('chave', calcular)
+    assert segundo['base']['quantidade'].tolist() == [1, 2, 3]
+    assert segundo['serie'][0].tolist() == [0, 0, 0] and segundo['serie'][1] == ['A']
+    assert cache.estatisticas()['acertos'] == 1
+    assert len(medicoes) == 1
+
+
+# Intervalos começando e terminando em dias da semana diferentes, dentro de um mês, atravessando
+# meses e anos (inclusive bissexto) e com um único dia.
+INTERVALOS_SEMANAIS = [
+    ('2024-02-27', '2024-03-02'),
+    ('2023-01-01', '2023-01-01'),
+    ('2022-12-29', '2023-01-03'),
+    ('2023-05-17', '2023-08-05'),
+    ('2019-06-08', '2024-02-29'),
+    ('2020-12-26', '2021-01-09'),
+]
+
+
+def _dias_por_linha_com_date_range(inicio, fim, linha):
+    datas = pd.date_range(inicio, fim, freq='D')
+    dias_semana = (datas.dayofweek + 1) % 7
+    if linha == 'mes':
+        linhas = datas.month - 1
+    elif linha == 'semana_do_ano':
+        linhas = (datas.dayofyear - 1) // 7
+    else:
+        return np.tile(np.bincount(dias_semana, minlength=7), (24, 1))
+    tamanho = {'mes': 12, 'semana_do_ano': 53}[linha]
+    return np.bincount(linhas * 7 + dias_semana, minlength=tamanho * 7).reshape(tamanho, 7)
+
+
+@pytest.mark.parametrize('linha', ['mes', 'semana_do_ano', 'hora'])
+@pytest.mark.parametrize('inicio, fim', INTERVALOS_SEMANAIS)
+def test_dias_por_linha_semanal_equivale_a_date_range(inicio, fim, linha):
+    d0, d1 = (int(dia_ordinal(pd.Timestamp(d))) for d in (inicio, fim))
+    np.testing.assert_array_equal(dias_por_linha_semanal(d0, d1, linha), _dias_por_linha_com_date_range(inicio, fim, linha))
+
+
+def test_dias_por_linha_semanal_intervalo_vazio():
+    assert not dias_por_linha_semanal(19500, 19499).any()
+
+
+@pytest.mark.parametrize('inicio, fim', INTERVALOS_SEMANAIS)
+def test_contar_por_linha_semanal_equivale_a_date_range(inicio, fim):
+    datas = pd.date_range(inicio, fim, freq='D')
+    codigos_mes = np.append(datas.month - 1, -1)
+    codigos_dia = np.append((datas.dayofweek + 1) % 7, 3)
+    np.testing.assert_array_equal(
+        contar_por_linha_semanal(codigos_mes, codigos_dia), _dias_por_linha_com_date_range(inicio, fim, 'mes'),
+    )
+    pesos = np.append(np.full(len(datas), 2.0), 100.0)
+    np.testing.assert_array_equal(
+        contar_por_linha_semanal(codigos_mes, codigos_dia, pesos=pesos), 2.0 * _dias_por_linha_com_date_range(inicio, fim, 'mes'),
+    )
+
+
+@pytest.fixture(scope='module')
+def contagens(base):
+    df = base.rename(columns={'idade': 'idade_vitima'})
+    df['quantidade'] = 1 + np.arange(len(df)) % 3
+    df.loc[df.index[:5], 'dia_ordinal'] = DIA_ORDINAL_AUSENTE
+    return df, ContagensDiariasAcumuladas(df, DIMENSOES)
+
+
+def _periodos_nas_bordas(primeiro, ultimo):
+    return [
+        (primeiro, primeiro + 30), (primeiro, primeiro), (ultimo - 30, ultimo), (ultimo, ultimo),
+        (primeiro + 100, primeiro + 100), (primeiro, ultimo), (primeiro - 50, primeiro - 1),
+        (ultimo + 1, ultimo + 50), (primeiro - 10, primeiro + 10), (ultimo - 10, ultimo + 10),
+    ]
+
+
+def test_contagens_acumuladas_nas_bordas_da_base(contagens):
+    df, estrutura = contagens
+    validos = df[(df['dia_ordinal'] != DIA_ORDINAL_AUSENTE) & df['idade_vitima'].notna()]
+    primeiro, ultimo = validos['dia_ordinal'].min(), validos['dia_ordinal'].max()
+    assert estrutura.primeiro_dia == primeiro
+
+    selecoes = {'fato': ['Ameaça'], 'municipio': ['A', 'C']}
+    linhas = estrutura.linhas(selecoes)
+    selecionados = _filtrar_com_mascara(validos, selecoes, {})
+    for inicio, fim in _periodos_nas_bordas(primeiro, ultimo):
+        no_periodo = selecionados[selecionados['dia_ordinal'].between(inicio, fim)]
+        assert estrutura.total(linhas, inicio, fim) == no_periodo['quantidade'].sum(), (inicio, fim)
+
+        diarias = estrutura.diarias(linhas, inicio, fim)
+        por_dia = no_periodo.groupby('dia_ordinal')['quantidade'].sum().reindex(range(inicio, fim + 1), fill_value=0)
+        assert diarias.shape == (len(linhas), fim - inicio + 1)
+        np.testing.assert_array_equal(diarias.sum(axis=0), por_dia.to_numpy())
+
+        anos = pd.to_datetime(no_periodo['dia_ordinal'], unit='D').dt.year.rename('ano')
+        por_ano = no_periodo['quantidade'].groupby(anos).sum()
+        assert estrutura.totais_por_ano(linhas, inicio, fim).to_dict() == por_ano.to_dict()
@@ -0,0 +1,46 @@
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+import painel_espacial
+from painel_espacial import PesosEspaciais, calcular_lisa
+
+
+class ExecutorNoProcesso:
+    """Executor que roda as tarefas na hora, para testar o despacho sem subir processos."""
+
+    def __init__(self):
+        self.tarefas = 0
+
+    def submit(self, funcao, *argumentos):
+        self.tarefas += 1
+        futuro = Future()
+        futuro.set_result(funcao(*argumentos))
+        return futuro
+
+
+def _grade(lado):
+    nomes = [f'M{i}' for i in range(lado * lado)]
+    matriz = np.zeros((lado * lado, lado * lado))
+    for i in range(lado * lado):
+        for j in (i - 1, i + 1, i - lado, i + lado):
+            if 0 <= j < lado * lado and (abs(i - j) == lado or i // lado == j // lado):
+                matriz[i, j] = 1
+    valores = pd.Series(np.random.default_rng(3).random(lado * lado), index=nomes)
+    return PesosEspaciais(nomes, matriz), valores
+
+
+def test_pool_so_e_criado_quando_a_carga_passa_do_limiar(monkeypatch):
+    pesos, valores = _grade(8)
+    executor = ExecutorNoProcesso()
+    criacoes = []
+    fabrica = lambda: criacoes.append(1) or executor
+
+    em_serie = calcular_lisa(pesos, valores, 99)
+    pd.testing.assert_frame_equal(calcular_lisa(pesos, valores, 99, executor=fabrica), em_serie)
+    assert not criacoes
+
+    monkeypatch.setattr(painel_espacial, 'LIMIAR_PARALELO', 0)
+    pd.testing.assert_frame_equal(calcular_lisa(pesos, valores, 99, executor=fabrica), em_serie)
+    assert len(criacoes) == 1 and executor.tarefas == 2
@@ -0,0 +1,20 @@
+import pandas as pd
+
+from painel_ingest import caminho_aliases, normalizar_serie
+
+
+def _diretorio_com_aliases(diretorio, linhas):
+    diretorio.mkdir()
+    pd.DataFrame(linhas, columns=['nome', 'nome_canonico']).to_csv(caminho_aliases(diretorio), index=False)
+    return diretorio
+
+
+def test_aliases_vem_do_diretorio_de_dados(tmp_path):
+    # Cada diretório tem a própria tabela; a leitura memorizada não pode misturar as duas.
+    primeiro = _diretorio_com_aliases(tmp_path / 'a', [('herval', "herval d'oeste")])
+    segundo = _diretorio_com_aliases(tmp_path / 'b', [('herval', 'herval velho')])
+    serie = pd.Series(['Herval', 'Joinville', None])
+
+    assert normalizar_serie(serie, caminho_aliases(primeiro)).tolist() == ['HERVAL OESTE', 'JOINVILLE', '']
+    assert normalizar_serie(serie, caminho_aliases(segundo)).tolist() == ['HERVAL VELHO', 'JOINVILLE', '']
+    assert normalizar_serie(serie, caminho_aliases(tmp_path)).tolist() == ['HERVAL', 'JOINVILLE', '']
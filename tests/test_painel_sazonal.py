@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from painel_consultas import CalendarioDias
+from painel_ingest import dia_ordinal
+from painel_sazonal import GRANULARIDADES, JANELAS_MOVEIS, agregar_serie, analisar_janelas, dias_de_evento, linha_de_base
+
+PRIMEIRO_DIA = int(dia_ordinal(pd.Timestamp('2022-09-01')))
+NATAL = int(dia_ordinal(pd.Timestamp('2022-12-25')))
+ANO_NOVO = int(dia_ordinal(pd.Timestamp('2023-01-01')))
+INICIO_EVENTOS, FIM_EVENTOS = pd.Timestamp('2023-01-01'), pd.Timestamp('2026-12-31')
+
+
+def _serie(natal=5.0):
+    serie = np.full((1, 240), 5.0)
+    serie[0, NATAL - PRIMEIRO_DIA] = natal
+    return serie
+
+
+def test_esperado_do_ano_novo_nao_depende_do_natal():
+    # 1º de janeiro - 7 dias = 25 de dezembro: sem a exclusão, o Natal entraria na referência do Ano Novo.
+    esperados = [
+        analisar_janelas(_serie(natal), PRIMEIRO_DIA, [ANO_NOVO], 3, dias_excluidos=[NATAL], replicas=10)['perfil']['esperado']
+        for natal in (5.0, 500.0)
+    ]
+    pd.testing.assert_series_equal(esperados[0], esperados[1])
+    assert esperados[0].loc[0] == 5.0
+
+    sem_exclusao = analisar_janelas(_serie(500.0), PRIMEIRO_DIA, [ANO_NOVO], 3, replicas=10)['perfil']['esperado']
+    assert sem_exclusao.loc[0] > 5.0
+
+
+def test_linha_de_base_faz_a_media_das_referencias_validas():
+    serie = np.arange(100, dtype=float)[None, :]
+    excluidos = np.zeros(100, dtype=bool)
+    excluidos[50 - 7] = True
+    esperado = linha_de_base(serie, 1, semanas=2, excluidos=excluidos)
+    assert esperado[0, 50] == np.mean([50 - 14, 50 + 7, 50 + 14])
+    assert np.isnan(esperado[0, 5])
+
+
+@pytest.fixture(scope='module')
+def calendario():
+    return CalendarioDias.carregar()
+
+
+def _datas_do_evento(calendario, evento):
+    dias = dias_de_evento(calendario, evento, int(dia_ordinal(INICIO_EVENTOS)), int(dia_ordinal(FIM_EVENTOS)))
+    return pd.to_datetime(dias, unit='D').strftime('%Y-%m-%d').tolist()
+
+
+def _dias_uteis(calendario):
+    """Datas do período com o nome do feriado e se são dias úteis, contadas uma a uma."""
+    datas = pd.Series(pd.date_range(INICIO_EVENTOS, FIM_EVENTOS))
+    feriados = pd.Series(calendario.feriados_dias(dia_ordinal(datas)), index=datas.index)
+    return datas, feriados, (datas.dt.dayofweek < 5) & feriados.isna()
+
+
+def test_carnaval_e_45_dias_antes_da_sexta_feira_santa(calendario):
+    datas, feriados, _ = _dias_uteis(calendario)
+    sextas_santas = datas[feriados == 'Sexta-feira Santa']
+    esperado = (sextas_santas - pd.Timedelta(days=45)).dt.strftime('%Y-%m-%d').tolist()
+    assert _datas_do_evento(calendario, 'carnaval') == esperado
+    assert {'2024-02-13', '2025-03-04'} <= set(esperado)
+    assert (pd.to_datetime(esperado).dayofweek == 1).all()
+
+
+def test_enforcamentos_sao_segundas_antes_e_sextas_depois_de_feriado(calendario):
+    datas, feriados, uteis = _dias_uteis(calendario)
+    esperado = [
+        datas[i].strftime('%Y-%m-%d') for i in range(len(datas))
+        if uteis[i] and (
+            (datas[i].dayofweek == 0 and i + 1 < len(datas) and pd.notna(feriados[i + 1]))
+            or (datas[i].dayofweek == 4 and i > 0 and pd.notna(feriados[i - 1]))
+        )
+    ]
+    assert _datas_do_evento(calendario, 'enforcamentos') == esperado
+    # Finados (quinta), Dia do Trabalhador (quinta) e Tiradentes (terça).
+    assert {'2023-11-03', '2025-05-02', '2026-04-20'} <= set(esperado)
+
+
+def test_pagamento_e_o_quinto_dia_util_do_mes(calendario):
+    datas, _, uteis = _dias_uteis(calendario)
+    esperado = datas[uteis].groupby(datas[uteis].dt.to_period('M')).nth(4).dt.strftime('%Y-%m-%d').tolist()
+    assert _datas_do_evento(calendario, 'pagamento') == esperado
+    # Janeiro de 2024 começa com o feriado de Ano Novo numa segunda; maio de 2025, com o Dia do Trabalhador numa quinta.
+    assert {'2024-01-08', '2025-05-08'} <= set(esperado)
+
+
+# Série de dois grupos começando numa quarta-feira no meio do mês, com um mês inteiro sem ocorrências.
+INICIO_SERIE = pd.Timestamp('2021-11-17')
+MES_VAZIO = pd.Timestamp('2022-07-01')
+FREQUENCIAS_PERIODOS = {'semanal': 'W-SAT', 'mensal': 'M', 'trimestral': 'Q', 'anual': 'Y'}
+
+
+@pytest.fixture(scope='module')
+def serie_grupos():
+    datas = pd.date_range(INICIO_SERIE, periods=800)
+    serie = np.random.default_rng(3).poisson(4, (2, len(datas))).astype(float)
+    serie[:, (datas >= MES_VAZIO) & (datas < MES_VAZIO + pd.offsets.MonthBegin())] = 0
+    return datas, serie
+
+
+def _agregar_com_pandas(datas, serie, granularidade):
+    por_dia = pd.DataFrame(serie.T, index=datas, columns=['a', 'b'])
+    if granularidade in JANELAS_MOVEIS:
+        por_periodo = por_dia.rolling(JANELAS_MOVEIS[granularidade]).sum().dropna()
+    elif granularidade == 'diaria':
+        por_periodo = por_dia
+    else:
+        por_periodo = por_dia.groupby(datas.to_period(FREQUENCIAS_PERIODOS[granularidade]).start_time).sum()
+    longo = por_periodo.rename_axis('periodo').melt(ignore_index=False, var_name='grupo', value_name='quantidade')
+    return longo.reset_index().astype({'quantidade': np.int64})
+
+
+@pytest.mark.parametrize('granularidade', list(GRANULARIDADES))
+def test_agregar_serie_equivale_ao_pandas(serie_grupos, granularidade):
+    datas, serie = serie_grupos
+    agregada = agregar_serie(serie, int(dia_ordinal(INICIO_SERIE)), granularidade, grupos=['a', 'b'])
+    esperada = _agregar_com_pandas(datas, serie, granularidade)
+    pd.testing.assert_frame_equal(agregada, esperada, check_dtype=False)
+
+
+def test_agregar_serie_mantem_periodos_vazios_com_zero(serie_grupos):
+    datas, serie = serie_grupos
+    mensal = agregar_serie(serie, int(dia_ordinal(INICIO_SERIE)), 'mensal', grupos=['a', 'b'])
+    assert mensal.groupby('grupo').size().tolist() == [datas.to_period('M').nunique()] * 2
+    assert mensal.loc[mensal['periodo'] == MES_VAZIO, 'quantidade'].tolist() == [0, 0]
+    assert mensal['periodo'].iloc[0] == pd.Timestamp('2021-11-01')